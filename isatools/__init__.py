@@ -14,55 +14,65 @@ Example:
     We can import the same module without specifying the .convert package::
 
         $ from isatools import isatab2json
+
+The submodules are imported lazily, the first time they are accessed, so that
+``import isatools`` does not import every converter and network client along
+with their dependencies.
 """
 from __future__ import absolute_import
 
-from isatools.convert import (
-    isatab2cedar as isatab2cedar_module,
-    isatab2json as isatab2json_module,
-    isatab2sampletab as isatab2sampletab_module,
-    isatab2sra as isatab2sra_module,
-    isatab2w4m as isatab2w4m_module,
-    json2isatab as json2isatab_module,
-    json2magetab as json2magetab_module,
-    json2sampletab as json2sampletab_module,
-    json2sra as json2sra_module,
-    magetab2isatab as magetab2isatab_module,
-    magetab2json as magetab2json_module,
-    mzml2isa as mzml2isa_module,
-    sampletab2isatab as sampletab2isatab_module,
-    sampletab2json as sampletab2json_module,
-)
-from isatools.net import (
-    biocrates2isatab as biocrates2isatab_module,
-    mtbls as mtbls_module,
-    mw2isa as mw2isa_module,
-    ols as ols_module,
-    pubmed as pubmed_module,
-    sra2isatab as sra2isatab_module,
-)
+import importlib
+import importlib.util
 
 
 # isatools.convert packages
-isatab2cedar = isatab2cedar_module
-isatab2json = isatab2json_module
-isatab2sampletab = isatab2sampletab_module
-isatab2sra = isatab2sra_module
-isatab2w4m = isatab2w4m_module
-json2isatab = json2isatab_module
-json2magetab = json2magetab_module
-json2sampletab = json2sampletab_module
-json2sra = json2sra_module
-magetab2isatab = magetab2isatab_module
-magetab2json = magetab2json_module
-mzml2isa = mzml2isa_module
-sampletab2isatab = sampletab2isatab_module
-sampletab2json = sampletab2json_module
+_CONVERT_MODULES = (
+    'isatab2cedar',
+    'isatab2json',
+    'isatab2sampletab',
+    'isatab2sra',
+    'isatab2w4m',
+    'json2isatab',
+    'json2magetab',
+    'json2sampletab',
+    'json2sra',
+    'magetab2isatab',
+    'magetab2json',
+    'mzml2isa',
+    'sampletab2isatab',
+    'sampletab2json',
+)
 
 # isatools.net packages
-biocrates2isatab = biocrates2isatab_module
-mtbls = mtbls_module
-mw2isa = mw2isa_module
-ols = ols_module
-pubmed = pubmed_module
-sra2isatab = sra2isatab_module
+_NET_MODULES = (
+    'biocrates2isatab',
+    'mtbls',
+    'mw2isa',
+    'ols',
+    'pubmed',
+    'sra2isatab',
+)
+
+# public name -> fully qualified name of the module it refers to
+_LAZY_MODULES = {}
+for _package, _module_names in (('isatools.convert', _CONVERT_MODULES), ('isatools.net', _NET_MODULES)):
+    for _module_name in _module_names:
+        _LAZY_MODULES[_module_name] = _LAZY_MODULES[_module_name + '_module'] = \
+            '{0}.{1}'.format(_package, _module_name)
+del _package, _module_names, _module_name
+
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        module = importlib.import_module(_LAZY_MODULES[name])
+    elif not name.startswith('_') and importlib.util.find_spec('{0}.{1}'.format(__name__, name)) is not None:
+        # a subpackage, e.g. isatools.isatab, that used to be imported along with the converters
+        module = importlib.import_module('{0}.{1}'.format(__name__, name))
+    else:
+        raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
+    globals()[name] = module
+    return module
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_MODULES))
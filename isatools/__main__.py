@@ -12,6 +12,8 @@ import json
 import os
 import sys
 
+from isatools.batch import TASKS as BATCH_TASKS
+
 
 def main(argv=None):
     """Run **isatools** from the command line
@@ -33,21 +35,49 @@ def main(argv=None):
     p.add_argument('-c', dest='cmd', help='isatools API command to run',
                    required=True,
                    choices=['isatab2json', 'json2isatab', 'sampletab2isatab',
-                            'sampletab2json'])
+                            'sampletab2json', 'batch'])
     p.add_argument('-i', dest='in_path',
-                   help='in  (files or directory will be read from here)',
-                   required=True)
+                   help='in  (files or directory will be read from here, '
+                        'a glob pattern of them for batch)')
     p.add_argument('-o', dest='out_path',
                    help='out (file will be written out here or written to '
-                        'directory if ISA-Tab archive out)', required=True)
+                        'directory if ISA-Tab archive out, the JSON Lines '
+                        'results file for batch)', required=True)
     p.add_argument(
         '--version', action='version', version='isatools {}'.format(
             "0.10"))
     p.add_argument('-v', dest='verbose', help="show more output",
                    action='store_true', default=False)
 
+    batch_options = p.add_argument_group('batch options')
+    batch_options.add_argument(
+        '--task', dest='tasks', action='append', choices=BATCH_TASKS,
+        help='task to run on every input, may be repeated')
+    batch_options.add_argument(
+        '--manifest', help='file listing the inputs, one path or JSON object '
+                           '{"input", "task", "output"} per line')
+    batch_options.add_argument(
+        '--out-dir', help='directory the conversions are written to')
+    batch_options.add_argument(
+        '--workers', type=int, help='number of tasks run concurrently '
+                                    '(default: number of CPUs)')
+    batch_options.add_argument(
+        '--timeout', type=float, help='seconds a task may run before it is '
+                                      'killed')
+    batch_options.add_argument(
+        '--max-memory', type=int, help='MB of memory a task may use')
+    batch_options.add_argument(
+        '--resume', action='store_true', default=False,
+        help='skip the tasks already completed successfully in the results '
+             'file, running the failed ones again')
+
     args = p.parse_args(argv or sys.argv[1:])
 
+    if args.cmd == 'batch':
+        return run_batch_command(p, args)
+    if args.in_path is None:
+        p.error('the following arguments are required: -i')
+
     if args.verbose:
         print("{} input: {}".format(os.linesep, args.in_path))
         print("output: {}".format(args.out_path))
@@ -75,5 +105,46 @@ def main(argv=None):
                 sampletab2json.convert(in_fp, out_fp)
 
 
+def run_batch_command(parser, args):
+    """Run the tasks of a batch from the command line
+
+    Args:
+        parser (argparse.ArgumentParser): the parser, to report errors with.
+        args (argparse.Namespace): the parsed arguments.
+
+    Returns:
+        dict: the summary of the batch.
+    """
+    from isatools import batch
+    if (args.in_path is None) == (args.manifest is None):
+        parser.error('batch takes either a glob pattern with -i or a '
+                     '--manifest')
+    try:
+        if args.manifest is not None:
+            items = batch.read_manifest(args.manifest, args.tasks,
+                                        args.out_dir)
+        elif not args.tasks:
+            parser.error('batch needs at least one --task')
+        else:
+            items = batch.glob_items(args.in_path, args.tasks, args.out_dir)
+    except ValueError as e:
+        parser.error(str(e))
+
+    def report(result):
+        if args.verbose:
+            print("{status}\t{task}\t{input}".format(**result))
+
+    runner = batch.BatchRunner(
+        args.out_path, workers=args.workers, timeout=args.timeout,
+        max_memory=args.max_memory, resume=args.resume)
+    summary = runner.run(items, callback=report)
+    print("{completed} tasks completed ({ok} ok, {failed} failed, {skipped} "
+          "already done) in {elapsed:.1f}s: {items_per_second:.2f} tasks/s, "
+          "{mb_per_second:.2f} MB/s".format(
+              mb_per_second=summary['bytes_per_second'] / 1024 / 1024,
+              **summary))
+    return summary
+
+
 if __name__ == '__main__':
     main()
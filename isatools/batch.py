@@ -0,0 +1,361 @@
+"""Batch conversion and validation of many ISA archives.
+
+A batch is a list of items, each one a task (a conversion or a validation)
+to run on an input file or directory. Items run in a bounded pool of worker
+processes, one process per item, so that an item running past its timeout or
+its memory cap is killed without taking the rest of the batch down with it.
+
+The result of every item is appended to a JSON Lines file as soon as the
+item completes, so that a batch can be followed while it runs and resumed
+after an interruption: the items that already ran successfully are skipped,
+and the ones that failed, timed out or crashed run again. The last result of
+an item in the file is the current one.
+"""
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+log = logging.getLogger('isatools')
+
+CONVERSIONS = ('isatab2json', 'json2isatab', 'sampletab2isatab', 'sampletab2json')
+
+VALIDATIONS = ('validate-isatab', 'validate-isajson')
+
+TASKS = CONVERSIONS + VALIDATIONS
+
+# the extension of the output of the conversions, None for a directory
+OUTPUT_EXTENSIONS = {
+    'isatab2json': '.json',
+    'json2isatab': None,
+    'sampletab2isatab': None,
+    'sampletab2json': '.json'
+}
+
+
+def get_output_path(task: str, in_path: str, out_dir: str) -> str | None:
+    """Gets the path a conversion writes to, in out_dir and named after the
+    input
+
+    :param task: The task
+    :param in_path: The path of the input file or directory
+    :param out_dir: The directory of the outputs
+    :return: The output path, None for a validation
+    """
+    if task in VALIDATIONS:
+        return None
+    if out_dir is None:
+        raise ValueError('An output directory is required for the %s conversion of %s' % (task, in_path))
+    name = os.path.splitext(os.path.basename(os.path.normpath(in_path)))[0]
+    return os.path.join(out_dir, name + (OUTPUT_EXTENSIONS[task] or ''))
+
+
+def make_item(task: str, in_path: str, out_path: str = None, out_dir: str = None) -> dict:
+    """Makes a batch item
+
+    :param task: One of TASKS
+    :param in_path: The path of the input file or directory
+    :param out_path: The output path of a conversion, by default named after
+    the input in out_dir
+    :param out_dir: The directory of the outputs
+    :return: The item, as a dict of 'task', 'input' and 'output'
+    """
+    if task not in TASKS:
+        raise ValueError('Unknown batch task %s, expected one of %s' % (task, ', '.join(TASKS)))
+    if out_path is None:
+        out_path = get_output_path(task, in_path, out_dir)
+    return {'task': task, 'input': in_path, 'output': out_path}
+
+
+def glob_items(pattern: str, tasks: list, out_dir: str = None) -> list:
+    """Makes the batch items of the paths matching a glob pattern
+
+    :param pattern: The glob pattern, ** matching any directories
+    :param tasks: The tasks to run on every path
+    :param out_dir: The directory of the outputs
+    :return: The items, each path with all its tasks in turn
+    """
+    return [make_item(task, in_path, out_dir=out_dir)
+            for in_path in sorted(glob.glob(pattern, recursive=True)) for task in tasks]
+
+
+def read_manifest(manifest_path: str, tasks: list = None, out_dir: str = None) -> list:
+    """Reads the batch items of a manifest file. Every line of the manifest
+    is either the path of an input, to run all of tasks on, or a JSON object
+    with an 'input' path and optionally a 'task' and an 'output' path.
+    Blank lines and lines starting with # are ignored.
+
+    :param manifest_path: The path of the manifest
+    :param tasks: The tasks of the entries not naming their task
+    :param out_dir: The directory of the outputs
+    :return: The items
+    """
+    items = []
+    with open(manifest_path, encoding='utf-8') as manifest:
+        for line_number, line in enumerate(manifest, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            entry = json.loads(line) if line.startswith('{') else {'input': line}
+            if 'input' not in entry:
+                raise ValueError('No input in line %s of %s' % (line_number, manifest_path))
+            entry_tasks = [entry['task']] if 'task' in entry else tasks
+            if not entry_tasks:
+                raise ValueError('No task for line %s of %s' % (line_number, manifest_path))
+            items.extend(make_item(task, entry['input'], entry.get('output'), out_dir) for task in entry_tasks)
+    return items
+
+
+def read_completed(results_path: str) -> set:
+    """Reads the items already completed successfully in a results file: the
+    conversions that finished and the validations that produced a report.
+    The items whose last result is a failure, a timeout or a crash are left
+    out, to be run again
+
+    :param results_path: The path of the JSON Lines results file
+    :return: The set of the (task, input) of the completed items
+    """
+    statuses = {}
+    try:
+        with open(results_path, encoding='utf-8') as results:
+            for line in results:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # a line cut short by an interruption
+                    continue
+                statuses[(result['task'], result['input'])] = result.get('status')
+    except FileNotFoundError:
+        pass
+    return {key for key, status in statuses.items() if status == 'ok'}
+
+
+def get_size(path: str) -> int:
+    """Gets the size in bytes of a file, or of all the files in a directory"""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names)
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def run_task(task: str, in_path: str, out_path: str = None) -> dict | None:
+    """Runs a conversion or a validation
+
+    :param task: One of TASKS
+    :param in_path: The path of the input file or directory
+    :param out_path: The output path of a conversion
+    :return: The validation report, None for a conversion
+    """
+    if task in CONVERSIONS:
+        if OUTPUT_EXTENSIONS[task] is None:
+            os.makedirs(out_path, exist_ok=True)
+        elif os.path.dirname(out_path):
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+    if task == 'isatab2json':
+        from isatools.convert import isatab2json
+        isa_json = isatab2json.convert(in_path)
+        if isa_json is None:
+            raise RuntimeError('Could not convert %s, check that it is a valid ISA-Tab archive' % in_path)
+        with open(out_path, 'w') as out_fp:
+            json.dump(isa_json, out_fp)
+
+    elif task == 'json2isatab':
+        from isatools.convert import json2isatab
+        with open(in_path) as in_fp:
+            json2isatab.convert(in_fp, out_path)
+        if not os.path.isfile(os.path.join(out_path, 'i_investigation.txt')):
+            raise RuntimeError('Could not convert %s, check that it is a valid ISA-JSON file' % in_path)
+
+    elif task == 'sampletab2isatab':
+        from isatools.convert import sampletab2isatab
+        with open(in_path) as in_fp:
+            sampletab2isatab.convert(in_fp, out_path)
+
+    elif task == 'sampletab2json':
+        from isatools.convert import sampletab2json
+        with open(in_path) as in_fp:
+            with open(out_path, 'w') as out_fp:
+                sampletab2json.convert(in_fp, out_fp)
+
+    elif task == 'validate-isatab':
+        from isatools import isatab
+        from isatools.utils import utf8_text_file_open
+        i_files = glob.glob(os.path.join(in_path, 'i_*.txt'))
+        if len(i_files) != 1:
+            raise RuntimeError('Could not find an investigation file in %s' % in_path)
+        with utf8_text_file_open(i_files[0]) as fp:
+            return isatab.validate(fp)
+
+    elif task == 'validate-isajson':
+        from isatools import isajson
+        with open(in_path) as fp:
+            return isajson.validate(fp)
+
+    else:
+        raise ValueError('Unknown batch task %s' % task)
+    return None
+
+
+def _run_in_child(conn, item: dict, max_memory: int) -> None:
+    """Runs an item in a worker process and sends its result back"""
+    try:
+        if max_memory and resource is not None:
+            limit = max_memory * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        try:
+            report = run_task(item['task'], item['input'], item['output'])
+            result = {'status': 'ok'}
+            if report is not None:
+                result['report'] = report
+        except MemoryError:
+            result = {'status': 'memory', 'error': 'Exceeded the memory cap of %s MB' % max_memory}
+        except Exception as e:
+            result = {'status': 'error', 'error': '%s: %s' % (type(e).__name__, e)}
+        conn.send_bytes(json.dumps(result, default=str).encode('utf-8'))
+    finally:
+        conn.close()
+
+
+class BatchRunner:
+    """Runs batch items in a bounded pool of worker processes and appends
+    their results to a JSON Lines file
+    """
+
+    def __init__(
+            self,
+            results_path: str,
+            workers: int = None,
+            timeout: float = None,
+            max_memory: int = None,
+            resume: bool = False
+    ) -> None:
+        """
+        :param results_path: The path of the JSON Lines results file
+        :param workers: The number of items run concurrently, by default the
+        number of CPUs
+        :param timeout: The number of seconds an item may run before it is
+        killed, no limit by default
+        :param max_memory: The address space in MB a worker process may use,
+        no limit by default
+        :param resume: Whether to skip the items already completed
+        successfully in the results file, and append the results of the
+        others to it, rather than starting it again
+        """
+        self.results_path = results_path
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.resume = resume
+        if max_memory and resource is None:  # pragma: no cover
+            log.warning('Memory caps are not supported on this platform, ignoring them')
+
+    def __open_results(self):
+        if not self.resume:
+            return open(self.results_path, 'w', encoding='utf-8')
+        try:
+            with open(self.results_path, 'r+b') as results:
+                # drop the line an interruption cut short
+                content = results.read()
+                results.truncate(content.rfind(b'\n') + 1)
+        except FileNotFoundError:
+            pass
+        return open(self.results_path, 'a', encoding='utf-8')
+
+    def run(self, items: list, callback=None) -> dict:
+        """Runs a batch
+
+        :param items: The items, as made by make_item
+        :param callback: A function called with the result of every item
+        :return: The summary of the batch, with the number of items 'total',
+        'skipped' as already completed, 'completed', 'ok' and 'failed', the
+        'elapsed' seconds, and the throughput in 'items_per_second' and
+        'bytes_per_second' of input
+        """
+        completed_items = read_completed(self.results_path) if self.resume else set()
+        pending = deque(item for item in items if (item['task'], item['input']) not in completed_items)
+        summary = {'total': len(items), 'skipped': len(items) - len(pending), 'completed': 0, 'ok': 0, 'failed': 0}
+        input_bytes = 0
+        context = multiprocessing.get_context()
+        running = {}
+        start = time.monotonic()
+        with self.__open_results() as results:
+            while pending or running:
+                while pending and len(running) < self.workers:
+                    item = pending.popleft()
+                    receiver, sender = context.Pipe(duplex=False)
+                    process = context.Process(target=_run_in_child, args=(sender, item, self.max_memory), daemon=True)
+                    process.start()
+                    sender.close()
+                    running[receiver] = (process, item, time.monotonic())
+
+                now = time.monotonic()
+                wait_timeout = None
+                if self.timeout is not None:
+                    wait_timeout = max(0, min(started + self.timeout for _, _, started in running.values()) - now)
+                ready = wait(list(running), timeout=wait_timeout)
+
+                finished = []
+                for receiver in ready:
+                    process, item, started = running.pop(receiver)
+                    try:
+                        result = json.loads(receiver.recv_bytes().decode('utf-8'))
+                    except (EOFError, OSError):
+                        process.join()
+                        result = {'status': 'crashed',
+                                  'error': 'The worker process exited with code %s' % process.exitcode}
+                    finished.append((receiver, process, item, started, result))
+                if self.timeout is not None:
+                    now = time.monotonic()
+                    for receiver, (process, item, started) in list(running.items()):
+                        if now - started >= self.timeout:
+                            del running[receiver]
+                            process.kill()
+                            result = {'status': 'timeout', 'error': 'Exceeded the timeout of %ss' % self.timeout}
+                            finished.append((receiver, process, item, started, result))
+
+                for receiver, process, item, started, result in finished:
+                    receiver.close()
+                    process.join()
+                    result = dict(item, status=result.pop('status'), elapsed=round(time.monotonic() - started, 3),
+                                  **result)
+                    results.write(json.dumps(result, default=str) + '\n')
+                    results.flush()
+                    summary['completed'] += 1
+                    summary['ok' if result['status'] == 'ok' else 'failed'] += 1
+                    input_bytes += get_size(item['input'])
+                    if result['status'] != 'ok':
+                        log.error('%s of %s failed: %s' % (item['task'], item['input'], result['error']))
+                    if callback is not None:
+                        callback(result)
+
+        elapsed = time.monotonic() - start
+        summary['elapsed'] = round(elapsed, 3)
+        summary['items_per_second'] = round(summary['completed'] / elapsed, 3) if elapsed else 0.0
+        summary['bytes_per_second'] = round(input_bytes / elapsed, 1) if elapsed else 0.0
+        return summary
+
+
+def run_batch(items: list, results_path: str, **kwargs) -> dict:
+    """Runs a batch, see BatchRunner
+
+    :param items: The items, as made by make_item, glob_items or
+    read_manifest
+    :param results_path: The path of the JSON Lines results file
+    :return: The summary of the batch
+    """
+    return BatchRunner(results_path, **kwargs).run(items)
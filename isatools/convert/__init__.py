@@ -0,0 +1,13 @@
+"""This package provides converters between ISA formats and other formats.
+
+The converter modules are imported lazily, on first attribute access, e.g.
+isatools.convert.isatab2json
+"""
+import importlib
+import importlib.util
+
+
+def __getattr__(name):
+    if not name.startswith('_') and importlib.util.find_spec('{0}.{1}'.format(__name__, name)) is not None:
+        return importlib.import_module('{0}.{1}'.format(__name__, name))
+    raise AttributeError('module {0!r} has no attribute {1!r}'.format(__name__, name))
@@ -13,7 +13,6 @@ from jsonschema import Draft4Validator, RefResolver
 
 from isatools import isatab
 from isatools.io.isatab_parser import parse
-from isatools.isajson import ISAJSONEncoder
 
 
 log = logging.getLogger('isatools')
@@ -56,7 +55,7 @@ def convert(work_dir, identifier_type=IdentifierType.name,
         with open(i_files[0], 'r', encoding='utf-8') as fp:
             ISA = isatab.load(fp)
             log.info("Dumping ISA-JSON")
-            return json.loads(json.dumps(ISA, cls=ISAJSONEncoder))
+            return ISA.to_dict()
     else:
         converter = ISATab2ISAjson_v1(identifier_type)
         log.info("Using old parser")
@@ -75,18 +74,19 @@ class ISATab2ISAjson_v1:
     ARRAY_DESIGN_REF = "Array Design REF"
 
     def __init__(self, identifier_type):
-        self.identifiers = list()  # list of dictionaries
+        self.identifiers = dict()  # dictionary of dictionaries, by type
         self.counters = dict()
         self.identifier_type = identifier_type
 
     def setIdentifier(self, type, name, identifier):
-        self.identifiers.append(dict([("type", type), ("name", name),
-                                      ("identifier", identifier)]))
+        # the first identifier set for a name is the one kept
+        self.identifiers.setdefault(type, dict()).setdefault(name, identifier)
 
     def getIdentifier(self, type, name):
-        for subVal in self.identifiers:
-            if subVal["type"] == type and subVal["name"] == name:
-                return subVal["identifier"]
+        try:
+            return self.identifiers[type].get(name)
+        except KeyError:
+            return None
 
     def generateIdentifier(self, type, name):
         try:
@@ -20,6 +20,7 @@ import sys
 from string import Template
 
 import numpy
+import pandas
 
 from isatools import isatab as ISATAB
 from isatools.utils import utf8_text_file_open
@@ -29,6 +30,12 @@ __author__ = 'pkrog (Pierrick Roger)'
 
 log = logging.getLogger('isatools')
 
+# Number of rows of the sample x variable matrix written at a time by the
+# streaming path
+DEFAULT_CHUNKSIZE = 10000
+
+_UNWANTED_NAME_CHARS = re.compile(r'[^A-Za-z0-9_.]')
+
 # Check Python version
 if sys.hexversion < 0x03040000:
     sys.exit("Python 3.4 or newer is required to run this program.")
@@ -121,6 +128,11 @@ def read_args():
                              'metadata columns. The value is a comma separated'
                              ' list of column names.',
                         dest='var_na_filtering', required=False)
+    parser.add_argument('-c',
+                        help='Write the sample x variable matrix by chunks of '
+                             'the given number of rows, instead of building '
+                             'it in memory.',
+                        dest='chunksize', required=False, type=int)
     args = parser.parse_args()
     args = vars(args)
 
@@ -225,7 +237,7 @@ def get_data_file(assay):
 
 def load_df(path):
     df = ISATAB.read_tfile(path)
-    df = df.map(lambda x: numpy.nan if x == '' else x)
+    df = df.replace('', numpy.nan)
     return df
 
 
@@ -266,7 +278,7 @@ def make_names(u, uniq=False):
 
         # Remove unwanted characters
         else:
-            v[i] = re.sub(r'[^A-Za-z0-9_.]', '.', v[i])
+            v[i] = _UNWANTED_NAME_CHARS.sub('.', v[i])
 
     # Make sure all elements are unique
     if uniq:
@@ -300,22 +312,19 @@ def make_names(u, uniq=False):
 
 def make_variable_names(assay_df):
 
-    var_names = [''] * assay_df.shape[0]
+    var_names = pandas.Series('', index=assay_df.index, dtype=object)
 
     # Make variable names from data values
     for col in ['mass_to_charge', 'retention_time', 'chemical_shift']:
         if col in assay_df.keys():
-            for i, v in enumerate(assay_df[col].values):
-                if type(v) == str or not numpy.isnan(v):
-                    x = var_names[i]
-                    if x == '':
-                        x = str(v)
-                    else:
-                        x = '_'.join([x, str(v)])
-                    var_names[i] = x
+            values = assay_df[col]
+            present = values.notna()
+            values = values[present].map(str)
+            names = var_names[present]
+            var_names[present] = names.where(names == '', names + '_') + values
 
     # Normalize names
-    var_names = ['X' + s for s in var_names]
+    var_names = ['X' + s for s in var_names.tolist()]
     var_names = make_names(var_names, uniq=True)
 
     return var_names
@@ -362,12 +371,12 @@ def get_sample_names(assay_df, measures_df):
 
     # Loop on all assay data frame columns
     for col in assay_df.axes[1]:
-        n = assay_df.get(col).tolist()
+        n = assay_df.get(col)
 
         # Do you find all values of this column inside the column names of the
         # measure data frame?
-        if len(n) == len(set(n)) and all([x in measures_cols for x in n]):
-            sample_names = n
+        if n.is_unique and n.isin(measures_cols).all():
+            sample_names = n.tolist()
             break
 
     return sample_names
@@ -401,7 +410,8 @@ def make_variable_metadata(measures_df, sample_names, variable_names,
                            normalize=True):
     # Get variable columns from measures data frame
     all_cols = measures_df.axes[1].tolist()
-    variable_cols = [x for x in all_cols if x not in sample_names]
+    sample_cols = set(sample_names)
+    variable_cols = [x for x in all_cols if x not in sample_cols]
     variable_metadata = measures_df.get(variable_cols)
 
     # Add variable names as columns
@@ -418,7 +428,8 @@ def make_variable_metadata(measures_df, sample_names, variable_names,
 # Make matrix {{{1
 ################################################################
 
-def make_matrix(measures_df, sample_names, variable_names, normalize=True):
+def make_matrix(measures_df, sample_names, variable_names, normalize=True,
+                dtype=None):
     # Take all sample columns from measures data frame
     sample_variable_matrix = measures_df.get(sample_names)
 
@@ -429,6 +440,10 @@ def make_matrix(measures_df, sample_names, variable_names, normalize=True):
             'Some or all sample names were not found among the column names of'
             ' the data array.')
 
+    # Parse the values, e.g. as float32 or float64
+    if dtype is not None:
+        sample_variable_matrix = sample_variable_matrix.astype(dtype)
+
     # Add variable names as columns
     sample_variable_matrix.insert(0, 'variable.name', variable_names)
 
@@ -442,11 +457,27 @@ def make_matrix(measures_df, sample_names, variable_names, normalize=True):
     return sample_variable_matrix
 
 
+# Make matrix chunks {{{1
+################################################################
+
+def make_matrix_chunks(measures_df, sample_names, variable_names,
+                       normalize=True, dtype=None,
+                       chunksize=DEFAULT_CHUNKSIZE):
+    # Same as make_matrix, but yields the matrix by chunks of rows, so that
+    # only one chunk of the data array is copied at a time. There is always
+    # at least one chunk, for the header.
+    for start in range(0, max(measures_df.shape[0], 1), chunksize):
+        stop = start + chunksize
+        yield make_matrix(measures_df.iloc[start:stop], sample_names,
+                          variable_names[start:stop], normalize=normalize,
+                          dtype=dtype)
+
+
 # Convert to W4M {{{1
 ################################################################
 
 def convert2w4m(input_dir, study_filename=None, assay_filename=None,
-                all_assays=False):
+                all_assays=False, chunksize=None, dtype=None):
     # Select study
     investigation_file = get_investigation_file(input_dir)
     study = select_study(investigation_file, study_filename)
@@ -461,9 +492,9 @@ def convert2w4m(input_dir, study_filename=None, assay_filename=None,
 
     # Loop on all assays
     w4m_assays = []
+    study_df = get_study_df(input_dir, study)
     for assay in assays:
         info('Processing assay "{}".'.format(assay.filename))
-        study_df = get_study_df(input_dir, study)
         assay_df = get_assay_df(input_dir, assay)
         measures_df = get_measures_df(input_dir, assay)
         variable_names = make_variable_names(measures_df)
@@ -476,10 +507,16 @@ def convert2w4m(input_dir, study_filename=None, assay_filename=None,
         variable_metadata = make_variable_metadata(
             measures_df=measures_df, sample_names=sample_names,
             variable_names=variable_names, normalize=True)
-        sample_variable_matrix = make_matrix(measures_df=measures_df,
-                                             sample_names=sample_names,
-                                             variable_names=variable_names,
-                                             normalize=True)
+        # With a chunk size, the matrix is an iterator of data frames
+        if chunksize is None:
+            sample_variable_matrix = make_matrix(
+                measures_df=measures_df, sample_names=sample_names,
+                variable_names=variable_names, normalize=True, dtype=dtype)
+        else:
+            sample_variable_matrix = make_matrix_chunks(
+                measures_df=measures_df, sample_names=sample_names,
+                variable_names=variable_names, normalize=True, dtype=dtype,
+                chunksize=chunksize)
         w4m_assays.append(dict(samp=sample_metadata, var=variable_metadata,
                                mat=sample_variable_matrix,
                                filename=assay.filename,
@@ -493,19 +530,22 @@ def convert2w4m(input_dir, study_filename=None, assay_filename=None,
 
 def write_data_frame(df, output_dir, template_filename, study, assay):
 
-    # NA values are removed by `read_tfile()` and replaced by ''.
-    # Put them back here.
-    df_with_na = df.map(lambda x: numpy.nan if x == '' else x)
-
     # Set filename
     filename = FilenameTemplate(template_filename).substitute(s=study, a=assay)
     if output_dir is not None:
         filename = os.path.join(output_dir, filename)
 
-    # Write data frame
-    df_with_na.to_csv(
-        path_or_buf=filename, sep='\t', na_rep='NA', index=False,
-        quoting=csv.QUOTE_NONNUMERIC)
+    # Write data frame, or iterator of data frame chunks
+    if isinstance(df, pandas.DataFrame):
+        df = [df]
+    with open(filename, 'w', encoding='utf-8', newline='') as output_fp:
+        for i, chunk in enumerate(df):
+
+            # NA values are removed by `read_tfile()` and replaced by ''.
+            # Put them back here.
+            chunk.replace('', numpy.nan).to_csv(
+                path_or_buf=output_fp, sep='\t', na_rep='NA', index=False,
+                header=i == 0, quoting=csv.QUOTE_NONNUMERIC)
 
 
 # Write assays into files {{{1
@@ -540,20 +580,34 @@ def filter_na_values(assays, samp_na_filtering=None, var_na_filtering=None):
             removed_sample_names = numpy.setdiff1d(
                 assay['samp']['sample.name'], samp['sample.name'])
             assay['samp'] = samp
-            assay['mat'] = assay['mat'].drop(
-                labels=removed_sample_names.tolist(), axis=1)
+            assay['mat'] = drop_matrix_labels(
+                assay['mat'], labels=removed_sample_names.tolist(), axis=1)
 
         if var_na_filtering is not None:
             cols = make_names(var_na_filtering)
-            var_names = assay['var']['variable.name'].tolist()
-            assay['var'] = assay['var'].dropna(axis=0, how='all', subset=cols)
-            kept_var_names = assay['var']['variable.name'].tolist()
-            removed_variable_names_index = []
-            for i, v in enumerate(var_names):
-                if v not in kept_var_names:
-                    removed_variable_names_index.append(i)
-            assay['mat'] = assay['mat'].drop(labels=[assay['mat'].axes[0][i] for i in removed_variable_names_index],
-                                             axis=0)
+            var = assay['var']
+            assay['var'] = var.dropna(axis=0, how='all', subset=cols)
+            # The matrix rows have the same labels as the variable rows
+            kept = var['variable.name'].isin(assay['var']['variable.name'])
+            assay['mat'] = drop_matrix_labels(
+                assay['mat'], labels=var.index[~kept.values].tolist(), axis=0)
+
+
+# Drop matrix labels {{{1
+################################################################
+
+def drop_matrix_labels(mat, labels, axis):
+    # Matrix built by make_matrix
+    if isinstance(mat, pandas.DataFrame):
+        return mat.drop(labels=labels, axis=axis)
+
+    # Matrix chunks built by make_matrix_chunks, where each row label is in
+    # one chunk only
+    if axis == 0:
+        labels = pandas.Index(labels)
+        return (chunk.drop(labels=labels.intersection(chunk.index), axis=0)
+                for chunk in mat)
+    return (chunk.drop(labels=labels, axis=axis) for chunk in mat)
 
 
 # Convert {{{1
@@ -561,12 +615,15 @@ def filter_na_values(assays, samp_na_filtering=None, var_na_filtering=None):
 
 def convert(input_dir, output_dir, sample_output, variable_output,
             matrix_output, study_filename=None, assay_filename=None,
-            all_assays=None, samp_na_filtering=None, var_na_filtering=None):
+            all_assays=None, samp_na_filtering=None, var_na_filtering=None,
+            chunksize=None, dtype=None):
     # Convert assays to W4M format
     assays = convert2w4m(input_dir=input_dir,
                          study_filename=study_filename,
                          assay_filename=assay_filename,
-                         all_assays=all_assays)
+                         all_assays=all_assays,
+                         chunksize=chunksize,
+                         dtype=dtype)
 
     # Filter NA values
     filter_na_values(assays, samp_na_filtering, var_na_filtering)
@@ -593,7 +650,8 @@ def main():
             assay_filename=args_dict['assay_filename'],
             all_assays=args_dict['all_assays'],
             samp_na_filtering=args_dict['samp_na_filtering'],
-            var_na_filtering=args_dict['var_na_filtering']
+            var_na_filtering=args_dict['var_na_filtering'],
+            chunksize=args_dict['chunksize']
             )
 
 
@@ -1,14 +1,12 @@
 # -*- coding: utf-8 -*
 """Convert MAGE-TAB to ISA-JSON"""
 from __future__ import absolute_import
-import json
 import os
 import shutil
 import tempfile
 
 from isatools import isatab
 from isatools.convert import magetab2isatab
-from isatools.isajson import ISAJSONEncoder
 
 
 def convert(idf_file_path):
@@ -22,4 +20,4 @@ def convert(idf_file_path):
     finally:
         shutil.rmtree(tmp)
         if ISA is not None:
-            return json.loads(json.dumps(ISA, cls=ISAJSONEncoder))
+            return ISA.to_dict()
@@ -1,6 +1,5 @@
 # NON TREATMENT TYPES
-import os
-import yaml
+from isatools.io.resources import get_resource, thaw
 from isatools.model import OntologyAnnotation, StudyFactor, OntologySource, Characteristic
 
 SCREEN = 'screen'
@@ -94,18 +93,14 @@ EXTRACT_PREFIX = 'EXTR'
 LABELED_EXTRACT_PREFIX = 'LBLEXTR'
 ASSAY_GRAPH_PREFIX = 'AT'   # AT stands for Assay Type
 
-with open(os.path.join(os.path.dirname(__file__), '..', 'resources', 'config', 'yaml',
-                       'study-creator-config.yml')) as yaml_file:
-    yaml_config = yaml.load(yaml_file, Loader=yaml.FullLoader)
+yaml_config = thaw(get_resource('config', 'yaml', 'study-creator-config.yml'))
 default_ontology_source_reference = OntologySource(**yaml_config['study']['ontology_source_references'][1])
 
 # constants specific to the sampling plan in the study generation from the study design
 RUN_ORDER = yaml_config['study']['protocols'][0]['parameters'][0]
 STUDY_CELL = yaml_config['study']['protocols'][0]['parameters'][1]
 
-with open(os.path.join(os.path.dirname(__file__), '..', 'resources', 'config', 'yaml',
-                       'assay-options.yml')) as yaml_file:
-    assays_opts = yaml.load(yaml_file, Loader=yaml.FullLoader)
+assays_opts = thaw(get_resource('config', 'yaml', 'assay-options.yml'))
 
 
 DEFAULT_SOURCE_TYPE = Characteristic(
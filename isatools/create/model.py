@@ -6,17 +6,19 @@ from __future__ import absolute_import
 import datetime
 import itertools
 import json
+import pickle
 import re
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
 from collections.abc import Iterable
-from copy import deepcopy
+from copy import copy
 import logging
 from numbers import Number
 from abc import ABC
 from math import factorial
 import os
 
-import yaml
 import uuid
 import networkx as nx
 from isatools.create import errors
@@ -25,7 +27,7 @@ from isatools.create.constants import (
     DURATION_FACTOR, BASE_FACTORS, SOURCE, SAMPLE, EXTRACT, LABELED_EXTRACT,
     DATA_FILE, GROUP_PREFIX, SUBJECT_PREFIX, SAMPLE_PREFIX,
     ASSAY_GRAPH_PREFIX,
-    RUN_ORDER, STUDY_CELL, assays_opts,
+    RUN_ORDER, STUDY_CELL, assays_opts, yaml_config,
     DEFAULT_SOURCE_TYPE, SOURCE_QC_SOURCE_NAME, QC_SAMPLE_NAME,
     QC_SAMPLE_TYPE_PRE_RUN, QC_SAMPLE_TYPE_POST_RUN,
     QC_SAMPLE_TYPE_INTERSPERSED, ZFILL_WIDTH, DEFAULT_PERFORMER,
@@ -1352,6 +1354,241 @@ class AssayGraph(object):
         return not self == other
 
 
+class ISAElementSpec(object):
+    """
+    The recipe of the ISA element (a Process, a Material or a DataFile) generated from a node of an AssayGraph.
+    The name of the element contains the index of the start node it is generated from, so it is stored as the
+    two strings around that index.
+    """
+
+    def __init__(self, isa_class, name_attribute, name_prefix, name_suffix, **kwargs):
+        self.isa_class = isa_class
+        self.name_attribute = name_attribute
+        self.name_prefix = name_prefix
+        self.name_suffix = name_suffix
+        self.kwargs = kwargs
+
+    def create(self, start_node_index):
+        """
+        Generates the ISA element
+        :param start_node_index: int the index of the starting node in the graph
+        :return: the ISA element
+        """
+        kwargs = {self.name_attribute: '{}{}{}'.format(self.name_prefix, start_node_index, self.name_suffix)}
+        kwargs.update(self.kwargs)
+        return self.isa_class(**kwargs)
+
+
+class AssaySubgraphTemplate(object):
+    """
+    The ISA elements generated from a start node of an AssayGraph, in the order
+    StudyDesign._generate_isa_elements_from_node generates them, and how they are connected.
+    """
+
+    OUTPUT = 'output'
+    LINK = 'link'
+
+    def __init__(self, start_node, assay_graph, performer=DEFAULT_PERFORMER):
+        self.start_node = start_node
+        self.specs = []
+        self.parents = []  # index of the element input of each element, -1 for the sample
+        self.operations = []  # (OUTPUT|LINK, index, index) tuples
+        self.characteristic_categories = []
+        self.__nodes = []
+        self.__previous_protocol_nodes = {}
+        self.__compile_node(start_node, -1, assay_graph, {}, performer)
+        self.process_indexes = [i for i, spec in enumerate(self.specs)
+                                if spec and issubclass(spec.isa_class, Process)]
+        self.other_material_indexes = [i for i, spec in enumerate(self.specs)
+                                       if spec and issubclass(spec.isa_class, Material)]
+        self.data_file_indexes = [i for i, spec in enumerate(self.specs)
+                                  if spec and issubclass(spec.isa_class, DataFile)]
+
+    def __previous_protocol_node(self, node, assay_graph):
+        # the hypothesis here is that there is only one previous protocol node
+        if node not in self.__previous_protocol_nodes:
+            previous_protocol_nodes = assay_graph.previous_protocol_nodes(node)
+            self.__previous_protocol_nodes[node] = previous_protocol_nodes.pop() \
+                if previous_protocol_nodes and len(previous_protocol_nodes) == 1 \
+                else None
+        return self.__previous_protocol_nodes[node]
+
+    def __compile_node(self, node, parent, assay_graph, counter, performer):
+        counter = StudyDesign._increment_counter_by_node_type(counter, node)
+        spec = StudyDesign._isa_element_spec(
+            node, assay_graph.id, counter,
+            measurement_type=assay_graph.measurement_type,
+            technology_type=assay_graph.technology_type,
+            performer=performer
+        )
+        index = len(self.specs)
+        self.specs.append(spec)
+        self.parents.append(parent)
+        self.__nodes.append(node)
+        if spec and issubclass(spec.isa_class, Material):
+            for charx in spec.kwargs['characteristics'] or []:
+                if charx.category not in self.characteristic_categories:
+                    self.characteristic_categories.append(charx.category)
+        for next_node in assay_graph.next_nodes(node):
+            size = next_node.size if isinstance(next_node, ProductNode) \
+                else next_node.replicates if isinstance(next_node, ProtocolNode) \
+                else 1
+            for _ in range(size):
+                next_index = self.__compile_node(next_node, index, assay_graph, counter, performer)
+                if isinstance(node, ProtocolNode):
+                    next_spec = self.specs[next_index]
+                    if not (next_spec and issubclass(next_spec.isa_class, Process)):
+                        self.operations.append((self.OUTPUT, index, next_index))
+                    previous_protocol_node = self.__previous_protocol_node(node, assay_graph)
+                    if previous_protocol_node:
+                        previous_index = next(
+                            i for i in range(len(self.specs) - 1, -1, -1)
+                            if self.specs[i] and issubclass(self.specs[i].isa_class, Process)
+                            if self.__nodes[i] == previous_protocol_node
+                        )
+                        self.operations.append((self.LINK, previous_index, index))
+        return index
+
+    def instantiate(self, sample, start_node_index):
+        """
+        Generates the ISA elements of the subgraph for a sample
+        :param sample: Sample the input of the start node
+        :param start_node_index: int the index of the starting node in the graph
+        :return: the lists of processes, other materials and data files generated
+        """
+        items = [spec.create(start_node_index) if spec else None for spec in self.specs]
+        for item, parent in zip(items, self.parents):
+            if isinstance(item, Process):
+                item.inputs = [sample if parent == -1 else items[parent]]
+        for operation, index, other_index in self.operations:
+            if operation == self.OUTPUT:
+                items[index].outputs.append(items[other_index])
+            else:
+                plink(items[index], items[other_index])
+        return [items[i] for i in self.process_indexes], [items[i] for i in self.other_material_indexes], \
+            [items[i] for i in self.data_file_indexes]
+
+
+class AssayTemplate(object):
+    """
+    An AssayGraph compiled for the generation of assays. The graph is walked once per start node, and the assay of
+    a batch of samples is generated by instantiating the resulting subgraph templates for each sample, instead of
+    walking the graph again for each sample and replicate.
+    """
+
+    def __init__(self, assay_graph, performer=DEFAULT_PERFORMER):
+        if not isinstance(assay_graph, AssayGraph):
+            raise TypeError()
+        self.assay_graph = assay_graph
+        self.subgraphs = []
+        for node in assay_graph.start_nodes:
+            size = node.size if isinstance(node, ProductNode) \
+                else node.replicates if isinstance(node, ProtocolNode) \
+                else 1
+            self.subgraphs.append((size, AssaySubgraphTemplate(node, assay_graph, performer)))
+
+    def instantiate(self, assay_samples, first_sample_index=0, sample_size=None):
+        """
+        Generates the ISA elements of the assay for a batch of samples
+        :param assay_samples: list of Samples
+        :param first_sample_index: int the position of the first sample of the batch among the samples of the assay
+        :param sample_size: int the number of samples of the assay, by default the number of samples of the batch
+        :return: a list with, for each start node, the processes, other materials, data files and characteristic
+                 categories generated
+        """
+        if sample_size is None:
+            sample_size = len(assay_samples)
+        elements = []
+        for i, (size, subgraph) in enumerate(self.subgraphs):
+            processes, other_materials, data_files, characteristic_categories = [], [], [], []
+            for j, sample in enumerate(assay_samples, first_sample_index):
+                for k in range(size):
+                    ix = i * sample_size * size + j * size + k
+                    sample_processes, sample_other_materials, sample_data_files = subgraph.instantiate(sample, ix + 1)
+                    processes.extend(sample_processes)
+                    other_materials.extend(sample_other_materials)
+                    data_files.extend(sample_data_files)
+                    characteristic_categories.extend(subgraph.characteristic_categories)
+            elements.append((processes, other_materials, data_files, characteristic_categories))
+        return elements
+
+    def shared_objects(self, assay_samples):
+        """
+        The objects the ISA elements generated for a batch of samples refer to without owning them, that is the
+        samples and the nodes, parameter values and characteristics of the AssayGraph, by a key that identifies them
+        in any copy of the template
+        :param assay_samples: list of Samples
+        :return: dict
+        """
+        shared_objects = {('sample', j): sample for j, sample in enumerate(assay_samples)}
+        for i, (size, subgraph) in enumerate(self.subgraphs):
+            for n, spec in enumerate(subgraph.specs):
+                if spec is None:
+                    continue
+                for name, value in spec.kwargs.items():
+                    if value is None or isinstance(value, str):
+                        continue
+                    shared_objects[(i, n, name)] = value
+                    if name == 'characteristics':
+                        for c, characteristic in enumerate(value):
+                            shared_objects[(i, n, name, c)] = characteristic
+            for c, category in enumerate(subgraph.characteristic_categories):
+                shared_objects[(i, 'category', c)] = category
+        return shared_objects
+
+
+class _SharedObjectsPickler(pickle.Pickler):
+
+    def __init__(self, file, shared_objects):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.__keys = {id(value): key for key, value in shared_objects.items()}
+
+    def persistent_id(self, obj):
+        return self.__keys.get(id(obj))
+
+
+class _SharedObjectsUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, shared_objects):
+        super().__init__(file)
+        self.__shared_objects = shared_objects
+
+    def persistent_load(self, pid):
+        return self.__shared_objects[pid]
+
+
+def dump_assay_template_elements(elements, assay_template, assay_samples):
+    """
+    Pickles the ISA elements generated by an AssayTemplate for a batch of samples, leaving out the objects shared with
+    the template and the samples
+    :param elements: the output of AssayTemplate.instantiate()
+    :param assay_template: AssayTemplate
+    :param assay_samples: list of Samples
+    :return: bytes
+    """
+    buffer = BytesIO()
+    _SharedObjectsPickler(buffer, assay_template.shared_objects(assay_samples)).dump(elements)
+    return buffer.getvalue()
+
+
+def load_assay_template_elements(data, assay_template, assay_samples):
+    """
+    Unpickles the output of dump_assay_template_elements(), linking the elements to the objects of the template and
+    to the samples given here
+    :param data: bytes
+    :param assay_template: AssayTemplate, of which the template pickled was a copy
+    :param assay_samples: list of Samples, of which the samples pickled were copies
+    :return: the output of AssayTemplate.instantiate()
+    """
+    return _SharedObjectsUnpickler(BytesIO(data), assay_template.shared_objects(assay_samples)).load()
+
+
+def _instantiate_assay_template(assay_template, assay_samples, first_sample_index, sample_size):
+    """Generates the ISA elements of an assay for a batch of samples in a worker process"""
+    elements = assay_template.instantiate(assay_samples, first_sample_index, sample_size)
+    return dump_assay_template_elements(elements, assay_template, assay_samples)
+
+
 def get_full_class_name(instance):
     return "{0}.{1}".format(instance.__class__.__module__, instance.__class__.__name__)
 
@@ -2161,21 +2398,35 @@ class StudyDesign(object):
 
         return src_map
 
-    def _generate_samples_and_assays(self, sources_map, sampling_protocol, performer):
+    def _generate_samples_and_assays(self, sources_map, sampling_protocol, performer, workers=None):
         """
         Private method to be used in 'generate_isa_study'.
         :param sources_map: dict - the output of '_generate_sources'
         :param sampling_protocol: isatools.model.Protocol
         :param performer: str
+        :param workers: int - the number of worker processes generating the assays, None to generate them here
         :return:
         """
+        factors, protocols, samples, characteristic_categories, samples_grouped_by_assay_graph, arm_boundaries, \
+            process_sequence, ontology_sources = self._generate_samples(sources_map, sampling_protocol, performer)
+        assays = list(self._generate_assays(samples_grouped_by_assay_graph, arm_boundaries, workers=workers))
+        return factors, protocols, samples, characteristic_categories, assays, process_sequence, ontology_sources
+
+    def _generate_samples(self, sources_map, sampling_protocol, performer):
+        """
+        Private method to be used in 'generate_isa_study'.
+        :param sources_map: dict - the output of '_generate_sources'
+        :param sampling_protocol: isatools.model.Protocol
+        :param performer: str
+        :return: the samples and sampling processes, and for each AssayGraph the samples it is run on, with the
+                 number of these samples at the end of each study arm
+        """
         factors = {SEQUENCE_ORDER_FACTOR}
         ontology_sources = set()
         samples = []
         sample_count = 0
         process_sequence = []
         characteristic_categories = []
-        assays = []
         protocols = set()
         unique_assay_types = {
             assay_graph for arm in self.study_arms
@@ -2185,6 +2436,9 @@ class StudyDesign(object):
         samples_grouped_by_assay_graph = {
             assay_graph: [] for assay_graph in unique_assay_types
         }
+        arm_boundaries = {
+            assay_graph: [] for assay_graph in unique_assay_types
+        }
 
         # generate samples
         for arm in self.study_arms:
@@ -2264,12 +2518,52 @@ class StudyDesign(object):
                                     problematic_sample_group
                                 ))
                 epoch_nb += 1
-        # generate assays
-        for assay_graph in unique_assay_types:
+            for assay_graph, assay_samples in samples_grouped_by_assay_graph.items():
+                arm_boundaries[assay_graph].append(len(assay_samples))
+        for assay_graph in samples_grouped_by_assay_graph:
             protocols.update({node for node in assay_graph.nodes if isinstance(node, Protocol)})
-            assays.append(self.generate_assay(assay_graph, samples_grouped_by_assay_graph[assay_graph]))
 
-        return factors, protocols, samples, characteristic_categories, assays, process_sequence, ontology_sources
+        return factors, protocols, samples, characteristic_categories, samples_grouped_by_assay_graph, \
+            arm_boundaries, process_sequence, ontology_sources
+
+    def _generate_assays(self, samples_grouped_by_assay_graph, arm_boundaries, workers=None):
+        """
+        Private method to be used in 'generate_isa_study'. Yields the assays one by one.
+        With workers, the samples of each AssayGraph are split by study arm, and in up to as many chunks as workers
+        within an arm, and the assay elements of each chunk are generated in a pool of processes. The chunks are
+        merged back in order, so the assays are the same as the ones generated in this process.
+        :param samples_grouped_by_assay_graph: dict - the samples of each AssayGraph
+        :param arm_boundaries: dict - the number of samples of each AssayGraph at the end of each study arm
+        :param workers: int - the number of worker processes, None to generate the assays here
+        :return: generator of isatools.model.Assay
+        """
+        if not workers:
+            for assay_graph, assay_samples in samples_grouped_by_assay_graph.items():
+                yield self.generate_assay(assay_graph, assay_samples)
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            submitted = []
+            for assay_graph, assay_samples in samples_grouped_by_assay_graph.items():
+                assay_template = AssayTemplate(assay_graph)
+                chunks = []
+                chunk_size = max(1, -(-len(assay_samples) // workers))
+                arm_start = 0
+                for arm_stop in arm_boundaries[assay_graph]:
+                    for start in range(arm_start, arm_stop, chunk_size):
+                        chunk_samples = assay_samples[start:min(start + chunk_size, arm_stop)]
+                        chunks.append((chunk_samples, executor.submit(
+                            _instantiate_assay_template, assay_template, chunk_samples, start, len(assay_samples)
+                        )))
+                    arm_start = arm_stop
+                submitted.append((assay_graph, assay_template, chunks))
+            for assay_graph, assay_template, chunks in submitted:
+                elements = [([], [], [], []) for _ in assay_template.subgraphs]
+                for chunk_samples, future in chunks:
+                    chunk_elements = load_assay_template_elements(future.result(), assay_template, chunk_samples)
+                    for merged, chunk in zip(elements, chunk_elements):
+                        for merged_list, chunk_list in zip(merged, chunk):
+                            merged_list.extend(chunk_list)
+                yield self._assemble_assay(assay_graph, elements)
 
     @staticmethod
     def _increment_counter_by_node_type(counter, node):
@@ -2389,13 +2683,27 @@ class StudyDesign(object):
         return processes, other_materials, characteristic_categories, data_files, item, counter
 
     @staticmethod
-    def generate_assay(assay_graph, assay_samples):
+    def generate_assay(assay_graph, assay_samples, assay_template=None):
+        """
+        Generates the Assay of an AssayGraph for a list of samples
+        :param assay_graph: AssayGraph
+        :param assay_samples: list of the Samples the assay is run on
+        :param assay_template: AssayTemplate of the assay_graph, compiled here if not given
+        :return: isatools.model.Assay
+        """
         if not isinstance(assay_graph, AssayGraph):
             raise TypeError()
+        if assay_template is None:
+            assay_template = AssayTemplate(assay_graph)
+        return StudyDesign._assemble_assay(assay_graph, assay_template.instantiate(assay_samples))
+
+    @staticmethod
+    def _assemble_assay(assay_graph, elements):
         """
-        sample_char_value = getattr(sample_node.characteristics[0], 'value', None) \
-            if isinstance(sample_node, ProductNode) and sample_node.characteristics \
-            else None
+        Builds the Assay of an AssayGraph from the elements generated by its AssayTemplate
+        :param assay_graph: AssayGraph
+        :param elements: the output of AssayTemplate.instantiate()
+        :return: isatools.model.Assay
         """
         measurement_type, technology_type = assay_graph.measurement_type, assay_graph.technology_type
         assay = Assay(
@@ -2409,32 +2717,11 @@ class StudyDesign(object):
         )
         log.debug('assay measurement type: {0} - technology type: {1}'.format(measurement_type,
                                                                               assay.technology_type))
-        # assay.samples = assay_samples
-        # assay.sources = {source for sample in assay_samples for source in sample.derives_from}
-        # assay.process_sequence = sampling_processes
-        for i, node in enumerate(assay_graph.start_nodes):
-            size = node.size if isinstance(node, ProductNode) \
-                else node.replicates if isinstance(node, ProtocolNode) \
-                else 1
-            log.debug('Size: {0}'.format(size))
-
-            for j, sample in enumerate(assay_samples):
-                log.debug('Iteration: {0} - Sample: {1}'.format(i, sample.name))
-                for k in range(size):
-                    ix = i * len(assay_samples) * size + j * size + k
-                    log.debug('i = {0}, j = {1}, k={2}, ix={3}'.format(i, j, k, ix))
-                    processes, other_materials, characteristic_categories, data_files, _, __ = \
-                        StudyDesign._generate_isa_elements_from_node(
-                            node, assay_graph, assay_graph.id, start_node_index=ix + 1, counter=None, processes=[],
-                            other_materials=[], characteristic_categories=[], data_files=[], previous_items=[sample]
-                        )
-
-                    assay.other_material.extend(other_materials)
-                    assay.characteristic_categories.extend(characteristic_categories)
-                    assay.process_sequence.extend(processes)
-                    assay.data_files.extend(data_files)
-                    log.debug('i={0}, i={1}, num_processes={2}, num_assay_files={3}'.format(i, j, len(processes),
-                                                                                            len(data_files)))
+        for processes, other_materials, data_files, characteristic_categories in elements:
+            assay.other_material.extend(other_materials)
+            assay.characteristic_categories.extend(characteristic_categories)
+            assay.process_sequence.extend(processes)
+            assay.data_files.extend(data_files)
             final_list = set(assay.characteristic_categories)
             assay.characteristic_categories.clear()
             assay.characteristic_categories.extend(final_list)
@@ -2462,43 +2749,64 @@ class StudyDesign(object):
         :param performer: str/Person
         :return: either a Sample or a Material or a DataFile. So far only RawDataFile is supported among files
         """
+        spec = StudyDesign._isa_element_spec(node, assay_file_prefix, counter, measurement_type=measurement_type,
+                                             technology_type=technology_type, performer=performer)
+        return spec.create(start_node_index) if spec else None
+
+    @staticmethod
+    def _isa_element_spec(
+            node,
+            assay_file_prefix,
+            counter,
+            measurement_type=None,
+            technology_type=None,
+            performer=DEFAULT_PERFORMER
+    ):
+        """
+        This method computes how the ISA element of an ISA node is built, leaving out the index of the starting node
+        :param technology_type:
+        :param measurement_type:
+        :param node: SequenceNode - can be either a ProductNode or a ProtocolNode
+        :param assay_file_prefix: str
+        :param counter: dict containing the counts for this specific subgraph
+        :param performer: str/Person
+        :return: ISAElementSpec or None if the node does not generate any ISA element
+        """
         if isinstance(node, ProtocolNode):
-            return Process(
-
-                name='{}_S{}_DAE_R{}'.format(  # DAE: DataAcquisitionEvent
-                    assay_file_prefix,
-                    start_node_index,
-                    # NB: if node.name has special characters (e.g. whitespace)
-                    # these are replaced with  dashes by urlify()
-                    # urlify(node.name),
-                    counter[node.name]
-                ),
+            return ISAElementSpec(
+                Process, 'name',
+                # DAE: DataAcquisitionEvent
+                # NB: if node.name has special characters (e.g. whitespace)
+                # these are replaced with  dashes by urlify()
+                # urlify(node.name),
+                '{}_S'.format(assay_file_prefix), '_DAE_R{}'.format(counter[node.name]),
                 executes_protocol=node,
                 performer=performer,
-                parameter_values=node.parameter_values,
-                inputs=[],
-                outputs=[],
+                parameter_values=node.parameter_values
             )
         if isinstance(node, ProductNode):
             if node.type == SAMPLE:
-                return Sample(
-                    name='{}_S{}_Sample-R{}'.format(assay_file_prefix, start_node_index, counter[SAMPLE]),
+                return ISAElementSpec(
+                    Sample, 'name', '{}_S'.format(assay_file_prefix), '_Sample-R{}'.format(counter[SAMPLE]),
                     characteristics=node.characteristics
                 )
 
             if node.type == EXTRACT:
-                return Extract(
-                    name='{}_S{}_Extract-R{}'.format(assay_file_prefix, start_node_index, counter[EXTRACT]),
+                return ISAElementSpec(
+                    Extract, 'name', '{}_S'.format(assay_file_prefix), '_Extract-R{}'.format(counter[EXTRACT]),
                     characteristics=node.characteristics
                 )
             if node.type == LABELED_EXTRACT:
-                return LabeledExtract(
-                    name='{}_S{}_LE-R{}'.format(assay_file_prefix, start_node_index, counter[LABELED_EXTRACT]),
+                return ISAElementSpec(
+                    LabeledExtract, 'name', '{}_S'.format(assay_file_prefix),
+                    '_LE-R{}'.format(counter[LABELED_EXTRACT]),
                     characteristics=node.characteristics
                 )
             # under the hypothesis that we deal only with raw data files
             # derived data file would require a completely separate approach
             if node.type == DATA_FILE:
+                file_extension = '.{}'.format(node.extension) if node.extension else ''
+                filename_suffix = '_DAE_R{}_{}{}'.format(counter[node.name], urlify(node.name), file_extension)
                 try:
                     log.debug('Assay conf. found: {}; {};'.format(
                         measurement_type, technology_type)
@@ -2522,38 +2830,32 @@ class StudyDesign(object):
                         ProteinAssignmentFile, PeptideAssignmentFile, DerivedArrayDataMatrixFile,
                         PostTranslationalModificationAssignmentFile, AcquisitionParameterDataFile
                     }
-                    file_extension = '.{}'.format(node.extension) if node.extension else ''
-                    return isa_class(
-                        filename='{}_S{}_DAE_R{}_{}{}'.format(
-                            assay_file_prefix,
-                            start_node_index,
-                            counter[node.name],
-                            urlify(node.name),
-                            file_extension
-                        )
-                    )
+                    return ISAElementSpec(isa_class, 'filename', '{}_S'.format(assay_file_prefix), filename_suffix)
                 except StopIteration:
-                    file_extension = '.{}'.format(node.extension) if node.extension else ''
-                    return RawDataFile(
-                        filename='{}_S{}_DAE_R{}_{}{}'.format(
-                            assay_file_prefix,
-                            start_node_index,
-                            counter[node.name],
-                            urlify(node.name),
-                            file_extension
-                        )
-                    )
+                    return ISAElementSpec(RawDataFile, 'filename', '{}_S'.format(assay_file_prefix), filename_suffix)
 
-    def generate_isa_study(self, identifier=None):
+    def generate_isa_study(self, identifier=None, workers=None):
         """
         this is the core method to return the fully populated ISA Study object from the StudyDesign
+        :param identifier: str - the study identifier, if the StudyDesign has none
+        :param workers: int - the number of worker processes generating the assays, None to generate them here
         :return: isatools.model.Study
         """
-        with open(os.path.join(os.path.dirname(__file__), '..', 'resources', 'config', 'yaml',
-                               'study-creator-config.yml')) as yaml_file:
-            config = yaml.load(yaml_file, Loader=yaml.FullLoader)
+        isa_study = self.iter_isa_study(identifier=identifier, workers=workers)
+        study = next(isa_study)
+        study.assays = list(isa_study)
+        return study
 
-        study_config = config['study']
+    def iter_isa_study(self, identifier=None, workers=None):
+        """
+        Generator variant of 'generate_isa_study', to write the assays out one at a time. It first yields the Study,
+        with its sources, samples, sampling processes and protocols but without assays, then each Assay as soon as it
+        is generated. The assays are not added to the Study.
+        :param identifier: str - the study identifier, if the StudyDesign has none
+        :param workers: int - the number of worker processes generating the assays, None to generate them here
+        :return: generator of isatools.model.Study then isatools.model.Assay
+        """
+        study_config = yaml_config['study']
         study = Study(
             identifier=self.identifier or identifier or DEFAULT_STUDY_IDENTIFIER,
             title=self.name,
@@ -2575,18 +2877,17 @@ class StudyDesign(object):
         # setting the `characteristic_categories` associated to study and required for isajson loading
         # study_charac_categories = []
         study.characteristic_categories.append(DEFAULT_SOURCE_TYPE.category)
-        study.factors, new_protocols, study.samples, study_charac_categories, study.assays, study.process_sequence, \
-        study.ontology_source_references = \
-            self._generate_samples_and_assays(
-                sources_map, study.protocols[0], study_config['performers'][0]['name']
-            )
+        study.factors, new_protocols, study.samples, study_charac_categories, samples_grouped_by_assay_graph, \
+            arm_boundaries, study.process_sequence, study.ontology_source_references = \
+            self._generate_samples(sources_map, study.protocols[0], study_config['performers'][0]['name'])
 
         study.characteristic_categories.extend(study_charac_categories)
 
         for new_protocol in new_protocols:
             study.add_protocol(new_protocol)
 
-        return study
+        yield study
+        yield from self._generate_assays(samples_grouped_by_assay_graph, arm_boundaries, workers=workers)
 
     def __repr__(self):
         return '{0}.{1}(' \
@@ -2631,6 +2932,8 @@ class QualityControlService(object):
     def augment_study(cls, study, study_design, in_place=False):
         """
         Augment a study with QualityControl samples and modifies the assay
+        If in_place is False the returned Study is a new Study which shares with the original one all the
+        objects the augmentation leaves unchanged (sources, samples, processes and the assays without QC)
         :param study: Study
         :param study_design: StudyDesign
         :param in_place: boolean
@@ -2641,7 +2944,8 @@ class QualityControlService(object):
             raise TypeError('study must be a valid Study object')
         if not isinstance(study_design, StudyDesign):
             raise TypeError('study must be a valid StudyDesign object')
-        qc_study = deepcopy(study) if in_place is False else study
+        qc_study = cls._copy_study(study) if in_place is False else study
+        assay_templates = {}
         for arm in study_design.study_arms:
             for cell, study_assay_plan in arm.arm_map.items():
                 if study_assay_plan:
@@ -2681,13 +2985,38 @@ class QualityControlService(object):
                                 qc_study.samples.extend(qc_samples)
                             qc_study.process_sequence.extend(qc_processes)
                             augmented_samples = cls._augment_sample_batch_with_qc_samples(
-                                samples_in_assay_to_expand, pre_run_samples=qc_samples_post_run,
+                                samples_in_assay_to_expand, pre_run_samples=qc_samples_pre_run,
                                 post_run_samples=qc_samples_post_run,
                                 interspersed_samples=qc_samples_interspersed
                             )
-                            qc_study.assays[index] = StudyDesign.generate_assay(assay_graph, augmented_samples)
+                            # the names of the assay elements follow the run order, hence the whole assay
+                            # is instantiated again, from an AssayTemplate compiled once per AssayGraph
+                            if id(assay_graph) not in assay_templates:
+                                assay_templates[id(assay_graph)] = AssayTemplate(assay_graph)
+                            qc_study.assays[index] = StudyDesign.generate_assay(
+                                assay_graph, augmented_samples, assay_template=assay_templates[id(assay_graph)]
+                            )
         return qc_study
 
+    @staticmethod
+    def _copy_study(study):
+        """
+        Copies a Study without copying its contents: the copy has its own lists (and dicts of lists) of
+        sources, samples, processes, assays, etc., so they can be extended or replaced without affecting the
+        original Study, but the items in them are the same objects
+        :param study: Study
+        :return: Study
+        """
+        study_copy = copy(study)
+        for attribute, value in vars(study_copy).items():
+            if isinstance(value, list):
+                setattr(study_copy, attribute, list(value))
+            elif isinstance(value, dict):
+                setattr(study_copy, attribute, {
+                    key: list(item) if isinstance(item, list) else item for key, item in value.items()
+                })
+        return study_copy
+
     @staticmethod
     def _augment_sample_batch_with_qc_samples(samples, pre_run_samples=None, post_run_samples=None,
                                               interspersed_samples=None):
@@ -2699,18 +3028,22 @@ class QualityControlService(object):
         :return:
         """
         sorted_samples = sorted(samples, key=lambda s: s.name)
-        assay_samples = [s for s in sorted_samples]  # this variable will contain all samples
-        # pdb.set_trace()
+        # the interspersed QC samples to run before each sample, by position of the sample in the run order
+        qc_samples_before = {}
         if interspersed_samples:
             for (qc_sample_node, interspersing_interval), qc_samples in interspersed_samples.items():
                 for ix, qc_sample in enumerate(qc_samples):
-                    index_to_insert = assay_samples.index(
-                        sorted_samples[(ix + 1) * interspersing_interval])  # FIXME +1 or no ??
-                    assay_samples.insert(index_to_insert, qc_sample)
-        if pre_run_samples:
-            assay_samples = pre_run_samples + assay_samples
+                    position = (ix + 1) * interspersing_interval  # FIXME +1 or no ??
+                    if position >= len(sorted_samples):
+                        raise IndexError('list index out of range')
+                    qc_samples_before.setdefault(position, []).append(qc_sample)
+        assay_samples = list(pre_run_samples) if pre_run_samples else []  # this variable will contain all samples
+        for position, sample in enumerate(sorted_samples):
+            if position in qc_samples_before:
+                assay_samples.extend(qc_samples_before[position])
+            assay_samples.append(sample)
         if post_run_samples:
-            assay_samples = assay_samples + post_run_samples
+            assay_samples.extend(post_run_samples)
         return assay_samples
 
     @staticmethod
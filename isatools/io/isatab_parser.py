@@ -320,100 +320,41 @@ class StudyAssayParser:
         if not os.path.exists(os.path.join(self._dir, fname)):
             return {}
         process_nodes = {}
+        # the inputs and outputs of each process node, as sets
+        process_inputs = {}
+        process_outputs = {}
 
         with self._preprocess(os.path.join(self._dir, fname)) as in_handle:
             reader = csv.reader(in_handle, dialect="excel-tab")
-            headers = self._swap_synonyms(next(reader))
-            hgroups = self._collapse_header(headers)
-            htypes = self._characterize_header(headers, hgroups)
-            processing_indices = [i for i, x in enumerate(htypes)
-                                  if x == "processing"]
-            all_parameters_indices = [i for i, x in enumerate(htypes)
-                                      if x == "parameter"]
-            node_indices = [i for i, x in enumerate(htypes)
-                            if x == "node"]
-            node_assay_indices = [i for i, x in enumerate(htypes)
-                                  if x == "node_assay"]
-            line_number = 0
-            # max_number = 0
+            plan = self._compile_header(next(reader))
             process_counters = {}
-            assay_name_map = {}
             input_process_map = {}
             output_process_map = {}
 
             for line in reader:
                 previous_processing_node = None
-                for processing_index in processing_indices:
+                for step in plan.processing_steps:
 
-                    processing_name = line[hgroups[processing_index][0]]
+                    processing_name = line[step.column]
                     if not processing_name:
                         continue
-                    next_processing_index = find_gt(
-                        processing_indices, processing_index)
-                    previous_processing_index = find_lt(
-                        processing_indices, processing_index)
-
-                    input_indices = find_in_between(
-                        node_indices, previous_processing_index,
-                        processing_index)
-                    output_indices = find_in_between(
-                        node_indices, processing_index,
-                        next_processing_index)
-                    parameters_indices = find_in_between(
-                        all_parameters_indices, processing_index,
-                        next_processing_index)
-                    assay_name_indices = find_in_between(
-                        node_assay_indices, processing_index,
-                        next_processing_index)
-                    qualifier_indices = hgroups[processing_index][1:]
-
-                    input_headers = [
-                        headers[hgroups[x][0]]
-                        for i, x in enumerate(input_indices)]
-                    output_headers = [
-                        headers[hgroups[x][0]]
-                        for i, x in enumerate(output_indices)]
-                    processing_header = headers[
-                        hgroups[processing_index][0]]
-
-                    # qualifier_headers = [
-                    #     headers[x] for i, x in enumerate(
-                    #         qualifier_indices)]
-                    qualifier_values = [
-                        line[x]
-                        for i, x in enumerate(qualifier_indices)]
-
-                    # parameters_values = [
-                    #     line[x]
-                    #     for i, x in enumerate(parameters_indices)]
-
-                    input_values = [line[
-                        hgroups[x][0]]
-                        for i, x in enumerate(input_indices)]
+
+                    qualifier_indices_string = '-'.join(
+                        [line[x] for x in step.qualifier_columns])
                     input_node_indices = [
-                        self._build_node_index(
-                            input_headers[i], input_values[i])
-                        for i, x in enumerate(input_values)]
-
-                    output_values = [
-                        line[hgroups[x][0]]
-                        for i, x in enumerate(output_indices)]
-                    output_node_indices = [self._build_node_index(
-                        output_headers[i], output_values[i])
-                        for i, x in enumerate(output_values)]
-
-                    qualifier_indices_string = '-'.join(qualifier_values)
+                        self._build_node_index(header, line[column])
+                        for column, header in step.inputs]
+                    output_node_indices = [
+                        self._build_node_index(header, line[column])
+                        for column, header in step.outputs]
                     input_node_indices_string = \
                         "-".join(input_node_indices)
                     output_node_indices_string = \
                         "-".join(output_node_indices)
-                    # parameters_indices_string = '-'.join(parameters_values)
 
                     assay_name = ""
-                    if assay_name_indices:
-                        if len(assay_name_indices) == 1:
-                            assay_name = line[
-                                hgroups[assay_name_indices[0]][0]]
+                    if step.assay_name_column is not None:
+                        assay_name = line[step.assay_name_column]
 
                     if assay_name:
                         unique_process_name = assay_name
@@ -454,8 +395,10 @@ class StudyAssayParser:
                         # create process node
                         process_node = ProcessNodeRecord(
                             unique_process_name,
-                            processing_header, study,
+                            step.header, study,
                             processing_name)
+                        process_inputs[unique_process_name] = set()
+                        process_outputs[unique_process_name] = set()
 
                     if previous_processing_node:
                         previous_processing_node.next_process = \
@@ -464,35 +407,28 @@ class StudyAssayParser:
                             previous_processing_node
 
                     previous_processing_node = process_node
-                    # previous_protocol = line[
-                    # hgroups[next_processing_index]]
 
                     if assay_name:
                         process_node.assay_name = assay_name
-                        assay_name_map.update({assay_name: process_node})
 
                     # Add qualifiers (performer and date)
-                    for qualifier_index in qualifier_indices:
-                        qualifier_header = headers[qualifier_index]
+                    for qualifier_index, qualifier_header in \
+                            step.qualifiers:
                         if qualifier_header == "Date":
                             process_node.date = line[qualifier_index]
                         elif qualifier_header == "Performer":
                             process_node.performer = line[qualifier_index]
 
-                    if not (input_node_indices in process_node.inputs):
-                        in_first = set(process_node.inputs)
-                        in_second = set(input_node_indices)
-                        in_second_but_not_in_first = in_second - in_first
-                        process_node.inputs = \
-                            process_node.inputs + list(
-                                in_second_but_not_in_first)
-                    if not (output_node_indices in process_node.outputs):
-                        in_first = set(process_node.outputs)
-                        in_second = set(output_node_indices)
-                        in_second_but_not_in_first = in_second - in_first
-                        process_node.outputs = \
-                            process_node.outputs + list(
-                                in_second_but_not_in_first)
+                    in_first = process_inputs[unique_process_name]
+                    in_second_but_not_in_first = \
+                        set(input_node_indices) - in_first
+                    process_node.inputs.extend(in_second_but_not_in_first)
+                    in_first.update(in_second_but_not_in_first)
+                    in_first = process_outputs[unique_process_name]
+                    in_second_but_not_in_first = \
+                        set(output_node_indices) - in_first
+                    process_node.outputs.extend(in_second_but_not_in_first)
+                    in_first.update(in_second_but_not_in_first)
 
                     input_process_map[qualifier_indices_string
                                       + input_node_indices_string] = \
@@ -501,25 +437,14 @@ class StudyAssayParser:
                                        + output_node_indices_string] = \
                         unique_process_name
 
-                    # Add parameters
-                    for parameter_index in parameters_indices:
-                        parameter_header = headers[hgroups[
-                            parameter_index][0]]
-                        process_node.parameters.append(parameter_header)
-                        # creating the metadata object
-                        process_node.metadata = collections.defaultdict(set)
-                        attrs = self._line_keyvals(line, headers, hgroups,
-                                                   htypes,
-                                                   process_node.metadata)
-                        process_node.metadata = attrs
-
-                    # max_number = max(len(process_node.inputs),
-                    # len(process_node.outputs))
-                    line_number += 1
+                    # Add parameters, the metadata object is built from the
+                    # last line setting them
+                    if step.parameters:
+                        process_node.parameters.extend(step.parameters)
+                        process_node.metadata = self._line_keyvals(
+                            line, plan, collections.defaultdict(set))
+
                     process_nodes[unique_process_name] = process_node
-                else:
-                    line_number += 1
-                # study.process_nodes = process_nodes
         return dict([(k, self._finalize_metadata(v))
                      for k, v in process_nodes.items()])
 
@@ -540,42 +465,36 @@ class StudyAssayParser:
         nodes = {}
         with self._preprocess(os.path.join(self._dir, fname)) as in_handle:
             reader = csv.reader(in_handle, dialect="excel-tab")
-            headers = self._swap_synonyms(next(reader))
-            hgroups = self._collapse_header(headers)
-            htypes = self._characterize_header(headers, hgroups)
+            plan = self._compile_header(next(reader))
+            headers = plan.headers
+            hgroups = plan.hgroups
+            lines = list(reader)
 
-            node_indices = [i for i, x in enumerate(htypes) if x == "node"]
-            all_attribute_indices = [i for i, x in enumerate(
-                htypes) if x == "attribute"]
-
-            for node_index in node_indices:
+            for node_index in plan.node_indices:
 
                 node_type = headers[hgroups[node_index][0]]
                 if node_type not in node_types:
                     continue
-                try:
-                    header_index = hgroups[node_index][0]
-
-                except ValueError:
-                    header_index = None
-
-                if header_index is None:
-                    # print "Could not find standard header name: %s in %s" \
-                    #                        % (node_type, header)
-                    continue
-
-                next_node_index = find_gt(node_indices, node_index)
-                previous_node_index = find_lt(node_indices, node_index)
-                attribute_indices = find_in_between(
-                    all_attribute_indices, node_index, next_node_index)
+                header_index = hgroups[node_index][0]
+
+                previous_node_index = find_lt(plan.node_indices, node_index)
+                next_node_index = find_gt(plan.node_indices, node_index)
+                attribute_headers = []
+                for attribute_index in find_in_between(
+                        plan.attribute_indices, node_index, next_node_index):
+                    attribute_header = headers[hgroups[attribute_index][0]]
+                    if attribute_header.startswith("Factor Value") \
+                            and node_type != "Sample Name":
+                        continue
+                    attribute_headers.append(attribute_header)
 
-                in_handle.seek(0, 0)
-                for line in reader:
+                for line in lines:
                     if (line[0].startswith("#")):
                         continue
-                    name = self._swap_synonyms([line[header_index]])[0]
-                    # skip the header line and empty lines
-                    if (not name or name in headers):
+                    name = line[header_index]
+                    name = self._synonyms.get(name, name)
+                    # skip empty lines, and names that are headers
+                    if (not name or name in plan.header_set):
                         continue
                     # to deal with same name used for different node types
                     # (e.g. Source Name and Sample Name using the same string)
@@ -583,34 +502,15 @@ class StudyAssayParser:
 
                     try:
                         node = nodes[node_index_name]
-
-                        for attribute_index in attribute_indices:
-                            attribute_header = headers[
-                                hgroups[attribute_index][0]]
-                            if attribute_header.startswith(
-                                    "Factor Value") \
-                                    and node_type != "Sample Name":
-                                continue
-                            if attribute_header not in node.attributes:
-                                node.attributes.append(attribute_header)
-
                     except KeyError:
                         node = NodeRecord(name, node_type, node_index_name)
-                        node.metadata = collections.defaultdict(set)
                         nodes[node_index_name] = node
-                        attrs = self._line_keyvals(
-                            line, headers, hgroups, htypes, node.metadata)
-                        nodes[node_index_name].metadata = attrs
-
-                        for attribute_index in attribute_indices:
-                            attribute_header = headers[
-                                hgroups[attribute_index][0]]
-                            if attribute_header.startswith(
-                                    "Factor Value") \
-                                    and node_type != "Sample Name":
-                                continue
-                            if attribute_header not in node.attributes:
-                                node.attributes.append(attribute_header)
+                        node.metadata = self._line_keyvals(
+                            line, plan, collections.defaultdict(set))
+
+                    for attribute_header in attribute_headers:
+                        if attribute_header not in node.attributes:
+                            node.attributes.append(attribute_header)
 
                     if not (previous_node_index == -1):
                         node.derivesFrom.append(line[previous_node_index])
@@ -631,47 +531,49 @@ class StudyAssayParser:
         node.metadata = final
         return node
 
-    def _line_keyvals(self, line, header, hgroups, htypes, out):
-        out = self._line_by_type(line, header, hgroups, htypes, out, "node")
-        out = self._line_by_type(
-            line, header, hgroups, htypes, out, "attribute",
-            self._collapse_attributes)
-        out = self._line_by_type(
-            line, header, hgroups, htypes, out, "processing",
-            self._collapse_attributes)
-        out = self._line_by_type(
-            line, header, hgroups, htypes, out, "parameter",
-            self._collapse_attributes)
-        return out
+    def _compile_header(self, header):
+        """Work out once per file how the columns of its lines are read.
+        """
+        headers = self._swap_synonyms(header)
+        hgroups = self._collapse_header(headers)
+        htypes = self._characterize_header(headers, hgroups)
+        keyvals = []
+        for want_type in ("node", "attribute", "processing", "parameter"):
+            for index in (i for i, t in enumerate(htypes) if t == want_type):
+                column = hgroups[index][0]
+                if want_type == "node":
+                    columns, names = None, None
+                else:
+                    columns, names = self._collapse_attributes(
+                        headers, hgroups[index])
+                keyvals.append((headers[column], column, columns, names))
+        return HeaderPlan(headers, hgroups, htypes, keyvals)
 
     @staticmethod
-    def _line_by_type(line, header, hgroups, htypes, out, want_type,
-                      collapse_quals_fn=None):
-        """Parse out key value pairs for line information based on a group of
+    def _line_keyvals(line, plan, out):
+        """Parse out key value pairs for line information, the node values
+        first, then the collapsed attribute, processing and parameter
         values."""
-        for index, htype in ((i, t) for i, t in enumerate(
-                htypes) if t == want_type):
-            col = hgroups[index][0]
-            key = header[col]
-            if collapse_quals_fn:
-                val = collapse_quals_fn(line, header, hgroups[index])
+        for key, column, attribute_columns, attribute_names in plan.keyvals:
+            if attribute_names is None:
+                out[key].add(line[column])
             else:
-                val = line[col]
-            out[key].add(val)
+                out[key].add(_attrs_type(attribute_names)(
+                    *[line[i] for i in attribute_columns]))
         return out
 
-    def _collapse_attributes(self, line, header, indexes):
-        """Combine attributes in multiple columns into single named tuple.
+    def _collapse_attributes(self, header, indexes):
+        """Get the columns and names of attributes in multiple columns that
+        are combined into single named tuple.
         """
+        columns = []
         names = []
-        vals = []
         for i in indexes:
             if header[i]:
+                columns.append(i)
                 names.append(_RX_COLLAPSE_ATTRIBUTE.sub(
                     "_", self._clean_header(header[i])))
-                vals.append(line[i])
-        Attrs = collections.namedtuple('Attrs', names)
-        return Attrs(*vals)
+        return columns, tuple(names)
 
     @staticmethod
     def _clean_header(header):
@@ -718,49 +620,111 @@ class StudyAssayParser:
     # to ensure uniqueness of node indexes
     @staticmethod
     def _build_node_index(type, name):
-        if type == "Source Name":
-            return "source-" + name
-        elif type == "Sample Name":
-            return "sample-" + name
-        elif type == "Extract Name":
-            return "extract-" + name
-        elif type == "Labeled Extract Name":
-            return "labeledextract-" + name
-        elif type == "Raw Data File":
-            return "rawdatafile-" + name
-        elif type == "Derived Data File":
-            return "deriveddatafile-" + name
-        elif type == "Acquisition Parameter Data File":
-            return "acquisitionparameterfile-" + name
-        elif type == "Image File":
-            return "imagefile-" + name
-        elif type == "Array Data File":
-            return "arraydatafile-" + name
-        elif type == "Array Data Matrix File":
-            return "arraydatamatrixfile-" + name
-        elif type == "Derived Array Data Matrix File":
-            return "derivedarraydatamatrixfile-" + name
-        elif type == "Raw Spectral Data File":
-            return "rawspectraldatafile-" + name
-        elif type == "Derived Array Data Matrix File":
-            return "derivedarraydatamatrixfile-" + name
-        elif type == "Protein Assignment File":
-            return "proteinassignmentfile-" + name
-        elif type == "Peptide Assignment File":
-            return "peptideassignmentfile-" + name
-        elif type == "Post Translational Modification Assignment File":
-            return "posttranslationalmodificationassignmentfile-" + name
-        elif type == "Free Induction Decay Data File":
-            return "freeinductiondecaydatafile-" + name
-        elif type == "Derived Array Data File":
-            return "derivedarraydatafile-" + name
-        elif type == "Derived Spectral Data File":
-            return "derivedspectraldatafile-" + name
-        else:
+        try:
+            return _NODE_INDEX_PREFIXES[type] + name
+        except KeyError:
             print("ERROR - Type not being considered! ", type)
             return name
 
 
+class HeaderPlan:
+    """The header of a study or assay file, grouped and characterized once
+    for all its lines.
+      - headers -- the column headers, with synonyms swapped
+      - hgroups, htypes -- the columns of each header group, and its type
+      - keyvals -- list of (key, column, attribute columns, attribute names)
+        for the values of a line kept as node or process metadata
+      - processing_steps -- list of ProcessingStep, one per Protocol REF
+    """
+
+    def __init__(self, headers, hgroups, htypes, keyvals):
+        self.headers = headers
+        self.header_set = set(headers)
+        self.hgroups = hgroups
+        self.htypes = htypes
+        self.keyvals = keyvals
+        self.node_indices = self.indices("node")
+        self.attribute_indices = self.indices("attribute")
+        processing_indices = self.indices("processing")
+        self.processing_steps = [
+            ProcessingStep(self, processing_indices, processing_index)
+            for processing_index in processing_indices]
+
+    def indices(self, want_type):
+        """Get the header groups of a type."""
+        return [i for i, x in enumerate(self.htypes) if x == want_type]
+
+
+class ProcessingStep:
+    """The columns read for a Protocol REF on each line: the input and
+    output nodes around it, its parameters, qualifiers and assay name.
+    """
+
+    def __init__(self, plan, processing_indices, processing_index):
+        headers = plan.headers
+        hgroups = plan.hgroups
+        next_processing_index = find_gt(processing_indices, processing_index)
+        previous_processing_index = find_lt(
+            processing_indices, processing_index)
+        input_indices = find_in_between(
+            plan.node_indices, previous_processing_index, processing_index)
+        output_indices = find_in_between(
+            plan.node_indices, processing_index, next_processing_index)
+        parameters_indices = find_in_between(
+            plan.indices("parameter"), processing_index,
+            next_processing_index)
+        assay_name_indices = find_in_between(
+            plan.indices("node_assay"), processing_index,
+            next_processing_index)
+
+        self.column = hgroups[processing_index][0]
+        self.header = headers[self.column]
+        self.inputs = [(hgroups[x][0], headers[hgroups[x][0]])
+                       for x in input_indices]
+        self.outputs = [(hgroups[x][0], headers[hgroups[x][0]])
+                        for x in output_indices]
+        self.parameters = [headers[hgroups[x][0]] for x in parameters_indices]
+        self.qualifier_columns = hgroups[processing_index][1:]
+        self.qualifiers = [(x, headers[x]) for x in self.qualifier_columns]
+        self.assay_name_column = hgroups[assay_name_indices[0]][0] \
+            if len(assay_name_indices) == 1 else None
+
+
+_NODE_INDEX_PREFIXES = {
+    "Source Name": "source-",
+    "Sample Name": "sample-",
+    "Extract Name": "extract-",
+    "Labeled Extract Name": "labeledextract-",
+    "Raw Data File": "rawdatafile-",
+    "Derived Data File": "deriveddatafile-",
+    "Acquisition Parameter Data File": "acquisitionparameterfile-",
+    "Image File": "imagefile-",
+    "Array Data File": "arraydatafile-",
+    "Array Data Matrix File": "arraydatamatrixfile-",
+    "Derived Array Data Matrix File": "derivedarraydatamatrixfile-",
+    "Raw Spectral Data File": "rawspectraldatafile-",
+    "Protein Assignment File": "proteinassignmentfile-",
+    "Peptide Assignment File": "peptideassignmentfile-",
+    "Post Translational Modification Assignment File":
+        "posttranslationalmodificationassignmentfile-",
+    "Free Induction Decay Data File": "freeinductiondecaydatafile-",
+    "Derived Array Data File": "derivedarraydatafile-",
+    "Derived Spectral Data File": "derivedspectraldatafile-"
+}
+
+# namedtuple types of the collapsed attributes, by field names
+_ATTRS_TYPES = {}
+
+
+def _attrs_type(names):
+    try:
+        return _ATTRS_TYPES[names]
+    except KeyError:
+        attrs_type = collections.namedtuple('Attrs', names)
+        _ATTRS_TYPES[names] = attrs_type
+        return attrs_type
+
+
 _record_str = \
     """* ISATab Record
  metadata: {md}
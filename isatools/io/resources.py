@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Registry of the YAML and JSON resource files packaged with isatools.
+
+Each resource file is read and parsed once per process, the first time it is
+requested with get_resource(), and the same read-only view of its content is
+handed out to every caller afterwards: dicts are wrapped in MappingProxyType
+and lists are turned into tuples. thaw() returns a mutable copy of a view.
+"""
+import json
+import os
+from functools import lru_cache
+from types import MappingProxyType
+
+import yaml
+
+RESOURCES_DIR = os.path.join(os.path.dirname(__file__), '..', 'resources')
+
+# the libyaml bindings parse the same documents as FullLoader, several times faster
+YAML_LOADER = yaml.CFullLoader if yaml.__with_libyaml__ else yaml.FullLoader
+
+
+def get_resource(*path):
+    """Gets the content of a packaged resource file
+
+    :param path: The path of the file, relative to the isatools/resources
+    directory, e.g. ('config', 'yaml', 'protocol-types.yml')
+    :return: A read-only view of the parsed file
+    """
+    return _load_resource(os.path.join(*path))
+
+
+@lru_cache(maxsize=None)
+def _load_resource(relative_path):
+    file_path = os.path.join(RESOURCES_DIR, relative_path)
+    extension = os.path.splitext(file_path)[1].lower()
+    with open(file_path, encoding='utf-8') as resource_file:
+        if extension in ('.yml', '.yaml'):
+            content = yaml.load(resource_file, Loader=YAML_LOADER)
+        elif extension in ('.json', '.jsonld'):
+            content = json.load(resource_file)
+        else:
+            raise ValueError('Unsupported resource file type: {0}'.format(relative_path))
+    return freeze(content)
+
+
+def freeze(obj):
+    """Builds a read-only view of parsed YAML or JSON content
+
+    :param obj: The content, made of dicts, lists and scalars
+    :return: The same content made of MappingProxyTypes, tuples and scalars
+    """
+    if isinstance(obj, dict):
+        return MappingProxyType({key: freeze(value) for key, value in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(item) for item in obj)
+    return obj
+
+
+def thaw(obj):
+    """Builds a mutable copy of a view returned by freeze() or get_resource()
+
+    :param obj: The read-only content
+    :return: The same content made of dicts, lists and scalars
+    """
+    if isinstance(obj, MappingProxyType):
+        return {key: thaw(value) for key, value in obj.items()}
+    if isinstance(obj, tuple):
+        return [thaw(item) for item in obj]
+    return obj
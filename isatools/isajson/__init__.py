@@ -4,6 +4,8 @@ Don't forget to read the ISA-JSON spec:
 https://isa-specs.readthedocs.io/en/latest/isajson.html
 """
 
-from isatools.isajson.load import load
-from isatools.isajson.dump import ISAJSONEncoder
-from isatools.isajson.validate import validate, batch_validate, default_config_dir, load_config
+from isatools.isajson.load import load, load_dict
+from isatools.isajson.dump import ISAJSONEncoder, ISAJSONStreamWriter, dump, dumps
+from isatools.isajson.validate import (
+    validate, batch_validate, iter_batch_validate, default_config_dir, load_config
+)
@@ -1,4 +1,36 @@
-from json import JSONEncoder
+"""Functions for writing ISA-JSON.
+
+ISAJSONEncoder serializes ISA objects through their to_dict() method, which
+builds the whole document as nested dicts before json encodes it. dump() and
+dumps() produce the same text by walking the model and writing each value to
+the output as soon as it is reached, without the intermediate dict tree.
+Ontology annotations and ontology sources referenced many times over, like
+characteristic categories and units, are encoded once and reused.
+
+Don't forget to read the ISA-JSON spec:
+https://isa-specs.readthedocs.io/en/latest/isajson.html
+"""
+from functools import lru_cache
+from io import StringIO
+from json import JSONEncoder, dumps as json_dumps
+from uuid import uuid4
+
+from isatools.model import (
+    Assay,
+    Characteristic,
+    Comment,
+    DataFile,
+    FactorValue,
+    Investigation,
+    Material,
+    OntologyAnnotation,
+    OntologySource,
+    Process,
+    Sample,
+    Source,
+    Study
+)
+from isatools.model.mixins import MaterialAttribute
 
 
 class ISAJSONEncoder(JSONEncoder):
@@ -8,3 +40,367 @@ class ISAJSONEncoder(JSONEncoder):
             if callable(method):
                 return o.to_dict()
         return JSONEncoder.default(self, o)
+
+
+def dump(isa_obj, fp, ld=False):
+    """Writes an ISA object as ISA-JSON to a text file object
+
+    The output is identical to json.dump(isa_obj, fp, cls=ISAJSONEncoder)
+    but is streamed to fp instead of being built in memory first.
+
+    :param isa_obj: An ISA Investigation, or any ISA object with a to_dict()
+    :param fp: A text file-like object to write to
+    :param ld: If True, write the JSON-LD attributes of each object too
+    :return: None
+    """
+    ISAJSONStreamWriter(fp, ld=ld).write_document(isa_obj)
+
+
+def dumps(isa_obj, ld=False):
+    """Returns the ISA-JSON text of an ISA object, as written by dump()
+
+    :param isa_obj: An ISA Investigation, or any ISA object with a to_dict()
+    :param ld: If True, write the JSON-LD attributes of each object too
+    :return: The ISA-JSON string
+    """
+    buffer = StringIO()
+    dump(isa_obj, buffer, ld=ld)
+    return buffer.getvalue()
+
+
+class ISAJSONStreamWriter(object):
+    """Writes ISA objects as ISA-JSON while walking the model
+
+    Each ISA class with a streaming method below lists its fields in the
+    order of its to_dict(); the other objects are written from their
+    to_dict(). The text of every ontology annotation and ontology source is
+    cached by object, so shared terms are only encoded once per writer.
+    """
+
+    def __init__(self, fp, ld=False):
+        self.ld = ld
+        self._write = fp.write
+        self._cache = {}
+        self._root_fields = []
+
+    def write_document(self, isa_obj):
+        """Writes an ISA object as a whole document, with the root JSON-LD context if there is one
+
+        :param isa_obj: An ISA Investigation, or any ISA object with a to_dict()
+        :return: None
+        """
+        if self.ld and hasattr(isa_obj, 'get_root_context'):
+            self._root_fields = list(isa_obj.get_root_context().items())
+        self.write(isa_obj)
+
+    def write(self, value):
+        """Writes a value: an ISA object, a JSON value or a list or dict of them"""
+        if value is None or isinstance(value, (str, int, float)):
+            self._write(json_dumps(value))
+        elif isinstance(value, (list, tuple)):
+            self._write_list(value)
+        elif isinstance(value, dict):
+            self._write_fields(value.items())
+        elif callable(value):
+            value()
+        else:
+            self._write_isa_object(value)
+
+    def _write_list(self, values):
+        self._write('[')
+        first = True
+        for value in values:
+            if not first:
+                self._write(', ')
+            first = False
+            self.write(value)
+        self._write(']')
+
+    def _write_fields(self, fields):
+        self._write('{')
+        first = True
+        for key, value in fields:
+            if not first:
+                self._write(', ')
+            first = False
+            self._write(json_dumps(key))
+            self._write(': ')
+            self.write(value)
+        self._write('}')
+
+    def _write_refs(self, isa_objects):
+        self._write_list([{'@id': isa_object.id} for isa_object in isa_objects])
+
+    def _write_isa_object(self, isa_object):
+        _get_stream_method(type(isa_object))(self, isa_object)
+
+    def _write_from_dict(self, isa_object):
+        if not callable(getattr(isa_object, 'to_dict', None)):
+            raise TypeError('Object of type {} is not JSON serializable'.format(type(isa_object).__name__))
+        isa_dict = isa_object.to_dict(ld=self.ld)
+        if self._root_fields:
+            isa_dict = {**dict(self._pop_root_fields()), **isa_dict}
+        self._write(json_dumps(isa_dict, cls=ISAJSONEncoder))
+
+    def _write_object(self, isa_object, fields):
+        if self.ld:
+            fields = _update_fields(fields, isa_object.get_ld_attributes())
+            if self._root_fields:
+                fields = self._pop_root_fields() + fields
+        self._write_fields(fields)
+
+    def _pop_root_fields(self):
+        root_fields, self._root_fields = self._root_fields, []
+        return root_fields
+
+    def _write_cached(self, isa_object, method):
+        key = id(isa_object)
+        try:
+            cached_object, text = self._cache[key]
+            if cached_object is isa_object:
+                self._write(text)
+                return
+        except KeyError:
+            pass
+        write = self._write
+        chunks = []
+        self._write = chunks.append
+        try:
+            method(self, isa_object)
+        finally:
+            self._write = write
+        text = ''.join(chunks)
+        self._cache[key] = (isa_object, text)
+        write(text)
+
+    def _write_investigation(self, investigation):
+        self._write_object(investigation, [
+            ('identifier', investigation.identifier),
+            ('title', investigation.title),
+            ('description', investigation.description),
+            ('publicReleaseDate', investigation.public_release_date),
+            ('submissionDate', investigation.submission_date),
+            ('comments', investigation.comments),
+            ('ontologySourceReferences', investigation.ontology_source_references),
+            ('people', investigation.contacts),
+            ('publications', investigation.publications),
+            ('studies', investigation.studies)
+        ])
+
+    def _write_study(self, study):
+        self._write_object(study, [
+            ('filename', study.filename),
+            ('identifier', study.identifier),
+            ('title', study.title),
+            ('description', study.description),
+            ('submissionDate', study.submission_date),
+            ('publicReleaseDate', study.public_release_date),
+            ('publications', study.publications),
+            ('people', study.contacts),
+            ('comments', study.comments),
+            ('studyDesignDescriptors', study.design_descriptors),
+            ('protocols', study.protocols),
+            ('materials', {
+                'sources': study.sources,
+                'samples': study.samples,
+                'otherMaterials': study.other_material
+            }),
+            ('processSequence', study.process_sequence),
+            ('factors', study.factors),
+            ('characteristicCategories', lambda: self._write_categories(study)),
+            ('unitCategories', study.units),
+            ('assays', study.assays)
+        ])
+
+    def _write_assay(self, assay):
+        self._write_object(assay, [
+            ('measurementType', assay.measurement_type if assay.measurement_type else ''),
+            ('technologyType', assay.technology_type if assay.technology_type else ''),
+            ('technologyPlatform', assay.technology_platform),
+            ('filename', assay.filename),
+            ('characteristicCategories', lambda: self._write_categories(assay)),
+            ('unitCategories', assay.units),
+            ('comments', assay.comments),
+            ('materials', {
+                'samples': lambda: self._write_refs(assay.samples),
+                'otherMaterials': assay.other_material
+            }),
+            ('dataFiles', assay.data_files),
+            ('processSequence', assay.process_sequence)
+        ])
+
+    def _write_categories(self, isa_object):
+        """Writes the characteristicCategories of a study or an assay, as categories_to_dict()"""
+        self._write('[')
+        first = True
+        for category in isa_object.characteristic_categories:
+            if not first:
+                self._write(', ')
+            first = False
+            id_ = category.id
+            if id_.startswith('#ontology_annotation/'):
+                id_ = id_.replace('#ontology_annotation/', '#characteristic_category/')
+            elif not id_.startswith('#characteristic_category/'):
+                id_ = '#characteristic_category/' + id_
+            fields = [('@id', id_), ('characteristicType', category)]
+            if self.ld:
+                fields = _update_fields(fields, MaterialAttribute(id_=id_).to_dict())
+            self._write_fields(fields)
+        self._write(']')
+
+    def _write_process(self, process):
+        fields = [
+            ('@id', process.id),
+            ('name', process.name if process.name is not None else ''),
+            ('performer', process.performer if process.performer is not None else ''),
+            ('date', process.date if process.date is not None else ''),
+            ('executesProtocol', {'@id': process.executes_protocol.id}),
+            ('parameterValues', lambda: self._write_parameter_values(process.parameter_values)),
+            ('inputs', lambda: self._write_refs(process.inputs)),
+            ('outputs', lambda: self._write_refs(process.outputs)),
+            ('comments', process.comments)
+        ]
+        if process.prev_process:
+            fields.append(('previousProcess', {'@id': process.prev_process.id}))
+        if process.next_process:
+            fields.append(('nextProcess', {'@id': process.next_process.id}))
+        self._write_object(process, fields)
+
+    def _write_parameter_values(self, parameter_values):
+        self._write('[')
+        first = True
+        for parameter_value in parameter_values:
+            if not first:
+                self._write(', ')
+            first = False
+            fields = [
+                ('category', {'@id': parameter_value.category.id} if parameter_value.category else ''),
+                ('value', parameter_value.value if parameter_value.value else '')
+            ]
+            if parameter_value.unit:
+                fields.append(('unit', {'@id': parameter_value.unit.id}))
+            self._write_fields(fields)
+        self._write(']')
+
+    def _write_source(self, source):
+        self._write_object(source, [
+            ('@id', source.id),
+            ('name', source.name),
+            ('characteristics', source.characteristics),
+            ('comments', source.comments)
+        ])
+
+    def _write_sample(self, sample):
+        self._write_object(sample, [
+            ('@id', sample.id),
+            ('name', sample.name),
+            ('characteristics', sample.characteristics),
+            ('factorValues', sample.factor_values),
+            ('derivesFrom', lambda: self._write_refs(sample.derives_from)),
+            ('comments', sample.comments)
+        ])
+
+    def _write_material(self, material):
+        self._write_object(material, [
+            ('@id', material.id),
+            ('name', material.name),
+            ('type', material.type),
+            ('characteristics', material.characteristics),
+            ('comments', material.comments)
+        ])
+
+    def _write_data_file(self, data_file):
+        self._write_object(data_file, [
+            ('@id', data_file.id),
+            ('name', data_file.filename),
+            ('type', data_file.label),
+            ('comments', data_file.comments)
+        ])
+
+    def _write_characteristic(self, characteristic):
+        category = ''
+        if characteristic.category:
+            category = {'@id': characteristic.category.id.replace('#ontology_annotation/',
+                                                                  '#characteristic_category/')}
+        fields = [
+            ('category', category),
+            ('value', characteristic.value),
+            ('comments', characteristic.comments)
+        ]
+        if characteristic.unit:
+            id_ = '#ontology_annotation/' + str(uuid4())
+            if isinstance(characteristic.unit, OntologyAnnotation):
+                id_ = characteristic.unit.id
+            fields.append(('unit', {'@id': id_}))
+        self._write_object(characteristic, fields)
+
+    def _write_factor_value(self, factor_value):
+        fields = [
+            ('category', {'@id': factor_value.factor_name.id} if factor_value.factor_name else ''),
+            ('value', factor_value.value if factor_value.value else '')
+        ]
+        if factor_value.unit:
+            id_ = '#unit/' + str(uuid4())
+            if isinstance(factor_value.unit, OntologyAnnotation):
+                id_ = factor_value.unit.id.replace('#ontology_annotation/', '#unit/')
+            fields.append(('unit', {'@id': id_}))
+        self._write_object(factor_value, fields)
+
+    def _write_comment(self, comment):
+        self._write_object(comment, [('name', comment.name), ('value', comment.value)])
+
+    def _write_ontology_annotation(self, ontology_annotation):
+        self._write_cached(ontology_annotation, ISAJSONStreamWriter._write_ontology_annotation_fields)
+
+    def _write_ontology_annotation_fields(self, ontology_annotation):
+        term_source = ontology_annotation.term_source if ontology_annotation.term_source else ''
+        if isinstance(term_source, OntologySource):
+            term_source = term_source.name
+        self._write_object(ontology_annotation, [
+            ('@id', ontology_annotation.id),
+            ('annotationValue', ontology_annotation.term),
+            ('termSource', term_source),
+            ('termAccession', ontology_annotation.term_accession),
+            ('comments', ontology_annotation.comments)
+        ])
+
+    def _write_ontology_source(self, ontology_source):
+        self._write_cached(ontology_source, ISAJSONStreamWriter._write_from_dict)
+
+
+def _update_fields(fields, attributes):
+    """Returns the fields updated with the attributes, in the order dict.update() leaves them"""
+    fields = list(fields)
+    positions = {key: i for i, (key, _) in enumerate(fields)}
+    for key, value in attributes.items():
+        if key in positions:
+            fields[positions[key]] = (key, value)
+        else:
+            positions[key] = len(fields)
+            fields.append((key, value))
+    return fields
+
+
+# the streaming method of each ISA class, which must write the same fields in the same order as its to_dict()
+_STREAM_METHODS = {
+    Investigation: ISAJSONStreamWriter._write_investigation,
+    Study: ISAJSONStreamWriter._write_study,
+    Assay: ISAJSONStreamWriter._write_assay,
+    Process: ISAJSONStreamWriter._write_process,
+    Source: ISAJSONStreamWriter._write_source,
+    Sample: ISAJSONStreamWriter._write_sample,
+    Material: ISAJSONStreamWriter._write_material,
+    DataFile: ISAJSONStreamWriter._write_data_file,
+    Characteristic: ISAJSONStreamWriter._write_characteristic,
+    FactorValue: ISAJSONStreamWriter._write_factor_value,
+    Comment: ISAJSONStreamWriter._write_comment,
+    OntologyAnnotation: ISAJSONStreamWriter._write_ontology_annotation,
+    OntologySource: ISAJSONStreamWriter._write_ontology_source
+}
+
+
+@lru_cache(maxsize=None)
+def _get_stream_method(cls):
+    """Returns the streaming method of an ISA class or of its closest base class, _write_from_dict otherwise"""
+    return next((_STREAM_METHODS[base] for base in cls.__mro__ if base in _STREAM_METHODS),
+                ISAJSONStreamWriter._write_from_dict)
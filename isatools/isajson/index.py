@@ -0,0 +1,309 @@
+"""
+Single-pass indexing of ISA-JSON documents for the validator.
+
+The ISA-JSON validator used to walk the whole document once per rule and
+rebuild the same id collections in every check. ISAJSONIndex traverses the
+document a single time and records, for each study and assay, the ids
+declared and used by the rules 1002-1022, together with every ontology
+annotation, date, DOI and PubMed id needed by the rules 3001-3010.
+
+Don't forget to read the ISA-JSON spec:
+https://isa-specs.readthedocs.io/en/latest/isajson.html
+"""
+from __future__ import absolute_import
+
+__author__ = 'djcomlab@gmail.com (David Johnson)'
+
+
+def is_ontology_annotation(isa_json):
+    """Returns True if the JSON dict is an ontology annotation structure
+
+    :param isa_json: a dict from an ISA-JSON document
+    :return: True if the keys are those of an ontology annotation
+    """
+    size = len(isa_json)
+    return (size == 3 or (size == 4 and "@id" in isa_json)) \
+        and "annotationValue" in isa_json \
+        and "termAccession" in isa_json \
+        and "termSource" in isa_json
+
+
+def _characteristic_category_id(category_json):
+    return category_json["@id"].replace("#ontology_annotation", "#characteristic_category")
+
+
+class ScopeIndex(object):
+    """Ids collected from a study or an assay and from its process sequence"""
+
+    def __init__(self, scope_json):
+        self.characteristic_categories = [_characteristic_category_id(category)
+                                          for category in scope_json["characteristicCategories"]]
+        self.unit_categories = [category["@id"] for category in scope_json["unitCategories"]]
+        self.characteristic_categories_used = []
+        self.unit_categories_used = []
+        self.io_ids = []
+        self.protocol_ids_used = []
+        self.parameter_ids_used = []
+
+    def add_characteristics(self, characteristics):
+        for characteristic in characteristics:
+            self.characteristic_categories_used.append(_characteristic_category_id(characteristic["category"]))
+            if "unit" in characteristic:
+                self.unit_categories_used.append(characteristic["unit"]["@id"])
+
+    def add_process(self, process):
+        self.io_ids.extend(i["@id"] for i in process["inputs"])
+        self.io_ids.extend(o["@id"] for o in process["outputs"])
+        try:
+            self.protocol_ids_used.append(process["executesProtocol"]["@id"])
+        except KeyError:
+            pass
+        for parameter_value in process["parameterValues"]:
+            self.parameter_ids_used.append(parameter_value["category"]["@id"])
+            if "unit" in parameter_value:
+                self.unit_categories_used.append(parameter_value["unit"]["@id"])
+
+
+class AssayIndex(ScopeIndex):
+    """Ids collected from an assay"""
+
+    def __init__(self, assay_json):
+        super(AssayIndex, self).__init__(assay_json)
+        self.material_ids = []
+        self.data_file_ids = []
+
+
+class StudyIndex(ScopeIndex):
+    """Ids, dates and publications collected from a study and its assays"""
+
+    def __init__(self, study_json):
+        super(StudyIndex, self).__init__(study_json)
+        self.source_ids = []
+        self.sample_ids = []
+        self.protocol_ids = []
+        self.parameter_ids = []
+        self.factor_ids = []
+        self.factor_ids_used = []
+        self.dates = [study_json[key] for key in ("publicReleaseDate", "submissionDate") if key in study_json]
+        self.dois = []
+        self.pubmed_ids = []
+        self.assays = []
+
+    def _from_assays(self, attribute):
+        return [elem for assay in self.assays for elem in getattr(assay, attribute)]
+
+    @property
+    def material_ids(self):
+        """Used for rule 1005"""
+        return self._from_assays("material_ids")
+
+    @property
+    def data_file_ids(self):
+        """Used for rule 1004"""
+        return self._from_assays("data_file_ids")
+
+    @property
+    def all_io_ids(self):
+        """Used for rules 1001-1005"""
+        return self.io_ids + self._from_assays("io_ids")
+
+    @property
+    def all_protocol_ids_used(self):
+        """Used for rules 1007 and 1019"""
+        return self.protocol_ids_used + self._from_assays("protocol_ids_used")
+
+    @property
+    def all_parameter_ids_used(self):
+        """Used for rules 1009 and 1020"""
+        return self.parameter_ids_used + self._from_assays("parameter_ids_used")
+
+    @property
+    def all_characteristic_categories(self):
+        """Used for rules 1013 and 1022"""
+        return self.characteristic_categories + self._from_assays("characteristic_categories")
+
+    @property
+    def all_characteristic_categories_used(self):
+        """Used for rules 1013 and 1022"""
+        return self.characteristic_categories_used + self._from_assays("characteristic_categories_used")
+
+    @property
+    def all_unit_categories(self):
+        """Used for rules 1014 and 1022"""
+        return self.unit_categories + self._from_assays("unit_categories")
+
+    @property
+    def all_unit_categories_used(self):
+        """Used for rules 1014 and 1022"""
+        return self.unit_categories_used + self._from_assays("unit_categories_used")
+
+
+class ISAJSONIndex(object):
+    """Visitor collecting everything the ISA-JSON rules need in one traversal
+
+    Usage:
+      index = ISAJSONIndex(isa_json)
+      for study_json, study_index in zip(isa_json["studies"], index.studies):
+          ...
+    """
+
+    def __init__(self, isa_json=None):
+        self.ontology_source_refs = []
+        self.annotations = []
+        self.studies = []
+        self._dates = []
+        self._dois = []
+        self._pubmed_ids = []
+        self._study = None
+        self._assay = None
+        if isa_json is not None:
+            self.visit(isa_json, ())
+
+    @classmethod
+    def index_study(cls, study_json):
+        """Builds the StudyIndex of a single study JSON dict
+
+        :param study_json: a study from an ISA-JSON document
+        :return: the StudyIndex of the study
+        """
+        index = cls()
+        index.visit(study_json, ("studies",))
+        return index.studies[0]
+
+    @property
+    def dates(self):
+        """Used for rule 3001"""
+        return self._dates + [date for study in self.studies for date in study.dates]
+
+    @property
+    def dois(self):
+        """Used for rule 3002"""
+        return self._dois + [doi for study in self.studies for doi in study.dois]
+
+    @property
+    def pubmed_ids(self):
+        """Used for rule 3003"""
+        return self._pubmed_ids + [pubmed_id for study in self.studies for pubmed_id in study.pubmed_ids]
+
+    def visit(self, isa_json, path):
+        """Walks the JSON tree, dispatching the dicts found at known paths
+
+        :param isa_json: a node of the ISA-JSON document
+        :param path: the tuple of keys leading to the node, list positions excluded
+        """
+        if isinstance(isa_json, dict):
+            if is_ontology_annotation(isa_json):
+                self.annotations.append(isa_json)
+            visitor = _VISITORS.get(path)
+            if visitor is not None:
+                visitor(self, isa_json)
+            for key, value in isa_json.items():
+                if isinstance(value, (dict, list)):
+                    child_path = path + (key,)
+                    if child_path in _VISITED_PATHS:
+                        self.visit(value, child_path)
+                    else:
+                        self.collect_annotations(value)
+        elif isinstance(isa_json, list):
+            for item in isa_json:
+                self.visit(item, path)
+
+    def collect_annotations(self, isa_json):
+        """Walks a JSON subtree no rule looks into, except for its annotations"""
+        if isinstance(isa_json, dict):
+            if is_ontology_annotation(isa_json):
+                self.annotations.append(isa_json)
+            for value in isa_json.values():
+                if isinstance(value, (dict, list)):
+                    self.collect_annotations(value)
+        elif isinstance(isa_json, list):
+            for item in isa_json:
+                if isinstance(item, (dict, list)):
+                    self.collect_annotations(item)
+
+    def _visit_investigation(self, investigation_json):
+        self._dates.extend(investigation_json[key] for key in ("publicReleaseDate", "submissionDate")
+                           if key in investigation_json)
+        self.ontology_source_refs = [ontology_source_ref["name"] for ontology_source_ref in
+                                     investigation_json["ontologySourceReferences"]]
+
+    def _visit_investigation_publication(self, publication_json):
+        if "doi" in publication_json:
+            self._dois.append(publication_json["doi"])
+        self._pubmed_ids.append(publication_json["pubMedID"])
+
+    def _visit_study(self, study_json):
+        self._study = StudyIndex(study_json)
+        self._assay = None
+        self.studies.append(self._study)
+
+    def _visit_study_publication(self, publication_json):
+        if "doi" in publication_json:
+            self._study.dois.append(publication_json["doi"])
+        self._study.pubmed_ids.append(publication_json["pubMedID"])
+
+    def _visit_protocol(self, protocol_json):
+        self._study.protocol_ids.append(protocol_json["@id"])
+        self._study.parameter_ids.extend(parameter["@id"] for parameter in protocol_json["parameters"])
+
+    def _visit_factor(self, factor_json):
+        self._study.factor_ids.append(factor_json["@id"])
+
+    def _visit_source(self, source_json):
+        self._study.source_ids.append(source_json["@id"])
+        self._study.add_characteristics(source_json["characteristics"])
+
+    def _visit_sample(self, sample_json):
+        self._study.sample_ids.append(sample_json["@id"])
+        self._study.add_characteristics(sample_json["characteristics"])
+        for factor_value in sample_json["factorValues"]:
+            self._study.factor_ids_used.append(factor_value["category"]["@id"])
+            if "unit" in factor_value:
+                self._study.unit_categories_used.append(factor_value["unit"]["@id"])
+
+    def _visit_study_process(self, process_json):
+        self._study.add_process(process_json)
+        if "date" in process_json:
+            self._study.dates.append(process_json["date"])
+
+    def _visit_assay(self, assay_json):
+        self._assay = AssayIndex(assay_json)
+        self._study.assays.append(self._assay)
+
+    def _visit_assay_sample(self, sample_json):
+        if "characteristics" in sample_json:
+            self._assay.characteristic_categories_used.extend(
+                _characteristic_category_id(characteristic["category"])
+                for characteristic in sample_json["characteristics"])
+
+    def _visit_other_material(self, material_json):
+        self._assay.material_ids.append(material_json["@id"])
+        if "characteristics" in material_json:
+            self._assay.add_characteristics(material_json["characteristics"])
+
+    def _visit_data_file(self, data_file_json):
+        self._assay.data_file_ids.append(data_file_json["@id"])
+
+    def _visit_assay_process(self, process_json):
+        self._assay.add_process(process_json)
+
+
+_VISITORS = {
+    (): ISAJSONIndex._visit_investigation,
+    ("publications",): ISAJSONIndex._visit_investigation_publication,
+    ("studies",): ISAJSONIndex._visit_study,
+    ("studies", "publications"): ISAJSONIndex._visit_study_publication,
+    ("studies", "protocols"): ISAJSONIndex._visit_protocol,
+    ("studies", "factors"): ISAJSONIndex._visit_factor,
+    ("studies", "materials", "sources"): ISAJSONIndex._visit_source,
+    ("studies", "materials", "samples"): ISAJSONIndex._visit_sample,
+    ("studies", "processSequence"): ISAJSONIndex._visit_study_process,
+    ("studies", "assays"): ISAJSONIndex._visit_assay,
+    ("studies", "assays", "materials", "samples"): ISAJSONIndex._visit_assay_sample,
+    ("studies", "assays", "materials", "otherMaterials"): ISAJSONIndex._visit_other_material,
+    ("studies", "assays", "dataFiles"): ISAJSONIndex._visit_data_file,
+    ("studies", "assays", "processSequence"): ISAJSONIndex._visit_assay_process,
+}
+
+#  every prefix of a path with a visitor must be walked with its path, the rest only for annotations
+_VISITED_PATHS = {path[:i] for path in _VISITORS for i in range(len(path) + 1)}
@@ -9,7 +9,15 @@ def load(fp):
     :param fp: A file-like object or a string containing the JSON data.
     :return: An Investigation object.
     """
-    investigation_json = json.load(fp)
+    return load_dict(json.load(fp))
+
+
+def load_dict(investigation_json):
+    """Builds an Investigation object from an already parsed ISA-JSON document.
+
+    :param investigation_json: A dict containing the ISA-JSON data.
+    :return: An Investigation object.
+    """
     investigation = Investigation()
     investigation.from_dict(investigation_json)
     return investigation
@@ -10,10 +10,13 @@ import json
 import logging
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 from io import StringIO
 from jsonschema import Draft4Validator, RefResolver, ValidationError
 
-from isatools.isajson.load import load
+from isatools.isajson.index import ISAJSONIndex, is_ontology_annotation
+from isatools.isajson.load import load_dict
 
 __author__ = 'djcomlab@gmail.com (David Johnson)'
 
@@ -28,6 +31,9 @@ _RX_DOI = re.compile("(10[.][0-9]{4,}(?:[.][0-9]+)*/(?:(?![%'#? ])\\S)+)")
 _RX_PMID = re.compile("[0-9]{8}")
 _RX_PMCID = re.compile("PMC[0-9]{8}")
 
+#  maximum number of bytes fed to the encoding detector for rule 0010
+ENCODING_DETECTION_LIMIT = 4 * 1024 * 1024
+
 
 """Everything below here is for the validator"""
 
@@ -68,10 +74,24 @@ def get_io_ids_in_process_sequence(study_json):
                                  all_process_sequences] for elem in iterabl]
 
 
-def check_material_ids_declared_used(study_json, id_collector_func):
+#  id collectors whose results are precomputed in a StudyIndex
+_INDEXED_ID_COLLECTORS = {
+    get_source_ids: "source_ids",
+    get_sample_ids: "sample_ids",
+    get_material_ids: "material_ids",
+    get_data_file_ids: "data_file_ids"
+}
+
+
+def check_material_ids_declared_used(study_json, id_collector_func, study_index=None):
     """Used for rules 1015-1018"""
-    node_ids = id_collector_func(study_json)
-    io_ids_in_process_sequence = get_io_ids_in_process_sequence(study_json)
+    if study_index is None:
+        study_index = ISAJSONIndex.index_study(study_json)
+    if id_collector_func in _INDEXED_ID_COLLECTORS:
+        node_ids = getattr(study_index, _INDEXED_ID_COLLECTORS[id_collector_func])
+    else:
+        node_ids = id_collector_func(study_json)
+    io_ids_in_process_sequence = study_index.all_io_ids
     is_node_ids_used = set(node_ids).issubset(set(io_ids_in_process_sequence))
     if not is_node_ids_used:
         warnings.append({
@@ -83,13 +103,15 @@ def check_material_ids_declared_used(study_json, id_collector_func):
                                                                                   io_ids_in_process_sequence))
 
 
-def check_material_ids_not_declared_used(study_json):
+def check_material_ids_not_declared_used(study_json, study_index=None):
     """Used for rules 1002-1005"""
-    node_ids = get_source_ids(study_json) \
-               + get_sample_ids(study_json) \
-               + get_material_ids(study_json) \
-               + get_data_file_ids(study_json)
-    io_ids_in_process_sequence = get_io_ids_in_process_sequence(study_json)
+    if study_index is None:
+        study_index = ISAJSONIndex.index_study(study_json)
+    node_ids = study_index.source_ids \
+               + study_index.sample_ids \
+               + study_index.material_ids \
+               + study_index.data_file_ids
+    io_ids_in_process_sequence = study_index.all_io_ids
     if len(set(io_ids_in_process_sequence)) - len(set(node_ids)) > 0:
         diff = set(io_ids_in_process_sequence) - set(node_ids)
         errors.append({
@@ -104,7 +126,7 @@ def check_material_ids_not_declared_used(study_json):
 
 def check_process_sequence_links(process_sequence_json):
     """Used for rule 1006"""
-    process_ids = [process["@id"] for process in process_sequence_json]
+    process_ids = {process["@id"] for process in process_sequence_json}
     for process in process_sequence_json:
         try:
             if process["previousProcess"]["@id"] not in process_ids:
@@ -137,23 +159,12 @@ def get_study_protocol_ids(study_json):
     return [protocol["@id"] for protocol in study_json["protocols"]]
 
 
-def check_process_protocol_ids_usage(study_json):
+def check_process_protocol_ids_usage(study_json, study_index=None):
     """Used for rules 1007 and 1019"""
-    protocol_ids_declared = get_study_protocol_ids(study_json)
-    process_sequence = study_json["processSequence"]
-    protocol_ids_used = list()
-    for process in process_sequence:
-        try:
-            protocol_ids_used.append(process["executesProtocol"]["@id"])
-        except KeyError:
-            pass
-    for assay in study_json["assays"]:
-        process_sequence = assay["processSequence"]
-        for process in process_sequence:
-            try:
-                protocol_ids_used.append(process["executesProtocol"]["@id"])
-            except KeyError:
-                pass
+    if study_index is None:
+        study_index = ISAJSONIndex.index_study(study_json)
+    protocol_ids_declared = study_index.protocol_ids
+    protocol_ids_used = study_index.all_protocol_ids_used
     if len(set(protocol_ids_used) - set(protocol_ids_declared)) > 0:
         diff = set(protocol_ids_used) - set(protocol_ids_declared)
         errors.append({
@@ -194,11 +205,13 @@ def get_parameter_value_parameter_ids(study_json):
     return study_pv_parameter_ids
 
 
-def check_protocol_parameter_ids_usage(study_json):
+def check_protocol_parameter_ids_usage(study_json, study_index=None):
     """Used for rule 1009 and 1020"""
-    protocols_declared = get_study_protocols_parameter_ids(study_json) + [
+    if study_index is None:
+        study_index = ISAJSONIndex.index_study(study_json)
+    protocols_declared = study_index.parameter_ids + [
         "#parameter/Array_Design_REF"]  # + special case
-    protocols_used = get_parameter_value_parameter_ids(study_json)
+    protocols_used = study_index.all_parameter_ids_used
     if len(set(protocols_used) - set(protocols_declared)) > 0:
         diff = set(protocols_used) - set(protocols_declared)
         errors.append({
@@ -243,19 +256,15 @@ def get_characteristic_category_ids_in_assay_materials(assay_json):
             elem in iterabl]
 
 
-def check_characteristic_category_ids_usage(studies_json):
+def check_characteristic_category_ids_usage(studies_json, study_indexes=None):
     """Used for rule 1013"""
+    if study_indexes is None:
+        study_indexes = [ISAJSONIndex.index_study(study_json) for study_json in studies_json]
     characteristic_categories_declared = list()
     characteristic_categories_used = list()
-    for study_json in studies_json:
-        characteristic_categories_declared += get_characteristic_category_ids(study_json)
-        for assay in study_json["assays"]:
-            characteristic_categories_declared_in_assay = get_characteristic_category_ids(assay)
-            characteristic_categories_declared += characteristic_categories_declared_in_assay
-        characteristic_categories_used += get_characteristic_category_ids_in_study_materials(study_json)
-        for assay in study_json["assays"]:
-            characteristic_categories_used_in_assay = get_characteristic_category_ids_in_assay_materials(assay)
-            characteristic_categories_used += characteristic_categories_used_in_assay
+    for study_index in study_indexes:
+        characteristic_categories_declared += study_index.all_characteristic_categories
+        characteristic_categories_used += study_index.all_characteristic_categories_used
     if len(set(characteristic_categories_used) - set(characteristic_categories_declared)) > 0:
         diff = set(characteristic_categories_used) - set(characteristic_categories_declared)
         errors.append({
@@ -287,10 +296,12 @@ def get_study_factor_ids_in_sample_factor_values(study_json):
                                  study_json["materials"]["samples"]] for elem in iterabl]
 
 
-def check_study_factor_usage(study_json):
+def check_study_factor_usage(study_json, study_index=None):
     """Used for rules 1008 and 1021"""
-    factors_declared = get_study_factor_ids(study_json)
-    factors_used = get_study_factor_ids_in_sample_factor_values(study_json)
+    if study_index is None:
+        study_index = ISAJSONIndex.index_study(study_json)
+    factors_declared = study_index.factor_ids
+    factors_used = study_index.factor_ids_used
     if len(set(factors_used) - set(factors_declared)) > 0:
         diff = set(factors_used) - set(factors_declared)
         errors.append({
@@ -355,17 +366,12 @@ def get_assay_unit_category_ids_in_materials_and_processes(assay_json):
     return [x for x in assay_characteristics_units_used + parameter_value_units_used if x is not None]
 
 
-def check_unit_category_ids_usage(study_json):
+def check_unit_category_ids_usage(study_json, study_index=None):
     """Used for rules 1014 and 1022"""
-    log.info("Getting units declared...")
-    units_declared = get_unit_category_ids(study_json)
-    for assay in study_json["assays"]:
-        units_declared.extend(get_unit_category_ids(assay))
-    log.info("Getting units used (study)...")
-    units_used = get_study_unit_category_ids_in_materials_and_processes(study_json)
-    log.info("Getting units used (assay)...")
-    for assay in study_json["assays"]:
-        units_used.extend(get_assay_unit_category_ids_in_materials_and_processes(assay))
+    if study_index is None:
+        study_index = ISAJSONIndex.index_study(study_json)
+    units_declared = study_index.all_unit_categories
+    units_used = study_index.all_unit_categories_used
     log.info("Comparing units declared vs units used...")
     if len(set(units_used) - set(units_declared)) > 0:
         diff = set(units_used) - set(units_declared)
@@ -382,11 +388,22 @@ def check_unit_category_ids_usage(study_json):
                     .format(list(diff)))
 
 
-def check_utf8(fp):
-    """Used for rule 0010"""
-    import chardet
+def check_utf8(fp, limit=ENCODING_DETECTION_LIMIT):
+    """Used for rule 0010
+
+    The file is fed to the detector in chunks, stopping as soon as it is confident or after limit bytes,
+    so that large files are not read into memory just to find out their encoding.
+    """
+    from chardet.universaldetector import UniversalDetector
+    detector = UniversalDetector()
     with open(fp.name, "rb") as fp:
-        charset = chardet.detect(fp.read())
+        bytes_read = 0
+        for chunk in iter(partial(fp.read, 64 * 1024), b""):
+            detector.feed(chunk)
+            bytes_read += len(chunk)
+            if detector.done or bytes_read >= limit:
+                break
+        charset = detector.close()
         if charset["encoding"].upper() != "UTF-8" and charset["encoding"].lower() != "ascii":
             warnings.append({
                 "message": "File should be UTF8 encoding",
@@ -399,14 +416,30 @@ def check_utf8(fp):
             raise SystemError()
 
 
+# schema validators and configurations loaded once by the batch_validate
+# worker processes, by schema path and configuration directory. They are
+# shared by all the validations of a worker, so the rules must only read them
+_preloaded_schema_validators = {}
+_preloaded_configs = {}
+
+
+def get_schema_validator(investigation_schema_path):
+    """Gets a Draft4Validator of an investigation schema, resolving its
+    references from the directory of the schema
+    """
+    validator = _preloaded_schema_validators.get(investigation_schema_path)
+    if validator is None:
+        with open(investigation_schema_path) as fp:
+            investigation_schema = json.load(fp)
+        resolver = RefResolver("file://" + investigation_schema_path, investigation_schema)
+        validator = Draft4Validator(investigation_schema, resolver=resolver)
+    return validator
+
+
 def check_isa_schemas(isa_json, investigation_schema_path):
     """Used for rule 0003 and 4003"""
     try:
-        with open(investigation_schema_path) as fp:
-            investigation_schema = json.load(fp)
-            resolver = RefResolver("file://" + investigation_schema_path, investigation_schema)
-            validator = Draft4Validator(investigation_schema, resolver=resolver)
-            validator.validate(isa_json)
+        get_schema_validator(investigation_schema_path).validate(isa_json)
     except ValidationError as ve:
         errors.append({
             "message": "Invalid JSON against ISA-JSON schemas",
@@ -418,7 +451,7 @@ def check_isa_schemas(isa_json, investigation_schema_path):
         raise SystemError("(F) The JSON does not validate against the provided ISA-JSON schemas!")
 
 
-def check_date_formats(isa_json):
+def check_date_formats(isa_json, index=None):
     """Used for rule 3001"""
 
     def check_iso8601_date(date_str):
@@ -434,31 +467,13 @@ def check_date_formats(isa_json):
                 log.warning("(W) Date {} does not conform to ISO8601 format".format(date_str))
 
     import iso8601
-    try:
-        check_iso8601_date(isa_json["publicReleaseDate"])
-    except KeyError:
-        pass
-    try:
-        check_iso8601_date(isa_json["submissionDate"])
-    except KeyError:
-        pass
-    for study in isa_json["studies"]:
-        try:
-            check_iso8601_date(study["publicReleaseDate"])
-        except KeyError:
-            pass
-        try:
-            check_iso8601_date(study["submissionDate"])
-        except KeyError:
-            pass
-        for process in study["processSequence"]:
-            try:
-                check_iso8601_date(process["date"])
-            except KeyError:
-                pass
+    if index is None:
+        index = ISAJSONIndex(isa_json)
+    for date_str in index.dates:
+        check_iso8601_date(date_str)
 
 
-def check_dois(isa_json):
+def check_dois(isa_json, index=None):
     """Used for rule 3002"""
 
     def check_doi(doi_str):
@@ -471,17 +486,10 @@ def check_dois(isa_json):
                 })
                 log.warning("(W) DOI {} does not conform to DOI format".format(doi_str))
 
-    for ipub in isa_json["publications"]:
-        try:
-            check_doi(ipub["doi"])
-        except KeyError:
-            pass
-    for study in isa_json["studies"]:
-        for spub in study["publications"]:
-            try:
-                check_doi(spub["doi"])
-            except KeyError:
-                pass
+    if index is None:
+        index = ISAJSONIndex(isa_json)
+    for doi_str in index.dois:
+        check_doi(doi_str)
 
 
 def check_filenames_present(isa_json):
@@ -504,7 +512,7 @@ def check_filenames_present(isa_json):
                 log.warning("(W) An assay filename is missing")
 
 
-def check_pubmed_ids_format(isa_json):
+def check_pubmed_ids_format(isa_json, index=None):
     """Used for rule 3003"""
 
     def check_pubmed_id(pubmed_id_str):
@@ -517,11 +525,10 @@ def check_pubmed_ids_format(isa_json):
                 })
                 log.warning("(W) PubMed ID {} is not valid format".format(pubmed_id_str))
 
-    for ipub in isa_json["publications"]:
-        check_pubmed_id(ipub["pubMedID"])
-    for study in isa_json["studies"]:
-        for spub in study["publications"]:
-            check_pubmed_id(spub["pubMedID"])
+    if index is None:
+        index = ISAJSONIndex(isa_json)
+    for pubmed_id_str in index.pubmed_ids:
+        check_pubmed_id(pubmed_id_str)
 
 
 def check_protocol_names(isa_json):
@@ -594,8 +601,7 @@ def walk_and_get_annotations(isa_json, collector):
     """
     #  Walk JSON tree looking for ontology annotation structures in the JSON
     if isinstance(isa_json, dict):
-        if set(isa_json.keys()) == {"annotationValue", "termAccession", "termSource"} or \
-                set(isa_json.keys()) == {"@id", "annotationValue", "termAccession", "termSource"}:
+        if is_ontology_annotation(isa_json):
             collector.append(isa_json)
         for i in isa_json.keys():
             walk_and_get_annotations(isa_json[i], collector)
@@ -604,12 +610,13 @@ def walk_and_get_annotations(isa_json, collector):
             walk_and_get_annotations(j, collector)
 
 
-def check_term_source_refs(isa_json):
+def check_term_source_refs(isa_json, index=None):
     """Used for rules 3007 and 3009"""
-    term_sources_declared = get_ontology_source_refs(isa_json)
-    collector = list()
-    walk_and_get_annotations(isa_json, collector)
-    term_sources_used = [annotation["termSource"] for annotation in collector if annotation["termSource"] != ""]
+    if index is None:
+        index = ISAJSONIndex(isa_json)
+    term_sources_declared = index.ontology_source_refs
+    term_sources_used = [annotation["termSource"] for annotation in index.annotations
+                         if annotation["termSource"] != ""]
     if len(set(term_sources_used) - set(term_sources_declared)) > 0:
         diff = set(term_sources_used) - set(term_sources_declared)
         errors.append({
@@ -630,12 +637,13 @@ def check_term_source_refs(isa_json):
                     .format(list(diff)))
 
 
-def check_term_accession_used_no_source_ref(isa_json):
+def check_term_accession_used_no_source_ref(isa_json, index=None):
     """Used for rule 3010"""
-    collector = list()
-    walk_and_get_annotations(isa_json, collector)
+    if index is None:
+        index = ISAJSONIndex(isa_json)
     terms_using_accession_no_source_ref = [
-        annotation for annotation in collector if annotation["termAccession"] != "" and annotation["termSource"] == ""
+        annotation for annotation in index.annotations
+        if annotation["termAccession"] != "" and annotation["termSource"] == ""
     ]
     if len(terms_using_accession_no_source_ref) > 0:
         warnings.append({
@@ -650,7 +658,8 @@ def check_term_accession_used_no_source_ref(isa_json):
 
 def load_config(config_dir):
     #print('CONFIG at: ', config_dir)
-    import json
+    if config_dir in _preloaded_configs:
+        return _preloaded_configs[config_dir]
     configs = dict()
     for file in glob.iglob(os.path.join(config_dir, "*.json")):
         try:
@@ -807,6 +816,11 @@ default_isa_json_schemas_dir = os.path.join(
 )
 
 
+def get_core_schema_path(base_schemas_dir="isa_model_version_1_0_schemas"):
+    """Gets the path of the investigation schema of the ISA-JSON core schemas"""
+    return os.path.join(BASE_DIR, "..", "resources", "schemas", base_schemas_dir, "core", "investigation_schema.json")
+
+
 def validate(
         fp,
         config_dir=default_config_dir,
@@ -836,28 +850,29 @@ def validate(
         isa_json = json.load(fp=fp)  # Rule 0002
         log.info("Validating JSON against schemas using Draft4Validator")
         check_isa_schemas(isa_json=isa_json,
-                          investigation_schema_path=os.path.join(BASE_DIR,
-                                                                 "..", "resources", "schemas", base_schemas_dir,
-                                                                 "core", "investigation_schema.json"))  # Rule 0003
+                          investigation_schema_path=get_core_schema_path(base_schemas_dir))  # Rule 0003
+        log.info("Indexing ids, annotations, dates and publications...")
+        index = ISAJSONIndex(isa_json)
+        studies = list(zip(isa_json["studies"], index.studies))
         log.info("Checking if material IDs used are declared...")
-        for study_json in isa_json["studies"]:
-            check_material_ids_not_declared_used(study_json)  # Rules 1002-1005
-        for study_json in isa_json["studies"]:
-            check_material_ids_declared_used(study_json, get_source_ids)  # Rule 1015
-            check_material_ids_declared_used(study_json, get_sample_ids)  # Rule 1016
-            check_material_ids_declared_used(study_json, get_material_ids)  # Rule 1017
-            check_material_ids_declared_used(study_json, get_data_file_ids)  # Rule 1018
+        for study_json, study_index in studies:
+            check_material_ids_not_declared_used(study_json, study_index)  # Rules 1002-1005
+        for study_json, study_index in studies:
+            check_material_ids_declared_used(study_json, get_source_ids, study_index)  # Rule 1015
+            check_material_ids_declared_used(study_json, get_sample_ids, study_index)  # Rule 1016
+            check_material_ids_declared_used(study_json, get_material_ids, study_index)  # Rule 1017
+            check_material_ids_declared_used(study_json, get_data_file_ids, study_index)  # Rule 1018
         log.info("Checking characteristic categories usage...")
-        check_characteristic_category_ids_usage(isa_json["studies"])  # Rules 1013 and 1022
+        check_characteristic_category_ids_usage(isa_json["studies"], index.studies)  # Rules 1013 and 1022
         log.info("Checking study factor usage...")
-        for study_json in isa_json["studies"]:
-            check_study_factor_usage(study_json)  # Rules 1008 and 1021
+        for study_json, study_index in studies:
+            check_study_factor_usage(study_json, study_index)  # Rules 1008 and 1021
         log.info("Checking protocol parameter usage...")
-        for study_json in isa_json["studies"]:
-            check_protocol_parameter_ids_usage(study_json)  # Rules 1009 and 1020
+        for study_json, study_index in studies:
+            check_protocol_parameter_ids_usage(study_json, study_index)  # Rules 1009 and 1020
         log.info("Checking unit category usage...")
-        for study_json in isa_json["studies"]:
-            check_unit_category_ids_usage(study_json)  # Rules 1014 and 1022
+        for study_json, study_index in studies:
+            check_unit_category_ids_usage(study_json, study_index)  # Rules 1014 and 1022
         log.info("Checking process sequences (study)...")
         for study_json in isa_json["studies"]:
             check_process_sequence_links(study_json["processSequence"])  # Rule 1006
@@ -865,14 +880,14 @@ def validate(
             for assay_json in study_json["assays"]:
                 check_process_sequence_links(assay_json["processSequence"])  # Rule 1006
         log.info("Checking process protocol usage...")
-        for study_json in isa_json["studies"]:
-            check_process_protocol_ids_usage(study_json)  # Rules 1007 and 1019
+        for study_json, study_index in studies:
+            check_process_protocol_ids_usage(study_json, study_index)  # Rules 1007 and 1019
         log.info("Checking date formats...")
-        check_date_formats(isa_json)  # Rule 3001
+        check_date_formats(isa_json, index)  # Rule 3001
         log.info("Checking DOI formats...")
-        check_dois(isa_json)  # Rule 3002
+        check_dois(isa_json, index)  # Rule 3002
         log.info("Checking Pubmed ID formats...")
-        check_pubmed_ids_format(isa_json)  # Rule 3003
+        check_pubmed_ids_format(isa_json, index)  # Rule 3003
         log.info("Checking filenames are present...")
         check_filenames_present(isa_json)  # Rule 3005
         log.info("Checking protocol names...")
@@ -884,9 +899,9 @@ def validate(
         log.info("Checking ontology sources...")
         check_ontology_sources(isa_json)  # Rule 3008
         log.info("Checking term source REFs...")
-        check_term_source_refs(isa_json)  # Rules 3007 and 3009
+        check_term_source_refs(isa_json, index)  # Rules 3007 and 3009
         log.info("Checking missing term source REFs...")
-        check_term_accession_used_no_source_ref(isa_json)  # Rule 3010
+        check_term_accession_used_no_source_ref(isa_json, index)  # Rule 3010
         log.info("Loading configurations from " + config_dir)
         configs = load_config(config_dir)  # Rule 4001
         log.info("Checking measurement and technology types...")
@@ -896,24 +911,19 @@ def validate(
         log.info("Checking against configuration schemas...")
         check_isa_schemas(
             isa_json=isa_json,
-            investigation_schema_path=os.path.join(
-                default_isa_json_schemas_dir,
-                "investigation_schema.json"
-            )
+            investigation_schema_path=os.path.join(default_isa_json_schemas_dir, "investigation_schema.json")
         )  # Rule 4003
         # if all ERRORS are resolved, then try and validate against configuration
         handler.flush()
         if "(E)" in stream.getvalue():
             log.fatal("(F) There are some errors that mean validation against configurations cannot proceed.")
             return stream
-        fp.seek(0)  # reset file pointer
         log.info("Checking study and assay graphs...")
         for study_json in isa_json["studies"]:
             check_study_and_assay_graphs(study_json, configs)  # Rule 4004
-        fp.seek(0)
-        # try load and do study groups check
+        # build the objects from the JSON already loaded and do study groups check
         log.info("Checking study groups...")
-        isa = load(fp)
+        isa = load_dict(isa_json)
         for study in isa.studies:
             check_study_groups(study)
             for assay in study.assays:
@@ -951,9 +961,79 @@ def validate(
         }
 
 
-def batch_validate(json_file_list):
+def _validate_json_file(json_file, config_dir=default_config_dir):
+    """Validates an ISA-JSON file for batch_validate, None if it does not
+    exist
+    """
+    log.info("***Validating {}***\n".format(json_file))
+    if not os.path.isfile(json_file):
+        log.warning("Could not find ISA-JSON file, skipping {}".format(json_file))
+        return None
+    with open(json_file) as fp:
+        return {
+            "filename": fp.name,
+            "report": validate(fp, config_dir=config_dir)
+        }
+
+
+def _init_batch_worker(config_dir):
+    """Initialises a batch_validate worker process, the configurations and
+    the schema validators are loaded once and reused by all the validations
+    of the worker
+    """
+    _preloaded_configs[config_dir] = load_config(config_dir)
+    config_schema_path = os.path.join(default_isa_json_schemas_dir, "investigation_schema.json")
+    for schema_path in (get_core_schema_path(), config_schema_path):
+        _preloaded_schema_validators[schema_path] = get_schema_validator(schema_path)
+
+
+def _validate_json_files(json_files, config_dir):
+    """Validates a chunk of ISA-JSON files in a batch_validate worker"""
+    return [_validate_json_file(json_file, config_dir) for json_file in json_files]
+
+
+def iter_batch_validate(json_file_list, workers=None, chunksize=1, config_dir=default_config_dir, ordered=False):
+    """ Validate a batch of ISA-JSON files, yielding the reports as they are
+    ready
+        :param json_file_list: List of file paths to the ISA-JSON files to validate
+        :param workers: Number of worker processes validating the files, None
+        to validate them one after another in this process
+        :param chunksize: Number of files sent to a worker at a time
+        :param config_dir: Directory of the configurations
+        :param ordered: Whether to yield the reports in the order of
+        json_file_list rather than as soon as they are ready
+        :return: Iterator of dicts of the 'filename' and its 'report', missing
+        files are skipped
+
+        Example:
+            from isatools import isajson
+            for entry in isajson.iter_batch_validate(my_jsons, workers=8):
+                print(entry["filename"], len(entry["report"]["errors"]))
+        """
+    if not workers:
+        for json_file in json_file_list:
+            entry = _validate_json_file(json_file, config_dir)
+            if entry is not None:
+                yield entry
+        return
+    chunksize = max(1, chunksize)
+    chunks = [json_file_list[i:i + chunksize] for i in range(0, len(json_file_list), chunksize)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(config_dir,)) as executor:
+        futures = [executor.submit(_validate_json_files, chunk, config_dir) for chunk in chunks]
+        for future in (futures if ordered else as_completed(futures)):
+            for entry in future.result():
+                if entry is not None:
+                    yield entry
+
+
+def batch_validate(json_file_list, workers=None, chunksize=1, config_dir=default_config_dir):
     """ Validate a batch of ISA-JSON files
         :param json_file_list: List of file paths to the ISA-JSON files to validate
+        :param workers: Number of worker processes validating the files, None
+        to validate them one after another in this process
+        :param chunksize: Number of files sent to a worker at a time
+        :param config_dir: Directory of the configurations
         :return: Dict of reports
 
         Example:
@@ -962,21 +1042,9 @@ def batch_validate(json_file_list):
                 "/path/to/study1.json",
                 "/path/to/study2.json"
             ]
-            my_reports = isajson.batch_validate(my_jsons)
+            my_reports = isajson.batch_validate(my_jsons, workers=4)
         """
-    batch_report = {
-        "batch_report": []
+    return {
+        "batch_report": list(iter_batch_validate(json_file_list, workers=workers, chunksize=chunksize,
+                                                 config_dir=config_dir, ordered=True))
     }
-    for json_file in json_file_list:
-        log.info("***Validating {}***\n".format(json_file))
-        if not os.path.isfile(json_file):
-            log.warning("Could not find ISA-JSON file, skipping {}".format(json_file))
-        else:
-            with open(json_file) as fp:
-                batch_report["batch_report"].append(
-                    {
-                        "filename": fp.name,
-                        "report": validate(fp)
-                    }
-                )
-    return batch_report
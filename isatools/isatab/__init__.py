@@ -19,5 +19,5 @@ from isatools.isatab.load import (
 )
 from isatools.isatab.defaults import default_config_dir
 from isatools.isatab.utils import IsaTabDataFrame, TransposedTabParser
-from isatools.isatab.validate import validate, batch_validate
+from isatools.isatab.validate import validate, batch_validate, iter_batch_validate
 
@@ -1,2 +1,3 @@
-from isatools.isatab.dump.core import dump, dumps, dump_tables_to_dataframes
+from isatools.isatab.dump.core import dump, dumps, dump_tables_to_dataframes, write_investigation_file
+from isatools.isatab.dump.sinks import TableSink, DirectoryTableSink, StringTableSink, DataFrameTableSink
 from isatools.isatab.dump.write import write_study_table_files, write_assay_table_files, write_value_columns, flatten
@@ -1,13 +1,10 @@
 from os import path
-from glob import iglob
-from tempfile import mkdtemp
-from shutil import rmtree
+from io import BytesIO
 from pandas import DataFrame
 
 from isatools.model import Investigation
 from isatools.isatab.defaults import _RX_I_FILE_NAME, log
-from isatools.utils import utf8_text_file_open
-from isatools.isatab.load import read_tfile
+from isatools.isatab.dump.sinks import StringTableSink, DataFrameTableSink
 from isatools.isatab.dump.write import write_study_table_files, write_assay_table_files
 from isatools.isatab.dump.utils import (
     _build_ontology_reference_section,
@@ -52,6 +49,25 @@ def dump(isa_obj, output_path,
 
     # Process Investigation object first to write the investigation file
     investigation = isa_obj
+    write_investigation_file(investigation, fp)
+
+    if skip_dump_tables:
+        pass
+    else:
+        write_study_table_files(investigation, output_path)
+        write_assay_table_files(investigation, output_path, write_factor_values_in_assay_table)
+
+    fp.close()
+    return investigation
+
+
+def write_investigation_file(investigation, fp):
+    """Writes the investigation file of an Investigation object
+
+    :param investigation: An ISA Investigation object
+    :param fp: A binary file-like object to write the investigation file to
+    :return: None
+    """
 
     # Write ONTOLOGY SOURCE REFERENCE section
     ontology_source_references_df = _build_ontology_reference_section(investigation.ontology_source_references)
@@ -165,49 +181,34 @@ def dump(isa_obj, output_path,
         study_contacts_df.to_csv(path_or_buf=fp, mode='a', sep='\t', encoding='utf-8',
                                  index_label='Study Person Last Name')
 
-    if skip_dump_tables:
-        pass
-    else:
-        write_study_table_files(investigation, output_path)
-        write_assay_table_files(investigation, output_path, write_factor_values_in_assay_table)
-
-    fp.close()
-    return investigation
-
 
 def dumps(isa_obj, skip_dump_tables=False,
           write_fvs_in_assay_table=False):
     """Serializes ISA objects to ISA-Tab to standard output
 
+    The files are rendered in memory, each one preceded by its file name.
+
     :param isa_obj: An ISA Investigation object
     :param skip_dump_tables: Boolean flag on whether or not to write the
     :param  write_fvs_in_assay_table: Boolean flag indicating whether
         or not to write Factor Values in the assay table files
     :return: String output of the ISA-Tab files
     """
-    tmp = None
-    output = str()
-    try:
-        tmp = mkdtemp()
-        dump(isa_obj=isa_obj, output_path=tmp,
-             skip_dump_tables=skip_dump_tables,
-             write_factor_values_in_assay_table=write_fvs_in_assay_table)
-        with utf8_text_file_open(path.join(tmp, 'i_investigation.txt')) as i_fp:
-            output += path.join(tmp, 'i_investigation.txt') + '\n'
-            output += i_fp.read()
-        for s_file in iglob(path.join(tmp, 's_*')):
-            with utf8_text_file_open(s_file) as s_fp:
-                output += "--------\n"
-                output += s_file + '\n'
-                output += s_fp.read()
-        for a_file in iglob(path.join(tmp, 'a_*')):
-            with utf8_text_file_open(a_file) as a_fp:
-                output += "--------\n"
-                output += a_file + '\n'
-                output += a_fp.read()
-    finally:
-        if tmp is not None:
-            rmtree(tmp)
+    if not isinstance(isa_obj, Investigation):
+        log.debug('object type=', type(isa_obj))
+        raise NotImplementedError("Can only dump an Investigation object")
+    i_fp = BytesIO()
+    write_investigation_file(isa_obj, i_fp)
+    output = 'i_investigation.txt\n'
+    output += i_fp.getvalue().decode('utf-8')
+    if not skip_dump_tables:
+        sink = StringTableSink()
+        write_study_table_files(isa_obj, sink)
+        write_assay_table_files(isa_obj, sink, write_fvs_in_assay_table)
+        for filename, table in sink.tables.items():
+            output += "--------\n"
+            output += filename + '\n'
+            output += table
     return output
 
 
@@ -218,16 +219,10 @@ def dump_tables_to_dataframes(isa_obj):
     :return: A dictionary containing ISA table filenames as keys and the
     corresponding tables as DataFrames as the values
     """
-    tmp = None
-    output = dict()
-    try:
-        tmp = mkdtemp()
-        dump(isa_obj=isa_obj, output_path=tmp, skip_dump_tables=False)
-        for s_file in iglob(path.join(tmp, 's_*')):
-            output[path.basename(s_file)] = read_tfile(s_file)
-        for a_file in iglob(path.join(tmp, 'a_*')):
-            output[path.basename(a_file)] = read_tfile(a_file)
-    finally:
-        if tmp is not None:
-            rmtree(tmp)
-    return output
+    if not isinstance(isa_obj, Investigation):
+        log.debug('object type=', type(isa_obj))
+        raise NotImplementedError("Can only dump an Investigation object")
+    sink = DataFrameTableSink()
+    write_study_table_files(isa_obj, sink)
+    write_assay_table_files(isa_obj, sink)
+    return sink.tables
@@ -0,0 +1,87 @@
+"""Targets of the ISA-Tab study and assay table writers.
+
+write_study_table_files and write_assay_table_files build one DataFrame per
+table file and hand it to a TableSink, which decides where the table goes:
+a directory on disk, an in-memory string or a DataFrame.
+"""
+from collections import defaultdict
+from io import StringIO
+from os import path
+
+from isatools.isatab.utils import IsaTabDataFrame
+
+
+#  cells pandas.read_csv reads as missing values by default, hence '' in read_tfile tables
+_CSV_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+]
+
+
+class TableSink(object):
+    """Base class for the targets of the table writers"""
+
+    def write(self, filename, df):
+        """Writes a table
+
+        :param filename: The ISA-Tab file name of the table, e.g. s_study.txt
+        :param df: The DataFrame of the table, with ISA-Tab column labels
+        :return: None
+        """
+        raise NotImplementedError
+
+
+class DirectoryTableSink(TableSink):
+    """Writes each table to a file in a directory"""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+
+    def write(self, filename, df):
+        with open(path.join(self.output_dir, filename), 'wb') as out_fp:
+            df.to_csv(path_or_buf=out_fp, index=False, sep='\t', encoding='utf-8')
+
+
+class StringTableSink(TableSink):
+    """Keeps the text of each table file in memory, in the tables dict"""
+
+    def __init__(self):
+        self.tables = dict()
+
+    def write(self, filename, df):
+        buffer = StringIO()
+        df.to_csv(path_or_buf=buffer, index=False, sep='\t')
+        self.tables[filename] = buffer.getvalue()
+
+
+class DataFrameTableSink(TableSink):
+    """Keeps each table in memory, in the tables dict, as the IsaTabDataFrame
+    read_tfile would return for the file written by DirectoryTableSink: every
+    cell a string, empty and NA-like cells as '' and duplicate column labels
+    suffixed with .1, .2, ...
+    """
+
+    def __init__(self):
+        self.tables = dict()
+
+    def write(self, filename, df):
+        df = df.reset_index(drop=True)
+        df = df.where(df.notna(), '').astype(str)
+        df = df.where(~df.isin(_CSV_NA_VALUES), '')
+        df.columns = _dedup_labels(df.columns)
+        self.tables[filename] = IsaTabDataFrame(df)
+
+
+def _dedup_labels(labels):
+    """Renames duplicate column labels the same way pandas.read_csv does"""
+    counts = defaultdict(int)
+    deduped = []
+    for label in labels:
+        count = counts[label]
+        while count > 0:
+            counts[label] = count + 1
+            label = '{0}.{1}'.format(label, count)
+            count = counts[label]
+        deduped.append(label)
+        counts[label] = count + 1
+    return deduped
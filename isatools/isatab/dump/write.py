@@ -1,5 +1,3 @@
-from os import path
-
 from pandas import DataFrame
 from numpy import nan
 
@@ -15,6 +13,7 @@ from isatools.model import (
     Material
 )
 from isatools.isatab.defaults import log
+from isatools.isatab.dump.sinks import TableSink, DirectoryTableSink
 from isatools.isatab.graph import _all_end_to_end_paths, _longest_path_and_attrs
 from isatools.model.utils import _build_paths_and_indexes
 from isatools.isatab.utils import (
@@ -57,11 +56,13 @@ def write_study_table_files(inv_obj, output_dir):
     which should be equivalent to studySample.xml in default config
 
     :param inv_obj: An Investigation object containing ISA content
-    :param output_dir: A path to a directory to write the ISA-Tab study files
+    :param output_dir: A path to a directory to write the ISA-Tab study files,
+    or a TableSink receiving the study tables
     :return: None
     """
     if not isinstance(inv_obj, Investigation):
         raise NotImplementedError
+    sink = output_dir if isinstance(output_dir, TableSink) else DirectoryTableSink(output_dir)
     for study_obj in inv_obj.studies:
         s_graph = study_obj.graph
 
@@ -237,9 +238,7 @@ def write_study_table_files(inv_obj, output_dir):
         DF = DF.map(lambda x: nan if x == '' else x)
         DF = DF.dropna(axis=1, how='all')
 
-        with open(path.join(output_dir, study_obj.filename), 'wb') as out_fp:
-            DF.to_csv(
-                path_or_buf=out_fp, index=False, sep='\t', encoding='utf-8')
+        sink.write(study_obj.filename, DF)
 
 
 def write_assay_table_files(inv_obj, output_dir, write_factor_values=False):
@@ -251,7 +250,8 @@ def write_assay_table_files(inv_obj, output_dir, write_factor_values=False):
     [ FactorValue[], ... ]
 
     :param inv_obj: An Investigation object containing ISA content
-    :param output_dir: A path to a directory to write the ISA-Tab assay files
+    :param output_dir: A path to a directory to write the ISA-Tab assay files,
+    or a TableSink receiving the assay tables
     :param write_factor_values: Flag to indicate whether or not to write out
     the Factor Value columns in the assay tables
     :return: None
@@ -259,7 +259,8 @@ def write_assay_table_files(inv_obj, output_dir, write_factor_values=False):
 
     if not isinstance(inv_obj, Investigation):
         raise NotImplementedError
-    yaml_dict = load_protocol_types_info()
+    sink = output_dir if isinstance(output_dir, TableSink) else DirectoryTableSink(output_dir)
+    yaml_dict = load_protocol_types_info(read_only=True)
     protocol_types_dict = {}
     for protocol, attributes in yaml_dict.items():
         protocol_types_dict[protocol] = attributes
@@ -538,10 +539,7 @@ def write_assay_table_files(inv_obj, output_dir, write_factor_values=False):
 
             DF = DF.dropna(axis=1, how='all')
 
-            with open(path.join(
-                    output_dir, assay_obj.filename), 'wb') as out_fp:
-                DF.to_csv(path_or_buf=out_fp, index=False, sep='\t',
-                          encoding='utf-8')
+            sink.write(assay_obj.filename, DF)
 
 
 def write_value_columns(df_dict, label, x):
@@ -1,5 +1,6 @@
 from __future__ import absolute_import
-from typing import TextIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, Optional, TextIO
 
 from os import path
 from glob import glob
@@ -14,6 +15,7 @@ from isatools.isatab.validate.store import validator as message_handler
 from isatools.isatab.validate.rules.core import (
     ISAInvestigationValidator, ISAStudyValidator, ISAAssayValidator, build_rules
 )
+from isatools.isatab.validate.rules.rules_40xx import preload_config
 
 
 def load_investigation(fp):
@@ -234,10 +236,76 @@ def validate_origin_mzml2isa(fp: TextIO) -> None:
         pass
 
 
-def batch_validate(tab_dir_list):
+def _validate_tab_dir(tab_dir: str, config_dir: str = default_config_dir) -> Optional[dict]:
+    """Validates an ISA-Tab archive for batch_validate
+
+    :return: the filename of the investigation file and its report, or None if
+    the archive has no investigation file
+    """
+    log.info("***Validating {}***\n".format(tab_dir))
+    i_files = glob(path.join(tab_dir, 'i_*.txt'))
+    if len(i_files) != 1:
+        log.warning("Could not find an investigation file, skipping {}".format(tab_dir))
+        return None
+    with utf8_text_file_open(i_files[0]) as fp:
+        return {"filename": fp.name, "report": validate(fp, config_dir=config_dir)}
+
+
+def _init_batch_worker(config_dir: str) -> None:
+    """Initialises a batch_validate worker process, the configurations are
+    parsed once and reused by all the validations of the worker
+    """
+    preload_config(config_dir)
+
+
+def _validate_tab_dirs(tab_dirs: list, config_dir: str) -> list:
+    """Validates a chunk of ISA-Tab archives in a batch_validate worker"""
+    return [_validate_tab_dir(tab_dir, config_dir) for tab_dir in tab_dirs]
+
+
+def iter_batch_validate(tab_dir_list: list,
+                        workers: int = None,
+                        chunksize: int = 1,
+                        config_dir: str = default_config_dir,
+                        ordered: bool = False) -> Iterator[dict]:
+    """ Validate a batch of ISA-Tab archives, yielding the reports as they are
+    ready
+
+    :param tab_dir_list: List of file paths to the ISA-Tab archives to validate
+    :param workers: the number of worker processes validating the archives,
+    None to validate them one after another in this process
+    :param chunksize: the number of archives sent to a worker at a time
+    :param config_dir: the XML configuration directory
+    :param ordered: whether to yield the reports in the order of tab_dir_list
+    rather than as soon as they are ready
+    :return: an iterator of dicts of the investigation 'filename' and its
+    'report', archives without an investigation file are skipped
+    """
+    if not workers:
+        for tab_dir in tab_dir_list:
+            entry = _validate_tab_dir(tab_dir, config_dir)
+            if entry is not None:
+                yield entry
+        return
+    chunksize = max(1, chunksize)
+    chunks = [tab_dir_list[i:i + chunksize] for i in range(0, len(tab_dir_list), chunksize)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                             initargs=(config_dir,)) as executor:
+        futures = [executor.submit(_validate_tab_dirs, chunk, config_dir) for chunk in chunks]
+        for future in (futures if ordered else as_completed(futures)):
+            for entry in future.result():
+                if entry is not None:
+                    yield entry
+
+
+def batch_validate(tab_dir_list, workers=None, chunksize=1, config_dir=default_config_dir):
     """ Validate a batch of ISA-Tab archives
 
     :param tab_dir_list: List of file paths to the ISA-Tab archives to validate_rules
+    :param workers: the number of worker processes validating the archives,
+    None to validate them one after another in this process
+    :param chunksize: the number of archives sent to a worker at a time
+    :param config_dir: the XML configuration directory
     :return: batch report as JSON
 
     Example:
@@ -246,15 +314,7 @@ def batch_validate(tab_dir_list):
             '/path/to/study1/',
             '/path/to/study2/'
         ]
-        batch_report = isatab.batch_validate(my_tabs, '/path/to/report.txt')
+        batch_report = isatab.batch_validate(my_tabs, workers=4)
     """
-    batch_report = {"batch_report": []}
-    for tab_dir in tab_dir_list:
-        log.info("***Validating {}***\n".format(tab_dir))
-        i_files = glob(path.join(tab_dir, 'i_*.txt'))
-        if len(i_files) != 1:
-            log.warning("Could not find an investigation file, skipping {}".format(tab_dir))
-        else:
-            with utf8_text_file_open(i_files[0]) as fp:
-                batch_report['batch_report'].append({"filename": fp.name, "report": validate(fp)})
-    return batch_report
+    return {"batch_report": list(iter_batch_validate(tab_dir_list, workers=workers, chunksize=chunksize,
+                                                     config_dir=config_dir, ordered=True))}
@@ -66,15 +66,33 @@ def check_investigation_against_config(i_df_dict, configs):
         check_section_against_required_fields_one_value(i_df_dict['s_contacts'][x], required_fields, x)
 
 
+# configurations parsed once by the batch_validate worker processes, by directory. They are
+# shared by all the validations of a worker, so the rules must only read them
+_preloaded_configs = {}
+
+
+def preload_config(config_dir):
+    """Parses the configurations of a directory once, for the following
+    validations in this process to reuse. load_config then returns the same
+    objects to every validation, which must not modify them
+
+    :param config_dir: Path to a directory containing ISA Configuration XMLs
+    """
+    configs = isatab_configurator.load(config_dir)
+    if configs:
+        _preloaded_configs[config_dir] = configs
+
+
 def load_config(config_dir):
     """Rule 4001
 
     :param config_dir: Path to a directory containing ISA Configuration XMLs
     :return: A dictionary of ISA Configuration objects
     """
-    configs = None
+    configs = _preloaded_configs.get(config_dir)
     try:
-        configs = isatab_configurator.load(config_dir)
+        if configs is None:
+            configs = isatab_configurator.load(config_dir)
     except FileNotFoundError:
         spl = "On loading {}".format(config_dir)
         validator.add_error(message="Configurations could not be loaded", supplemental=spl, code=4001)
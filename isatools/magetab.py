@@ -10,12 +10,14 @@ import copy
 import csv
 import os
 import re
+import shutil
 import tempfile
 from io import StringIO
 from itertools import zip_longest
 import numpy as np
 import pandas as pd
 from isatools import isatab
+from isatools.isatab.dump.sinks import DataFrameTableSink
 from isatools.model import (
     Assay,
     Comment,
@@ -33,6 +35,22 @@ import logging
 
 log = logging.getLogger('isatools')
 
+# number of SDRF rows read at a time when converting SDRF files to ISA-Tab
+SDRF_CHUNK_SIZE = 10000
+
+# size above which the intermediate ISA-Tab tables are buffered on disk
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# the types of assay split_assay tells apart, and the records they are made of
+ASSAY_TYPE_RECORDS = (
+    ('transcription profiling by array', 'genechip'),
+    ('ChIP-chip', 'chipchip'),
+    ('ChIP-Seq', 'chip_seq'),
+    ('RNA-Seq', 'rna_seq'),
+    ('ME-Seq', 'me_seq'),
+    ('Chromatin-Seq', 'tf_seq')
+)
+
 
 def _get_sdrf_filenames(ISA):
     sdrf_filenames = []
@@ -371,6 +389,58 @@ def write_idf_file(inv_obj, output_path):
             index_label="MAGE-TAB Version")
 
 
+class _SdrfTableSink(DataFrameTableSink):
+    """Joins the ISA-Tab tables of a DNA microarray assay and of its study
+    into an SDRF file as soon as the assay table is produced, so the merged
+    table is streamed to disk row by row and never built in memory
+    """
+
+    def __init__(self, sdrf_files):
+        """
+        :param sdrf_files: dict of {assay table file name: list of (study
+        table file name, SDRF file path)} of the SDRF files to write
+        """
+        super(_SdrfTableSink, self).__init__()
+        self.sdrf_files = sdrf_files
+        self.study_filenames = {study_filename for targets in sdrf_files.values() for study_filename, _ in targets}
+
+    def write(self, filename, df):
+        if filename not in self.study_filenames and filename not in self.sdrf_files:
+            return
+        super(_SdrfTableSink, self).write(filename, df)
+        for study_filename, sdrf_file_path in self.sdrf_files.get(filename, []):
+            if study_filename not in self.tables:
+                raise IOError("There was a problem merging intermediate ISA-Tab files into SDRF")
+            log.debug("Writing {}".format(sdrf_file_path))
+            write_merged_table(self.tables[study_filename], self.tables[filename], sdrf_file_path)
+        if filename in self.sdrf_files:
+            del self.tables[filename]
+
+
+def write_merged_table(study_df, assay_df, target_file_path):
+    """Writes the join of a study table and an assay table on Sample Name,
+    with the same rows, in the same order, as
+    isatab.merge_study_with_assay_tables
+
+    :param study_df: IsaTabDataFrame of the study table
+    :param assay_df: IsaTabDataFrame of the assay table
+    :param target_file_path: Path of the merged table file to write
+    :return: None
+    """
+    study_key = study_df.columns.get_loc('Sample Name')
+    assay_key = assay_df.columns.get_loc('Sample Name')
+    assay_rows = {}
+    for row in assay_df.itertuples(index=False, name=None):
+        assay_rows.setdefault(row[assay_key], []).append(row[:assay_key] + row[assay_key + 1:])
+    assay_header = assay_df.isatab_header
+    with open(target_file_path, 'w', encoding='utf-8', newline='') as fp:
+        writer = csv.writer(fp, delimiter='\t', lineterminator='\n')
+        writer.writerow(study_df.isatab_header + assay_header[:assay_key] + assay_header[assay_key + 1:])
+        for row in study_df.itertuples(index=False, name=None):
+            for assay_row in assay_rows.get(row[study_key], []):
+                writer.writerow(row + assay_row)
+
+
 def write_sdrf_table_files(i, output_path):
     """Writes out SDRF table files
 
@@ -378,24 +448,18 @@ def write_sdrf_table_files(i, output_path):
     :param output_path: Output path to write SDRFs to
     :return: None
     """
-    tmp = tempfile.mkdtemp()
-    isatab.write_study_table_files(inv_obj=i, output_dir=tmp)
-    isatab.write_assay_table_files(inv_obj=i, output_dir=tmp)
+    sdrf_files = {}
     for study in i.studies:
         for assay in [
             x for x in study.assays
                 if x.technology_type.term.lower() == "dna microarray"]:
             sdrf_filename = study.filename[2:-3] + \
                 assay.filename[2:-3] + "sdrf.txt"
-            log.debug("Writing {}".format(sdrf_filename))
-            try:
-                isatab.merge_study_with_assay_tables(
-                    os.path.join(tmp, study.filename),
-                    os.path.join(tmp, assay.filename),
-                    os.path.join(output_path, sdrf_filename))
-            except FileNotFoundError:
-                raise IOError("There was a problem merging intermediate "
-                              "ISA-Tab files into SDRF")
+            sdrf_files.setdefault(assay.filename, []).append(
+                (study.filename, os.path.join(output_path, sdrf_filename)))
+    sink = _SdrfTableSink(sdrf_files)
+    isatab.write_study_table_files(inv_obj=i, output_dir=sink)
+    isatab.write_assay_table_files(inv_obj=i, output_dir=sink)
 
 
 def dump(inv_obj, output_path):
@@ -883,270 +947,408 @@ class MageTabParser(object):
 
     def parse_sdrf_to_isa_table_files(self, in_filename):
         """
-        Parses MAGE-TAB SDRF file into ISA-Tab study and assay tables as
-        pandas dataframes
+        Parses MAGE-TAB SDRF file into ISA-Tab study and assay tables
+
+        :param in_filename: Path to the SDRF file
+        :return: A list of memory file buffer objects, the study table
+        followed by the assay tables, each named after its ISA-Tab file name
         """
-        with open(in_filename, encoding='utf-8') as in_fp:
-            with strip_comments(in_fp) as fp:
-                df = pd.read_csv(
-                    fp, dtype=str, sep='\t', encoding='utf-8').fillna('')
-            # do some preliminary cleanup of the table
-            columns_to_keep = []
-            for i, col in enumerate(df.columns):
-                if col.lower().startswith('term source ref') \
-                    and df.columns[i - 1].lower().startswith(
-                        'protocol ref'):
-                    pass
-                    # drop term source ref column that appears
-                    # after protocol ref
-                elif col.lower().startswith('term source ref') \
-                    and df.columns[i - 1].lower().startswith(
-                        'array design ref'):
-                    pass
-                    # drop term source ref column that appears after
-                    # array design ref
-                elif col.lower().startswith('technology type'):
-                    pass
-                    # drop technology type column / in java code it moves it
-                    # 1 to the right of assay name column
-                elif col.lower().startswith('provider'):
-                    pass  # drop provider column
-                else:
-                    columns_to_keep.append(col)
-            # reset dataframe with only columns we are interested in
-            df = df[columns_to_keep]
-            #  TODO: Do we need to replicate what CleanupRunner.java does?
-
-            # now find the first index to split the SDRF into sfile and
-            # afile(s)
-            cols = [x.lower() for x in list(df.columns)]  # columns all lowered
-            if 'sample name' not in cols:
-                # if we can't find the sample name, we need to insert it
-                # somewhere
-                first_node_index = -1
-                if 'extract name' in cols:
-                    first_node_index = cols.index('extract name')
-                elif 'labeled extract name' in cols:
-                    first_node_index = cols.index('labeled extract name')
-                elif 'labeled extract name' in cols:
-                    first_node_index = cols.index('hybridization name')
-                if first_node_index > 0:  # do Sample Name insertion here
-                    cols_ = list(df.columns)
-                    # add Sample Name column where first indexed col is
-                    df["Sample Name"] = df[cols_[first_node_index]]
-                    # insert to the column index where Sample Name should occur
-                    cols_.insert(first_node_index, "Sample Name")
-                    # reset the dataframe with the new order of columns
-                    df = df[cols_]
-
-            # before splitting, let's rename columns where necessary
-
-            df = df.rename(columns={
-                "Material Type": "Characteristic[material]",
-                "Technology Type": "Comment[technology type]",
-                "Hybridization Name": "Hybridization Assay Name"
-            })
-
-            # now do the slice
-            cols = list(df.columns)
-            sample_name_index = cols.index("Sample Name")
-            study_df = df[df.columns[0:sample_name_index + 1]
-                          ].drop_duplicates()
-            assay_df = df[df.columns[sample_name_index:]]
-
-            table_files = []
-            with StringIO() as assay_fp:
-                columns = [x[:x.rindex('.')] if '.' in x else x for x in list(
-                    assay_df.columns)]
-                assay_df.columns = columns
-                assay_df.to_csv(
-                    path_or_buf=assay_fp,
-                    mode='a',
-                    sep='\t',
-                    encoding='utf-8',
-                    index=False)
-                log.info(
-                    "Trying to split assay file extracted from %s",
-                    in_filename)
-                assay_fp.seek(0)
-                assay_files = self.split_assay(assay_fp)
-                log.info("We have %s assays", len(assay_files))
-
-            study_fp = StringIO()
-            study_fp.name = self.ISA.studies[-1].filename
-            columns = [x[:x.rindex('.')] if '.' in x else x for x in list(
-                study_df.columns)]
-            study_df.columns = columns
-            study_df.to_csv(
-                path_or_buf=study_fp,
-                mode='a',
-                sep='\t',
-                encoding='utf-8',
-                index=False)
-            study_fp.seek(0)
-            table_files.append(study_fp)
-            table_files.extend(assay_files)
-            return table_files
+        study_file, assay_files = self._split_sdrf(in_filename)
+        table_files = []
+        try:
+            for filename, spool_file in [study_file] + assay_files:
+                table_fp = StringIO(spool_file.read())
+                table_fp.name = filename
+                table_files.append(table_fp)
+                spool_file.seek(0)
+        finally:
+            for _, spool_file in [study_file] + assay_files:
+                spool_file.close()
+        return table_files
+
+    def write_sdrf_to_isa_table_files(self, in_filename, output_path):
+        """
+        Parses MAGE-TAB SDRF file into ISA-Tab study and assay table files.
+        The SDRF is read in chunks of SDRF_CHUNK_SIZE rows and the tables
+        are buffered on disk, so large SDRF files are converted in bounded
+        memory
+
+        :param in_filename: Path to the SDRF file
+        :param output_path: Path to directory to write the table files to
+        :return: The list of the table file names written
+        """
+        study_file, assay_files = self._split_sdrf(in_filename)
+        filenames = []
+        try:
+            for filename, spool_file in [study_file] + assay_files:
+                log.info("Writing {0} to {1}".format(filename, output_path))
+                with open(os.path.join(output_path, filename), 'w',
+                          encoding='utf-8') as out_fp:
+                    shutil.copyfileobj(spool_file, out_fp)
+                spool_file.seek(0)
+                filenames.append(filename)
+        finally:
+            for _, spool_file in [study_file] + assay_files:
+                spool_file.close()
+        return filenames
+
+    def _split_sdrf(self, in_filename):
+        """Splits an SDRF file into the study table and the assay tables
+
+        :param in_filename: Path to the SDRF file
+        :return: A tuple of the study table (file name, spooled file) and
+        the list of the assay tables (file name, spooled file)
+        """
+        study_file = _spooled_table_file()
+        splitter = None
+        try:
+            with open(in_filename, encoding='utf-8') as in_fp:
+                reader = pd.read_csv(_UncommentedFile(in_fp), dtype=str, sep='\t', encoding='utf-8',
+                                     chunksize=SDRF_CHUNK_SIZE)
+                seen_study_rows = set()
+                columns, labels, sample_name_index = None, None, None
+                for chunk in reader:
+                    if columns is None:
+                        columns, labels = self._get_sdrf_columns(list(chunk.columns))
+                        sample_name_index = labels.index("Sample Name")
+                        header = pd.DataFrame(columns=_strip_suffixes(labels))
+                        header.iloc[:, :sample_name_index + 1].to_csv(study_file, sep='\t', index=False)
+                        assay_header = header.iloc[:, sample_name_index:].to_csv(sep='\t', index=False)
+                        log.info("Trying to split assay file extracted from %s", in_filename)
+                        splitter = self._get_assay_splitter(assay_header)
+                    chunk = chunk[columns].fillna('')
+                    chunk.columns = range(len(columns))
+                    study_df = chunk.iloc[:, :sample_name_index + 1].drop_duplicates()
+                    is_new = []
+                    for row in map(tuple, study_df.to_numpy(dtype=object).tolist()):
+                        is_new.append(row not in seen_study_rows)
+                        seen_study_rows.add(row)
+                    study_file.write(study_df.loc[is_new].to_csv(sep='\t', index=False, header=False))
+                    splitter.add_lines(StringIO(chunk.iloc[:, sample_name_index:].to_csv(
+                        sep='\t', index=False, header=False)))
+            assay_files = self._get_split_assay_files(splitter)
+            log.info("We have %s assays", len(assay_files))
+        except BaseException:
+            study_file.close()
+            if splitter is not None:
+                splitter.close()
+            raise
+        study_file.seek(0)
+        return (self.ISA.studies[-1].filename, study_file), assay_files
 
-    def split_assay(self, fp):
-        assay_files = []
-        header = fp.readline()
-        chip_seq_records = [header]
-        rna_seq_records = [header]
-        me_seq_records = [header]
-        tf_seq_records = [header]
-        genechip_records = [header]
-        chipchip_records = [header]
+    @staticmethod
+    def _get_sdrf_columns(sdrf_columns):
+        """Works out which SDRF columns make up the ISA-Tab tables
 
-        default_records = [header]
+        :param sdrf_columns: The column labels of the SDRF, as read by pandas
+        :return: A tuple of the SDRF columns to take, in order, and of the
+        ISA-Tab labels they get
+        """
+        columns_to_keep = []
+        for i, col in enumerate(sdrf_columns):
+            if col.lower().startswith('term source ref') \
+                and sdrf_columns[i - 1].lower().startswith(
+                    'protocol ref'):
+                pass
+                # drop term source ref column that appears
+                # after protocol ref
+            elif col.lower().startswith('term source ref') \
+                and sdrf_columns[i - 1].lower().startswith(
+                    'array design ref'):
+                pass
+                # drop term source ref column that appears after
+                # array design ref
+            elif col.lower().startswith('technology type'):
+                pass
+                # drop technology type column / in java code it moves it
+                # 1 to the right of assay name column
+            elif col.lower().startswith('provider'):
+                pass  # drop provider column
+            else:
+                columns_to_keep.append(col)
+        #  TODO: Do we need to replicate what CleanupRunner.java does?
+
+        # now find the first index to split the SDRF into sfile and
+        # afile(s)
+        labels = list(columns_to_keep)
+        cols = [x.lower() for x in columns_to_keep]  # columns all lowered
+        if 'sample name' not in cols:
+            # if we can't find the sample name, we need to insert it
+            # somewhere
+            first_node_index = -1
+            if 'extract name' in cols:
+                first_node_index = cols.index('extract name')
+            elif 'labeled extract name' in cols:
+                first_node_index = cols.index('labeled extract name')
+            elif 'labeled extract name' in cols:
+                first_node_index = cols.index('hybridization name')
+            if first_node_index > 0:  # do Sample Name insertion here
+                # the Sample Name column is a copy of the first node column
+                columns_to_keep.insert(first_node_index, columns_to_keep[first_node_index])
+                labels.insert(first_node_index, "Sample Name")
+
+        # rename columns where necessary
+        renamed_labels = {
+            "Material Type": "Characteristic[material]",
+            "Technology Type": "Comment[technology type]",
+            "Hybridization Name": "Hybridization Assay Name"
+        }
+        labels = [renamed_labels.get(label, label) for label in labels]
+        return columns_to_keep, labels
 
-        assay_types = set()
+    def split_assay(self, fp):
+        """Splits an assay table extracted from an SDRF into one table per
+        type of assay found in its rows
 
-        is_hybridization_assay = 'hybridization' in get_squashed(header)
-        contains_antibody_in_header = 'antibody' in get_squashed(header)
+        :param fp: A file-like buffer object of the assay table
+        :return: A list of memory file buffer objects, one per assay table,
+        each named after its ISA-Tab file name
+        """
+        assay_files = []
+        split_files = self._split_assay_file(fp)
+        try:
+            for filename, spool_file in split_files:
+                a_fp = StringIO(spool_file.read())
+                a_fp.name = filename
+                spool_file.seek(0)
+                assay_files.append(a_fp)
+        finally:
+            for _, spool_file in split_files:
+                spool_file.close()
+        return assay_files
 
+    def _split_assay_file(self, fp):
+        splitter = self._get_assay_splitter(fp.readline())
+        try:
+            while True:
+                lines = fp.readlines(SPOOL_MAX_SIZE)
+                if not lines:
+                    break
+                splitter.add_lines(lines)
+            return self._get_split_assay_files(splitter)
+        except BaseException:
+            splitter.close()
+            raise
+
+    def _get_assay_splitter(self, header):
         A = self.ISA.studies[-1].assays[-1]
-
         log.info(
             "Reading assay memory file; mt=%s, tt=%s",
             A.measurement_type.term,
             A.technology_type.term)
-        for line in fp.readlines():
-            sqline = get_squashed(line)
-            if A.measurement_type and A.technology_type:
-                if 'sequencing' in get_squashed(A.technology_type.term) \
-                        and 'protein-dnabindingsiteidentification' == \
-                        get_squashed(A.measurement_type.term):
-                    if not is_hybridization_assay \
-                            and 'chip-seq' in sqline \
-                            or 'chipseq' in sqline:
-                        assay_types.add('ChIP-Seq')
-                        chip_seq_records.append(line)
-                    if 'bisulfite-seq' in sqline \
-                            or 'mre-seq' in sqline \
-                            or 'mbd-seq' in sqline \
-                            or 'medip-seq' in sqline:
-                        assay_types.add('ME-Seq')
-                        me_seq_records.append(line)
-                    if 'dnase-hypersensitivity' in sqline \
-                            or 'mnase-seq' in sqline:
-                        assay_types.add('Chromatin-Seq')
-                        tf_seq_records.append(line)
-
-            if is_hybridization_assay and (
-                    'genomicdna' in sqline
-                    or 'genomic_dna' in sqline) \
-                    and 'mnase-seq' not in sqline:
-                assay_types.add('ChIP-Seq')
-                chip_seq_records.append(line)
-
-            if hasattr(A, '_design_type'):
-                if 'dye_swap_design' == get_squashed(A._design_type):
-                    assay_types.add('Hybridization')
-                    genechip_records.append(line)
-
-                if 'chip-chipbytilingarray' in get_squashed(A._design_type):
-                    assay_types.add('ChIP-chip by tiling array')
-                    chipchip_records.append(line)
-
-            if (is_hybridization_assay and not contains_antibody_in_header) \
-                    and 'rna' in sqline \
-                    or 'genomicdna' in sqline:
-                assay_types.add('transcription profiling by array')
-                genechip_records.append(line)
-
-            if (not is_hybridization_assay and ('genomicdna' in sqline
-                                                or 'genomic_dna' in sqline)) \
-                    and 'mnase-seq' in sqline:
-                assay_types.add('ChIP-Seq')
-                chip_seq_records.append(line)
-
-            if not is_hybridization_assay and (
-                    'rna-seq' in sqline or 'totalrna' in sqline):
-                assay_types.add('RNA-Seq')
-                rna_seq_records.append(line)
-
-            if is_hybridization_assay and contains_antibody_in_header and (
-                    'genomicdna' in sqline or 'chip' in sqline):
-                assay_types.add('ChIP-chip')
-                chipchip_records.append(line)
-            else:
-                default_records.append(line)
+        return _AssaySplitter(A, header)
 
-        log.info("assay_types found: %s", assay_types)
-
-        if len(assay_types) > 0:
+    def _get_split_assay_files(self, splitter):
+        log.info("assay_types found: %s", splitter.assay_types)
+        assays, assay_files = splitter.get_assay_files()
+        if len(splitter.assay_types) > 0:
             # reset the assays list to load new split ones
-            self.ISA.studies[-1].assays = []
-            for assay_type in assay_types:
-                new_A = copy.copy(A)
-                if 'transcription profiling by array' in assay_type:
-                    new_A.filename = '{0}-{1}.txt'.format(
-                        A.filename[:A.filename.rindex('.')], assay_type)
-                    new_A.technology_platform = assay_type
-                    a_fp = StringIO()
-                    a_fp.writelines(genechip_records)
-                    a_fp.name = new_A.filename
-                    a_fp.seek(0)
-                    self.ISA.studies[-1].assays.append(new_A)
-                    assay_files.append(a_fp)
-                if 'ChIP-chip' in assay_type:
-                    new_A.filename = '{0}-{1}.txt'.format(
-                        A.filename[:A.filename.rindex('.')], assay_type)
-                    new_A.technology_platform = assay_type
-                    a_fp = StringIO()
-                    a_fp.writelines(chipchip_records)
-                    a_fp.name = new_A.filename
-                    a_fp.seek(0)
-                    self.ISA.studies[-1].assays.append(new_A)
-                    assay_files.append(a_fp)
-                if 'ChIP-Seq' in assay_type:
-                    new_A.filename = '{0}-{1}.txt'.format(
-                        A.filename[:A.filename.rindex('.')], assay_type)
-                    new_A.technology_platform = assay_type
-                    a_fp = StringIO()
-                    a_fp.writelines(chip_seq_records)
-                    a_fp.name = new_A.filename
-                    a_fp.seek(0)
-                    self.ISA.studies[-1].assays.append(new_A)
-                    assay_files.append(a_fp)
-                if 'RNA-Seq' in assay_type:
-                    new_A.filename = '{0}-{1}.txt'.format(
-                        A.filename[:A.filename.rindex('.')], assay_type)
-                    new_A.technology_platform = assay_type
-                    a_fp = StringIO()
-                    a_fp.writelines(rna_seq_records)
-                    a_fp.name = new_A.filename
-                    a_fp.seek(0)
-                    self.ISA.studies[-1].assays.append(new_A)
-                    assay_files.append(a_fp)
-                if 'ME-Seq' in assay_type:
-                    new_A.filename = '{0}-{1}.txt'.format(
-                        A.filename[:A.filename.rindex('.')], assay_type)
-                    new_A.technology_platform = assay_type
-                    a_fp = StringIO()
-                    a_fp.writelines(me_seq_records)
-                    a_fp.name = new_A.filename
-                    a_fp.seek(0)
-                    self.ISA.studies[-1].assays.append(new_A)
-                    assay_files.append(a_fp)
-                if 'Chromatin-Seq' in assay_type:
+            self.ISA.studies[-1].assays = assays
+        return assay_files
+
+
+def _spooled_table_file():
+    return tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', encoding='utf-8', newline='\n')
+
+
+def _strip_suffixes(labels):
+    """Strips the .1, .2, ... suffixes pandas gives to duplicate labels"""
+    return [x[:x.rindex('.')] if '.' in x else x for x in labels]
+
+
+class _AssaySplitter(object):
+    """Sorts the rows of an assay table extracted from an SDRF into records
+    of the types of assay they look like, as split_assay does. The squashed
+    assay annotations are worked out once, rather than for every row
+    """
+
+    def __init__(self, assay, header):
+        self.assay = assay
+        self.header = header
+        self.assay_types = set()
+        self.records = {}
+        self._pending = {}
+
+        squashed_header = get_squashed(header)
+        self.is_hybridization_assay = 'hybridization' in squashed_header
+        self.contains_antibody_in_header = 'antibody' in squashed_header
+        self.is_sequencing_binding_site_assay = False
+        if assay.measurement_type and assay.technology_type:
+            self.is_sequencing_binding_site_assay = \
+                'sequencing' in get_squashed(assay.technology_type.term) \
+                and 'protein-dnabindingsiteidentification' == \
+                get_squashed(assay.measurement_type.term)
+        design_type = get_squashed(assay._design_type) \
+            if hasattr(assay, '_design_type') else ''
+        self.is_dye_swap_design = 'dye_swap_design' == design_type
+        self.is_tiling_array_design = 'chip-chipbytilingarray' in design_type
+
+    def _add_record(self, records, line):
+        if records not in self._pending:
+            self._pending[records] = []
+        self._pending[records].append(line)
+
+    def _flush(self):
+        for records, lines in self._pending.items():
+            if records not in self.records:
+                self.records[records] = _spooled_table_file()
+                self.records[records].write(self.header)
+            self.records[records].writelines(lines)
+        self._pending = {}
+
+    def add_lines(self, lines):
+        """Sorts rows of the assay table
+
+        :param lines: Iterable of the lines of the rows
+        :return: None
+        """
+        for line in lines:
+            self._add(line)
+        self._flush()
+
+    def _add(self, line):
+        sqline = get_squashed(line)
+        is_hybridization_assay = self.is_hybridization_assay
+        if self.is_sequencing_binding_site_assay:
+            if not is_hybridization_assay \
+                    and 'chip-seq' in sqline \
+                    or 'chipseq' in sqline:
+                self.assay_types.add('ChIP-Seq')
+                self._add_record('chip_seq', line)
+            if 'bisulfite-seq' in sqline \
+                    or 'mre-seq' in sqline \
+                    or 'mbd-seq' in sqline \
+                    or 'medip-seq' in sqline:
+                self.assay_types.add('ME-Seq')
+                self._add_record('me_seq', line)
+            if 'dnase-hypersensitivity' in sqline \
+                    or 'mnase-seq' in sqline:
+                self.assay_types.add('Chromatin-Seq')
+                self._add_record('tf_seq', line)
+
+        if is_hybridization_assay and (
+                'genomicdna' in sqline
+                or 'genomic_dna' in sqline) \
+                and 'mnase-seq' not in sqline:
+            self.assay_types.add('ChIP-Seq')
+            self._add_record('chip_seq', line)
+
+        if self.is_dye_swap_design:
+            self.assay_types.add('Hybridization')
+            self._add_record('genechip', line)
+
+        if self.is_tiling_array_design:
+            self.assay_types.add('ChIP-chip by tiling array')
+            self._add_record('chipchip', line)
+
+        if (is_hybridization_assay and not self.contains_antibody_in_header) \
+                and 'rna' in sqline \
+                or 'genomicdna' in sqline:
+            self.assay_types.add('transcription profiling by array')
+            self._add_record('genechip', line)
+
+        if (not is_hybridization_assay and ('genomicdna' in sqline
+                                            or 'genomic_dna' in sqline)) \
+                and 'mnase-seq' in sqline:
+            self.assay_types.add('ChIP-Seq')
+            self._add_record('chip_seq', line)
+
+        if not is_hybridization_assay and (
+                'rna-seq' in sqline or 'totalrna' in sqline):
+            self.assay_types.add('RNA-Seq')
+            self._add_record('rna_seq', line)
+
+        if is_hybridization_assay and self.contains_antibody_in_header and (
+                'genomicdna' in sqline or 'chip' in sqline):
+            self.assay_types.add('ChIP-chip')
+            self._add_record('chipchip', line)
+        else:
+            self._add_record('default', line)
+
+    def close(self):
+        """Closes the spooled files of the tables
+
+        :return: None
+        """
+        for records in self.records.values():
+            records.close()
+
+    def get_assay_files(self):
+        """Gets the assays split out of the table
+
+        :return: A tuple of the list of the split assays and of the list of
+        their tables (file name, spooled file). Without any assay type found,
+        the original assay is kept and gets all the rows. The spooled files
+        of the rows of no assay type found are closed
+        """
+        A = self.assay
+        if 'default' not in self.records:
+            self.records['default'] = _spooled_table_file()
+            self.records['default'].write(self.header)
+        for records in self.records.values():
+            records.seek(0)
+        if len(self.assay_types) == 0:
+            for records, spool_file in self.records.items():
+                if records != 'default':
+                    spool_file.close()
+            return [A], [(A.filename, self.records['default'])]
+        assays = []
+        assay_files = []
+        used_records = set()
+        for assay_type in self.assay_types:
+            new_A = copy.copy(A)
+            for type_name, records in ASSAY_TYPE_RECORDS:
+                if type_name in assay_type:
                     new_A.filename = '{0}-{1}.txt'.format(
                         A.filename[:A.filename.rindex('.')], assay_type)
                     new_A.technology_platform = assay_type
-                    a_fp = StringIO()
-                    a_fp.writelines(tf_seq_records)
-                    a_fp.name = new_A.filename
-                    a_fp.seek(0)
-                    self.ISA.studies[-1].assays.append(new_A)
-                    assay_files.append(a_fp)
-        else:
-            a_fp = StringIO()
-            a_fp.writelines(default_records)
-            a_fp.name = A.filename
-            a_fp.seek(0)
-            assay_files.append(a_fp)
-        return assay_files
+                    assays.append(new_A)
+                    assay_files.append((new_A.filename, self.records[records]))
+                    used_records.add(records)
+        for records, spool_file in self.records.items():
+            if records not in used_records:
+                spool_file.close()
+        return assays, assay_files
+
+
+class _UncommentedFile(object):
+    """File-like reader over a text file that skips the comment lines, which
+    start with a #, without loading the whole file in memory like
+    strip_comments
+    """
+
+    def __init__(self, in_fp):
+        self.name = getattr(in_fp, 'name', None)
+        self._lines = (line for line in in_fp if not line.lstrip().startswith('#'))
+        self._buffer = ''
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def readline(self):
+        while '\n' not in self._buffer:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line
+        index = self._buffer.find('\n') + 1 or len(self._buffer)
+        line, self._buffer = self._buffer[:index], self._buffer[index:]
+        return line
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        for line in self._lines:
+            chunks.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = ''.join(chunks)
+        if size < 0:
+            self._buffer = ''
+            return data
+        data, self._buffer = data[:size], data[size:]
+        return data
 
 
 def strip_comments(in_fp):
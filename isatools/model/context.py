@@ -62,7 +62,9 @@ class ContextPath:
         self.all_in_one = True
         self.local = True
         self.include_contexts = False
+        self.context_at_root = False
         self.contexts = {}
+        self.context_paths = {}
         self.get_context()
         self.prepend_url = None
 
@@ -82,6 +84,17 @@ class ContextPath:
         context and include it in the instance.
         :param classname: the name of the class to get the context for.
         """
+        key = (classname, self.__context, self.all_in_one, self.local)
+        try:
+            context_path = self.context_paths[key]
+        except KeyError:
+            context_path = self.context_paths[key] = self.get_context_path(classname)
+        return context_path if not self.include_contexts else self.load_context(context_path)
+
+    def get_context_path(self, classname: str = 'allinone') -> str:
+        """ Build the path or URL of the context file of a class, with the current vocabulary and settings.
+        :param classname: the name of the class to get the context path for.
+        """
         classname = get_name(classname)
         classname = camelcase2snakecase(classname)
         name = self.__context
@@ -90,8 +103,7 @@ class ContextPath:
         if self.all_in_one:
             filename = 'isa_allinone_%s_context.jsonld' % name
 
-        context_path = path.join(path_source, filename) if self.local else path_source + filename
-        return context_path if not self.include_contexts else self.load_context(context_path)
+        return path.join(path_source, filename) if self.local else path_source + filename
 
     def load_context(self, context_path: str) -> dict:
         """
@@ -102,8 +114,11 @@ class ContextPath:
             return self.contexts[context_path]
         if self.local:
             with open(context_path, 'r') as f:
-                return loads(f.read())
-        return requests.get(context_path).json()
+                loaded_context = loads(f.read())
+        else:
+            loaded_context = requests.get(context_path).json()
+        self.contexts[context_path] = loaded_context
+        return loaded_context
 
     def __repr__(self) -> str:
         return self.__context
@@ -121,6 +136,7 @@ def set_context(
         all_in_one: bool = True,
         local: bool = True,
         include_contexts: bool = False,
+        context_at_root: bool = False
 ) -> None:
     """ Set the context properties necessary for the serialization of the ISA model to JSON-LD.
     :param prepend_url: the URL to prepend to the identifiers.
@@ -128,12 +144,15 @@ def set_context(
     :param all_in_one: if True, combine all the contexts into one. If False, use the context for each class.
     :param local: if True, use the local context files. If False, use the remote context files.
     :param include_contexts: if True, include the context files in the JSON-LD output.
+    :param context_at_root: if True, write the context once at the root of the JSON-LD output with `to_ld()`
+        instead of in every object. The all-in-one context is used, as it covers every class.
     """
     context.all_in_one = all_in_one
     context.local = local
     context.context = vocab
     context.include_contexts = include_contexts
     context.prepend_url = prepend_url
+    context.context_at_root = context_at_root
 
 
 class LDSerializable(metaclass=ABCMeta):
@@ -156,12 +175,27 @@ class LDSerializable(metaclass=ABCMeta):
 
     def get_ld_attributes(self) -> dict:
         """ Generate and return the LD attributes for the object. """
+        if self.context.context_at_root:
+            return {
+                '@type': get_name(self.__class__.__name__).replace('Number', ''),
+                '@id': self.gen_id()
+            }
         return {
             '@type': get_name(self.__class__.__name__).replace('Number', ''),
             '@context': self.get_context(),
             '@id': self.gen_id()
         }
 
+    def get_root_context(self) -> dict:
+        """ Return the LD attributes to put at the root of a document, when the context is not in every object. """
+        if not self.context.context_at_root:
+            return {}
+        return {'@context': self.context.get_context()}
+
+    def to_ld(self) -> dict:
+        """ Serialize the object to JSON-LD, using the current context settings. """
+        return {**self.get_root_context(), **self.to_dict(ld=True)}
+
     def update_isa_object(self, isa_object, ld=False) -> object:
         """ Update the ISA object with the LD attributes if necessary. Needs to be called
         after serialization the object.
@@ -1,8 +1,14 @@
 from abc import ABCMeta
+from functools import lru_cache
 from uuid import uuid4
 from re import sub
 
 
+@lru_cache(maxsize=None)
+def _id_prefix(class_name):
+    return '#' + sub(r'(?<!^)(?=[A-Z])', '_', class_name).lower() + '/'
+
+
 class Identifiable(metaclass=ABCMeta):
 
     def __init__(self, id_: str = '', **kwargs):
@@ -15,9 +21,8 @@ class Identifiable(metaclass=ABCMeta):
 
     @id.setter
     def id(self, val):
-        camelcase_id_to_snakecase = '#' + sub(r'(?<!^)(?=[A-Z])', '_', type(self).__name__).lower() + '/'
         if val is not None and not isinstance(val, str):
             raise AttributeError('Identifiable.id must be a str or None; got {0}:{1}'.format(val, type(val)))
         if not val or val == '':
-            val = camelcase_id_to_snakecase + str(uuid4())
+            val = _id_prefix(type(self).__name__) + str(uuid4())
         self.__id = val
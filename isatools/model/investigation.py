@@ -246,9 +246,6 @@ class Investigation(Commentable, MetadataMixin, Identifiable, object):
         }
         return self.update_isa_object(investigation, ld=ld)
 
-    def to_ld(self):
-        return self.to_dict(ld=True)
-
     def from_dict(self, investigation):
         self.identifier = investigation.get('identifier', '')
         self.title = investigation.get('title', '')
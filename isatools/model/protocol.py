@@ -1,8 +1,7 @@
-import os
 from collections.abc import Iterable
 from pprint import pprint
-from yaml import load, FullLoader
 from isatools.constants import SYNONYMS
+from isatools.io.resources import get_resource, thaw
 from isatools.model.comments import Commentable
 from isatools.model.ontology_annotation import OntologyAnnotation
 from isatools.model.protocol_parameter import ProtocolParameter
@@ -275,15 +274,18 @@ class Protocol(Commentable, Identifiable):
             self.components.append(component)
 
 
-def load_protocol_types_info() -> dict:
+def load_protocol_types_info(read_only: bool = False) -> dict:
     """ Load the protocol types info from the YAML protocol types file
 
+    Args:
+        read_only: If True, returns the read-only view of the file shared by
+            all the callers instead of a copy
+
     Returns:
         A dictionary of protocol types
     """
-    filepath = os.path.join(os.path.dirname(__file__), '..', 'resources', 'config', 'yaml', 'protocol-types.yml')
-    with open(filepath) as yaml_file:
-        return load(yaml_file, Loader=FullLoader)
+    protocol_types = get_resource('config', 'yaml', 'protocol-types.yml')
+    return protocol_types if read_only else thaw(protocol_types)
 
     
     
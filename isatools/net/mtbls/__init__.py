@@ -16,6 +16,7 @@ from isatools.net.mtbls.helpers import (
     get_filtered_df_on_factors_list,
     get_mtbls_list,
     dl_all_mtbls_isatab,
+    mirror_mtbls_isatab,
     get_factors_command,
     get_factor_values_command,
     get_data_files_command,
@@ -24,3 +25,5 @@ from isatools.net.mtbls.helpers import (
 )
 from isatools.net.mtbls.html import build_html_summary, build_html_data_files_list
 from isatools.net.mtbls.core import MTBLSInvestigation
+from isatools.net.mtbls.mirror import FTPConnectionPool, MTBLSMirror
+from isatools.net.mtbls.cache import MTBLSCache, get_default_cache, set_default_cache
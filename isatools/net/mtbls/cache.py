@@ -0,0 +1,242 @@
+"""Persistent local cache of MetaboLights studies.
+
+The raw ISA-Tab files downloaded from the MetaboLights FTP server are
+stored once, under the SHA-256 of their content, and a manifest per study
+records which file names map to which content. Within the manifest time to
+live a study is served from the cache without contacting the server. Past
+it, the manifest is revalidated against the size and modification time the
+server reports for each file, the FTP counterpart of an HTTP ETag, and only
+the files that changed are downloaded again.
+
+Because everything parsed from the files is keyed by their content, the
+DataFrames of the tables and the Investigation loaded from a study are
+pickled too, and a study downloaded again with unchanged content is not
+parsed again.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from ftplib import error_perm
+
+log = logging.getLogger('isatools')
+
+# bump to invalidate the pickled tables and investigations of older versions
+CACHE_VERSION = 1
+
+DEFAULT_TTL = 24 * 60 * 60
+
+
+def get_default_cache_dir() -> str:
+    """Gets the directory of the default cache: $ISATOOLS_MTBLS_CACHE, or
+    isatools/mtbls in the user cache directory
+    """
+    cache_dir = os.environ.get('ISATOOLS_MTBLS_CACHE')
+    if cache_dir:
+        return cache_dir
+    user_cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(user_cache_dir, 'isatools', 'mtbls')
+
+
+class MTBLSCache:
+    """A content-addressed cache of MetaboLights study files and of the
+    tables and investigations parsed from them
+    """
+
+    def __init__(self, cache_dir: str = None, ttl: float = DEFAULT_TTL) -> None:
+        """
+        :param cache_dir: The directory of the cache, by default
+        get_default_cache_dir()
+        :param ttl: The number of seconds a study is used without checking
+        the server for changes
+        """
+        self.cache_dir = cache_dir or get_default_cache_dir()
+        self.ttl = ttl
+        self.__tables = {}
+        self.__lock = threading.Lock()
+
+    def __directory(self, *parts: str) -> str:
+        directory = os.path.join(self.cache_dir, *parts)
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def __path(self, *parts: str) -> str:
+        return os.path.join(self.__directory(*parts[:-1]), parts[-1])
+
+    def __object_path(self, digest: str) -> str:
+        return self.__path('objects', digest[:2], digest)
+
+    def __manifest_path(self, mtbls_id: str) -> str:
+        return self.__path('studies', mtbls_id + '.json')
+
+    def __write_atomic(self, file_path: str, content: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path))
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(content)
+        os.replace(tmp_path, file_path)
+
+    # raw files
+
+    def get_manifest(self, mtbls_id: str) -> dict:
+        """Gets the manifest of a study
+
+        :param mtbls_id: Accession number of the Metabolights study
+        :return: A dict with the time the study was last checked against the
+        server, 'checked', and its files, 'files', as {file name: {'sha256',
+        'size', 'modify'}}, or None if the study is not cached
+        """
+        try:
+            with open(self.__manifest_path(mtbls_id), encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+        if not all(os.path.isfile(self.__object_path(x['sha256'])) for x in manifest['files'].values()):
+            return None
+        return manifest
+
+    def save_manifest(self, mtbls_id: str, files: dict) -> None:
+        """Records the files of a study, checked against the server now
+
+        :param mtbls_id: Accession number of the Metabolights study
+        :param files: The files of the study, as in the 'files' of get_manifest
+        """
+        manifest = {'checked': time.time(), 'files': files}
+        self.__write_atomic(self.__manifest_path(mtbls_id), json.dumps(manifest, indent=1).encode('utf-8'))
+
+    def is_fresh(self, manifest: dict) -> bool:
+        """Tells whether a manifest can be used without checking the server"""
+        return manifest is not None and time.time() - manifest['checked'] < self.ttl
+
+    def retrieve(self, ftp: object, filename: str) -> str:
+        """Downloads a file of the current FTP directory into the cache
+
+        :param ftp: The FTP connection
+        :param filename: The name of the file
+        :return: The SHA-256 of the file content
+        """
+        sha256 = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.__directory('objects', 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                def write(block):
+                    sha256.update(block)
+                    tmp_file.write(block)
+                ftp.retrbinary('RETR ' + filename, write)
+            digest = sha256.hexdigest()
+            os.replace(tmp_path, self.__object_path(digest))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return digest
+
+    def get_file_path(self, digest: str) -> str:
+        """Gets the path of a cached file
+
+        :param digest: The SHA-256 of the file content
+        :return: The path of the file in the cache
+        """
+        return self.__object_path(digest)
+
+    def copy_file(self, digest: str, file_path: str) -> None:
+        """Copies a cached file
+
+        :param digest: The SHA-256 of the file content
+        :param file_path: The path to copy the file to
+        """
+        shutil.copyfile(self.__object_path(digest), file_path)
+
+    @staticmethod
+    def get_validators(ftp: object) -> dict:
+        """Gets the size and modification time of the files of the current
+        FTP directory, with MLSD
+
+        :param ftp: The FTP connection
+        :return: A dict of {file name: {'size', 'modify'}}, empty if the
+        server does not support MLSD
+        """
+        try:
+            return {name: {'size': facts.get('size'), 'modify': facts.get('modify')}
+                    for name, facts in ftp.mlsd(facts=['type', 'size', 'modify'])
+                    if facts.get('type', 'file') == 'file'}
+        except error_perm:
+            return {}
+
+    # parsed content
+
+    def get_table(self, digest: str, loader) -> object:
+        """Gets the DataFrame of a table file
+
+        :param digest: The SHA-256 of the file content
+        :param loader: Function returning the DataFrame parsed from the file,
+        called if it is not cached yet
+        :return: A copy of the cached DataFrame
+        """
+        with self.__lock:
+            df = self.__tables.get(digest)
+        if df is None:
+            df = self.__load_pickle(('tables', digest), loader)
+            with self.__lock:
+                self.__tables[digest] = df
+        return df.copy()
+
+    def get_investigation(self, digests: dict, loader) -> object:
+        """Gets the Investigation loaded from a set of ISA-Tab files
+
+        :param digests: The files, as {file name: SHA-256 of the content}
+        :param loader: Function returning the Investigation, called if it is
+        not cached yet
+        :return: The Investigation
+        """
+        key = hashlib.sha256(json.dumps(sorted(digests.items())).encode('utf-8')).hexdigest()
+        return self.__load_pickle(('investigations', key), loader)
+
+    def __load_pickle(self, key: tuple, loader) -> object:
+        file_path = self.__path('parsed', key[0], '%s-v%s.pickle' % (key[1], CACHE_VERSION))
+        try:
+            with open(file_path, 'rb') as pickle_file:
+                return pickle.load(pickle_file)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            log.warning('Ignoring unreadable cache file %s: %s' % (file_path, e))
+        content = loader()
+        try:
+            self.__write_atomic(file_path, pickle.dumps(content, protocol=pickle.HIGHEST_PROTOCOL))
+        except (pickle.PicklingError, RecursionError, TypeError) as e:
+            log.warning('Could not cache %s: %s' % (file_path, e))
+        return content
+
+    def clear(self) -> None:
+        """Empties the cache"""
+        with self.__lock:
+            self.__tables.clear()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> MTBLSCache:
+    """Gets the cache shared by the MetaboLights helpers"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = MTBLSCache()
+        return _default_cache
+
+
+def set_default_cache(cache: MTBLSCache | None) -> None:
+    """Sets the cache shared by the MetaboLights helpers, None to use a new
+    default one
+    """
+    global _default_cache
+    with _default_cache_lock:
+        _default_cache = cache
@@ -7,18 +7,18 @@ import logging
 import tempfile
 from typing import TextIO
 from shutil import rmtree
-from re import compile as regex
 from json import dump, loads as json_loads, load as json_load
 
 import pandas as pd
 
 from isatools.isatab import load_table, load as isa_load
 from isatools.model import OntologyAnnotation
-from isatools.net.mtbls.utils import MTBLSDownloader, EBI_FTP_SERVER, MTBLS_BASE_DIR, slice_data_files
+from isatools.net.mtbls.utils import MTBLSDownloader, MTBLSStudyIndex, EBI_FTP_SERVER, MTBLS_BASE_DIR
 from isatools.net.mtbls.html import build_html_summary
+from isatools.net.mtbls.cache import MTBLSCache
+from isatools.net.mtbls.mirror import get_table_filenames
 
 log = logging.getLogger('isatools')
-_RX_FACTOR_VALUE = regex(r'Factor Value\[(.*?)\]')
 
 
 class MTBLSInvestigationBase:
@@ -28,7 +28,8 @@ class MTBLSInvestigationBase:
             mtbls_id: str,
             output_directory: str = None,
             output_format: str = 'tab',
-            ftp_server: object = None
+            ftp_server: object = None,
+            cache: MTBLSCache = None
     ) -> None:
         self.mtbls_id = mtbls_id
         self.format = output_format
@@ -36,12 +37,22 @@ class MTBLSInvestigationBase:
         self.output_dir = output_directory
         self.__executed = False
         self.__ftp_directory = EBI_FTP_SERVER + MTBLS_BASE_DIR + '/' + mtbls_id
-        self.ftp = ftp_server
-        if not ftp_server:
-            ftp = MTBLSDownloader()
-            self.ftp = ftp.ftp
+        self.__ftp = ftp_server
+        self.cache = cache
+        self.digests = {}
         self.downloaded = False
 
+    @property
+    def ftp(self) -> object:
+        # connect on first use only, a study served from the cache needs no connection
+        if not self.__ftp:
+            self.__ftp = MTBLSDownloader().ftp
+        return self.__ftp
+
+    @ftp.setter
+    def ftp(self, ftp_server: object) -> None:
+        self.__ftp = ftp_server
+
     @property
     def mtbls_id(self) -> str:
         return self.__mtbls_id
@@ -77,6 +88,8 @@ class MTBLSInvestigationBase:
         self.__output_dir = output_dir
 
     def get_investigation(self):
+        if self.cache is not None:
+            return self.__get_cached_investigation()
         ftp = self.ftp
         log.info("Looking for study '%s'" % self.mtbls_id)
         ftp.cwd(MTBLS_BASE_DIR + '/' + self.mtbls_id)
@@ -103,6 +116,53 @@ class MTBLSInvestigationBase:
         except error_perm as e:
             raise Exception('Could not download a file: %s for %s' % (e, self.mtbls_id))
 
+    def __get_cached_investigation(self):
+        manifest = self.cache.get_manifest(self.mtbls_id)
+        if self.cache.is_fresh(manifest):
+            log.info("Using cached study '%s'" % self.mtbls_id)
+            files = manifest['files']
+        else:
+            files = self.__revalidate(manifest['files'] if manifest else {})
+            self.cache.save_manifest(self.mtbls_id, files)
+        log.info("Using directory '%s'" % self.output_dir)
+        for filename, entry in files.items():
+            self.cache.copy_file(entry['sha256'], path.join(self.output_dir, filename))
+        self.digests = {filename: entry['sha256'] for filename, entry in files.items()}
+        self.downloaded = True
+        return self.output_dir
+
+    def __revalidate(self, cached_files: dict) -> dict:
+        ftp = self.ftp
+        log.info("Looking for study '%s'" % self.mtbls_id)
+        ftp.cwd(MTBLS_BASE_DIR + '/' + self.mtbls_id)
+        validators = self.cache.get_validators(ftp)
+        remote_files = list(validators) if validators else list(ftp.nlst())
+        try:
+            investigation_filename = next(filter(lambda x: x.startswith('i_') and x.endswith('.txt'), remote_files))
+        except StopIteration:
+            raise Exception('Could not find an investigation file for this study')
+
+        def fetch(filename):
+            facts = validators.get(filename, {})
+            entry = cached_files.get(filename)
+            if entry and facts.get('size') and facts.get('modify') \
+                    and (entry.get('size'), entry.get('modify')) == (facts['size'], facts['modify']):
+                log.debug("File '%s' is unchanged" % filename)
+                return entry
+            log.info("Retrieving file '%s'" % (self.__ftp_directory + '/' + filename))
+            return dict(facts, sha256=self.cache.retrieve(ftp, filename))
+
+        try:
+            files = {investigation_filename: fetch(investigation_filename)}
+            with open(self.cache.get_file_path(files[investigation_filename]['sha256']), encoding='utf-8') as i_fp:
+                lines = i_fp.read().splitlines()
+            for filename in get_table_filenames(lines):
+                if filename not in files:
+                    files[filename] = fetch(filename)
+            return files
+        except error_perm as e:
+            raise Exception('Could not download a file: %s for %s' % (e, self.mtbls_id))
+
     @staticmethod
     def __get_filename(line):
         file_val = line.split('\t')[1]
@@ -135,11 +195,14 @@ class MTBLSInvestigation(MTBLSInvestigationBase):
             mtbls_id: str,
             output_directory: str = None,
             output_format: str = 'tab',
-            ftp_server: object = None
+            ftp_server: object = None,
+            cache: MTBLSCache = None
     ) -> None:
-        super().__init__(mtbls_id, output_directory, output_format, ftp_server)
+        super().__init__(mtbls_id, output_directory, output_format, ftp_server, cache)
         self.investigation = None
         self.dataframes = None
+        self.__index = None
+        self.__data_by_sample = None
 
     def load_dataframes(self) -> None:
         if not self.downloaded:
@@ -147,44 +210,48 @@ class MTBLSInvestigation(MTBLSInvestigationBase):
         if not self.dataframes:
             self.dataframes = {}
             for table_file in glob.iglob(path.join(self.output_dir, '[a|s|i]_*')):
-                with open(path.join(self.output_dir, table_file), encoding='utf-8') as fp:
-                    self.dataframes[table_file] = load_table(fp)
+                digest = self.digests.get(path.basename(table_file))
+                if digest is None:
+                    self.dataframes[table_file] = self.__load_table(table_file)
+                else:
+                    self.dataframes[table_file] = self.cache.get_table(
+                        digest, lambda table_file=table_file: self.__load_table(table_file))
+
+    @staticmethod
+    def __load_table(table_file: str) -> pd.DataFrame:
+        with open(table_file, encoding='utf-8') as fp:
+            return load_table(fp)
 
     def load_json(self) -> None:
         if not self.downloaded:
             self.get_investigation()
         if not self.investigation:
-            with open(glob.glob(path.join(self.output_dir, 'i_*.txt'))[0], encoding='utf-8') as fp:
-                self.investigation = isa_load(fp)
+            if self.digests:
+                self.investigation = self.cache.get_investigation(self.digests, self.__load_investigation)
+            else:
+                self.investigation = self.__load_investigation()
+
+    def __load_investigation(self) -> object:
+        with open(glob.glob(path.join(self.output_dir, 'i_*.txt'))[0], encoding='utf-8') as fp:
+            return isa_load(fp)
+
+    @property
+    def index(self) -> MTBLSStudyIndex:
+        """The inverted index of the samples of the study tables, built on
+        first use"""
+        if self.__index is None:
+            self.load_dataframes()
+            self.__index = MTBLSStudyIndex(self.dataframes)
+        return self.__index
 
     def get_factor_names(self) -> set:
-        self.load_dataframes()
-        factors = set()
-        for table_file in glob.iglob(path.join(self.output_dir, '[a|s]_*')):
-            df = self.dataframes[table_file]
-            factors_headers = [header for header in list(df.columns.values) if _RX_FACTOR_VALUE.match(header)]
-            [factors.add(header[13:-1]) for header in factors_headers]
-        return factors
+        return set(self.index.factors)
 
     def get_factor_values(self, factor_name: str) -> set:
-        self.load_dataframes()
-        fvs = set()
-        for table_file in glob.iglob(path.join(self.output_dir, '[a|s]_*')):
-            df = self.dataframes[table_file]
-            if 'Factor Value[{factor}]'.format(factor=factor_name) in list(df.columns.values):
-                for _, match in df['Factor Value[{factor}]'.format(factor=factor_name)].items():
-                    try:
-                        match = match.item()
-                    except AttributeError:
-                        pass
-                    if isinstance(match, (str, int, float)):
-                        if str(match) != 'nan':
-                            fvs.add(match)
-        return fvs
+        return set(self.index.factors.get(factor_name, ()))
 
     def get_data_files(self, factor_selection: dict = None) -> list:
-        self.load_dataframes()
-        return slice_data_files(self.output_dir, factor_selection=factor_selection)
+        return self.index.slice_data_files(factor_selection)
 
     def get_factors_summary(self) -> list:
         self.load_json()
@@ -225,26 +292,18 @@ class MTBLSInvestigation(MTBLSInvestigationBase):
         return list(map(lambda x: (x[0], len(x[1])), study_groups.items()))
 
     def get_sources_for_sample(self, sample_name: str) -> list:
-        self.load_json()
-        hits = []
-        for study in self.investigation.studies:
-            for sample in study.samples:
-                if sample.name == sample_name:
-                    log.info('Found a hit: %s' % sample.name)
-                    for source in sample.derives_from:
-                        hits.append(source.name)
-        return hits
+        return self.index.get_sources(sample_name)
 
     def get_data_for_sample(self, sample_name: str) -> list:
-        self.load_json()
-        hits = []
-        for study in self.investigation.studies:
-            for assay in study.assays:
-                for data in assay.data_files:
-                    if sample_name in [x.name for x in data.generated_from]:
-                        log.info('found a hit: %s' % data.filename)
-                        hits.append(data)
-        return hits
+        if self.__data_by_sample is None:
+            self.load_json()
+            self.__data_by_sample = {}
+            for study in self.investigation.studies:
+                for assay in study.assays:
+                    for data in assay.data_files:
+                        for name in dict.fromkeys(x.name for x in data.generated_from):
+                            self.__data_by_sample.setdefault(name, []).append(data)
+        return list(self.__data_by_sample.get(sample_name, ()))
 
     def get_study_groups_data_sizes(self) -> list:
         study_groups = self.get_study_groups()
@@ -324,7 +383,8 @@ class MTBLSInvestigation(MTBLSInvestigationBase):
             query_str = ''.join(query_str)[:-4]
             queries.append(query_str)
         for table_file in glob.iglob(path.join(self.output_dir, '[s]_*')):
-            df = self.dataframes[table_file]
+            # a shallow copy, the loaded tables keep their column names
+            df = self.dataframes[table_file].copy(deep=False)
             cols = df.columns
             cols = cols.map(
                 lambda x: x.replace(' ', '_').replace('[', '_').replace(']', '_') if isinstance(x, str) else x
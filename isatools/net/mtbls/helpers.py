@@ -3,7 +3,9 @@ from tempfile import mkdtemp
 
 import progressbar
 
+from isatools.net.mtbls.cache import get_default_cache
 from isatools.net.mtbls.core import MTBLSInvestigation
+from isatools.net.mtbls.mirror import FTPConnectionPool, MTBLSMirror
 from isatools.net.mtbls.utils import MTBLSDownloader
 
 
@@ -20,7 +22,7 @@ def get(mtbls_study_id: str, target_dir: str = None) -> str:
     """
     if target_dir is None:
         target_dir = mkdtemp()
-    investigation = MTBLSInvestigation(mtbls_id=mtbls_study_id, output_directory=target_dir)
+    investigation = MTBLSInvestigation(mtbls_id=mtbls_study_id, output_directory=target_dir, cache=get_default_cache())
     investigation.get_investigation()
     return investigation.output_dir
 
@@ -35,7 +37,7 @@ def getj(mtbls_study_id: str) -> dict:
     Example usage:
         my_json = getj('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_id=mtbls_study_id, output_format='json')
+    investigation = MTBLSInvestigation(mtbls_id=mtbls_study_id, output_format='json', cache=get_default_cache())
     investigation.load_json()
     return investigation.investigation.to_dict()
 
@@ -51,7 +53,7 @@ def get_data_files(mtbls_study_id: str, factor_selection: dict = None) -> list:
     Example usage:
         data_files = get_data_files('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_data_files(factor_selection)
 
 
@@ -65,7 +67,7 @@ def get_factor_names(mtbls_study_id: str) -> set:
     Example usage:
         factor_names = get_factor_names('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_factor_names()
 
 
@@ -80,7 +82,7 @@ def get_factor_values(mtbls_study_id: str, factor_name: str) -> set:
     Example usage:
         factor_values = get_factor_values('MTBLS1', 'genotype')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_factor_values(factor_name)
 
 
@@ -94,7 +96,7 @@ def get_factors_summary(mtbls_study_id: str) -> list:
     Example usage:
         factors_summary = get_factors_summary('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_factors_summary()
 
 
@@ -108,7 +110,7 @@ def get_study_groups(mtbls_study_id: str) -> dict:
     Example usage:
         study_groups = get_study_groups('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_study_groups()
 
 
@@ -122,7 +124,7 @@ def get_study_groups_samples_sizes(mtbls_study_id: str) -> list:
     Example usage:
         study_groups_samples_sizes = get_study_groups_samples_sizes('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_study_groups_samples_sizes()
 
 
@@ -137,7 +139,7 @@ def get_sources_for_sample(mtbls_study_id: str, sample_name: str) -> list:
     Example usage:
         sources = get_sources_for_sample('MTBLS1', 'my-sample-name')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_sources_for_sample(sample_name)
 
 
@@ -152,7 +154,7 @@ def get_data_for_sample(mtbls_study_id: str, sample_name: str) -> list:
     Example usage:
         data = get_data_for_sample('MTBLS1', 'sample1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_data_for_sample(sample_name)
 
 
@@ -166,7 +168,7 @@ def get_study_groups_data_sizes(mtbls_study_id: str) -> list:
     Example usage:
         study_groups_data_sizes = get_study_groups_data_sizes('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_study_groups_data_sizes()
 
 
@@ -180,7 +182,7 @@ def get_characteristics_summary(mtbls_study_id: str) -> list:
     Example usage:
         characteristics_summary = get_characteristics_summary('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_characteristics_summary()
 
 
@@ -194,7 +196,7 @@ def get_study_variable_summary(mtbls_study_id: str) -> list:
     Example usage:
         study_variable_summary = get_study_variable_summary('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_study_variable_summary()
 
 
@@ -208,7 +210,7 @@ def get_study_group_factors(mtbls_study_id: str) -> list:
     Example usage:
         study_group_factors = get_study_group_factors('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_study_group_factors()
 
 
@@ -221,7 +223,7 @@ def get_filtered_df_on_factors_list(mtbls_study_id: str) -> list:
     Example usage:
         queries = get_filtered_df_on_factors_list('MTBLS1')
     """
-    investigation = MTBLSInvestigation(mtbls_study_id)
+    investigation = MTBLSInvestigation(mtbls_study_id, cache=get_default_cache())
     return investigation.get_filtered_df_on_factors_list()
 
 
@@ -268,6 +270,35 @@ def dl_all_mtbls_isatab(target_dir: str, mtbls_ids: list = None, limit: int = 0)
     return download_count, download_errors
 
 
+def mirror_mtbls_isatab(
+        target_dir: str,
+        mtbls_ids: list = None,
+        limit: int = 0,
+        workers: int = 4,
+        retries: int = 3,
+        backoff: float = 1.0
+) -> tuple:
+    """
+    This function mirrors Metabolights studies as ISA-Tab, downloading several studies at once over a pool of FTP
+    connections. Files already mirrored, with the same size and modification time as on the server, are skipped, so
+    an interrupted mirror can be resumed by running it again
+
+    :param target_dir: The directory to mirror the studies to
+    :param mtbls_ids: A list of Metabolights study accession numbers to mirror. Mirrors all studies if not specified
+    :param limit: The maximum number of studies to mirror. Mirrors all studies if not specified
+    :param workers: The number of studies downloaded concurrently, and of FTP connections
+    :param retries: The number of times a failed transfer is retried
+    :param backoff: The delay in seconds before the first retry, doubled at every following retry
+    :return: The number of studies mirrored and a report for failing studies
+
+    Example usage:
+        count, errors = mirror_mtbls_isatab('/path/to/mirror', workers=8)
+    """
+    with FTPConnectionPool(size=workers) as pool:
+        mirror = MTBLSMirror(target_dir, pool=pool, workers=workers, retries=retries, backoff=backoff)
+        return mirror.mirror(mtbls_ids=mtbls_ids, limit=limit)
+
+
 ########################################################################################################################
 # ISA commands for MTBLS
 ########################################################################################################################
@@ -275,7 +306,7 @@ def dl_all_mtbls_isatab(target_dir: str, mtbls_ids: list = None, limit: int = 0)
 
 def get_factors_command(study_id: str, output: str) -> list:
     """ TODO: write docstring """
-    investigation = MTBLSInvestigation(study_id)
+    investigation = MTBLSInvestigation(study_id, cache=get_default_cache())
     with open(output, 'w+') as f:
         factors = investigation.get_factors_command(f)
     return factors
@@ -283,7 +314,7 @@ def get_factors_command(study_id: str, output: str) -> list:
 
 def get_factor_values_command(study_id: str, factor: str, output: str) -> list:
     """ TODO: write docstring """
-    investigation = MTBLSInvestigation(study_id)
+    investigation = MTBLSInvestigation(study_id, cache=get_default_cache())
     with open(output, 'w+') as f:
         factors = investigation.get_factor_values_command(factor, f)
     return factors
@@ -296,7 +327,7 @@ def get_data_files_command(
         galaxy_parameters_file: str = None
 ) -> None:
     """ TODO: write docstring """
-    investigation = MTBLSInvestigation(study_id)
+    investigation = MTBLSInvestigation(study_id, cache=get_default_cache())
     with open(output, 'w+') as f:
         investigation.get_data_files_command(f, json_query, galaxy_parameters_file)
 
@@ -312,7 +343,7 @@ def get_summary_command(study_id: str, json_output: str, html_output: str) -> li
     Example usage:
         html = get_summary_command('MTBLS1', '/path/to/summary/MTBLS1.json', '/path/to/summary/MTBLS1.html')
     """
-    investigation = MTBLSInvestigation(study_id)
+    investigation = MTBLSInvestigation(study_id, cache=get_default_cache())
     with open(json_output, 'w+') as f:
         return investigation.get_summary_command(f, html_output)
 
@@ -327,6 +358,6 @@ def datatype_get_summary_command(study_id: str, output):
         Example usage:
             html = get_summary_command('MTBLS1', '/path/to/download/MTBLS1.json')
         """
-    investigation = MTBLSInvestigation(study_id)
+    investigation = MTBLSInvestigation(study_id, cache=get_default_cache())
     with open(output, 'w+') as f:
         return investigation.datatype_get_summary_command(f)
@@ -0,0 +1,342 @@
+"""Bulk mirroring of the MetaboLights ISA-Tab files.
+
+MTBLSMirror downloads the investigation, study and assay files of many
+MetaboLights studies at once. Studies are downloaded concurrently, each
+worker borrowing an FTP session from a bounded FTPConnectionPool. Failed
+transfers are retried with an exponential backoff, and files already
+mirrored with the same size and modification time as on the server are
+not downloaded again.
+"""
+from __future__ import annotations
+
+import calendar
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from ftplib import FTP, error_perm, error_proto, error_reply, error_temp
+
+from isatools.net.mtbls.utils import EBI_FTP_SERVER, MTBLS_BASE_DIR
+
+log = logging.getLogger('isatools')
+
+# errors after which a transfer is retried on a new connection; error_perm
+# (e.g. 550 file not found) is permanent and not retried
+RETRY_ERRORS = (error_temp, error_reply, error_proto, OSError, EOFError)
+
+
+class FTPSession:
+    """An FTP connection that remembers its working directory, so that
+    changing to the directory it is already in costs no round trip
+    """
+
+    def __init__(self, ftp: FTP) -> None:
+        self.ftp = ftp
+        self.directory = None
+
+    def cwd(self, directory: str) -> None:
+        if directory != self.directory:
+            self.directory = None
+            self.ftp.cwd(directory)
+            self.directory = directory
+
+    def close(self) -> None:
+        try:
+            self.ftp.close()
+        except Exception:  # pragma: no cover
+            pass
+
+
+class FTPConnectionPool:
+    """A bounded pool of FTP sessions shared between threads. Sessions are
+    opened on demand, up to size of them, and a session that fails with
+    anything but a permanent FTP error is closed rather than handed out again
+    """
+
+    def __init__(
+            self,
+            host: str = EBI_FTP_SERVER,
+            port: int = 21,
+            user: str = '',
+            passwd: str = '',
+            size: int = 4,
+            timeout: float = 60
+    ) -> None:
+        if size < 1:
+            raise ValueError('The FTP connection pool size must be at least 1 but got %s' % size)
+        self.host = host
+        self.port = port
+        self.user = user
+        self.passwd = passwd
+        self.size = size
+        self.timeout = timeout
+        self.__idle = queue.LifoQueue()
+        self.__slots = threading.BoundedSemaphore(size)
+        self.__closed = False
+
+    def __connect(self) -> FTPSession:
+        log.info('Connecting to %s:%s' % (self.host, self.port))
+        ftp = FTP(timeout=self.timeout)
+        ftp.connect(self.host, self.port)
+        ftp.login(self.user, self.passwd)
+        return FTPSession(ftp)
+
+    @contextmanager
+    def session(self) -> FTPSession:
+        """Borrows a session from the pool, waiting for one to be returned
+        if size of them are already in use
+        """
+        if self.__closed:
+            raise RuntimeError('The FTP connection pool is closed')
+        self.__slots.acquire()
+        session = None
+        try:
+            try:
+                session = self.__idle.get_nowait()
+            except queue.Empty:
+                session = self.__connect()
+            yield session
+        except error_perm:
+            raise
+        except BaseException:
+            if session is not None:
+                session.close()
+                session = None
+            raise
+        finally:
+            if session is not None:
+                if self.__closed:
+                    session.close()
+                else:
+                    self.__idle.put(session)
+            self.__slots.release()
+
+    def close(self) -> None:
+        self.__closed = True
+        while True:
+            try:
+                self.__idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self) -> FTPConnectionPool:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def get_table_filenames(investigation_lines: list) -> list:
+    """Gets the names of the study and assay files of an investigation file
+
+    :param investigation_lines: The lines of the investigation file
+    :return: The list of the file names, study files first
+    """
+    filenames = []
+    for line in investigation_lines:
+        if 'Study File Name' in line:
+            filename = line.split('\t')[1]
+            if filename.startswith('"') and filename.endswith('"'):
+                filename = filename[1:-1]
+            filenames.append(filename)
+    for line in investigation_lines:
+        if 'Study Assay File Name' in line:
+            filenames.extend(filename.replace('"', '') for filename in line.split('\t')[1:])
+    return [filename.strip() for filename in filenames if filename.strip()]
+
+
+def _parse_mlsd_time(value: str) -> float:
+    """Converts a MLSD modify fact, YYYYMMDDHHMMSS[.sss] in UTC, to a timestamp"""
+    return float(calendar.timegm(time.strptime(value[:14], '%Y%m%d%H%M%S')))
+
+
+class MTBLSMirror:
+    """Mirrors the ISA-Tab files of MetaboLights studies into a directory,
+    one sub-directory per study
+    """
+
+    def __init__(
+            self,
+            target_dir: str,
+            pool: FTPConnectionPool = None,
+            workers: int = 4,
+            retries: int = 3,
+            backoff: float = 1.0,
+            base_dir: str = MTBLS_BASE_DIR
+    ) -> None:
+        """
+        :param target_dir: The directory to mirror the studies to
+        :param pool: The FTPConnectionPool to download with, by default a pool
+        of workers connections to the EBI FTP server
+        :param workers: The number of studies downloaded concurrently
+        :param retries: The number of times a failed transfer is retried
+        :param backoff: The delay in seconds before the first retry, doubled
+        at every following retry
+        :param base_dir: The FTP directory holding the studies
+        """
+        self.target_dir = target_dir
+        self.pool = pool if pool is not None else FTPConnectionPool(size=workers)
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.base_dir = base_dir
+        self.skipped_files = 0
+        self.downloaded_files = 0
+        self.__lock = threading.Lock()
+
+    def _retry(self, func, *args):
+        for attempt in range(self.retries + 1):
+            try:
+                return func(*args)
+            except error_perm:
+                raise
+            except RETRY_ERRORS as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                log.warning('FTP transfer failed (%s), retrying in %ss' % (e, delay))
+                time.sleep(delay)
+
+    def __list(self, directory: str) -> dict:
+        with self.pool.session() as session:
+            session.cwd(directory)
+            try:
+                return {name: facts for name, facts in session.ftp.mlsd(facts=['type', 'size', 'modify'])
+                        if facts.get('type', 'file') == 'file'}
+            except error_perm:
+                # the server does not support MLSD, file sizes and times are asked for one by one
+                return {name: {} for name in session.ftp.nlst()}
+
+    def get_mtbls_list(self) -> list:
+        """Get list of MTBLS studies from the FTP server"""
+        return sorted(self._retry(self.__list_studies))
+
+    def __list_studies(self) -> list:
+        with self.pool.session() as session:
+            session.cwd(self.base_dir)
+            return list(session.ftp.nlst())
+
+    @staticmethod
+    def is_up_to_date(file_path: str, facts: dict) -> bool:
+        """Tells whether a local file matches the MLSD facts of the remote one
+
+        :param file_path: The path of the local file
+        :param facts: The MLSD facts of the remote file
+        :return: True if the size and modification time are the same
+        """
+        if 'size' not in facts or 'modify' not in facts or not os.path.isfile(file_path):
+            return False
+        stat = os.stat(file_path)
+        return stat.st_size == int(facts['size']) and int(stat.st_mtime) == int(_parse_mlsd_time(facts['modify']))
+
+    def __download(self, directory: str, filename: str, file_path: str, facts: dict) -> None:
+        part_path = file_path + '.part'
+        with self.pool.session() as session:
+            session.cwd(directory)
+            if 'modify' not in facts:
+                # no MLSD facts, the modification time is asked for before the
+                # transfer so that the next runs can tell the file is up to date
+                try:
+                    facts = dict(facts, modify=session.ftp.sendcmd('MDTM ' + filename).split()[-1])
+                except error_perm:
+                    log.debug("No modification time for '%s/%s'" % (directory, filename))
+            with open(part_path, 'wb') as output_file:
+                log.info("Retrieving file '%s/%s'" % (directory, filename))
+                session.ftp.retrbinary('RETR ' + filename, output_file.write)
+        os.replace(part_path, file_path)
+        if 'modify' in facts:
+            mtime = _parse_mlsd_time(facts['modify'])
+            os.utime(file_path, (mtime, mtime))
+
+    def __stat(self, directory: str, filename: str) -> dict:
+        with self.pool.session() as session:
+            session.cwd(directory)
+            # servers may refuse SIZE in ASCII mode
+            session.ftp.voidcmd('TYPE I')
+            return {
+                'size': str(session.ftp.size(filename)),
+                'modify': session.ftp.sendcmd('MDTM ' + filename).split()[-1]
+            }
+
+    def _get_file(self, mtbls_id: str, filename: str, listing: dict) -> str:
+        directory = self.base_dir + '/' + mtbls_id
+        file_path = os.path.join(self.target_dir, mtbls_id, filename)
+        facts = listing.get(filename)
+        if facts is None:
+            raise Exception('Could not download a file: %s not found for %s' % (filename, mtbls_id))
+        if not facts and os.path.isfile(file_path):
+            # no MLSD facts, ask for the size and modification time of the file instead
+            facts = self._retry(self.__stat, directory, filename)
+        if self.is_up_to_date(file_path, facts):
+            log.debug("Skipping file '%s', already mirrored" % file_path)
+            with self.__lock:
+                self.skipped_files += 1
+            return file_path
+        self._retry(self.__download, directory, filename, file_path, facts)
+        with self.__lock:
+            self.downloaded_files += 1
+        return file_path
+
+    def mirror_study(self, mtbls_id: str) -> str:
+        """Mirrors the investigation, study and assay files of a study
+
+        :param mtbls_id: Accession number of the Metabolights study
+        :return: The directory the study is mirrored to
+        """
+        study_dir = os.path.join(self.target_dir, mtbls_id)
+        os.makedirs(study_dir, exist_ok=True)
+        log.info("Looking for study '%s'" % mtbls_id)
+        listing = self._retry(self.__list, self.base_dir + '/' + mtbls_id)
+        try:
+            investigation_filename = sorted(
+                x for x in listing if x.startswith('i_') and x.endswith('.txt'))[0]
+        except IndexError:
+            raise Exception('Could not find an investigation file for this study')
+        try:
+            investigation_path = self._get_file(mtbls_id, investigation_filename, listing)
+            with open(investigation_path, encoding='utf-8') as i_fp:
+                lines = i_fp.read().splitlines()
+            for filename in get_table_filenames(lines):
+                self._get_file(mtbls_id, filename, listing)
+        except error_perm as e:
+            raise Exception('Could not download a file: %s for %s' % (e, mtbls_id))
+        return study_dir
+
+    def mirror(self, mtbls_ids: list = None, limit: int = 0) -> tuple:
+        """Mirrors studies concurrently
+
+        :param mtbls_ids: A list of Metabolights study accession numbers to
+        mirror. Mirrors all studies if not specified
+        :param limit: The maximum number of studies to mirror. Mirrors all
+        studies if not specified
+        :return: The number of studies mirrored and a report for failing
+        studies
+        """
+        pending = list(mtbls_ids if mtbls_ids else self.get_mtbls_list())
+        pending.reverse()
+        download_count = 0
+        download_errors = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while pending or running:
+                while pending and len(running) < self.workers \
+                        and (limit <= 0 or download_count + len(running) < limit):
+                    mtbls_id = pending.pop()
+                    running[executor.submit(self.mirror_study, mtbls_id)] = mtbls_id
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    mtbls_id = running.pop(future)
+                    try:
+                        future.result()
+                        download_count += 1
+                    except Exception as e:
+                        log.error('Could not mirror %s: %s' % (mtbls_id, e))
+                        download_errors[mtbls_id] = e
+        log.info('Mirrored %s studies: %s files downloaded, %s files up to date'
+                 % (download_count, self.downloaded_files, self.skipped_files))
+        return download_count, download_errors
@@ -1,15 +1,20 @@
+from __future__ import annotations
+
 import os
 from ftplib import FTP
 import glob
 import logging
 
+import numpy as np
 import pandas as pd
 
 from isatools import isatab
+from isatools.isatab.defaults import _RX_FACTOR_VALUE
 
 EBI_FTP_SERVER = 'ftp.ebi.ac.uk'
 MTBLS_BASE_DIR = '/pub/databases/metabolights/studies/public'
 log = logging.getLogger('isatools')
+RANGE_OPERATORS = ('equals', 'less_than', 'more_than')
 
 
 class MTBLSDownloader:
@@ -45,28 +50,166 @@ class MTBLSDownloader:
             self.ftp.close()
 
 
+class MTBLSStudyIndex:
+    """An inverted index of the samples of a study, built once from its study
+    and assay tables: factor value to samples, sample to sources and sample to
+    data files
+    """
+
+    def __init__(self, tables: dict) -> None:
+        """
+        :param tables: The DataFrames of the tables of the study, by file
+        path. Only the study (s_*) and assay (a_*) tables are indexed
+        """
+        self.samples = {}
+        self.factors = {}
+        self.sources = {}
+        self.data_files = {}
+        self.__factor_names = {}
+        self.__numeric_values = {}
+        table_files = [x for x in tables if os.path.basename(x).startswith(('s_', 'a_'))]
+        # study tables first, so that the samples are in the order of the study table
+        for table_file in sorted(table_files, key=lambda x: (not os.path.basename(x).startswith('s_'), x)):
+            filename = os.path.basename(table_file)
+            self.__add_table(tables[table_file], filename.startswith('a_') and filename.endswith('.txt'))
+
+    @classmethod
+    def from_directory(cls, dir: str) -> MTBLSStudyIndex:
+        """Builds the index of the study and assay tables of a directory"""
+        tables = {}
+        for table_file in glob.iglob(os.path.join(dir, '[a|s]_*')):
+            log.info('Loading {table_file}'.format(table_file=table_file))
+            with open(table_file, encoding='utf-8') as fp:
+                tables[table_file] = isatab.load_table(fp)
+        return cls(tables)
+
+    def __add_table(self, df: pd.DataFrame, is_assay: bool) -> None:
+        columns = list(df.columns)
+        if 'Sample Name' not in columns:
+            return
+        # columns are taken by position, load_table may give several columns the same label
+        samples = df.iloc[:, columns.index('Sample Name')]
+        self.samples.update(dict.fromkeys(samples))
+        for position, column in enumerate(columns):
+            match = _RX_FACTOR_VALUE.match(column)
+            if match:
+                factor_name = match.group(1)
+                self.__factor_names.setdefault(factor_name.replace(' ', '_'), factor_name)
+                self.__numeric_values.pop(factor_name, None)
+                values = self.factors.setdefault(factor_name, {})
+                for value, value_samples in samples.groupby(df.iloc[:, position].to_numpy(), sort=False):
+                    values.setdefault(value, {}).update(dict.fromkeys(value_samples))
+        if 'Source Name' in columns:
+            self.__add_links(self.sources, samples.to_numpy(), df.iloc[:, columns.index('Source Name')].to_numpy())
+        file_positions = [i for i, x in enumerate(columns) if 'File' in x]
+        if is_assay and file_positions:
+            # row by row, the data files of a sample in the order of the assay table
+            self.__add_links(self.data_files, samples.to_numpy().repeat(len(file_positions)),
+                             df.iloc[:, file_positions].to_numpy().ravel())
+
+    @staticmethod
+    def __add_links(index: dict, samples: np.ndarray, targets: np.ndarray) -> None:
+        links = pd.DataFrame({'sample': samples, 'target': targets})
+        links = links[links['target'].notna() & (links['target'] != '')]
+        for sample, sample_targets in links.groupby('sample', sort=False)['target'].unique().items():
+            index.setdefault(sample, {}).update(dict.fromkeys(sample_targets))
+
+    def get_sources(self, sample_name: str) -> list:
+        """Gets the names of the sources of a sample"""
+        return list(self.sources.get(sample_name, ()))
+
+    def get_data_files(self, sample_name: str) -> list:
+        """Gets the data file names of a sample"""
+        return list(self.data_files.get(sample_name, ()))
+
+    def select_samples(self, factor_selection: dict = None) -> list:
+        """Gets the samples matching all the conditions of a factor
+        selection, see slice_data_files
+
+        :param factor_selection: The conditions on the factor values, by
+        factor name
+        :return: The names of the matching samples
+        """
+        if not factor_selection:
+            return list(self.samples)
+        selected = None
+        for factor_name, condition in factor_selection.items():
+            factor_samples = self.__select(factor_name, condition)
+            selected = factor_samples if selected is None else {x: None for x in selected if x in factor_samples}
+        return [x for x in self.samples if x in selected]
+
+    def __select(self, factor_name: str, condition: object) -> dict:
+        factor_name = self.__factor_names.get(factor_name.replace(' ', '_'))
+        if factor_name is None:
+            return {}
+        values = self.factors[factor_name]
+        if isinstance(condition, dict):
+            matching_values = self.__select_range(factor_name, condition)
+        elif isinstance(condition, (int, float)) and not isinstance(condition, bool):
+            matching_values = self.__select_range(factor_name, {'equals': condition})
+        elif isinstance(condition, (list, tuple, set)):
+            matching_values = [str(x) for x in condition]
+        else:
+            matching_values = [str(condition)]
+        samples = {}
+        for value in matching_values:
+            samples.update(values.get(value, {}))
+        return samples
+
+    def __select_range(self, factor_name: str, condition: dict) -> list:
+        unknown = [x for x in condition if x not in RANGE_OPERATORS]
+        if unknown:
+            raise ValueError('Unknown factor value filter %s, expected one of: %s'
+                             % (', '.join(unknown), ', '.join(RANGE_OPERATORS)))
+        if factor_name not in self.__numeric_values:
+            # the numeric factor values, sorted once so that ranges are found by bisection
+            values = list(self.factors[factor_name])
+            numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+            order = [x for x in np.argsort(numbers, kind='stable') if not np.isnan(numbers[x])]
+            self.__numeric_values[factor_name] = (numbers[order], [values[x] for x in order])
+        numbers, values = self.__numeric_values[factor_name]
+        start, end = 0, len(numbers)
+        if 'equals' in condition:
+            start = max(start, np.searchsorted(numbers, float(condition['equals']), side='left'))
+            end = min(end, np.searchsorted(numbers, float(condition['equals']), side='right'))
+        if 'more_than' in condition:
+            start = max(start, np.searchsorted(numbers, float(condition['more_than']), side='right'))
+        if 'less_than' in condition:
+            end = min(end, np.searchsorted(numbers, float(condition['less_than']), side='left'))
+        return values[start:end]
+
+    def slice_data_files(self, factor_selection: dict = None) -> list:
+        """Gets the samples matching a factor selection and their data files,
+        see slice_data_files
+        """
+        query_used = '' if factor_selection is None else factor_selection
+        return [{'sample': x, 'data_files': self.get_data_files(x), 'query_used': query_used}
+                for x in self.select_samples(factor_selection)]
+
+
 def slice_data_files(dir, factor_selection=None):
     """
     This function gets a list of samples and related data file URLs for a given
-    MetaboLights study, optionally filtered by factor value (currently by
-    matching on exactly 1 factor value)
+    MetaboLights study, optionally filtered by factor values
 
-    :param mtbls_study_id: Study identifier for MetaboLights study to get, as
-    a str (e.g. MTBLS1)
-    :param factor_selection: A list of selected factor values to filter on
-    samples
+    :param dir: The directory of the ISA-Tab files of the study
+    :param factor_selection: A dict of conditions on the factor values, by
+    factor name, that samples must all match
     :return: A list of dicts {sample_name, list of data_files} containing
     sample names with associated data filenames
 
     Example usage:
-        samples_and_data = mtbls.get_data_files('MTBLS1', [{'Gender': 'Male'}])
+        samples_and_data = mtbls.get_data_files('MTBLS1', {'Gender': 'Male'})
 
-    TODO:  Need to work on more complex filters e.g.:
+    A condition is one of:
+        {"gender": "male"} selects samples matching "male" factor value
         {"gender": ["male", "female"]} selects samples matching "male" or
         "female" factor value
         {"age": {"equals": 60}} selects samples matching age 60
         {"age": {"less_than": 60}} selects samples matching age less than 60
         {"age": {"more_than": 60}} selects samples matching age more than 60
+        {"age": {"more_than": 20, "less_than": 60}} selects samples matching
+        age between 20 and 60
 
         To select samples matching "male" and age less than 60:
         {
@@ -76,48 +219,4 @@ def slice_data_files(dir, factor_selection=None):
             }
         }
     """
-    results = []
-    # first collect matching samples
-    for table_file in glob.iglob(os.path.join(dir, '[a|s]_*')):
-        log.info('Loading {table_file}'.format(table_file=table_file))
-
-        with open(table_file, encoding='utf-8') as fp:
-            df = isatab.load_table(fp)
-            df = df[[x for x in df.columns if 'Factor Value' in x or 'Sample Name' in x]]
-            df.columns = ['sample' if 'Sample Name' in x else x for x in df.columns]
-            df.columns = [x[13:-1] if 'Factor Value' in x else x for x in df.columns]
-            df.columns = [x.replace(' ', '_') for x in df.columns]
-            # build query
-            sample_names_series = df['sample'].drop_duplicates()
-            if factor_selection is None:
-                results = sample_names_series.apply(
-                    lambda x: {'sample': x, 'data_files': [], 'query_used': ''}
-                ).tolist()
-            else:
-                factor_query = ''
-                for factor_name, factor_value in factor_selection.items():
-                    factor_name = factor_name.replace(' ', '_')
-                    factor_query += '%s=="%s" and ' % (factor_name, factor_value)
-                factor_query = factor_query[:-5]
-                try:
-                    query_results = df.query(factor_query)['sample'].drop_duplicates()
-                    results = query_results.apply(
-                        lambda x: {'sample': x, 'data_files': [], 'query_used': factor_selection}
-                    ).tolist()
-                except pd.errors.UndefinedVariableError:
-                    pass
-
-    # now collect the data files relating to the samples
-    for table_file in glob.iglob(os.path.join(dir, 'a_*.txt')):
-        with open(table_file, encoding='utf-8') as fp:
-            df = isatab.load_table(fp)
-            df = df[[x for x in df.columns if 'File' in x or 'Sample Name' in x]]
-            df.columns = ['sample' if 'Sample Name' in x else x for x in df.columns]
-            for result in results:
-                sample_name = result['sample']
-                sample_rows = df.loc[df['sample'] == sample_name]
-
-                for data_col in [x for x in sample_rows.columns if 'File' in x]:
-                    data_files = sample_rows[data_col]
-                    result['data_files'] = [i for i in data_files if str(i) != 'nan']
-    return results
+    return MTBLSStudyIndex.from_directory(dir).slice_data_files(factor_selection)
@@ -1,10 +1,21 @@
 # -*- coding: utf-8 -*-
-"""Functions for importing from MetabolomicsWorkbench"""
+"""Functions for importing from MetabolomicsWorkbench
+
+Metabolomics Workbench tabular (mwTab) files are read as a stream of rows,
+decoded and split on tabs line by line, and the ISA-Tab tables are built as
+generators of rows written through csv writers, so that large studies are
+converted without holding whole files in memory. Every function reading a
+mwTab file accepts a URL, a local file path or a binary file object.
+"""
+import csv
 import ftplib
+import io
 import json
 import logging
 import os.path
 import re
+import shutil
+import tempfile
 import urllib
 from collections import defaultdict
 from datetime import date
@@ -30,29 +41,136 @@ from isatools.model import (
 __author__ = 'proccaserra@gmail.com'
 
 
+MW_REST_STUDY_URL = "http://www.metabolomicsworkbench.org/rest/study/study_id/"
+
+MW_TEXTFORMAT_URL = "http://www.metabolomicsworkbench.org/data/study_textformat_view.php"
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def open_mwfile(source):
+    """Opens a Metabolomics Workbench file as a binary stream
+
+    :param source: A URL, a local file path or a binary file object
+    :return: A binary file object
+    """
+    if hasattr(source, 'read'):
+        return source
+    if os.path.exists(source):
+        return open(source, 'rb')
+    return urlopen(source)
+
+
+def iter_mwfile_rows(source, rstrip=False):
+    """A generator of the rows of a Metabolomics Workbench tabular file,
+    decoded and split on tabs one line at a time
+
+    :param source: A URL, a local file path or a binary file object
+    :param rstrip: Whether to strip the trailing white space of each line
+    before splitting it
+    :return: A generator of lists of cells
+    """
+    with open_mwfile(source) as binary_file:
+        text_file = io.TextIOWrapper(binary_file, encoding='utf-8', errors='replace', newline='')
+        for line in text_file:
+            line = line.rstrip() if rstrip else line.rstrip('\r\n')
+            yield line.split('\t')
+
+
+class MWTabFile:
+    """A Metabolomics Workbench tabular file read row by row, from the start
+    again every time it is iterated over
+    """
+
+    def __init__(self, source, rstrip=False):
+        """
+        :param source: A URL or a local file path
+        :param rstrip: Whether to strip the trailing white space of each line
+        """
+        self.source = source
+        self.rstrip = rstrip
+
+    def __iter__(self):
+        return iter_mwfile_rows(self.source, self.rstrip)
+
+
+def download_mwfile(input_url, file_path):
+    """Saves a remote Metabolomics Workbench file to a local file, one chunk
+    at a time
+
+    :param input_url: The URL of the file
+    :param file_path: The path of the local copy
+    :return: file_path
+    """
+    with urlopen(input_url) as response, open(file_path, 'wb') as local_file:
+        shutil.copyfileobj(response, local_file, DOWNLOAD_CHUNK_SIZE)
+    return file_path
+
+
+def get_local_mwfile(download_dir, mw_study_id, mw_analysis_id):
+    """Gets the local copy of the mwTab file of an analysis, downloading it
+    into download_dir the first time, so that the file is only downloaded
+    once however many times it is read
+
+    :param download_dir: The directory of the local copies
+    :param mw_study_id: str
+    :param mw_analysis_id: str
+    :return: The path of the local copy
+    """
+    file_path = os.path.join(download_dir, mw_study_id + "_" + mw_analysis_id + ".txt")
+    if not os.path.exists(file_path):
+        query = "?STUDY_ID=" + mw_study_id + "&ANALYSIS_ID=" + mw_analysis_id + "&MODE=d"
+        download_mwfile(MW_TEXTFORMAT_URL + query, file_path)
+    return file_path
+
+
+def iter_block(rows, start_marker, end_marker):
+    """A generator of the rows between a start and an end marker, the row of
+    the start marker included
+
+    :param rows: An iterable of lists of cells
+    :param start_marker: str
+    :param end_marker: str
+    :return: A generator of lists of cells
+    """
+    begin = False
+    for row in rows:
+        line = '\t'.join(row)
+        if start_marker in line:
+            begin = True
+        elif end_marker in line:
+            begin = False
+        if begin:
+            yield row
+
+
+def _tsv_writer(output_file):
+    """A csv writer of tab separated rows, writing the cells as they are"""
+    return csv.writer(output_file, delimiter='\t', quoting=csv.QUOTE_NONE, quotechar=None, lineterminator='\n')
+
+
+def _quoted(row):
+    """The cells of an ISA-Tab table row, double quoted and followed by a tab"""
+    return ['"{0}"'.format(cell) for cell in row] + ['']
+
+
 def getblock(container, start_marker, end_marker):
     """A method to obtain a block of line between a start and an end marker
     this will be invoked to obtain raw data, metabolite identification, metabolite
     annotation and possible study factors parameters are a filehandle and 2
     strings allowing the specify the section brackets
-    :param container:
+    :param container: The content of a mwTab file, as bytes or str, or its
+    rows as an iterable of lists of cells
     :param start_marker:
     :param end_marker:
     :return:
     """
     try:
-        begin = False
-        block = []
-        lines = str(container).split('\\n')
-        for line in lines:
-            line_elements = line.split('\\t')
-            if start_marker in str(line):
-                begin = True
-            elif end_marker in str(line):
-                begin = False
-            if begin:
-                block.append(line_elements)
-        return block
+        if isinstance(container, bytes):
+            container = container.decode('utf-8', errors='replace')
+        if isinstance(container, str):
+            container = (line.split('\t') for line in container.splitlines())
+        return list(iter_block(container, start_marker, end_marker))
 
     except Exception as e:
         logging.exception(e)
@@ -84,7 +202,39 @@ def get_archived_file(mw_study_id):
     return False
 
 
-def generate_maf_file(write_dir, mw_study_id, mw_analysis_id):
+def _get_json(source):
+    """Decodes a JSON document straight from a URL, a local file path or a
+    binary file object
+    """
+    try:
+        with open_mwfile(source) as binary_file:
+            return json.load(io.TextIOWrapper(binary_file, encoding='utf-8'))
+    except urllib.error.HTTPError as error:
+        logging.error("Could not get %s: %s" % (source, error))
+        return {}
+
+
+def iter_maf_rows(dd, mw_analysis_id):
+    """A generator of the rows of a MAF file, header first, from the merged
+    data and metabolites records of the MW REST API
+
+    :param dd: The records, as {metabolite number: record}
+    :param mw_analysis_id: The analysis to keep the records of
+    :return: A generator of lists of cells
+    """
+    def clean(value):
+        return re.sub(r'[\t\r\n]', ' ', str(value))
+
+    units = "(" + dd["1"]["units"] + ")"
+    yield ["metabolite number", "metabolite name", "metabolite identifier"] + \
+        [clean(key) + units for key in dd["1"]["DATA"].keys()]
+    for key in dd:
+        if dd[key]["analysis_id"] == mw_analysis_id:
+            yield [key, clean(dd[key]["metabolite_name"]), clean(dd[key]["metabolite_id"])] + \
+                [clean(value) for value in dd[key]["DATA"].values()]
+
+
+def generate_maf_file(write_dir, mw_study_id, mw_analysis_id, data_url=None, metabolites_url=None):
     """ A method to create an EBI Metabolights MAF file from Metabolomics Workbench
     REST API over data and metabolites
     input: a valid Metabolomics Workbench study accession number that should
@@ -92,25 +242,14 @@ def generate_maf_file(write_dir, mw_study_id, mw_analysis_id):
     :param write_dir:
     :param mw_study_id:
     :param mw_analysis_id:
+    :param data_url: The data feed, by default from the MW REST API
+    :param metabolites_url: The metabolites feed, by default from the MW REST
+    API
     :return:
     """
     try:
-        data_url = "http://www.metabolomicsworkbench.org/rest/study/study_id/" + mw_study_id + "/data"
-        metabolites_url = "http://www.metabolomicsworkbench.org/rest/study/study_id/" + mw_study_id + "/metabolites"
-
-        with urllib.request.urlopen(data_url) as url:
-            try:
-                data_response = url.read().decode('utf8')
-                data = json.loads(data_response)
-            except urllib.error.HTTPError as error:
-                data = error.read()
-
-        with urllib.request.urlopen(metabolites_url) as url:
-            try:
-                metabolites_response = url.read().decode('utf8')
-                metabolites = json.loads(metabolites_response)
-            except urllib.error.HTTPError as error:
-                data = error.read()
+        data = _get_json(data_url or MW_REST_STUDY_URL + mw_study_id + "/data")
+        metabolites = _get_json(metabolites_url or MW_REST_STUDY_URL + mw_study_id + "/metabolites")
 
         dd = defaultdict(list)
         if len(metabolites) != 0 or len(data) != 0:
@@ -124,96 +263,10 @@ def generate_maf_file(write_dir, mw_study_id, mw_analysis_id):
                 dd[k] = {i: j for x in v for i, j in x.items()}
             try:
                 if not isinstance(dd["1"]["DATA"], list):
-
-                    if "other_id" in dd.items():
-                        data_rec_header = "metabolite number" + "\t" \
-                                          + "metabolite name" \
-                                          + "\t" + "metabolite identifier" \
-                                          + "\t" + "pubchem identifier" \
-                                          + "\t" + "other id" \
-                                          + "\t" + "other id type" \
-                                          + '\t' + \
-                                          ("(" + dd["1"]["units"] + ')\t')\
-                            .join(dd["1"]["DATA"].keys()) \
-                            + ("(" + dd["1"]["units"] + ")")
-
-                    elif "pubchem_id" in dd.items():
-                        data_rec_header = "metabolite number" + "\t" \
-                                          + "metabolite name" \
-                                          + "\t" + "metabolite identifier" \
-                                          + "\t" + "pubchem identifier" \
-                                          + '\t' + \
-                                          ("(" + dd["1"]["units"] + ')\t')\
-                            .join(dd["1"]["DATA"].keys()) \
-                            + ("(" + dd["1"]["units"] + ")")
-
-                    else:
-                        data_rec_header = "metabolite number" + "\t" \
-                                          + "metabolite name" \
-                                          + "\t" + "metabolite identifier" \
-                                          + '\t' + \
-                                          ("(" + dd["1"]["units"] + ')\t')\
-                            .join(dd["1"]["DATA"].keys()) \
-                            + ("(" + dd["1"]["units"] + ")")
                     with open(write_dir + "/" + mw_study_id + "/data/"
                               + mw_study_id + "_" + mw_analysis_id
-                              + "-maf-data-jsonparsing.txt", "w") as fh:
-                        # print("writing 'maf file document' to file from
-                        # 'generate_maf_file' method:...")
-                        fh.writelines(data_rec_header)
-                        fh.writelines("\n")
-
-                        for key in dd:
-                            # print(dd[key]["analysis_id"])
-                            if dd[key]["analysis_id"] == mw_analysis_id:
-                                if "other_id" in dd.items():
-                                    record_values = \
-                                        key + '\t' \
-                                        + dd[key]["metabolite_name"] \
-                                        + "\t" + dd[key]["metabolite_id"] \
-                                        + "\t" + dd[key]["pubchem_id"] \
-                                        + "\t" + dd[key]["other_id"] \
-                                        + "\t" + dd[key]["other_id_type"]
-
-                                    for value in dd[key]["DATA"].values():
-                                        record_values = record_values \
-                                            + "\t" + str(value)
-                                    fh.writelines(record_values)
-                                    fh.writelines("\n")
-                                elif "pubchem_id" in dd.items():
-                                    record_values = \
-                                        key + '\t' \
-                                        + dd[key]["metabolite_name"] \
-                                        + "\t" \
-                                        + dd[key]["metabolite_id"] \
-                                        + "\t" + dd[key]["pubchem_id"] \
-                                        + "\t" + dd[key]["other_id"] \
-                                        + "\t" + dd[key][
-                                            "other_id_type"]
-
-                                    for value in dd[key]["DATA"].values():
-                                        record_values = \
-                                            record_values + "\t" + str(value)
-                                    fh.writelines(record_values)
-                                    fh.writelines("\n")
-                                else:
-                                    record_values = \
-                                        key + '\t' \
-                                        + dd[key]["metabolite_name"] \
-                                        + "\t" + dd[key]["metabolite_id"]
-
-                                    for value in dd[key]["DATA"].values():
-                                        record_values = \
-                                            record_values + "\t" + str(value)
-                                    fh.writelines(record_values)
-                                    fh.writelines("\n")
-
-                                    # Output resulting json to file
-                                    # [Action Disabled]
-                                    # open("output.json", "w").write(
-                                    #     json.dumps(dd, sort_keys=True,
-                                    #     indent=4, separators=(',', ': '))
-                                    # )
+                              + "-maf-data-jsonparsing.txt", "w", newline='') as fh:
+                        _tsv_writer(fh).writerows(iter_maf_rows(dd, mw_analysis_id))
                 else:
                     print("Dictionary expected, List Found, "
                           "error in MW REST API")
@@ -254,6 +307,31 @@ def get_assay_type(container):
         print("Error: in get_assay_type() method, situation not recognized")
 
 
+# the columns of the canonical ms and nmr assay workflows receiving the sample
+# identifier, and the one receiving the raw data file name with its extension
+ASSAY_SAMPLE_COLUMNS = {
+    "mass spectrometry": ((0, 2, 18, 23), 19, ".mzml"),
+    "nmr spectroscopy": ((0, 2, 19, 23), 20, ".nmrml")
+}
+
+
+def iter_assay_rows(technotype, assayrecords):
+    """A generator of the records of an ISA assay table, the sample
+    identifier inserted in the canonical workflow of the technology
+
+    :param technotype: "mass spectrometry" or "nmr spectroscopy"
+    :param assayrecords: The workflow records, as {sample identifier: [record]}
+    :return: A generator of lists of cells
+    """
+    sample_columns, data_file_column, data_file_extension = ASSAY_SAMPLE_COLUMNS[technotype]
+    for my_key in assayrecords:
+        record = list(assayrecords[my_key][0])
+        for column in sample_columns:
+            record[column] = my_key
+        record[data_file_column] = my_key + data_file_extension
+        yield record
+
+
 def write_assay(write_dir, technotype, accnum, mw_analysis_nb, assayrecords, assay_wf_header):
     """A method to write an ISA assay table
 
@@ -270,54 +348,17 @@ def write_assay(write_dir, technotype, accnum, mw_analysis_nb, assayrecords, ass
         if not os.path.exists(assayfileoutputpath):
             os.makedirs(assayfileoutputpath)
 
-        assay_file = open(assayfileoutputpath + "a_" + accnum + "_" + mw_analysis_nb + '.txt', 'w')
-        print("writing 'assay information' to file...")
-
-        # DOC: writing header for ISA assay file:
-        for this_item in assay_wf_header:
-            assay_file.write('"{0}"'.format(this_item))
-            assay_file.write('\t')
-            # print('"{0}"'.format(this_item))
-        assay_file.write("\n")
-
-        # DOC: now writing associated data records:
-        if technotype == "mass spectrometry":
-            for my_key in assayrecords:
-                # print(my_key, str(assayrecords[my_key][0]))
-                # DOC: performing insertion of sample identifier in the
-                # canonical workflow for ms assay
-                assayrecords[my_key][0][0] = my_key
-                assayrecords[my_key][0][2] = my_key
-                assayrecords[my_key][0][18] = my_key
-                assayrecords[my_key][0][19] = my_key + ".mzml"
-                assayrecords[my_key][0][23] = my_key
-
-                # writing the record to file
-                for this_item in assayrecords[my_key][0]:
-                    assay_file.write('"{0}"'.format(this_item))
-                    assay_file.write('\t')
-                assay_file.write("\n")
-            assay_file.write("\n")
-
-        elif technotype == "nmr spectroscopy":
-            for my_key in assayrecords:
-                # print("mickey: ", my_key)
-                # DOC: performing insertion of sample identifier in the
-                # canonical workflow for ms assay
-                assayrecords[my_key][0][0] = my_key
-                assayrecords[my_key][0][2] = my_key
-                assayrecords[my_key][0][19] = my_key
-                assayrecords[my_key][0][20] = my_key + ".nmrml"
-                assayrecords[my_key][0][23] = my_key
-
-                # writing the record to file
-                for this_item in assayrecords[my_key][0]:
-                    assay_file.write('"{0}"'.format(this_item))
-                    assay_file.write('\t')
-                assay_file.write("\n")
-            assay_file.write("\n")
+        with open(assayfileoutputpath + "a_" + accnum + "_" + mw_analysis_nb + '.txt', 'w', newline='') as assay_file:
+            print("writing 'assay information' to file...")
+            writer = _tsv_writer(assay_file)
+
+            # DOC: writing header for ISA assay file:
+            writer.writerow(_quoted(assay_wf_header))
 
-        assay_file.close()
+            # DOC: now writing associated data records:
+            if technotype in ASSAY_SAMPLE_COLUMNS:
+                writer.writerows(_quoted(record) for record in iter_assay_rows(technotype, assayrecords))
+                assay_file.write("\n")
     except IOError:
         print("Error: in write_assay() method, situation not recognized")
 
@@ -337,11 +378,6 @@ def create_raw_data_files(write_dir, input_techtype, f, input_study_id, input_an
     """
 
     try:
-        # dlurl = urlopen(f)
-        # saving a remote file to local drive
-        # localcopy = open(studyID + "_" + analysisID + ".txt", 'w+')
-        # localcopy.write(str(dlurl.read()))
-
         # the combination of MW study ID and analysis ID ensure unicity of
         # file name.
         dataoutputdirectory = write_dir + "/" + input_study_id + "/data/"
@@ -353,100 +389,89 @@ def create_raw_data_files(write_dir, input_techtype, f, input_study_id, input_an
         maf_file_name = input_study_id + '_' + input_analysis_id + '_maf.txt'
 
         if input_techtype == "mass spectrometry":
-            dlurl = urlopen(f).read()
-            rawblock = getblock(dlurl, "MS_ALL_DATA_START", "MS_ALL_DATA_END")
+            raw_markers = ("MS_ALL_DATA_START", "MS_ALL_DATA_END")
+            maf_markers = [("MS_METABOLITE_DATA_START", "MS_METABOLITE_DATA_END"),
+                           ("METABOLITES_START", "METABOLITES_END")]
+        elif input_techtype == "nmr spectroscopy":
+            raw_markers = ("NMR_BINNED_DATA_START", "NMR_BINNED_DATA_END")
+            maf_markers = [("NMR_METABOLITE_DATA_START", "NMR_METABOLITE_DATA_END")]
+        else:
+            return
 
-            if len(rawblock) < 1:
-                print("WARNING: no MS raw data reported in MWtab file")
-            else:
-                print("writing 'ms raw data' to file...")
-                with open((dataoutputdirectory + raw_data_file_name), 'w+') \
-                        as rawdata:
-                    for item in rawblock:
-                        print("item: ,", item)
-                        rawdata.writelines(
-                            "%s\t" % this_element for this_element in item)
-                        rawdata.writelines(item)
-                        rawdata.writelines("\n")
-                        for this_element in item:
-                            if "MS_ALL_DATA_START" in this_element:
-                                rawdata.writelines(
-                                    "datatype:\t%s" % this_element)
-                            elif "Bin range" in this_element:
-                                rawdata.writelines(
-                                    "quantitationtype:   %s" % this_element)
-                                rawdata.writelines('\n')
-                            else:
-                                rawdata.writelines('%s\t' % this_element)
-                        rawdata.writelines('\n')
+        # a single pass over the file, each block written out as it is read;
+        # the files are opened on the first row of their blocks
+        outputs = {}
 
-        elif input_techtype == "nmr spectroscopy":
-            dlurl = urlopen(f).read()
-            rawblock = getblock(
-                dlurl, "NMR_BINNED_DATA_START", "NMR_BINNED_DATA_END")
-            # rawdata.writelines("%s\n" % item.replace("\t","\\t") for item in
-            # rawblock)
-            if len(rawblock) < 1:
-                print("WARNING: no nmr binned  data reported in MWtab file")
-            else:
-                print("writing 'nmr binned data' to file...")
-                with open((dataoutputdirectory + raw_data_file_name), 'w+') \
-                        as rawdata:
-                    for item in rawblock:
-                        # print(*item, sep='\t')
-                        for this_element in item:
-                            if "NMR_BINNED" in this_element:
-                                rawdata.writelines(
-                                    "datatype:\t%s" % this_element)
-                            elif "Bin range" in this_element:
-                                rawdata.writelines(
-                                    "quantitationtype:   %s" % this_element)
-                                rawdata.writelines('\n')
-                            else:
-                                rawdata.writelines('%s\t' % this_element)
-                        rawdata.writelines('\n')
-
-        # generate_maf_file(input_study_id)
+        def get_output(file_name):
+            if file_name not in outputs:
+                outputs[file_name] = open(dataoutputdirectory + file_name, 'w+', newline='')
+            return outputs[file_name]
 
-        if input_techtype == "mass spectrometry":
-            dlurl = urlopen(f).read()
-            mafblock = getblock(dlurl, "MS_METABOLITE_DATA_START",
-                                "MS_METABOLITE_DATA_END")
-            mafblock2 = getblock(dlurl, "METABOLITES_START", "METABOLITES_END")
-            # print("mafblock2", mafblock2)
-            with open((dataoutputdirectory + maf_file_name), 'w+') as mafdata:
-                for item in mafblock:
-                    mafdata.writelines(
-                        "%s\t" % this_element for this_element in item)
-                    mafdata.writelines("\n")
-                for item in mafblock2:
-                    mafdata.writelines(
-                        "%s\t" % this_element for this_element in item)
-                    mafdata.writelines("\n")
-                # mafdata.writelines("%s\n" % item for item in mafblock)
-                # mafdata.writelines("%s\n" % item for item in mafblock2)
+        in_raw_block = False
+        in_maf_block = [False] * len(maf_markers)
+        maf_writer = None
+        try:
+            for item in iter_mwfile_rows(f):
+                line = '\t'.join(item)
+                if raw_markers[0] in line:
+                    in_raw_block = True
+                elif raw_markers[1] in line:
+                    in_raw_block = False
+                if in_raw_block:
+                    get_output(raw_data_file_name).writelines(_format_raw_data_row(input_techtype, item))
+                for i, (start_marker, end_marker) in enumerate(maf_markers):
+                    if start_marker in line:
+                        in_maf_block[i] = True
+                    elif end_marker in line:
+                        in_maf_block[i] = False
+                    if in_maf_block[i]:
+                        if input_techtype == "mass spectrometry":
+                            if maf_writer is None:
+                                maf_writer = _tsv_writer(get_output(maf_file_name))
+                            maf_writer.writerow(item + [''])
+                        else:
+                            get_output(maf_file_name).writelines(item)
 
-        elif input_techtype == "nmr spectroscopy":
-            dlurl = urlopen(f).read()
-            nmr_mafblock = getblock(dlurl, "NMR_METABOLITE_DATA_START",
-                                    "NMR_METABOLITE_DATA_END")
-            if len(nmr_mafblock) < 1:
-                print("WARNING: no nmr metabolite data reported in MWTab")
-                # print("nmr_mafblodk:", len(nmr_mafblock))
-            else:
-                # print("nmr_mafblock", nmr_mafblock)
-                # mafdata.writelines("%s\n" % item for item in mafblock)
-                with open((dataoutputdirectory + maf_file_name), 'w+') \
-                        as mafdata:
-                    for item in nmr_mafblock:
-                        mafdata.writelines(
-                            "%s" % this_element for this_element in item)
+            if raw_data_file_name not in outputs:
+                if input_techtype == "mass spectrometry":
+                    print("WARNING: no MS raw data reported in MWtab file")
+                else:
+                    print("WARNING: no nmr binned  data reported in MWtab file")
+            if maf_file_name not in outputs:
+                if input_techtype == "mass spectrometry":
+                    get_output(maf_file_name)
+                else:
+                    print("WARNING: no nmr metabolite data reported in MWTab")
+        finally:
+            for output_file in outputs.values():
+                output_file.close()
     except Exception as e:
         logging.exception(e)
         print("Error in create_raw_data_files() methods, "
               "possibly when trying to write data files")
 
 
+def _format_raw_data_row(input_techtype, item):
+    """A generator of the strings a row of raw data is written as"""
+    if input_techtype == "mass spectrometry":
+        data_type_marker = "MS_ALL_DATA_START"
+        for this_element in item:
+            yield "%s\t" % this_element
+        yield from item
+        yield "\n"
+    else:
+        data_type_marker = "NMR_BINNED"
+    for this_element in item:
+        if data_type_marker in this_element:
+            yield "datatype:\t%s" % this_element
+        elif "Bin range" in this_element:
+            yield "quantitationtype:   %s" % this_element
+            yield '\n'
+        else:
+            yield '%s\t' % this_element
+    yield '\n'
+
+
 def create_nmr_assay_records(list_of_lines, study_id, analysis_id, fv_records):
     """A method to create ISA assay tables from an Metabolomics Workbench Study
     Identifier
@@ -523,15 +548,9 @@ def create_nmr_assay_records(list_of_lines, study_id, analysis_id, fv_records):
             "Data Transformation Name",
             "Derived Spectral Data File"]
 
-        input_nmr_file = urlopen(list_of_lines).read()
-        input_nmr_file = str(input_nmr_file).split('\\n')
-
         maf_file = str(study_id) + "_" + str(analysis_id) + "_maf_data.txt"
 
-        for this_row in input_nmr_file:
-            this_row = this_row.rstrip()
-            this_row = str(this_row).split('\\t')
-            # print(this_row)
+        for this_row in iter_mwfile_rows(list_of_lines, rstrip=True):
 
             if "NM:NMR_EXPERIMENT_TYPE" in this_row[0]:
                 pv_nmr_exprt_type = this_row[1]
@@ -704,6 +723,7 @@ def create_ms_assay_records(lol, input_study_id, input_analysis_id, fv_records):
         pv_ms_type = ""
         pv_ms_ion_mode = ""
         pv_ms_instrument = ""
+        pv_ms_instrument_type = ""
         pv_ms_acquisitionfile = ""
         pv_ms_analysisfile = ""
         pv_ms_sw_version = ""
@@ -744,13 +764,7 @@ def create_ms_assay_records(lol, input_study_id, input_analysis_id, fv_records):
                            "Metabolite Annotation File"
                            ]
 
-        input_ms_file = urlopen(lol).read()
-        input_ms_file = str(input_ms_file).split('\\n')
-
-        for row_item in input_ms_file:
-
-            row_item = row_item.rstrip()
-            row_item = str(row_item).split('\\t')
+        for row_item in iter_mwfile_rows(lol, rstrip=True):
 
             # if "AN:ANALYSIS_TYPE" in row_item[0]:
             #     ms_protocol_type = row_item[1].rstrip()
@@ -946,17 +960,24 @@ def get_mwfile_as_lol(input_url):
     :return: list of lists
     """
     try:
-        input_file = urlopen(input_url).read()
-        input_file = str(input_file).split('\\n')
-        mw_as_lol = []
-        for line in input_file:
-            lines = line.split('\\t')
-            mw_as_lol.append(lines)
-        return mw_as_lol
+        return list(iter_mwfile_rows(input_url))
     except IOError:
         print("IOError in get_mwfile_as_lol() method: can not open file or read data")
 
 
+def iter_study_rows(longrecords):
+    """A generator of the records of an ISA study table, from the
+    [organism, taxonomy identifier, source, sample, factor values...]
+    records of the study samples
+
+    :param longrecords: list of lists
+    :return: A generator of lists of cells
+    """
+    for each in longrecords:
+        # this is to reorder fields following the merge
+        yield [each[3], "specimen", each[0], each[1], "", "sample collection protocol", each[2]] + each[4:]
+
+
 def write_study_file(write_dir, study_acc_num, study_file_header, longrecords):
     """ A method to write an ISA study file
     :param write_dir:
@@ -967,42 +988,19 @@ def write_study_file(write_dir, study_acc_num, study_file_header, longrecords):
     """
     try:
         this_study_filename = "s_" + study_acc_num + ".txt"
-        # print("study filename: ",this_study_filename)
-        # /Users/Philippe/Documents/git/MW2ISA
         studyfilepath = write_dir + "/" + study_acc_num
         if not os.path.exists(studyfilepath):
             os.makedirs(studyfilepath)
-        study_file = open((studyfilepath + "/" + this_study_filename), 'w')
-        try:
-            print("writing 'study sample information' to file...")
-            # write study header to file
-            # studyfileheader = studyfileheader+factorheader
-            for this_element in study_file_header:
-                study_file.write('"{0}"'.format(this_element))
-                # print('"{0}"'.format(this_element))
-                study_file.write('\t')
-            study_file.write("\n")
-
-            # writing study records to file
-            for each in longrecords:
-                # this is to reorder fields following the merge
-                each[0], each[1], each[2], each[3] = \
-                    each[3], each[0], each[1], each[2]
-                each.insert(4, "sample collection protocol")
-                each.insert(3, "")
-                each[4], each[5] = each[5], each[4]
-                each.insert(1, "specimen")
-
-                for item in each:
-                    study_file.write("\"" + item + "\"")
-                    study_file.write('\t')
-                study_file.write('\n')
-
-            study_file.close()
-
-        except IOError:
-            print("IOError in write_study_file method(): "
-                  "can not write to file.")
+        with open((studyfilepath + "/" + this_study_filename), 'w', newline='') as study_file:
+            try:
+                print("writing 'study sample information' to file...")
+                writer = _tsv_writer(study_file)
+                writer.writerow(_quoted(study_file_header))
+                writer.writerows(_quoted(record) for record in iter_study_rows(longrecords))
+
+            except IOError:
+                print("IOError in write_study_file method(): "
+                      "can not write to file.")
 
     except IOError:
         print("IOError in write_study_file() method: "
@@ -1056,6 +1054,7 @@ def mw2isa_convert(**kwargs):
         'validate_option': ''}
 
     conversion_success = True
+    mwfiles_dir = None
     try:
         options.update(kwargs)
         print("user options", options)
@@ -1097,10 +1096,6 @@ def mw2isa_convert(**kwargs):
             # isa_assay_names = []
             # isa_assay_names_with_dlurl = {}
 
-            downLoadURI = "http://www.metabolomicsworkbench.org/data/" \
-                          "study_textformat_view.php?STUDY_ID=" + studyid \
-                          + "&ANALYSIS_ID="
-
             study_assays_dict = {"study_id": studyid, "assays": []}
             for table in AnalysisParamTable:
                 for index, obj in enumerate(table):
@@ -1208,9 +1203,10 @@ def mw2isa_convert(**kwargs):
             #  and protocols so we get the first file
             # to prime.
             analysisid = study_assays_dict["assays"][0]["analysis_id"]
-            downLoadURI = downLoadURI + analysisid + "&MODE=d"
-            # Going over the firt MWtab and loading it as an array of lines
-            thisFileContent = get_mwfile_as_lol(downLoadURI)
+            # Going over the firt MWtab, a row at a time on every pass; the
+            # files are downloaded once for all the passes over them
+            mwfiles_dir = tempfile.mkdtemp()
+            thisFileContent = MWTabFile(get_local_mwfile(mwfiles_dir, studyid, analysisid))
 
             # Generating the ISA Study Sample Table stub from MW Tab file
             # Factor section:
@@ -2010,13 +2006,7 @@ def mw2isa_convert(**kwargs):
                                        filename=this_assay_file)
                     study1.assays.append(this_assay)
 
-                    downLoadURI = "http://www.metabolomicsworkbench.org/" \
-                                  "data/study_textformat_view.php?STUDY_ID=" \
-                                  + studyid \
-                                  + "&ANALYSIS_ID="
-
-                    downLoadURI = downLoadURI + element["analysis_id"] \
-                        + "&MODE=d"
+                    downLoadURI = get_local_mwfile(mwfiles_dir, studyid, element["analysis_id"])
 
                     create_raw_data_files(
                         outputdir, tt, downLoadURI, studyid,
@@ -2059,12 +2049,7 @@ def mw2isa_convert(**kwargs):
                     study1.assays.append(this_assay)
                     # print("is it here?", study1.name)
 
-                    downLoadURI = "http://www.metabolomicsworkbench.org/" \
-                                  "data/study_textformat_view.php?STUDY_ID=" +\
-                                  studyid + "&ANALYSIS_ID="
-
-                    downLoadURI = \
-                        downLoadURI + element["analysis_id"] + "&MODE=d"
+                    downLoadURI = get_local_mwfile(mwfiles_dir, studyid, element["analysis_id"])
                     print("invoking create_raw_data_method for NMR data now\n")
                     create_raw_data_files(
                         outputdir, tt, downLoadURI, studyid,
@@ -2285,5 +2270,8 @@ def mw2isa_convert(**kwargs):
         print("Error: in main() method something went wrong")
         print("conversion failed\n")
         conversion_success = False
+    finally:
+        if mwfiles_dir is not None:
+            shutil.rmtree(mwfiles_dir, ignore_errors=True)
 
     return conversion_success, studyid, validate_option
@@ -8,77 +8,250 @@ https://www.ebi.ac.uk/ols4/
 from __future__ import absolute_import
 import json
 import logging
-from urllib.request import urlopen
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
 
 from isatools.model import OntologyAnnotation, OntologySource
 
 
 OLS_API_BASE_URI = "https://www.ebi.ac.uk/ols4/api"
 OLS_PAGINATION_SIZE = 500
+OLS_CACHE_TTL = 7 * 24 * 60 * 60
+OLS_NEGATIVE_CACHE_TTL = 24 * 60 * 60
 
 
 log = logging.getLogger('isatools')
 
 
+def get_default_cache_path():
+    """Returns the path of the default OLS cache: $ISATOOLS_OLS_CACHE, or
+    isatools/ols.sqlite in the user cache directory"""
+    cache_path = os.environ.get('ISATOOLS_OLS_CACHE')
+    if cache_path:
+        return cache_path
+    user_cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(user_cache_dir, 'isatools', 'ols.sqlite')
+
+
+class OLSCache(object):
+    """A persistent SQLite cache of OLS responses, expiring after a time to
+    live. Empty responses, e.g. a term not found, are cached too, for
+    negative_ttl seconds"""
+
+    def __init__(self, path=None, ttl=OLS_CACHE_TTL, negative_ttl=OLS_NEGATIVE_CACHE_TTL):
+        self.path = path or get_default_cache_path()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses '
+            '(key TEXT PRIMARY KEY, value TEXT, empty INTEGER, fetched REAL)')
+
+    def get(self, key):
+        """Returns the cached response for a key, or None if it is not
+        cached or has expired"""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT value, empty, fetched FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, empty, fetched = row
+        if time.time() - fetched >= (self.negative_ttl if empty else self.ttl):
+            return None
+        return json.loads(value)
+
+    def set(self, key, value):
+        """Caches a response, an empty one (None, or an empty list or dict)
+        being cached for negative_ttl seconds only"""
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                (key, json.dumps(value), int(not value), time.time()))
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute('DELETE FROM responses')
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class RateLimiter(object):
+    """Spaces calls to acquire() by at least 1 / rate seconds, across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class OLSClient(object):
+    """Resolves ontologies and terms with OLS, through a pooled HTTP session
+    and an OLSCache"""
+
+    def __init__(self, base_uri=OLS_API_BASE_URI, cache=None, workers=4, rate=10, timeout=60):
+        """
+        :param base_uri: The OLS API URI
+        :param cache: The OLSCache, by default a cache at get_default_cache_path()
+        :param workers: The number of concurrent requests of search_many
+        :param rate: The maximum number of requests per second, 0 for no limit
+        :param timeout: The timeout of the requests, in seconds
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.base_uri = base_uri
+        self.cache = cache if cache is not None else OLSCache()
+        self.workers = workers
+        self.timeout = timeout
+        self.rate_limiter = RateLimiter(rate)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(workers, 1))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _get_json(self, path, params=None, not_found=None):
+        self.rate_limiter.acquire()
+        url = self.base_uri + path
+        log.debug('%s %s' % (url, params or ''))
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        if response.status_code == 404:
+            return not_found
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _to_ontology_source(ontology_source_json):
+        config = ontology_source_json["config"]
+        return OntologySource(
+            name=ontology_source_json["ontologyId"],
+            version=config["version"] if config["version"] else '',
+            description=config["title"] if config["title"] else '',
+            file=ontology_source_json['_links']['self'].get('href', '')
+        )
+
+    def get_ontologies(self):
+        """Returns a list of OntologySource objects according to what's in OLS"""
+        key = 'ontologies'
+        ontologies = self.cache.get(key)
+        if ontologies is None:
+            J = self._get_json('/ontologies', {'size': OLS_PAGINATION_SIZE})
+            ontologies = J["_embedded"]["ontologies"]
+            self.cache.set(key, ontologies)
+        return [self._to_ontology_source(x) for x in ontologies]
+
+    def get_ontology(self, ontology_name):
+        """Returns a single OntologySource object according to what's in OLS,
+        or None if OLS has no such ontology"""
+        key = 'ontology:' + ontology_name
+        ontology = self.cache.get(key)
+        if ontology is None:
+            ontology = self._get_json('/ontologies/' + quote(ontology_name, safe=''), not_found={})
+            self.cache.set(key, ontology)
+        if not ontology or ontology["ontologyId"] != ontology_name:
+            return None
+        return self._to_ontology_source(ontology)
+
+    def search(self, term, ontology_source):
+        """Returns a list of OntologyAnnotation objects according to what's
+        returned by OLS search"""
+        os_search = None
+        if isinstance(ontology_source, str):
+            os_search = ontology_source
+        elif isinstance(ontology_source, OntologySource):
+            os_search = ontology_source.name
+        key = 'search:{0}:{1}'.format(os_search, term)
+        docs = self.cache.get(key)
+        if docs is None:
+            J = self._get_json('/search', {'q': term, 'queryFields': 'label', 'ontology': os_search, 'exact': 'True'})
+            docs = [{'label': x['label'], 'iri': x['iri']} for x in J["response"]["docs"]]
+            self.cache.set(key, docs)
+        return [OntologyAnnotation(
+            term=x["label"],
+            term_accession=x["iri"],
+            term_source=ontology_source if isinstance(ontology_source, OntologySource) else None
+        ) for x in docs]
+
+    def search_many(self, terms, ontology_source):
+        """Searches many terms concurrently, each distinct term once
+
+        :param terms: An iterable of terms
+        :param ontology_source: The OntologySource or ontology name to
+        search the terms in
+        :return: A dict of the lists of OntologyAnnotation objects found, by term
+        """
+        terms = list(dict.fromkeys(terms))
+        if self.workers <= 1 or len(terms) <= 1:
+            return {term: self.search(term, ontology_source) for term in terms}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            results = executor.map(lambda term: self.search(term, ontology_source), terms)
+            return dict(zip(terms, results))
+
+    def close(self):
+        self.session.close()
+        self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """Returns the OLSClient shared by the functions of this module"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OLSClient()
+        return _default_client
+
+
+def set_default_client(client):
+    """Sets the OLSClient shared by the functions of this module, None to use
+    a new default one"""
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+
 def get_ols_ontologies():
     """Returns a list of OntologySource objects according to what's in OLS"""
-    ontologiesUri = OLS_API_BASE_URI + "/ontologies?size=" + str(OLS_PAGINATION_SIZE)
-    log.debug(ontologiesUri)
-    J = json.loads(urlopen(ontologiesUri).read().decode("utf-8"))
-    ontology_sources = []
-    for ontology_source_json in J["_embedded"]["ontologies"]:
-        file = ''
-        if 'href' in ontology_source_json['_links']['self'].keys():
-            file = ontology_source_json['_links']['self']['href']
-        ontology_sources.append(OntologySource(
-            name=ontology_source_json["ontologyId"],
-            version=ontology_source_json["config"]["version"] if ontology_source_json["config"]["version"] else '',
-            description=ontology_source_json["config"]["title"] if ontology_source_json["config"]["title"] else '',
-            file=file
-        ))
-    return ontology_sources
+    return get_default_client().get_ontologies()
 
 
 def get_ols_ontology(ontology_name):
     """Returns a single OntologySource objects according to what's in OLS"""
-    ontologiesUri = OLS_API_BASE_URI + "/ontologies?size=" + str(OLS_PAGINATION_SIZE)
-    log.debug(ontologiesUri)
-    J = json.loads(urlopen(ontologiesUri).read().decode("utf-8"))
-    ontology_sources = []
-    for ontology_source_json in J["_embedded"]["ontologies"]:
-        ontology_sources.append(OntologySource(
-            name=ontology_source_json["ontologyId"],
-            version=ontology_source_json["config"]["version"] if ontology_source_json["config"]["version"] else '',
-            description=ontology_source_json["config"]["title"] if ontology_source_json["config"]["title"] else '',
-            file=ontology_source_json['_links']['self']['href']
-        ))
-    hits = [o for o in ontology_sources if o.name == ontology_name]
-    if len(hits) == 1:
-        return hits[0]
-    return None
+    return get_default_client().get_ontology(ontology_name)
 
 
 def search_ols(term, ontology_source):
     """Returns a list of OntologyAnnotation objects according to what's
     returned by OLS search"""
-    url = OLS_API_BASE_URI + "/search"
-    os_search = None
-    if isinstance(ontology_source, str):
-        os_search = ontology_source
-    elif isinstance(ontology_source, OntologySource):
-        os_search = ontology_source.name
-
-    query = "{0}&queryFields=label&ontology={1}&exact=True".format(term, os_search)
-    url += '?q={}'.format(query)
-    log.debug(url)
-    import requests
-    req = requests.get(url)
-    J = json.loads(req.text)
-    ontology_annotations = []
-    for search_result_json in J["response"]["docs"]:
-        ontology_annotations.append(OntologyAnnotation(
-            term=search_result_json["label"],
-            term_accession=search_result_json["iri"],
-            term_source=ontology_source if isinstance(ontology_source, OntologySource) else None
-        ))
-    return ontology_annotations
+    return get_default_client().search(term, ontology_source)
+
+
+def search_ols_many(terms, ontology_source):
+    """Returns a dict of the lists of OntologyAnnotation objects returned by
+    OLS search for each of the terms, searched concurrently and each
+    distinct term once"""
+    return get_default_client().search_many(terms, ontology_source)
@@ -6,16 +6,53 @@ If you have problems with it, check that it's working at
 https://www.ncbi.nlm.nih.gov/pubmed/
 """
 from __future__ import absolute_import
+import json
 import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from Bio import Entrez, Medline
 
 from isatools.model import Comment, Publication
+from isatools.net.ols import RateLimiter
+
+
+# NCBI E-utilities allow 3 requests per second without an API key
+PUBMED_RATE = 3
+PUBMED_BATCH_SIZE = 200
+PUBMED_NEGATIVE_CACHE_TTL = 24 * 60 * 60
 
 
 log = logging.getLogger('isatools')
 
 
+def _parse_record(pubmed_id, record):
+    response = {}
+    response["pubmedid"] = pubmed_id
+    response["title"] = record.get("TI", "")
+    response["authors"] = record.get("AU", "")
+    response["journal"] = record.get("TA", "")
+    response["year"] = record.get("EDAT", "").split("/")[0]
+    lidstring = record.get("LID", "")
+    if "[doi]" in lidstring:
+        response["doi"] = record.get("LID", "").split(" ")[0]
+    else:
+        response["doi"] = ""
+    if not response["doi"]:
+        aids = record.get("AID", "")
+        for aid in aids:
+            log.debug("AID:" + aid)
+            if "[doi]" in aid:
+                response["doi"] = aid.split(" ")[0]
+                break
+            else:
+                response["doi"] = ""
+    return response
+
+
 def get_pubmed_article(pubmed_id):
     # http://biopython.org/DIST/docs/tutorial/Tutorial.html#htoc126
     response = {}
@@ -23,30 +60,19 @@ def get_pubmed_article(pubmed_id):
     handle = Entrez.efetch(db="pubmed", id=pubmed_id.strip(), rettype="medline", retmode="text")
     records = Medline.parse(handle)
     for record in records:
-        response["pubmedid"] = pubmed_id
-        response["title"] = record.get("TI", "")
-        response["authors"] = record.get("AU", "")
-        response["journal"] = record.get("TA", "")
-        response["year"] = record.get("EDAT", "").split("/")[0]
-        lidstring = record.get("LID", "")
-        if "[doi]" in lidstring:
-            response["doi"] = record.get("LID", "").split(" ")[0]
-        else:
-            response["doi"] = ""
-        if not response["doi"]:
-            aids = record.get("AID", "")
-            for aid in aids:
-                log.debug("AID:" + aid)
-                if "[doi]" in aid:
-                    response["doi"] = aid.split(" ")[0]
-                    break
-                else:
-                    response["doi"] = ""
-
+        response = _parse_record(pubmed_id, record)
         break
     return response
 
 
+def _set_publication(publication, response):
+    publication.doi = response["doi"]
+    publication.author_list = ", ".join(response["authors"])
+    publication.title = response["title"]
+    publication.comments = [Comment(name="Journal",
+                                    value=response["journal"])]
+
+
 def set_pubmed_article(publication):
     """
         Given a Publication object with pubmed_id set to some value, set the
@@ -55,10 +81,151 @@ def set_pubmed_article(publication):
     """
     if isinstance(publication, Publication):
         response = get_pubmed_article(publication.pubmed_id)
-        publication.doi = response["doi"]
-        publication.author_list = ", ".join(response["authors"])
-        publication.title = response["title"]
-        publication.comments = [Comment(name="Journal",
-                                        value=response["journal"])]
+        _set_publication(publication, response)
     else:
         raise TypeError("Can only set PubMed details on a Publication object")
+
+
+def get_default_cache_path():
+    """Returns the path of the default PubMed cache: $ISATOOLS_PUBMED_CACHE,
+    or isatools/pubmed.sqlite in the user cache directory"""
+    cache_path = os.environ.get('ISATOOLS_PUBMED_CACHE')
+    if cache_path:
+        return cache_path
+    user_cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(user_cache_dir, 'isatools', 'pubmed.sqlite')
+
+
+class PubMedCache(object):
+    """A persistent SQLite cache of PubMed articles, by PubMed id. An id
+    PubMed has no article for is cached with an empty article, for
+    negative_ttl seconds, as it may be a transient miss or an article not
+    indexed yet"""
+
+    def __init__(self, path=None, negative_ttl=PUBMED_NEGATIVE_CACHE_TTL):
+        self.path = path or get_default_cache_path()
+        self.negative_ttl = negative_ttl
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS articles (pmid TEXT PRIMARY KEY, article TEXT, fetched REAL)')
+        columns = [row[1] for row in self._connection.execute('PRAGMA table_info(articles)')]
+        if 'fetched' not in columns:
+            # a cache written without fetch times: its empty articles are expired
+            self._connection.execute('ALTER TABLE articles ADD COLUMN fetched REAL DEFAULT 0')
+
+    def get_many(self, pubmed_ids):
+        """Returns the cached articles of the PubMed ids, as a dict by id,
+        leaving out the empty articles cached more than negative_ttl
+        seconds ago"""
+        rows = []
+        pubmed_ids = list(pubmed_ids)
+        with self._lock:
+            # SQLite limits the number of parameters of a query
+            for i in range(0, len(pubmed_ids), 500):
+                chunk = pubmed_ids[i:i + 500]
+                rows.extend(self._connection.execute(
+                    'SELECT pmid, article, fetched FROM articles WHERE pmid IN (%s)' % ','.join('?' * len(chunk)),
+                    chunk))
+        now = time.time()
+        articles = {}
+        for pmid, article, fetched in rows:
+            article = json.loads(article)
+            if article or now - fetched < self.negative_ttl:
+                articles[pmid] = article
+        return articles
+
+    def set_many(self, articles):
+        """Caches articles, given as a dict by PubMed id"""
+        with self._lock:
+            self._connection.execute('BEGIN')
+            fetched = time.time()
+            self._connection.executemany('INSERT OR REPLACE INTO articles VALUES (?, ?, ?)',
+                                         [(pmid, json.dumps(article), fetched) for pmid, article in articles.items()])
+            self._connection.execute('COMMIT')
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Returns the PubMedCache shared by get_pubmed_articles"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PubMedCache()
+        return _default_cache
+
+
+def _fetch_batch(pubmed_ids, rate_limiter):
+    rate_limiter.acquire()
+    log.debug("Fetching %s PubMed articles" % len(pubmed_ids))
+    handle = Entrez.efetch(db="pubmed", id=",".join(pubmed_ids), rettype="medline", retmode="text")
+    try:
+        articles = {pubmed_id: {} for pubmed_id in pubmed_ids}
+        for record in Medline.parse(handle):
+            pubmed_id = record.get("PMID", "")
+            if pubmed_id in articles:
+                articles[pubmed_id] = _parse_record(pubmed_id, record)
+        return articles
+    finally:
+        handle.close()
+
+
+def get_pubmed_articles(pubmed_ids, cache=None, batch_size=PUBMED_BATCH_SIZE, workers=2, rate=PUBMED_RATE):
+    """
+        Get the articles of many PubMed ids, each distinct id once. The ids
+        not cached yet are fetched in batches of batch_size ids per efetch
+        request, workers requests at a time and at most rate requests per
+        second, and cached
+
+        :param pubmed_ids: An iterable of PubMed ids
+        :param cache: The PubMedCache, by default get_default_cache()
+        :param batch_size: The number of ids fetched per request
+        :param workers: The number of concurrent requests
+        :param rate: The maximum number of requests per second
+        :return: A dict of the articles, as returned by get_pubmed_article,
+        by PubMed id. The article of an id PubMed does not know is empty
+    """
+    cache = cache if cache is not None else get_default_cache()
+    pubmed_ids = list(dict.fromkeys(pubmed_id.strip() for pubmed_id in pubmed_ids))
+    articles = cache.get_many(pubmed_ids)
+    missing = [pubmed_id for pubmed_id in pubmed_ids if pubmed_id not in articles]
+    if missing:
+        Entrez.email = "isatools@googlegroups.com"
+        rate_limiter = RateLimiter(rate)
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(batches)))) as executor:
+            for fetched in executor.map(lambda batch: _fetch_batch(batch, rate_limiter), batches):
+                cache.set_many(fetched)
+                articles.update(fetched)
+    return {pubmed_id: articles[pubmed_id] for pubmed_id in pubmed_ids}
+
+
+def set_pubmed_articles(publications, **kwargs):
+    """
+        Given Publication objects with pubmed_id set, set the rest of their
+        values from PubMed, fetching the articles with get_pubmed_articles.
+        Publications PubMed has no article for are left unchanged
+
+        :param publications: An iterable of Publication objects
+        :param kwargs: The options of get_pubmed_articles
+    """
+    publications = list(publications)
+    for publication in publications:
+        if not isinstance(publication, Publication):
+            raise TypeError("Can only set PubMed details on a Publication object")
+    articles = get_pubmed_articles([publication.pubmed_id for publication in publications], **kwargs)
+    for publication in publications:
+        response = articles[publication.pubmed_id.strip()]
+        if response:
+            _set_publication(publication, response)
+        else:
+            log.warning("No PubMed article found for %s" % publication.pubmed_id)
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 """Storage Adapter for accessing ISA content in Github"""
 import base64
+import hashlib
 import json
 import logging
 import os
 import pathlib
+import shutil
+import tempfile
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from io import BytesIO, StringIO
 from urllib.parse import urljoin
 from zipfile import ZipFile
@@ -13,6 +18,8 @@ from zipfile import ZipFile
 import requests
 from jsonschema import Draft4Validator, RefResolver
 from lxml import etree
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
 
 
 log = logging.getLogger('isatools')
@@ -30,6 +37,22 @@ GITHUB_API_BASE_URL = 'https://api.github.com'
 GITHUB_RAW_MEDIA_TYPE = 'application/vnd.github.VERSION.raw'
 REPOS = 'repos'
 CONTENTS = 'contents'
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+@lru_cache(maxsize=None)
+def _get_xml_schema(xml_schema_file):
+    with open(xml_schema_file, 'rb') as schema_file:
+        schema_root = etree.XML(schema_file.read())
+    return etree.XMLSchema(schema_root)
+
+
+@lru_cache(maxsize=None)
+def _get_json_validator(schema_src):
+    with open(schema_src) as schema_file:
+        schema = json.load(schema_file)
+    resolver = RefResolver(pathlib.Path(os.path.abspath(schema_src)).as_uri(), schema)
+    return Draft4Validator(schema, resolver=resolver)
 
 
 def validate_xml_against_schema(xml_str, xml_schema_file):
@@ -38,9 +61,7 @@ def validate_xml_against_schema(xml_str, xml_schema_file):
     :param xml_str str
     :param xml_schema_file str - valid file path to the XSD file
     """
-    with open(xml_schema_file, 'rb') as schema_file:
-        schema_root = etree.XML(schema_file.read())
-    schema = etree.XMLSchema(schema_root)
+    schema = _get_xml_schema(xml_schema_file)
     xml = etree.fromstring(xml_str)
     if not schema.validate(xml):
         raise etree.DocumentInvalid(
@@ -55,11 +76,58 @@ def validate_json_against_schema(json_dict, schema_src):
     :param json_dict dict
     :param schema_src str - file path to the JSON schema file
     """
-    with open(schema_src) as schema_file:
-        schema = json.load(schema_file)
-    resolver = RefResolver(pathlib.Path(os.path.abspath(schema_src)).as_uri(), schema)
-    validator = Draft4Validator(schema, resolver=resolver)
-    return validator.validate(json_dict, schema)
+    return _get_json_validator(schema_src).validate(json_dict)
+
+
+class ETagCache(object):
+    """
+    A local cache of HTTP responses, revalidated with conditional requests:
+    a cached response is sent again with its ETag in If-None-Match, and
+    reused if the server answers 304 Not Modified
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, params):
+        key = hashlib.sha256(json.dumps([url, sorted((params or {}).items())]).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, url, params=None):
+        """
+        Get the cached ETag and headers of a response and the path of its
+        body, or None if it is not cached
+        """
+        path = self._path(url, params)
+        try:
+            with open(path + '.json') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+        if not os.path.isfile(path + '.body'):
+            return None
+        return meta['etag'], meta['headers'], path + '.body'
+
+    def _write(self, path, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, 'wb') as tmp_file:
+            write(tmp_file)
+        os.replace(tmp_path, path)
+
+    def set(self, url, params, etag, headers, content=None, body_file=None):
+        """
+        Cache a response, with its body given as content or as the path of
+        a file to copy
+        """
+        path = self._path(url, params)
+        if body_file is not None:
+            with open(body_file, 'rb') as source:
+                self._write(path + '.body', lambda out: shutil.copyfileobj(source, out))
+        else:
+            self._write(path + '.body', lambda out: out.write(content))
+        meta = json.dumps({'etag': etag, 'headers': dict(headers)}).encode('utf-8')
+        self._write(path + '.json', lambda out: out.write(meta))
 
 
 class IsaStorageAdapter(metaclass=ABCMeta):
@@ -89,7 +157,8 @@ class IsaGitHubStorageAdapter(IsaStorageAdapter):
 
     AUTH_ENDPOINT = urljoin(GITHUB_API_BASE_URL, 'authorizations')
 
-    def __init__(self, username=None, password=None, note=None, scopes=('gist', 'repo')):
+    def __init__(self, username=None, password=None, note=None, scopes=('gist', 'repo'), workers=4, cache_dir=None,
+                 api_url=GITHUB_API_BASE_URL):
         """
         Constructor for IsaGitHubStorageAdapter.
         Initialize an ISA Storage Adapter to perform CRUD operations on a
@@ -112,15 +181,28 @@ class IsaGitHubStorageAdapter(IsaStorageAdapter):
         :param scopes tuple - a tuple containing the scopes
         (see https://developer.github.com/v3/oauth/#scopes)
         for the current authorization (if username and password are provided.
+        :param workers int - the number of files of a directory downloaded
+        concurrently, over a pool of as many connections
+        :param cache_dir str - an (optional) directory to cache the
+        downloaded files in, revalidated by their ETag on later requests
+        :param api_url str - the GitHub API URL
         """
         self._authorization = {}
+        self.workers = workers
+        self.api_url = api_url
+        self.auth_endpoint = urljoin(api_url, 'authorizations')
+        self.etag_cache = ETagCache(cache_dir) if cache_dir else None
+        self._session = requests.Session()
+        http_adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(workers, 1))
+        self._session.mount('http://', http_adapter)
+        self._session.mount('https://', http_adapter)
         if username and password:
             self._username = username
             self._password = password
             payload = {"scopes": list(scopes), "note": note or "Authorization to access the ISA data sets"}
             headers = {"content-type": "application/json", "accept": "application/json"}
             # retrieve all the existing authorizations for user
-            res = requests.get(self.AUTH_ENDPOINT, headers=headers, auth=(self._username, self._password))
+            res = self._session.get(self.auth_endpoint, headers=headers, auth=(self._username, self._password))
             if res.status_code == requests.codes.ok:
                 auths = json.loads(res.text)
 
@@ -132,10 +214,10 @@ class IsaGitHubStorageAdapter(IsaStorageAdapter):
 
                 # if the required authorization already exists, delete it
                 if len(auths) > 0:
-                    requests.delete(auths[0]['url'], headers=headers, auth=(username, password))
+                    self._session.delete(auths[0]['url'], headers=headers, auth=(username, password))
 
                 # require a new authorization
-                res = requests.post(self.AUTH_ENDPOINT, json=payload, headers=headers, auth=(username, password))
+                res = self._session.post(self.auth_endpoint, json=payload, headers=headers, auth=(username, password))
 
                 if res.status_code == requests.codes.created:
                     self._authorization = json.loads(res.text or res.content)
@@ -171,9 +253,11 @@ class IsaGitHubStorageAdapter(IsaStorageAdapter):
         """
         if self.is_authenticated:
             headers = {'accept': 'application/json'}
-            r = requests.delete(self.authorization_uri, headers=headers, auth=(self._username, self._password))
+            r = self._session.delete(self.authorization_uri, headers=headers, auth=(self._username, self._password))
             log.debug(r)
+            self._session.close()
             return r.raise_for_status()
+        self._session.close()
 
     def download(self, source, destination='isa-target', owner='ISA-tools', repository='isa-api', validate_json=False):
         """
@@ -190,7 +274,7 @@ class IsaGitHubStorageAdapter(IsaStorageAdapter):
         # get the content at source as raw data
         get_content_frag = '/'.join([REPOS, owner, repository, CONTENTS, source])
         headers = {'Authorization': 'token %s' % self.token, 'Accept': GITHUB_RAW_MEDIA_TYPE}
-        res = requests.get(urljoin(GITHUB_API_BASE_URL, get_content_frag), headers=headers)
+        res = self._get(urljoin(self.api_url, get_content_frag), headers=headers)
 
         if res.status_code == requests.codes.ok:
 
@@ -218,9 +302,7 @@ class IsaGitHubStorageAdapter(IsaStorageAdapter):
             except ValueError:
                 # try to parse the response payload as XML
                 try:
-                    with open(CONFIGURATION_SCHEMA_FILE, 'rb') as schema_file:
-                        schema_root = etree.XML(schema_file.read())
-                    xml_parser = etree.XMLParser(schema=etree.XMLSchema(schema_root))
+                    xml_parser = etree.XMLParser(schema=_get_xml_schema(CONFIGURATION_SCHEMA_FILE))
                     etree.fromstring(res.text, xml_parser)
                     os.makedirs(destination, exist_ok=True)
                     with open(os.path.join(destination, source.split('/')[-1]), 'w+') as out_file:
@@ -282,8 +364,7 @@ class IsaGitHubStorageAdapter(IsaStorageAdapter):
             'ref': ref
         }
 
-        r = requests.get(urljoin(GITHUB_API_BASE_URL, get_content_frag),
-                         headers=headers, params=req_payload)
+        r = self._get(urljoin(self.api_url, get_content_frag), headers=headers, params=req_payload)
 
         if r.status_code == requests.codes.ok:
             res_payload = json.loads(r.text)
@@ -336,29 +417,85 @@ class IsaGitHubStorageAdapter(IsaStorageAdapter):
     def delete(self):
         pass
 
+    def _get(self, url, headers=None, params=None):
+        """
+        GET a URL through the session, as a conditional request if the
+        response is in the ETag cache
+        """
+        cached = self.etag_cache.get(url, params) if self.etag_cache else None
+        request_headers = dict(headers or {}, **{'If-None-Match': cached[0]}) if cached else headers
+        r = self._session.get(url, headers=request_headers, params=params)
+        if not cached or r.status_code != requests.codes.not_modified:
+            # a first download or a changed resource: refresh the cached ETag and body
+            if self.etag_cache and r.status_code == requests.codes.ok and 'ETag' in r.headers:
+                self.etag_cache.set(url, params, r.headers['ETag'], r.headers, content=r.content)
+            return r
+        etag, cached_headers, body_path = cached
+        log.debug("Using cached %s" % url)
+        response = requests.Response()
+        response.status_code = requests.codes.ok
+        response.url = url
+        response.headers = CaseInsensitiveDict(cached_headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        with open(body_path, 'rb') as body_file:
+            response._content = body_file.read()
+        return response
+
+    def _download_file(self, url, headers, file_path):
+        """
+        Download a plain text file to disk, in chunks, and its ETag in the
+        cache if any. Returns False if the file is not a plain text file
+        """
+        cached = self.etag_cache.get(url) if self.etag_cache else None
+        request_headers = dict(headers, **{'If-None-Match': cached[0]}) if cached else headers
+        with self._session.get(url, headers=request_headers, stream=True) as res:
+            if cached and res.status_code == requests.codes.not_modified:
+                content_type = CaseInsensitiveDict(cached[1]).get('Content-Type', '')
+                if content_type.split(";")[0] != 'text/plain':
+                    return False
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                shutil.copyfile(cached[2], file_path)
+                return True
+            # if request went fine and the payload is a regular (ISA) text file write it to file
+            content_type = res.headers.get('Content-Type', '').split(";")[0]
+            if res.status_code != requests.codes.ok or content_type != 'text/plain':
+                return False
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, 'wb') as out_file:
+                for chunk in res.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    out_file.write(chunk)
+            if self.etag_cache and 'ETag' in res.headers:
+                self.etag_cache.set(url, None, res.headers['ETag'], res.headers, body_file=file_path)
+        return True
+
     def _download_dir(self, directory, destination, dir_items, write_to_directory=None):
         """
-        Retrieves the full content of a directory
+        Retrieves the full content of a directory, downloading its files
+        concurrently
         """
         headers = {'Authorization': 'token %s' % self.token} if self.token else {}
         # filter the items to keep only files
         files = [item for item in dir_items if item['type'] == 'file']
         buf = BytesIO()
-
-        with ZipFile(buf, 'w') as zip_file:
-            for file in files:
-                file_name = file["name"]
-                res = requests.get(file['download_url'], headers=headers)
-                # if request went fine and the payload is a regular (ISA) text file write it to file
-                if res.status_code == requests.codes.ok and res.headers['Content-Type'].split(";")[0] == 'text/plain':
-                    # zip the text payload
-                    zip_file.writestr(os.path.join(directory, file["name"]), res.text)
-                    # write to a target dir
-                    if write_to_directory:
-                        dir_path = os.path.join(destination, directory)
-                        os.makedirs(dir_path, exist_ok=True)
-                        with open(os.path.join(dir_path, file_name), 'w+') as out_file:
-                            out_file.write(res.text)
+        tmp_dir = tempfile.mkdtemp()
+        dir_path = os.path.join(destination, directory) if write_to_directory else tmp_dir
+
+        def download(file):
+            file_path = os.path.join(dir_path, file['name'])
+            if self._download_file(file['download_url'], headers, file_path):
+                return file_path
+            return None
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(self.workers, 1)) as executor:
+                file_paths = list(executor.map(download, files))
+            with ZipFile(buf, 'w') as zip_file:
+                for file, file_path in zip(files, file_paths):
+                    if file_path is not None:
+                        # zip the text payload
+                        zip_file.write(file_path, os.path.join(directory, file["name"]))
+        finally:
+            shutil.rmtree(tmp_dir)
 
         buf.seek(0)
         return buf
@@ -406,7 +543,7 @@ class IsaGitHubStorageAdapter(IsaStorageAdapter):
         Retrieve the raw file for further processing
         """
         headers = {'Authorization': 'token %s' % self.token} if self.token else {}
-        r = requests.get(file_uri, headers=headers)
+        r = self._get(file_uri, headers=headers)
         if r.status_code == requests.codes.ok:
             content_type = r.headers['content-type'].split(';')[0]
 
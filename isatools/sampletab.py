@@ -5,6 +5,7 @@ Functions for reading and writing SampleTab. SampleTab content is loaded into
 an in-memory representation using the ISA Data Model implemented in the
 isatools.model package.
 """
+import csv
 import io
 import logging
 from io import StringIO
@@ -95,7 +96,7 @@ def read_sampletab_msi(fp):
                          encoding='utf-8').dropna(axis=1, how='all')
         # load MSI section
         df = df.T  # transpose MSI section
-        df = df.map(lambda x: np.nan if x == '' else x)
+        df = df.replace('', np.nan)
         # Strip out the nan entries
         df.reset_index(inplace=True)
         # Reset index so it is accessible as column
@@ -210,7 +211,7 @@ def load(FP):
 
     for _, row in msi_df[["Term Source Name", "Term Source URI",
                           "Term Source Version"]]\
-            .map(lambda x: np.nan if x == '' else x).dropna(axis=0, how='all').iterrows():
+            .replace('', np.nan).dropna(axis=0, how='all').iterrows():
         version = ''
         try:
             if not isnan(row["Term Source Version"]):
@@ -243,7 +244,7 @@ def load(FP):
     try:
         for _, row in (msi_df[["Person Last Name", "Person First Name",
                               "Person Initials", "Person Email",
-                              "Person Role"]].map(lambda x: np.nan if x == '' else x).
+                              "Person Role"]].replace('', np.nan).
                 dropna(axis=0, how='all').iterrows()):
             person = Person(last_name=row['Person Last Name'],
                             first_name=row['Person First Name'],
@@ -258,7 +259,7 @@ def load(FP):
     for i, row in msi_df[
         ["Organization Name", "Organization Address", "Organization URI",
          "Organization Email",
-         "Organization Role"]].map(lambda x: np.nan if x == '' else x).dropna(
+         "Organization Role"]].replace('', np.nan).dropna(
             axis=0, how='all').iterrows():
         ISA.comments.extend([
             Comment(name="Organization Name.{}".format(i),
@@ -328,9 +329,20 @@ class GenericSampleTabProcessSequenceFactory:
         self.ontology_sources = ontology_sources
         self.factors = study_factors
 
+    def _get_factor(self, name):
+        factor_hits = [f for f in self.factors if f.name == name]
+        if len(factor_hits) == 1:
+            return factor_hits[0]
+        raise ValueError("Could not resolve Study Factor from {}".format(name))
+
     def create_from_df(self, DF):
         """Create the process sequences from the table DataFrame
 
+        The table is processed column group by column group rather than row
+        by row: the values of each column are read once for all the samples,
+        and the OntologyAnnotation values and units are shared between the
+        samples that have the same annotation.
+
         :param DF: Table DataFrame
         :return: List of Processes coressponding to the process sequences. The
         Processes are linked appropriately to all other ISA content objects,
@@ -370,134 +382,89 @@ class GenericSampleTabProcessSequenceFactory:
         except KeyError:
             pass
 
-        for sample_key in samples.keys():
-            sample = samples[sample_key]
-
-            row = DF[DF["Sample Accession"] == sample_key].iloc[0]
-            # there should only be one row with accession
-            sample.name = row["Sample Name"]
-
-            if row["Sample Accession"] != "":
-
-                try:
-                    category = characteristic_categories["Sample Accession"]
-                except KeyError:
-                    category = OntologyAnnotation(term="Sample Accession")
-                    characteristic_categories["Sample Accession"] = category
-                sample.characteristics.append(Characteristic(
-                    category=category, value=row["Sample Accession"]))
-
-            if row["Sample Description"] != "":
-                try:
-                    category = characteristic_categories["Sample Description"]
-                except KeyError:
-                    category = OntologyAnnotation(term="Sample Description")
-                    characteristic_categories["Sample Description"] = category
-                sample.characteristics.append(Characteristic(
-                    category=category, value=row["Sample Description"]))
-
-            if row["Derived From"] != "":
-                try:
-                    category = characteristic_categories["Derived From"]
-                except KeyError:
-                    category = OntologyAnnotation(term="Derived From")
-                    characteristic_categories["Derived From"] = category
-                sample.characteristics.append(Characteristic(
-                    category=category, value=row["Derived From"]))
-
-            try:
-                if row["Child Of"] != "":
-                    try:
-                        category = characteristic_categories["Child Of"]
-                    except KeyError:
-                        category = OntologyAnnotation(term="Child Of")
-                        characteristic_categories["Child Of"] = category
-                    sample.characteristics.append(Characteristic(
-                        category=category, value=row["Child Of"]))
-            except KeyError:
-                pass  # skip if Child Of is not present in sample table
-
-            if row["Group Name"] != "":
-                if isinstance(sample, Sample):
-                    factor_hits = [f for f in self.factors
-                                   if f.name == "Group Name"]
-                    if len(factor_hits) == 1:
-                        factor = factor_hits[0]
-                    else:
-                        raise ValueError("Could not resolve Study Factor from "
-                                         "Group Name")
-                    fv = FactorValue(factor_name=factor)
-                    v = row["Group Name"]
-                    fv.value = v
-                    sample.factor_values.append(fv)
-                else:
-                    category_key = "Group Name"
-                    try:
-                        category = characteristic_categories[category_key]
-                    except KeyError:
-                        category = OntologyAnnotation(term=category_key)
-                        characteristic_categories[category_key] = category
-                    characteristic = Characteristic(category=category)
-                    v = row["Group Name"]
-                    characteristic.value = v
-
-            if row["Group Accession"] != "":
-                if isinstance(sample, Sample):
-                    factor_hits = [f for f in self.factors
-                                   if f.name == "Group Accession"]
-                    if len(factor_hits) == 1:
-                        factor = factor_hits[0]
-                    else:
-                        raise ValueError("Could not resolve Study Factor "
-                                         "from Group Accession")
+        # the first row of each sample, in the order of the samples
+        rows = DF.drop_duplicates(subset="Sample Accession")
+        rows.index = rows["Sample Accession"].tolist()
+        rows = rows.loc[list(samples)]
+        sample_list = list(samples.values())
+        is_sample = [isinstance(sample, Sample) for sample in sample_list]
+
+        # Child Of is the only optional column
+        simple_columns = [(name, rows[name].tolist() if name in rows.columns else None) for name in (
+            "Sample Accession", "Sample Description", "Derived From", "Child Of")]
+        group_columns = [(name, rows[name].tolist()) for name in (
+            "Group Name", "Group Accession")]
+        characteristic_columns = [
+            (col, col[15:col.rfind("]")]) for col in DF.columns
+            if col.startswith("Characteristic[")]
+
+        # categories are registered in the order the samples first use them
+        first_uses = []
+        for position, (name, values) in enumerate(simple_columns):
+            if values is not None:
+                first_uses.append((next((i for i, value in enumerate(values) if value != ""), None), position, name))
+        for position, (name, values) in enumerate(group_columns):
+            first_uses.append((next((i for i, (value, sample_row) in enumerate(zip(values, is_sample))
+                                     if value != "" and not sample_row), None), 4 + position, name))
+        if sample_list:
+            first_uses.extend((0, 6 + position, category_key)
+                              for position, (_, category_key) in enumerate(characteristic_columns))
+        for _, _, category_key in sorted(
+                (use for use in first_uses if use[0] is not None), key=lambda use: use[:2]):
+            if category_key not in characteristic_categories:
+                characteristic_categories[category_key] = OntologyAnnotation(term=category_key)
+
+        for sample, name in zip(sample_list, rows["Sample Name"].tolist()):
+            sample.name = name
+
+        for (name, values) in simple_columns:
+            if values is None:
+                continue
+            category = characteristic_categories.get(name)
+            for sample, value in zip(sample_list, values):
+                if value != "":
+                    sample.characteristics.append(Characteristic(category=category, value=value))
+
+        for (name, values) in group_columns:
+            factor = None
+            for sample, value, sample_row in zip(sample_list, values, is_sample):
+                if value != "" and sample_row:
+                    if factor is None:
+                        factor = self._get_factor(name)
                     fv = FactorValue(factor_name=factor)
-                    v = row["Group Accession"]
-                    fv.value = v
+                    fv.value = value
                     sample.factor_values.append(fv)
-                else:
-                    category_key = "Group Accession"
-                    try:
-                        category = characteristic_categories[category_key]
-                    except KeyError:
-                        category = OntologyAnnotation(term=category_key)
-                        characteristic_categories[category_key] = category
-                    characteristic = Characteristic(category=category)
-                    v = row["Group Accession"]
-                    characteristic.value = v
-
-            for col in [x for x in DF.columns if x.startswith(
-                    "Characteristic[")]:  # build object map
-                category_key = col[15:col.rfind("]")]
-                try:
-                    category = characteristic_categories[category_key]
-                except KeyError:
-                    category = OntologyAnnotation(term=category_key)
-                    characteristic_categories[category_key] = category
-
-                characteristic = Characteristic(category=category)
-
-                v, u = get_value(col, DF.columns, row,
-                                 ontology_source_map, unit_categories)
-
-                characteristic.value = v
-                characteristic.unit = u
 
-                sample.characteristics.append(characteristic)
-
-            sample_accession = row["Derived From"]
-
-            try:
-                source = samples[sample_accession]
+        values_and_units = [
+            self._get_column_values(DF.columns, col, rows, ontology_source_map)
+            for col, _ in characteristic_columns]
+        # units are registered in the order the samples first use them
+        first_units = []
+        for position, (_, units) in enumerate(values_and_units):
+            if units is not None:
+                for key, i in {key: i for i, key in reversed(list(enumerate(units.keys)))}.items():
+                    first_units.append((i, position, key, units))
+        for i, _, key, units in sorted(first_units, key=lambda unit: unit[:2]):
+            if key not in unit_categories:
+                unit_categories[key] = units.create(i, ontology_source_map)
+        for (col, category_key), (values, units) in zip(characteristic_columns, values_and_units):
+            category = characteristic_categories[category_key]
+            unit_values = [unit_categories[key] for key in units.keys] if units is not None \
+                else [None] * len(sample_list)
+            for sample, value, unit in zip(sample_list, values, unit_values):
+                sample.characteristics.append(Characteristic(category=category, value=value, unit=unit))
+
+        for sample, sample_accession in zip(sample_list, simple_columns[2][1]):
+            source = samples.get(sample_accession)
+            if source is not None:
                 sample.derives_from.append(source)
-            except KeyError:
-                pass
 
         sample_collection_protocol = "sample collection"
+        process_nodes = {}
 
-        for _, row in DF[["Sample Accession", "Derived From"]].iterrows():
-            sample_accession = row["Sample Accession"]
+        for sample_accession, derived_from_accession in zip(
+                DF["Sample Accession"].tolist(), DF["Derived From"].tolist()):
             sample = samples[sample_accession]
-            derived_from_accession = row["Derived From"]
             if derived_from_accession == "":
                 continue
             derived_from_sample = samples[derived_from_accession]
@@ -506,12 +473,16 @@ class GenericSampleTabProcessSequenceFactory:
                                     sample_collection_protocol])
             try:
                 process = processes[process_key]
+                inputs, outputs = process_nodes[process_key]
             except KeyError:
                 process = Process(executes_protocol=sample_collection_protocol)
                 processes[process_key] = process
-            if derived_from_sample not in process.inputs:
+                inputs, outputs = process_nodes[process_key] = set(), set()
+            if id(derived_from_sample) not in inputs:
+                inputs.add(id(derived_from_sample))
                 process.inputs.append(derived_from_sample)
-            if sample not in process.outputs:
+            if id(sample) not in outputs:
+                outputs.add(id(sample))
                 process.outputs.append(sample)
 
         sources = dict([x for x in samples.items()
@@ -521,6 +492,80 @@ class GenericSampleTabProcessSequenceFactory:
         return sources, study_samples, processes, characteristic_categories, \
             unit_categories
 
+    @staticmethod
+    def _get_column_values(columns, object_column, rows, ontology_source_map):
+        """Gets the values of a column group for all the rows, as get_value()
+        does for a single row
+
+        :return: The list of values and a _UnitColumns, or None if the column
+        has no unit
+        """
+        values = rows[object_column].tolist()
+        column_group = list(columns)
+        column_index = column_group.index(object_column)
+        qualifiers = column_group[column_index + 1:column_index + 4]
+        if len(qualifiers) < 2:
+            return values, None
+
+        if qualifiers[0].startswith('Term Source REF') \
+                and qualifiers[1].startswith('Term Source ID'):
+            term_sources = rows[qualifiers[0]].tolist()
+            term_accessions = rows[qualifiers[1]].tolist()
+            annotations = {}
+            ontology_values = []
+            for value, term_source_value, term_accession_value in zip(values, term_sources, term_accessions):
+                key = (str(value), term_source_value, str(term_accession_value))
+                annotation = annotations.get(key)
+                if annotation is None:
+                    annotation = annotations[key] = _create_annotation(
+                        key[0], term_source_value, key[2], ontology_source_map)
+                ontology_values.append(annotation)
+            return ontology_values, None
+
+        if len(qualifiers) == 3 and qualifiers[0].startswith('Unit') \
+                and qualifiers[1].startswith('Term Source REF') \
+                and qualifiers[2].startswith('Term Source ID'):
+            return values, _UnitColumns(*(rows[qualifier].tolist() for qualifier in qualifiers))
+
+        return values, None
+
+
+class _UnitColumns(object):
+    """The Unit, Term Source REF and Term Source ID columns qualifying the
+    values of a column"""
+
+    def __init__(self, keys, term_sources, term_accessions):
+        self.keys = keys
+        self.term_sources = term_sources
+        self.term_accessions = term_accessions
+
+    def create(self, i, ontology_source_map):
+        """Creates the unit of the i-th row"""
+        unit_term_value = OntologyAnnotation(term=self.keys[i])
+        unit_term_source_value = self.term_sources[i]
+        if unit_term_source_value != '':
+            try:
+                unit_term_value.term_source = \
+                    ontology_source_map[unit_term_source_value]
+            except KeyError:
+                log.warning('term source: {} not found'.format(unit_term_source_value))
+        term_accession_value = self.term_accessions[i]
+        if term_accession_value != '':
+            unit_term_value.term_accession = term_accession_value
+        return unit_term_value
+
+
+def _create_annotation(term, term_source_value, term_accession_value, ontology_source_map):
+    value = OntologyAnnotation(term=term)
+    if term_source_value != '':
+        try:
+            value.term_source = ontology_source_map[term_source_value]
+        except KeyError:
+            log.warning('term source: {} not found'.format(term_source_value))
+    if term_accession_value != '':
+        value.term_accession = term_accession_value
+    return value
+
 
 def dumps(investigation):
     """Dumps out an ISA Investigation to a SampleTab string
@@ -636,7 +681,7 @@ def dumps(investigation):
     msi_DF = pd.concat(
         [metadata_DF, org_DF, people_DF, term_sources_DF], axis=1)
     msi_DF = msi_DF.set_index("Submission Title").T
-    msi_DF = msi_DF.map(lambda x: np.nan if x == '' else x)
+    msi_DF = msi_DF.replace('', np.nan)
     msi_memf = StringIO()
     msi_DF.to_csv(
         path_or_buf=msi_memf,
@@ -646,16 +691,12 @@ def dumps(investigation):
         index_label="Submission Title")
     msi_memf.seek(0)
 
-    scd_DF = pd.DataFrame(columns=(
-        "Sample Name", "Sample Accession", "Sample Description",
-        "Derived From", "Group Name", "Group Accession"))
-
     all_samples = []
     for study in investigation.studies:
         all_samples += study.sources
         all_samples += study.samples
 
-    all_samples = list(set(all_samples))
+    all_samples = _unique_materials(all_samples)
     if isa_logging.show_pbars:
         pbar = ProgressBar(min_value=0, max_value=len(all_samples),
                            widgets=['Writing {} samples: '.format(
@@ -663,69 +704,66 @@ def dumps(investigation):
             Bar(left=" |", right="| "), ETA()]).start()
     else:
         def pbar(x): return x
-    for i, s in pbar(enumerate(all_samples)):
+
+    # the SCD columns, in the order they are first written to
+    scd_columns = dict.fromkeys((
+        "Sample Name", "Sample Accession", "Sample Description",
+        "Derived From", "Group Name", "Group Accession"))
+    scd_rows = []
+    accessions = {}
+
+    def get_accession(material):
+        # the Sample Accession of a material, looked up once per material
+        try:
+            return accessions[id(material)]
+        except KeyError:
+            hits = [x for x in material.characteristics
+                    if x.category.term == "Sample Accession"]
+            accession = hits[0].value if len(hits) == 1 else None
+            accessions[id(material)] = accession
+            return accession
+
+    def get_single(hits):
+        return hits[0].value if hits is not None and len(hits) == 1 else ""
+
+    for s in pbar(all_samples):
+        characteristics_by_term = {}
+        for characteristic in s.characteristics:
+            characteristics_by_term.setdefault(
+                characteristic.category.term, []).append(characteristic)
+
         derived_from = ""
         if isinstance(s, Sample) and s.derives_from is not None:
             if len(s.derives_from) == 1:
                 derived_from_obj = s.derives_from[0]
-                derives_from_accession_hits = [
-                    x for x in derived_from_obj.characteristics
-                    if x.category.term == "Sample Accession"]
-                if len(derives_from_accession_hits) == 1:
-                    derived_from = derives_from_accession_hits[0].value
-                else:
+                derived_from = get_accession(derived_from_obj)
+                if derived_from is None:
                     log.warning(
                         "WARNING! No Sample Accession available so "
                         "referencing Derived From relation using "
                         "Sample Name \"{}\" instead".format(
                             derived_from_obj.name))
                     derived_from = derived_from_obj.name
-        sample_accession_hits = [x for x in s.characteristics
-                                 if x.category.term == "Sample Accession"]
-        if len(sample_accession_hits) == 1:
-            sample_accession = sample_accession_hits[0].value
-        else:
-            sample_accession = ""
-        sample_description_hits = [x for x in s.characteristics
-                                   if x.category.term == "Sample Description"]
-        if len(sample_description_hits) == 1:
-            sample_description = sample_description_hits[0].value
-        else:
-            sample_description = ""
 
         if isinstance(s, Sample):
-            group_name_hits = [x for x in s.factor_values
-                               if x.factor_name.name == "Group Name"]
-            if len(group_name_hits) == 1:
-                group_name = group_name_hits[0].value
-            else:
-                group_name = ""
-            group_accession_hits = [x for x in s.factor_values
-                                    if x.factor_name.name == "Group Accession"]
-            if len(group_accession_hits) == 1:
-                group_accession = group_accession_hits[0].value
-            else:
-                group_accession = ""
+            factor_values_by_name = {}
+            for factor_value in s.factor_values:
+                factor_values_by_name.setdefault(
+                    factor_value.factor_name.name, []).append(factor_value)
+            group_name = get_single(factor_values_by_name.get("Group Name"))
+            group_accession = get_single(factor_values_by_name.get("Group Accession"))
         else:
-            group_name_hits = [x for x in s.characteristics
-                               if x.category.term == "Group Name"]
-            if len(group_name_hits) == 1:
-                group_name = group_name_hits[0].value
-            else:
-                group_name = ""
-            group_accession_hits = [x for x in s.characteristics
-                                    if x.category.term == "Group Accession"]
-            if len(group_accession_hits) == 1:
-                group_accession = group_accession_hits[0].value
-            else:
-                group_accession = ""
-
-        scd_DF.loc[i, "Sample Name"] = s.name
-        scd_DF.loc[i, "Sample Accession"] = sample_accession
-        scd_DF.loc[i, "Sample Description"] = sample_description
-        scd_DF.loc[i, "Derived From"] = derived_from
-        scd_DF.loc[i, "Group Name"] = group_name
-        scd_DF.loc[i, "Group Accession"] = group_accession
+            group_name = get_single(characteristics_by_term.get("Group Name"))
+            group_accession = get_single(characteristics_by_term.get("Group Accession"))
+
+        row = {
+            "Sample Name": s.name,
+            "Sample Accession": get_single(characteristics_by_term.get("Sample Accession")),
+            "Sample Description": get_single(characteristics_by_term.get("Sample Description")),
+            "Derived From": derived_from,
+            "Group Name": group_name,
+            "Group Accession": group_accession
+        }
 
         characteristics = [
             x for x in s.characteristics if x.category.term not in [
@@ -735,42 +773,45 @@ def dumps(investigation):
         for characteristic in characteristics:
             characteristic_label = "Characteristic[{}]".format(
                 characteristic.category.term)
-            if characteristic_label not in scd_DF.columns:
-                scd_DF[characteristic_label] = ""
+            if characteristic_label not in scd_columns:
+                scd_columns[characteristic_label] = None
                 for val_col in get_value_columns(
                         characteristic_label, characteristic):
-                    scd_DF[val_col] = ""
+                    scd_columns.setdefault(val_col)
             if isinstance(characteristic.value, (int, float)
                           ) and characteristic.unit:
                 if isinstance(characteristic.unit, OntologyAnnotation):
-                    scd_DF.loc[i, characteristic_label] = characteristic.value
-                    scd_DF.loc[i, characteristic_label +
-                               ".Unit"] = characteristic.unit.term
-                    scd_DF.loc[i, characteristic_label +
-                               ".Unit.Term Source REF"]\
-                        = characteristic.unit.term_source.name \
-                        if characteristic.unit.term_source else ""
-                    scd_DF.loc[i, characteristic_label +
-                               ".Unit.Term Accession Number"] = \
-                        characteristic.unit.term_accession
+                    cells = {
+                        characteristic_label: characteristic.value,
+                        characteristic_label + ".Unit": characteristic.unit.term,
+                        characteristic_label + ".Unit.Term Source REF":
+                            characteristic.unit.term_source.name
+                            if characteristic.unit.term_source else "",
+                        characteristic_label + ".Unit.Term Accession Number":
+                            characteristic.unit.term_accession
+                    }
                 else:
-                    scd_DF.loc[i, characteristic_label] = characteristic.value
-                    scd_DF.loc[i, characteristic_label +
-                               ".Unit"] = characteristic.unit
+                    cells = {
+                        characteristic_label: characteristic.value,
+                        characteristic_label + ".Unit": characteristic.unit
+                    }
             elif isinstance(characteristic.value, OntologyAnnotation):
-                scd_DF.loc[i, characteristic_label] = characteristic.value.term
-                scd_DF.loc[i, characteristic_label + ".Term Source REF"] = \
-                    characteristic.value.term_source.name \
-                    if characteristic.value.term_source else ""
-                scd_DF.loc[i, characteristic_label
-                           + ".Term Accession Number"] = \
-                    characteristic.value.term_accession
+                cells = {
+                    characteristic_label: characteristic.value.term,
+                    characteristic_label + ".Term Source REF":
+                        characteristic.value.term_source.name
+                        if characteristic.value.term_source else "",
+                    characteristic_label + ".Term Accession Number":
+                        characteristic.value.term_accession
+                }
             else:
-                scd_DF.loc[i, characteristic_label] = characteristic.value
+                cells = {characteristic_label: characteristic.value}
+            for col in cells:
+                scd_columns.setdefault(col)
+            row.update(cells)
+        scd_rows.append(row)
 
-
-    scd_DF = scd_DF.map(lambda x: np.nan if x == '' else x)
-    columns = list(scd_DF.columns)
+    columns = list(scd_columns)
     for i, col in enumerate(columns):
         if col.endswith("Term Source REF"):
             columns[i] = "Term Source REF"
@@ -778,13 +819,11 @@ def dumps(investigation):
             columns[i] = "Term Source ID"
         elif col.endswith("Unit"):
             columns[i] = "Unit"
-    scd_DF.columns = columns
     scd_memf = StringIO()
-    scd_DF.to_csv(
-        path_or_buf=scd_memf,
-        index=False,
-        sep='\t',
-        encoding='utf-8')
+    scd_writer = csv.writer(scd_memf, delimiter='\t', lineterminator='\n')
+    scd_writer.writerow(columns)
+    scd_writer.writerows(
+        [_format_cell(row.get(col)) for col in scd_columns] for row in scd_rows)
     scd_memf.seek(0)
 
     sampletab_memf = StringIO()
@@ -810,6 +849,33 @@ def dump(investigation, out_fp):
     out_fp.write(sampletab_str)
 
 
+def _unique_materials(materials):
+    """Removes the duplicates from a list of Sources and Samples, keeping the
+    first of the equal materials. Equal materials have the same type and name,
+    so the materials are only compared to the others of the same name rather
+    than hashed.
+
+    :param materials: A list of Source and Sample objects
+    :return: The list without the duplicates
+    """
+    unique = []
+    by_name = {}
+    for material in materials:
+        same_name = by_name.setdefault((type(material), material.name), [])
+        if not any(material is other or material == other for other in same_name):
+            same_name.append(material)
+            unique.append(material)
+    return unique
+
+
+def _format_cell(value):
+    """Formats a value of the SCD section as DataFrame.to_csv() does, with
+    empty strings and missing values written as empty cells"""
+    if value is None or value == '' or (isinstance(value, float) and isnan(value)):
+        return ''
+    return str(value)
+
+
 def get_value_columns(label, x):
     """Generates the appropriate columns based on the value of the object.
     For example, if the object's .value value is an OntologyAnnotation,
@@ -8,10 +8,13 @@ isatools.model package.
 import datetime
 import hashlib
 import html
+import json
 import logging
 import os
-import xml.dom.minidom
-from functools import partial
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 
 import iso8601
 import jinja2
@@ -35,23 +38,67 @@ sra_lab_name = sra_center_name
 sra_submission_action = 'ADD'
 sra_center_prj_name = None
 
+# data files are hashed by blocks of 1 MiB
+HASH_BUFFER_SIZE = 1024 * 1024
 
-def export(investigation, export_path, sra_settings=None, datafilehashes=None):
-    """Exports ISA Data model objects to SRA-XML files
+SRA_TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), 'resources', 'sra_templates')
+SRA_SCHEMAS_DIR = os.path.join(os.path.dirname(__file__), 'resources', 'sra_schemas')
 
-    The exporter uses the jinja2 templating engine. The SRA templates can be
-    found in isatools/resources/sra_templates
+# rendered templates are fed to the XML parser by chunks of about 64 KiB
+XML_FEED_SIZE = 64 * 1024
 
-    :param investigation: An Investigation object
-    :param export_path: Path to write SRA-XML files to
-    :param sra_settings: Some universal settings to apply to the SRA export
-    :param datafilehashes: A list of data file hashes to apply to the exported
-    files
-    :return: None
+# from Python 3.13, xml.dom.minidom only escapes '"' in attributes, and escapes
+# the whitespace characters in them
+MINIDOM_ESCAPES_ATTRIBUTE_WHITESPACE = sys.version_info >= (3, 13)
+
+
+@lru_cache(maxsize=None)
+def get_sra_template_environment():
+    """Gets the jinja2 environment of the SRA templates
+
+    The environment is created once per process, so that each template is
+    compiled the first time it is used and reused by every export afterwards.
+
+    :return: A jinja2.Environment loading isatools/resources/sra_templates
+    """
+    return jinja2.Environment(loader=jinja2.FileSystemLoader(SRA_TEMPLATES_DIR), auto_reload=False)
+
+
+@lru_cache(maxsize=None)
+def get_sra_schema(schema_name):
+    """Gets one of the SRA XML schemas, parsed once per process
+
+    :param schema_name: The file name of the schema in
+    isatools/resources/sra_schemas, e.g. 'SRA.run.xsd'
+    :return: An lxml.etree.XMLSchema
+    """
+    with open(os.path.join(SRA_SCHEMAS_DIR, schema_name)) as xsd:
+        return etree.XMLSchema(etree.parse(xsd))
+
+
+class _ProcessAnnotationIndex(object):
+    """
+    Comments and parameter values of processes, indexed by name
+
+    Each process is indexed the first time it is looked up, so that repeated
+    lookups on the processes of an assay are dict accesses.
     """
 
-    def get_comment(assay, name):
-        hits = [c for c in assay.comments if c.name.lower() == name.lower()]
+    def __init__(self):
+        self._comments = dict()
+        self._parameter_values = dict()
+
+    @staticmethod
+    def _parameter_name(name):
+        return name.lower().replace('_', ' ')
+
+    def get_comment(self, process, name):
+        comments = self._comments.get(id(process))
+        if comments is None:
+            comments = self._comments[id(process)] = dict()
+            for comment in process.comments:
+                comments.setdefault(comment.name.lower(), []).append(comment)
+        hits = comments.get(name.lower(), [])
         if len(hits) > 1:
             raise AttributeError(
                 "Multiple comments of label '{}' found".format(name))
@@ -60,23 +107,17 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
         else:
             return hits[0]
 
-    def get_sample(process):
-        materials = process.inputs
-        this_sample = None
-        for material in materials:
-            if isinstance(material, Sample):
-                this_sample = material
-                break
-        return this_sample
-
-    def get_pv(process, name):
-        hits = [pv for pv in process.parameter_values if
-                pv.category.parameter_name.term.lower().replace('_', ' ')
-                == name.lower().replace('_', ' ')]
+    def get_pv(self, process, name):
+        parameter_values = self._parameter_values.get(id(process))
+        if parameter_values is None:
+            parameter_values = self._parameter_values[id(process)] = dict()
+            for pv in process.parameter_values:
+                parameter_values.setdefault(
+                    self._parameter_name(pv.category.parameter_name.term), []).append(pv)
+        hits = parameter_values.get(self._parameter_name(name), [])
         if len(hits) > 1:
             raise AttributeError(
-                "Multiple parameter values of category '{}' found".format(
-                    name))
+                "Multiple parameter values of category '{}' found".format(name))
         elif len(hits) < 1:
             return None
         else:
@@ -86,6 +127,28 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                 value = hits[0].value
             return value.replace('_', ' ')
 
+
+def _get_sample(process):
+    for material in process.inputs:
+        if isinstance(material, Sample):
+            return material
+    return None
+
+
+def export(investigation, export_path, sra_settings=None, datafilehashes=None):
+    """Exports ISA Data model objects to SRA-XML files
+
+    The exporter uses the jinja2 templating engine. The SRA templates can be
+    found in isatools/resources/sra_templates
+
+    :param investigation: An Investigation object
+    :param export_path: Path to write SRA-XML files to
+    :param sra_settings: Some universal settings to apply to the SRA export
+    :param datafilehashes: A list of data file hashes to apply to the exported
+    files
+    :return: None
+    """
+
     global sra_center_name
     global sra_broker_name
     if sra_settings is not None:
@@ -139,11 +202,6 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
         # ideally make it a requirement in the model or JSON to have html
         # escaped content
 
-        env = jinja2.Environment()
-        env.loader = jinja2.FileSystemLoader(
-            os.path.join(
-                os.path.dirname(__file__), 'resources', 'sra_templates'))
-        xsub_template = env.get_template('submission_add.xml')
         sra_contact = None
         if sra_settings is not None:
             inform_on_status = sra_settings['sra_broker_inform_on_status']
@@ -154,29 +212,27 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                 'inform_on_error': inform_on_error,
                 'contact_name': contact_name
             }
-        xsub = xsub_template.render(accession=study_acc,
-                                    contacts=istudy.contacts,
-                                    submission_date=istudy.submission_date,
-                                    sra_center_name=sra_center_name,
-                                    sra_broker_name=sra_broker_name,
-                                    sra_contact=sra_contact)
-        xproj_template = env.get_template('project_set.xml')
-        xproj = xproj_template.render(
-            study=istudy, sra_center_name=sra_center_name)
+        # inputs of the first study process outputting each sample
+        sample_sources = dict()
+        for process in istudy.process_sequence:
+            for output in process.outputs:
+                sample_sources.setdefault(id(output), process.inputs)
 
         assays_to_export = list()
         for iassay in istudy.assays:
             if (iassay.measurement_type.term, iassay.technology_type.term) in \
                     supported_sra_assays:
+                annotations = _ProcessAnnotationIndex()
                 assay_seq_processes = [
                     a for a in iassay.process_sequence if
                     a.executes_protocol.protocol_type.term ==
                     'nucleic acid sequencing']
                 for assay_seq_process in assay_seq_processes:
                     do_export = True
-                    if get_comment(assay_seq_process, 'export') is not None:
+                    export_comment = annotations.get_comment(assay_seq_process, 'export')
+                    if export_comment is not None:
                         log.debug('HAS EXPORT COMMENT IN ASSAY')
-                        export = get_comment(assay_seq_process, 'export').value
+                        export = export_comment.value
                         log.debug('export is {}'.format(export))
                         do_export = export.lower() != 'no'
                     else:
@@ -186,7 +242,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                         sample = None
                         curr_process = assay_seq_process
                         while sample is None:
-                            sample = get_sample(curr_process)
+                            sample = _get_sample(curr_process)
                             curr_process = curr_process.prev_process
                         assay_to_export = \
                             {
@@ -237,11 +293,13 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                                 }
                             )
                         source = None
-                        matching_sources = [
-                            p.inputs for p in istudy.process_sequence
-                            if sample in p.outputs]
-                        if len(matching_sources[0]) == 1:
-                            source = matching_sources[0][0]
+                        sample_inputs = sample_sources.get(id(sample))
+                        if sample_inputs is None:
+                            sample_inputs = [
+                                p.inputs for p in istudy.process_sequence
+                                if sample in p.outputs][0]
+                        if len(sample_inputs) == 1:
+                            source = sample_inputs[0]
                         assay_to_export['source'] = {
                             'name': source.name,
                             'characteristics': source.characteristics,
@@ -264,7 +322,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                                 curr_process = curr_process.prev_process
                             except AttributeError:
                                 pass
-                        target_taxon = get_pv(
+                        target_taxon = annotations.get_pv(
                             assay_to_export['library construction'],
                             'target_taxon')
                         assay_to_export['target_taxon'] = target_taxon
@@ -274,7 +332,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                         if iassay.measurement_type.term in [
                             'genome sequencing',
                                 'whole genome sequencing']:
-                            library_source = get_pv(
+                            library_source = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library source')
                             if library_source.upper() not in [
@@ -286,7 +344,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                                         library_source))
                                 library_source = 'OTHER'
 
-                            library_strategy = get_pv(
+                            library_strategy = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library strategy')
                             if library_strategy.upper() not in ['WGS',
@@ -297,7 +355,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                                         library_strategy))
                                 library_strategy = 'OTHER'
 
-                            library_selection = get_pv(
+                            library_selection = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library selection')
                             if library_selection not in ['RANDOM',
@@ -311,7 +369,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                             protocol = '\n protocol_description: {}'.format(
                                 assay_to_export['library construction']
                                 .executes_protocol.description)
-                            mid_pv = get_pv(
+                            mid_pv = annotations.get_pv(
                                 assay_to_export['library construction'], 'mid')
                             if mid_pv is not None:
                                 protocol += '\n mid: {}'.format(mid_pv.value)
@@ -324,7 +382,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                             assay_to_export[
                                 'library_construction_protocol'] = protocol
 
-                            library_layout = get_pv(
+                            library_layout = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library layout')
                             assay_to_export['library_layout'] = \
@@ -336,23 +394,23 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                             assay_to_export['library_source'] = 'METAGENOMIC'
                             assay_to_export['library_strategy'] = 'AMPLICON'
                             assay_to_export['library_selection'] = 'PCR'
-                            library_layout = get_pv(
+                            library_layout = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library layout')
                             assay_to_export['library_layout'] = \
                                 library_layout.lower()
-                            nucl_acid_amp = get_pv(
+                            nucl_acid_amp = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'nucleic acid amplification')
                             if nucl_acid_amp is None:
-                                nucl_acid_amp = get_pv(
+                                nucl_acid_amp = annotations.get_pv(
                                     assay_to_export['library construction'],
                                     'nucl_acid_amp')
 
                             protocol = '\n protocol_description: '.format(
                                 assay_to_export['library construction']
                                 .executes_protocol.description)
-                            mid_pv = get_pv(
+                            mid_pv = annotations.get_pv(
                                 assay_to_export['library construction'], 'mid')
                             if mid_pv is not None:
                                 protocol += '\n mid: {}'.format(mid_pv)
@@ -361,7 +419,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                             if nucl_acid_amp is not None:
                                 protocol += '\n nucl_acid_amp: {}'\
                                     .format(nucl_acid_amp.value)
-                            url = get_pv(
+                            url = annotations.get_pv(
                                 assay_to_export['library construction'], 'url')
                             if url is not None:
                                 protocol += '\n url: '.format(
@@ -370,25 +428,25 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                             if target_taxon is not None:
                                 protocol += '\n target_taxon: {}'.format(
                                     target_taxon)
-                            target_gene = get_pv(
+                            target_gene = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'target_gene')
                             if target_gene is not None:
                                 protocol += '\n target_gene: {}'.format(
                                     target_gene)
-                            target_subfragment = get_pv(
+                            target_subfragment = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'target_subfragment')
                             if target_subfragment is not None:
                                 protocol += '\n target_subfragment: {}'.format(
                                     target_subfragment)
-                            pcr_primers = get_pv(
+                            pcr_primers = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'pcr_primers')
                             if pcr_primers is not None:
                                 protocol += '\n pcr_primers: {}'.format(
                                     pcr_primers)
-                            pcr_cond = get_pv(
+                            pcr_cond = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'pcr_cond')
                             if pcr_cond is not None:
@@ -404,7 +462,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                         elif iassay.measurement_type.term in \
                                 ['metagenome sequencing']:
                             library_source = 'METAGENOMIC'
-                            library_strategy = get_pv(
+                            library_strategy = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library strategy')
                             if library_strategy.upper() not in [
@@ -415,7 +473,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                                         library_strategy))
                                 library_strategy = 'OTHER'
 
-                            library_selection = get_pv(
+                            library_selection = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library selection')
                             if library_selection not in \
@@ -429,7 +487,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                             protocol = '\n protocol_description: {}'.format(
                                 assay_to_export['library construction']
                                 .executes_protocol.description)
-                            mid_pv = get_pv(
+                            mid_pv = annotations.get_pv(
                                 assay_to_export['library construction'], 'mid')
                             if mid_pv is not None:
                                 protocol += '\n mid: {}'.format(mid_pv.value)
@@ -442,7 +500,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                             assay_to_export[
                                 'library_construction_protocol'] = protocol
 
-                            library_layout = get_pv(
+                            library_layout = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library layout')
                             assay_to_export['library_layout'] = \
@@ -451,7 +509,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                         # BEGIN transciption profiling library selection
                         elif iassay.measurement_type.term in \
                                 ['transcription profiling']:
-                            library_source = get_pv(
+                            library_source = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library source')
                             if library_source is None:
@@ -470,7 +528,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                                         library_source))
                                 library_source = 'OTHER'
 
-                            library_strategy = get_pv(
+                            library_strategy = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library strategy')
                             if library_strategy not in \
@@ -482,7 +540,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                                         library_strategy))
                                 library_strategy = 'OTHER'
 
-                            library_selection = get_pv(
+                            library_selection = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library selection')
                             if library_selection not in \
@@ -507,7 +565,7 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                             assay_to_export[
                                 'library_construction_protocol'] = protocol
 
-                            library_layout = get_pv(
+                            library_layout = annotations.get_pv(
                                 assay_to_export['library construction'],
                                 'library layout')
                             assay_to_export['library_layout'] = \
@@ -517,10 +575,10 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                             log.error(
                                 'ERROR:Unsupported measurement type: {}'
                                 .format(iassay.measurement_type.term))
-                        mid_pv = get_pv(
+                        mid_pv = annotations.get_pv(
                             assay_to_export['library construction'], 'mid')
                         assay_to_export['poolingstrategy'] = mid_pv
-                        seq_instrument = get_pv(
+                        seq_instrument = annotations.get_pv(
                             assay_to_export['nucleic acid sequencing'],
                             'sequencing instrument')
                         assay_to_export['platform'] = seq_instrument
@@ -532,92 +590,370 @@ def export(investigation, export_path, sra_settings=None, datafilehashes=None):
                         iassay.measurement_type.term,
                         iassay.technology_type.term))
 
-        xexp_set_template = env.get_template('experiment_set.xml')
-        xexp_set = xexp_set_template.render(assays_to_export=assays_to_export,
-                                            study=istudy,
-                                            sra_center_name=sra_center_name,
-                                            sra_broker_name=sra_broker_name)
-        xrun_set_template = env.get_template('run_set.xml')
-        xrun_set = xrun_set_template.render(assays_to_export=assays_to_export,
-                                            study=istudy,
-                                            sra_center_name=sra_center_name,
-                                            sra_broker_name=sra_broker_name)
         samples_to_export = list()
+        sample_aliases = set()
         for assay_to_export in assays_to_export:
-            if len([s for s in samples_to_export if
-                    s['sample_alias'] == assay_to_export['sample_alias']]) > 0:
-                pass
-            else:
+            if assay_to_export['sample_alias'] not in sample_aliases:
+                sample_aliases.add(assay_to_export['sample_alias'])
                 samples_to_export.append(assay_to_export)
-        xsample_set_template = env.get_template('sample_set.xml')
-        xsample_set = xsample_set_template.render(
-            assays_to_export=samples_to_export, study=istudy,
-            sra_center_name=sra_center_name, sra_broker_name=sra_broker_name)
-        log.debug("SRA exporter: writing SRA XML files for study " + study_acc)
 
-        # blitz out whitespaces with etree and format nicely with minidom
-        def prettify(xmlstr):
-            p = etree.XMLParser(remove_blank_text=True)
-            exsub = etree.XML(xmlstr, parser=p)
-            x = xml.dom.minidom.parseString(etree.tostring(exsub))
-            return x.toprettyxml()
-
-        # validate a doc against one of our SRA schemas
-        def validate(docpath, schemaname):
-            with open(os.path.join(os.path.dirname(__file__), 'resources',
-                                   'sra_schemas', schemaname)) as xsd:
-                doc = etree.parse(xsd)
-                try:
-                    schema = etree.XMLSchema(doc)
-                    with open(docpath, 'r') as xsub_file:
-                        doc = etree.parse(xsub_file)
-                        try:
-                            schema.assertValid(doc)
-                        except etree.DocumentInvalid as e:
-                            log.error(
-                                'Schema validation failed on {}'
-                                .format('{0}:\n{1}'.format(
-                                        docpath, str(e))))
-                except etree.XMLSchemaParseError as e:
-                    log.error(e)
-
-        if os.path.exists(export_path):
-            with open(os.path.join(
-                    export_path, 'submission.xml'), 'w') as xsub_file:
-                print(prettify(xsub), file=xsub_file)
-            validate(os.path.join(
-                export_path, 'submission.xml'), 'SRA.submission.xsd')
-            with open(os.path.join(
-                    export_path, 'project_set.xml'), 'w') as xproj_set_file:
-                print(prettify(xproj), file=xproj_set_file)
-            validate(os.path.join(
-                export_path, 'project_set.xml'), 'ENA.project.xsd')
-            with open(os.path.join(
-                    export_path, 'experiment_set.xml'), 'w') as xexp_set_file:
-                print(prettify(xexp_set), file=xexp_set_file)
-            validate(os.path.join(
-                export_path, 'experiment_set.xml'), 'SRA.experiment.xsd')
-            with open(os.path.join(
-                    export_path, 'run_set.xml'), 'w') as xrun_set_file:
-                print(prettify(xrun_set), file=xrun_set_file)
-            validate(os.path.join(export_path, 'run_set.xml'), 'SRA.run.xsd')
-            with open(os.path.join(
-                    export_path, 'sample_set.xml'), 'w') as xsample_set_file:
-                print(prettify(xsample_set), file=xsample_set_file)
-            validate(os.path.join(
-                export_path, 'sample_set.xml'), 'SRA.sample.xsd')
-        else:
+        if not os.path.isdir(export_path):
             raise NotADirectoryError(
                 "export path '{}' is not a directory".format(export_path))
+        log.debug("SRA exporter: writing SRA XML files for study " + study_acc)
+        documents = [
+            ('submission.xml', 'submission_add.xml', 'SRA.submission.xsd',
+             dict(accession=study_acc, contacts=istudy.contacts, submission_date=istudy.submission_date,
+                  sra_contact=sra_contact)),
+            ('project_set.xml', 'project_set.xml', 'ENA.project.xsd', dict(study=istudy)),
+            ('experiment_set.xml', 'experiment_set.xml', 'SRA.experiment.xsd',
+             dict(assays_to_export=assays_to_export, study=istudy)),
+            ('run_set.xml', 'run_set.xml', 'SRA.run.xsd', dict(assays_to_export=assays_to_export, study=istudy)),
+            ('sample_set.xml', 'sample_set.xml', 'SRA.sample.xsd',
+             dict(assays_to_export=samples_to_export, study=istudy)),
+        ]
+        for filename, template_name, schema_name, context in documents:
+            file_path = os.path.join(export_path, filename)
+            write_sra_xml(template_name, file_path, sra_center_name=sra_center_name,
+                          sra_broker_name=sra_broker_name, **context)
+            validate_sra_xml(file_path, schema_name)
+
+
+def write_sra_xml(template_name, file_path, **context):
+    """Renders an SRA template to an XML file
+
+    The template is rendered with Template.generate() and its output is
+    parsed and written out one top level element at a time, so that the
+    document is never held in memory as a whole. Blank text is removed and
+    the elements are indented with tabs, as xml.dom.minidom's toprettyxml()
+    formats them.
+
+    :param template_name: The name of the template in
+    isatools/resources/sra_templates
+    :param file_path: Path of the XML file to write
+    :param context: The variables passed to the template
+    :return: None
+    """
+    template = get_sra_template_environment().get_template(template_name)
+    with open(file_path, 'w') as xml_file:
+        write_pretty_xml(template.generate(**context), xml_file)
+        xml_file.write('\n')
+
+
+def validate_sra_xml(file_path, schema_name):
+    """Validates an XML file against one of the SRA schemas
+
+    The file is validated while it is parsed incrementally, and validation
+    errors are logged rather than raised.
+
+    :param file_path: Path of the XML file
+    :param schema_name: The file name of the schema in
+    isatools/resources/sra_schemas
+    :return: None
+    """
+    try:
+        schema = get_sra_schema(schema_name)
+    except etree.XMLSchemaParseError as e:
+        log.error(e)
+        return
+    try:
+        for _, element in etree.iterparse(file_path, events=('end',), schema=schema):
+            if element.getparent() is not None:
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        # raised by the validating parser on the first invalid element
+        log.error('Schema validation failed on {}'.format('{0}:\n{1}'.format(file_path, str(e))))
+
+
+def write_pretty_xml(chunks, xml_file):
+    """Writes an XML document given as an iterable of strings
+
+    The output is the same as parsing the whole document with lxml, removing
+    blank text, and serialising it with xml.dom.minidom's toprettyxml(), but
+    only the children of the root element being parsed are kept in memory.
+
+    :param chunks: Iterable of strings making up the XML document
+    :param xml_file: Text file-like object to write to
+    :return: None
+    """
+    parser = etree.XMLPullParser(events=('start-ns', 'start', 'end'), remove_blank_text=True)
+    writer = _PrettyXMLWriter()
+    root = None
+    depth = 0
+    root_open = False
+    namespaces = []
+
+    def flush(until=None):
+        # writes and drops the children of the root that precede `until`
+        for child in list(root):
+            if child is until:
+                break
+            writer.write_node(child, '\t')
+            if child.tail:
+                writer.write_text(child.tail, '\t')
+            root.remove(child)
+        xml_file.write(writer.pop())
+
+    def handle_events():
+        nonlocal root, depth, root_open
+        for event, item in parser.read_events():
+            if event == 'start-ns':
+                namespaces.append(item)
+            elif event == 'start':
+                depth += 1
+                if namespaces:
+                    writer.namespaces[item] = tuple(namespaces)
+                    namespaces.clear()
+                if root is None:
+                    root = item
+                    xml_file.write('<?xml version="1.0" ?>\n')
+                elif depth == 2:
+                    if not root_open:
+                        writer.write_start_tag(root, '')
+                        writer.out.append('>\n')
+                        if root.text:
+                            writer.write_text(root.text, '\t')
+                        root_open = True
+                    flush(until=item)
+            else:
+                depth -= 1
+                if item is root:
+                    if root_open:
+                        flush()
+                        xml_file.write('</{}>\n'.format(writer.name(root, root.tag)))
+                    else:
+                        writer.write_node(root, '')
+                        xml_file.write(writer.pop())
+
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= XML_FEED_SIZE:
+            # the parser only drops blank text consistently if no chunk ends
+            # right after the '<' of a markup
+            cut = buffer.rfind('<', 0, len(buffer) - 1)
+            if cut > 0:
+                parser.feed(buffer[:cut])
+                buffer = buffer[cut:]
+                handle_events()
+    parser.feed(buffer)
+    parser.close()
+    handle_events()
+
+
+class _PrettyXMLWriter(object):
+    """
+    Serialises lxml elements the way xml.dom.minidom's toprettyxml() does,
+    with tab indents, into a list of strings
+    """
+
+    def __init__(self):
+        self.out = []
+        # namespace declarations (prefix, uri) of the elements declaring some
+        self.namespaces = dict()
+
+    def pop(self):
+        text = ''.join(self.out)
+        self.out.clear()
+        return text
+
+    @staticmethod
+    def name(element, name):
+        if name[0] != '{':
+            return name
+        qname = etree.QName(name)
+        for prefix, uri in element.nsmap.items():
+            if uri == qname.namespace and prefix is not None:
+                return '{0}:{1}'.format(prefix, qname.localname)
+        return qname.localname
+
+    @staticmethod
+    def escape(text, attribute=False):
+        if '&' in text:
+            text = text.replace('&', '&amp;')
+        if '<' in text:
+            text = text.replace('<', '&lt;')
+        if '>' in text:
+            text = text.replace('>', '&gt;')
+        if not MINIDOM_ESCAPES_ATTRIBUTE_WHITESPACE:
+            return text.replace('"', '&quot;')
+        if attribute:
+            text = text.replace('"', '&quot;').replace('\r', '&#13;').replace('\n', '&#10;').replace('\t', '&#9;')
+        return text
+
+    def write_start_tag(self, element, indent):
+        out = self.out
+        out.append(indent + '<' + self.name(element, element.tag))
+        for prefix, uri in self.namespaces.get(element, ()):
+            out.append(' {0}="{1}"'.format('xmlns:' + prefix if prefix else 'xmlns', self.escape(uri, True)))
+        for name, value in element.attrib.items():
+            out.append(' {0}="{1}"'.format(self.name(element, name), self.escape(value, True)))
+
+    def write_text(self, text, indent):
+        self.out.append(self.escape(indent + text + '\n'))
+
+    def write_node(self, node, indent):
+        out = self.out
+        if node.tag is etree.Comment:
+            out.append('{0}<!--{1}-->\n'.format(indent, node.text or ''))
+            return
+        if node.tag is etree.PI:
+            out.append('{0}<?{1} {2}?>\n'.format(indent, node.target, node.text or ''))
+            return
+        self.write_start_tag(node, indent)
+        if not len(node):
+            if node.text:
+                out.append('>' + self.escape(node.text) + '</' + self.name(node, node.tag) + '>\n')
+            else:
+                out.append('/>\n')
+            return
+        out.append('>\n')
+        child_indent = indent + '\t'
+        if node.text:
+            self.write_text(node.text, child_indent)
+        for child in node:
+            self.write_node(child, child_indent)
+            if child.tail:
+                self.write_text(child.tail, child_indent)
+        out.append(indent + '</' + self.name(node, node.tag) + '>\n')
+
+
+def hash_file(file_path, algorithms=('md5',), buffer_size=HASH_BUFFER_SIZE):
+    """
+    Computes one or more hashes of a file in a single pass over its content
+
+    :param file_path: Path to the file
+    :param algorithms: Names of hashlib algorithms, e.g. ('md5', 'sha256')
+    :param buffer_size: Size in bytes of the blocks read from the file
+    :return: dict containing the hex digest of the file for each algorithm
+    """
+    digests = [(algorithm, hashlib.new(algorithm)) for algorithm in algorithms]
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(file_path, mode='rb', buffering=0) as f:
+        for size in iter(partial(f.readinto, buffer), 0):
+            for _, digest in digests:
+                digest.update(view[:size])
+    return {algorithm: digest.hexdigest() for algorithm, digest in digests}
 
 
-def create_datafile_hashes(fileroot, filenames):
+class DataFileHashCache(object):
+    """
+    Persistent cache of data file hashes, stored in a JSON file
+
+    The hashes of a file are cached under its absolute path along with its size
+    and modification time, and are only returned while these are unchanged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = dict()
+        if os.path.isfile(path):
+            with open(path) as cache_file:
+                self.entries = json.load(cache_file)
+
+    @staticmethod
+    def _key(file_path):
+        stat = os.stat(file_path)
+        return os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns
+
+    def get(self, file_path, algorithms):
+        """
+        :param file_path: Path to the file
+        :param algorithms: Names of the hash algorithms required
+        :return: dict of the hashes of the file for the algorithms, or None if
+        the file changed since they were cached or some are missing
+        """
+        path, size, mtime = self._key(file_path)
+        entry = self.entries.get(path)
+        if entry is None or entry['size'] != size or entry['mtime'] != mtime:
+            return None
+        if not all(algorithm in entry['hashes'] for algorithm in algorithms):
+            return None
+        return {algorithm: entry['hashes'][algorithm] for algorithm in algorithms}
+
+    def set(self, file_path, hashes, key=None):
+        """
+        :param file_path: Path to the file
+        :param hashes: dict of hashes of the file, by algorithm
+        :param key: The (path, size, mtime) of the file when it was hashed, by
+        default its current ones
+        """
+        path, size, mtime = key or self._key(file_path)
+        entry = self.entries.get(path)
+        if entry is None or entry['size'] != size or entry['mtime'] != mtime:
+            entry = self.entries[path] = dict(size=size, mtime=mtime, hashes=dict())
+        entry['hashes'].update(hashes)
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False) as cache_file:
+            json.dump(self.entries, cache_file)
+        os.replace(cache_file.name, self.path)
+
+
+def hash_datafiles(fileroot, filenames, algorithms=('md5',), workers=None, cache_path=None,
+                   buffer_size=HASH_BUFFER_SIZE):
+    """
+    Computes the hashes of files in a directory, reading the files in
+    parallel in a thread pool
+
+    :param fileroot: Root to directory containing files (assumes all in
+    same dir)
+    :param filenames: List of filenames of files to hash, assumed in fileroot
+    :param algorithms: Names of hashlib algorithms, e.g. ('md5', 'sha256'),
+    all computed in a single pass over each file
+    :param workers: Maximum number of threads, by default the
+    ThreadPoolExecutor default
+    :param cache_path: Path to a JSON file where the hashes are cached
+    between runs, so that unchanged files are not read again
+    :param buffer_size: Size in bytes of the blocks read from the files
+    :return: dict containing filenames and dicts of hashes by algorithm
+    """
+    file_paths = dict()
+    for file in filenames:
+        file_path = os.path.join(fileroot, file)
+        if not os.path.isfile(file_path):
+            raise FileNotFoundError('{} is not a file'.format(file_path))
+        file_paths[file] = file_path
+
+    cache = DataFileHashCache(cache_path) if cache_path else None
+    datafilehashes = dict()
+    to_hash = dict()
+    for file, file_path in file_paths.items():
+        hashes = cache.get(file_path, algorithms) if cache else None
+        if hashes is None:
+            to_hash[file] = DataFileHashCache._key(file_path)
+        else:
+            datafilehashes[file] = hashes
+
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                file: executor.submit(hash_file, file_paths[file], algorithms, buffer_size) for file in to_hash
+            }
+            for file, future in futures.items():
+                datafilehashes[file] = future.result()
+                if cache:
+                    cache.set(file_paths[file], datafilehashes[file], key=to_hash[file])
+        if cache:
+            cache.save()
+    return {file: datafilehashes[file] for file in file_paths}
+
+
+def create_datafile_hashes(fileroot, filenames, workers=None, cache_path=None):
     """
     Create md5 file dict for files in a directory with a particular extension
 
     :param fileroot: Root to directory containing files (assumes all in
     same dir)
     :param filenames: List of filenames of files to md5, assumed in fileroot
+    :param workers: Maximum number of threads hashing files in parallel
+    :param cache_path: Path to a JSON file caching the hashes between runs,
+    see hash_datafiles()
     :return: dict containing filenames and md5s
 
     Usage:
@@ -628,19 +964,6 @@ def create_datafile_hashes(fileroot, filenames):
         'myfile2.gz': 'd41d8cd98f00b204e9800998ecf8427e'
     }
     """
-    def md5sum(filename):
-        with open(filename, mode='rb') as f:
-            d = hashlib.md5()
-            for buf in iter(partial(f.read, 128), b''):
-                d.update(buf)
-        return d.hexdigest()
-
-    from os.path import isfile, join
-    datafilehashes = dict()
-    for file in filenames:
-        if isfile(join(fileroot, file)):
-            datafilehashes[file] = md5sum(filename=join(fileroot, file))
-        else:
-            raise FileNotFoundError(
-                '{} is not a file'.format(join(fileroot, file)))
-    return datafilehashes
+    datafilehashes = hash_datafiles(fileroot, filenames, algorithms=('md5',), workers=workers,
+                                    cache_path=cache_path)
+    return {file: hashes['md5'] for file, hashes in datafilehashes.items()}
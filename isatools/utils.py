@@ -13,7 +13,6 @@ from zipfile import ZipFile
 import pandas as pd
 import yaml
 
-from isatools import isatab
 from isatools.model import (
     Process
 )
@@ -68,6 +67,7 @@ def detect_isatab_process_pooling(fp):
     :return: Report on which files containing process pooling and the
     process IDs inside those tables
     """
+    from isatools import isatab
     report = []
 
     ISA = isatab.load(fp)
@@ -100,6 +100,7 @@ def insert_distinct_parameter(table_fp, protocol_ref_to_unpool):
     'unpool'
     :return: None
     """
+    from isatools import isatab
     reader = csv.reader(table_fp, dialect='excel-tab')
     headers = next(reader)  # get column headings
     table_fp.seek(0)
@@ -169,6 +170,7 @@ def create_isatab_archive(inv_fp, target_filename=None,
     :param filter_by_measurement: Select by measurement type
     :return: List of files zipped if successful, None if not successful
     """
+    from isatools import isatab
     if target_filename is None:
         target_filename = os.path.join(
             os.path.dirname(inv_fp.name), 'isatab.zip')
@@ -341,6 +343,7 @@ def check_loadable(tab_dir_root):
     :param tab_dir_root: Root of the MTBLS directories
     :return: None
     """
+    from isatools import isatab
     for mtbls_dir in [x for x in os.listdir(tab_dir_root) if
                       x.startswith('MTBLS')]:
         try:
@@ -391,6 +394,7 @@ class IsaTabAnalyzer(object):
         """Generates a study design report
         :return: JSON report
         """
+        from isatools import isatab
         isa = isatab.load(self.path, skip_load_tables=False)
         study_design_report = []
         raw_data_file_prefix = ('Raw', 'Array', 'Free Induction Decay')
@@ -499,6 +503,7 @@ class IsaTabAnalyzer(object):
 
     def compute_stats(self):
         """Computes some statistics about the ISA-Tab study"""
+        from isatools import isatab
         isa = isatab.load(self.path, skip_load_tables=False)
         print('-------------------------------------------')
         print('Investigation stats')
@@ -654,6 +659,7 @@ class IsaTabFixer(object):
         :param factor_name: The factor that's incorrect
         :return: None
         """
+        from isatools import isatab
         table_file_df = isatab.read_tfile(self.path)
 
         field_names = list(table_file_df.columns)
@@ -745,6 +751,7 @@ class IsaTabFixer(object):
         :param protocol_ref: Protocol REF for the new Parameter Value
         :return: None
         """
+        from isatools import isatab
         table_file_df = isatab.read_tfile(self.path)
 
         field_names = list(table_file_df.columns)
@@ -865,6 +872,7 @@ class IsaTabFixer(object):
 
         :return: None
         """
+        from isatools import isatab
         investigation = isatab.load(os.path.dirname(self.path))
         for study in investigation.studies:
             unused_protocol_names = set(x.name for x in study.protocols)
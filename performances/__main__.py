@@ -4,6 +4,8 @@ import sys
 
 from performances.isatab import profile_isatab
 from performances.isajson import profile_isajson
+from performances.create import benchmark_generate_assay, DEFAULT_SAMPLE_SIZE
+from performances.importtime import benchmark_import_time
 
 
 def main(argv=None):
@@ -15,11 +17,17 @@ def main(argv=None):
     parser.add_argument('-t', '--tab',
                         help='Run performance tests on the given ISA tab', required=False, dest='tab', type=str,
                         const='./tests/data/tab/BII-S-3/i_gilbert.txt', nargs='?')
+    parser.add_argument('-c', '--create',
+                        help='Benchmark the generation of an assay for the given number of samples', required=False,
+                        dest='create', type=int, const=DEFAULT_SAMPLE_SIZE, nargs='?')
+    parser.add_argument('-i', '--importtime',
+                        help='Benchmark the import time of isatools modules', required=False, dest='importtime',
+                        action='store_true')
     parser.add_argument('-o', '--output',
                         help='Output path for the profiles', required=False, dest='output', type=str)
     args = parser.parse_args(argv or sys.argv[1:])
 
-    if not args.tab and not args.json:
+    if not args.tab and not args.json and not args.create and not args.importtime:
         profile_isajson()
         profile_isatab()
 
@@ -29,6 +37,12 @@ def main(argv=None):
     if args.json:
         profile_isajson(args.json, args.output)
 
+    if args.create:
+        benchmark_generate_assay(args.create)
+
+    if args.importtime:
+        benchmark_import_time()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,49 @@
+"""
+File to benchmark the generation of ISA assays from a StudyDesign.
+StudyDesign.generate_assay compiles each AssayGraph into an AssayTemplate and instantiates it for every sample.
+generate_assay_recursive() is the former generator, walking the AssayGraph again for every sample and replicate,
+kept here as the reference for the timings and the output.
+"""
+
+from time import perf_counter
+
+from isatools.create.assay_templates import ms_assay_dict
+from isatools.create.model import AssayGraph, StudyDesign
+from isatools.model import Assay, Sample
+
+DEFAULT_SAMPLE_SIZE = 2000
+
+
+def generate_assay_recursive(assay_graph, assay_samples):
+    assay = Assay(measurement_type=assay_graph.measurement_type, technology_type=assay_graph.technology_type)
+    for i, node in enumerate(assay_graph.start_nodes):
+        size = node.size if hasattr(node, 'size') else node.replicates if hasattr(node, 'replicates') else 1
+        for j, sample in enumerate(assay_samples):
+            for k in range(size):
+                ix = i * len(assay_samples) * size + j * size + k
+                processes, other_materials, characteristic_categories, data_files, _, __ = \
+                    StudyDesign._generate_isa_elements_from_node(
+                        node, assay_graph, assay_graph.id, start_node_index=ix + 1, counter=None, processes=[],
+                        other_materials=[], characteristic_categories=[], data_files=[], previous_items=[sample]
+                    )
+                assay.other_material.extend(other_materials)
+                assay.characteristic_categories.extend(characteristic_categories)
+                assay.process_sequence.extend(processes)
+                assay.data_files.extend(data_files)
+    return assay
+
+
+def benchmark_generate_assay(sample_size=DEFAULT_SAMPLE_SIZE, assay_dict=ms_assay_dict):
+    assay_graph = AssayGraph.generate_assay_plan_from_dict(assay_dict)
+    samples = [Sample(name='sample_{}'.format(i)) for i in range(sample_size)]
+    timings = {}
+    for name, generator in (('recursive', generate_assay_recursive), ('template', StudyDesign.generate_assay)):
+        start = perf_counter()
+        assay = generator(assay_graph, samples)
+        timings[name] = perf_counter() - start
+        print('{0}: {1} processes generated in {2:.2f}s'.format(name, len(assay.process_sequence), timings[name]))
+    return timings
+
+
+if __name__ == '__main__':
+    benchmark_generate_assay()
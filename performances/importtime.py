@@ -0,0 +1,47 @@
+"""
+File to benchmark the time it takes to import isatools modules.
+Each module is imported in a fresh interpreter started with `python -X importtime`, whose report is parsed to get the
+cumulative import time of the module and the slowest of the modules imported along with it.
+"""
+
+import subprocess
+import sys
+
+DEFAULT_MODULES = ('isatools', 'isatools.isatab', 'isatools.isajson', 'isatools.convert.isatab2json')
+
+
+def measure_import_time(module_name, repeat=3):
+    """
+    Imports a module in fresh interpreters and returns the best cumulative import time in microseconds, along with
+    the per-module timings of that run as a dict {module name: cumulative time in microseconds}
+    """
+    best_time, best_timings = None, None
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {0}'.format(module_name)],
+                                   capture_output=True, text=True, check=True)
+        timings = {}
+        for line in completed.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            timings[name.strip()] = int(cumulative)
+        if best_time is None or timings[module_name] < best_time:
+            best_time, best_timings = timings[module_name], timings
+    return best_time, best_timings
+
+
+def benchmark_import_time(module_names=DEFAULT_MODULES, top=5):
+    results = {}
+    for module_name in module_names:
+        total, timings = measure_import_time(module_name)
+        results[module_name] = total
+        print('import {0}: {1:.3f}s, {2} modules imported'.format(module_name, total / 1e6, len(timings)))
+        slowest = sorted((name for name in timings if name != module_name and '.' not in name),
+                         key=lambda name: timings[name], reverse=True)[:top]
+        for name in slowest:
+            print('    {0}: {1:.3f}s'.format(name, timings[name] / 1e6))
+    return results
+
+
+if __name__ == '__main__':
+    benchmark_import_time()
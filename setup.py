@@ -101,6 +101,7 @@ setup(
         'ddt==1.7.2',
         'behave==1.2.6',
         'httpretty==1.1.4',
+        'pyftpdlib~=2.0',
         'sure==2.0.1',
         'coveralls~=4.0.1',
         'rdflib~=7.0.0',
@@ -130,3 +130,17 @@ class TestIsaTab2Json(unittest.TestCase):
         self.assertEqual(actual_json["studies"][0]["filename"], investigation.studies[0].filename)
         self.assertEqual(actual_json["studies"][0]["assays"][0]["comments"][0]["value"],
                          investigation.studies[0].assays[0].comments[0].value)
+
+
+class TestIsaTab2JsonIdentifiers(unittest.TestCase):
+
+    def test_identifiers(self):
+        converter = isatab2json.ISATab2ISAjson_v1(isatab2json.IdentifierType.counter)
+        self.assertEqual(converter.generateIdentifier("sample", "sample-s1"), "http://data.isa-tools.org/sample/1")
+        self.assertEqual(converter.generateIdentifier("source", "sample-s1"), "http://data.isa-tools.org/source/1")
+        # the first identifier of a name is kept
+        self.assertEqual(converter.generateIdentifier("sample", "sample-s1"), "http://data.isa-tools.org/sample/2")
+        self.assertEqual(converter.getIdentifier("sample", "sample-s1"), "http://data.isa-tools.org/sample/1")
+        self.assertEqual(converter.getIdentifier("source", "sample-s1"), "http://data.isa-tools.org/source/1")
+        self.assertIsNone(converter.getIdentifier("sample", "sample-s2"))
+        self.assertIsNone(converter.getIdentifier("material", "sample-s1"))
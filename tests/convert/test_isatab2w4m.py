@@ -40,14 +40,15 @@ class TestIsatab2w4m(unittest.TestCase):
     def tearDown(self):
         shutil.rmtree(self._tmp_dir)
 
-    def plain_test(self, study, test_dir):
+    def plain_test(self, study, test_dir, chunksize=None):
         # Convert
         isatab2w4m.convert(
             input_dir=os.path.join(utils.TAB_DATA_DIR, test_dir), 
             output_dir=self._tmp_dir, 
             sample_output='%s-w4m-sample-metadata.tsv', 
             variable_output='%s-w4m-variable-metadata.tsv', 
-            matrix_output='%s-w4m-sample-variable-matrix.tsv')
+            matrix_output='%s-w4m-sample-variable-matrix.tsv',
+            chunksize=chunksize)
         # Check files
         for x in [
                 'sample-metadata', 'variable-metadata', 'sample-variable-matrix']:
@@ -71,6 +72,10 @@ class TestIsatab2w4m(unittest.TestCase):
     def test_MTBLS338(self):
         self.plain_test('MTBLS338', 'MTBLS338-w4m')
 
+    # Test writing the matrix by chunks
+    def test_MTBLS404_chunks(self):
+        self.plain_test('MTBLS404', 'MTBLS404-w4m', chunksize=10)
+
     # Test NA filtering
     def na_filtering_test(self, study, test_dir, samp_na_filtering=None, 
                           var_na_filtering=None):
@@ -0,0 +1,143 @@
+# Test the W4M conversion helpers on small in-memory tables, against the
+# row-wise implementations they replaced
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+import pandas
+
+from isatools import isatab as ISATAB
+from isatools.convert import isatab2w4m
+
+
+# Row-wise reference implementations {{{1
+################################################################
+
+def load_df_rowwise(path):
+    df = ISATAB.read_tfile(path)
+    df = df.map(lambda x: numpy.nan if x == '' else x)
+    return df
+
+
+def make_variable_names_rowwise(assay_df):
+    var_names = [''] * assay_df.shape[0]
+    for col in ['mass_to_charge', 'retention_time', 'chemical_shift']:
+        if col in assay_df.keys():
+            for i, v in enumerate(assay_df[col].values):
+                if isinstance(v, str) or not numpy.isnan(v):
+                    x = var_names[i]
+                    if x == '':
+                        x = str(v)
+                    else:
+                        x = '_'.join([x, str(v)])
+                    var_names[i] = x
+    var_names = ['X' + s for s in var_names]
+    return isatab2w4m.make_names(var_names, uniq=True)
+
+
+def get_sample_names_rowwise(assay_df, measures_df):
+    measures_cols = measures_df.axes[1]
+    for col in assay_df.axes[1]:
+        n = assay_df.get(col).tolist()
+        if len(n) == len(set(n)) and all([x in measures_cols for x in n]):
+            return n
+    return None
+
+
+# Test class {{{1
+################################################################
+
+class TestIsatab2w4mHelpers(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self.measures_df = pandas.DataFrame({
+            'database_identifier': ['CHEBI:1', 'CHEBI:2', '', 'CHEBI:4', 'CHEBI:5'],
+            'mass_to_charge': [101.5, numpy.nan, 88.25, 101.5, numpy.nan],
+            'retention_time': [3.2, 4.0, numpy.nan, 3.2, numpy.nan],
+            'chemical_shift': [numpy.nan, numpy.nan, numpy.nan, numpy.nan, '1.2'],
+            'sample 1': ['1.5', '2.5', '', '4', '5'],
+            'sample-2': ['6', '', '8', '9', '10'],
+        })
+        self.assay_df = pandas.DataFrame({
+            'Sample Name': ['sample 1', 'sample-2'],
+            'Extract Name': ['extract', 'extract'],
+            'MS Assay Name': ['sample 1', 'sample-2'],
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def test_load_df(self):
+        path = os.path.join(self._tmp_dir, 'm_table.tsv')
+        with open(path, 'w') as table_file:
+            table_file.write('"name"\t"value"\t"unit"\n"a"\t"1"\t""\n"b"\t""\t"mg"\n""\t"3"\t""\n')
+        df = isatab2w4m.load_df(path)
+        expected = load_df_rowwise(path)
+        pandas.testing.assert_frame_equal(df, expected)
+        self.assertEqual(int(df.isna().sum().sum()), 4)
+
+    def test_make_variable_names(self):
+        variable_names = isatab2w4m.make_variable_names(self.measures_df)
+        self.assertEqual(variable_names, make_variable_names_rowwise(self.measures_df))
+        self.assertEqual(variable_names, ['X101.5_3.2', 'X4.0', 'X88.25', 'X101.5_3.2.1', 'X1.2'])
+
+    def test_make_variable_names_without_value_columns(self):
+        df = pandas.DataFrame({'database_identifier': ['a', 'b', 'c']})
+        self.assertEqual(isatab2w4m.make_variable_names(df), make_variable_names_rowwise(df))
+        self.assertEqual(isatab2w4m.make_variable_names(df), ['X', 'X.1', 'X.2'])
+
+    def test_get_sample_names(self):
+        sample_names = isatab2w4m.get_sample_names(self.assay_df, self.measures_df)
+        self.assertEqual(sample_names, get_sample_names_rowwise(self.assay_df, self.measures_df))
+        self.assertEqual(sample_names, ['sample 1', 'sample-2'])
+
+    def test_get_sample_names_not_found(self):
+        assay_df = self.assay_df.assign(**{'Sample Name': ['sample 1', 'sample 3'],
+                                           'MS Assay Name': ['sample 1', 'sample 1']})
+        self.assertIsNone(get_sample_names_rowwise(assay_df, self.measures_df))
+        self.assertIsNone(isatab2w4m.get_sample_names(assay_df, self.measures_df))
+
+    def test_make_names(self):
+        names = ['Sample Name', 'Characteristics[organism]', 'a.b_c', '', 'Sample Name', '']
+        self.assertEqual(isatab2w4m.make_names(names),
+                         ['Sample.Name', 'Characteristics.organism.', 'a.b_c', 'X', 'Sample.Name', 'X.1'])
+        self.assertEqual(isatab2w4m.make_names(names, uniq=True),
+                         ['Sample.Name', 'Characteristics.organism.', 'a.b_c', 'X', 'Sample.Name.1', 'X.1'])
+
+    def test_make_matrix_chunks(self):
+        sample_names = ['sample 1', 'sample-2']
+        variable_names = isatab2w4m.make_variable_names(self.measures_df)
+        matrix = isatab2w4m.make_matrix(self.measures_df, sample_names, variable_names)
+        for chunksize in (1, 2, 5, 10):
+            chunks = list(isatab2w4m.make_matrix_chunks(self.measures_df, sample_names, variable_names,
+                                                        chunksize=chunksize))
+            self.assertEqual(len(chunks), -(-len(variable_names) // chunksize))
+            pandas.testing.assert_frame_equal(pandas.concat(chunks), matrix)
+
+    def test_write_data_frame_chunks(self):
+        sample_names = ['sample 1', 'sample-2']
+        variable_names = isatab2w4m.make_variable_names(self.measures_df)
+        matrix = isatab2w4m.make_matrix(self.measures_df, sample_names, variable_names)
+        isatab2w4m.write_data_frame(matrix, self._tmp_dir, 'whole.tsv', 'S', 'A')
+        chunks = isatab2w4m.make_matrix_chunks(self.measures_df, sample_names, variable_names, chunksize=2)
+        isatab2w4m.write_data_frame(chunks, self._tmp_dir, 'chunks.tsv', 'S', 'A')
+        with open(os.path.join(self._tmp_dir, 'whole.tsv')) as whole, \
+                open(os.path.join(self._tmp_dir, 'chunks.tsv')) as chunked:
+            self.assertEqual(chunked.read(), whole.read())
+
+    def test_filter_na_values_chunks(self):
+        sample_names = ['sample 1', 'sample-2']
+        variable_names = isatab2w4m.make_variable_names(self.measures_df)
+        variable_metadata = isatab2w4m.make_variable_metadata(self.measures_df, sample_names, variable_names)
+        assays = []
+        for matrix in (isatab2w4m.make_matrix(self.measures_df, sample_names, variable_names),
+                       isatab2w4m.make_matrix_chunks(self.measures_df, sample_names, variable_names, chunksize=2)):
+            assays.append(dict(samp=None, var=variable_metadata.copy(), mat=matrix))
+        isatab2w4m.filter_na_values(assays, var_na_filtering=['mass_to_charge'])
+        whole, chunks = assays[0]['mat'], pandas.concat(list(assays[1]['mat']))
+        pandas.testing.assert_frame_equal(chunks, whole)
+        self.assertEqual(whole['variable.name'].tolist(), ['X101.5_3.2', 'X88.25', 'X101.5_3.2.1'])
@@ -32,6 +32,7 @@ from isatools.create.model import (
     ProtocolNode,
     SequenceNode,
     AssayGraph,
+    AssayTemplate,
     SampleAndAssayPlan,
     StudyArm,
     StudyDesign,
@@ -2076,6 +2077,45 @@ class StudyDesignTest(BaseStudyDesignTest):
         self.assertEqual(extraction_processes[0].next_process, nmr_processes[-1])
         # self.assertIsInstance(next_item, DataFile)
 
+    def test_assay_template_matches_generate_isa_elements_from_node(self):
+        assay_graph = AssayGraph.generate_assay_plan_from_dict(nmr_assay_dict)
+        node = next(iter(assay_graph.start_nodes))
+        sample = Sample(name='sample_0')
+        processes, other_materials, characteristic_categories, data_files, _, __ = \
+            StudyDesign._generate_isa_elements_from_node(node, assay_graph, assay_graph.id, start_node_index=3,
+                                                         previous_items=[sample])
+        template = AssayTemplate(assay_graph)
+        self.assertEqual(len(template.subgraphs), 1)
+        size, subgraph = template.subgraphs[0]
+        self.assertEqual(subgraph.characteristic_categories, characteristic_categories)
+        t_processes, t_other_materials, t_data_files = subgraph.instantiate(sample, 3)
+        self.assertEqual([process.name for process in t_processes], [process.name for process in processes])
+        self.assertEqual([material.name for material in t_other_materials],
+                         [material.name for material in other_materials])
+        self.assertEqual([data_file.filename for data_file in t_data_files],
+                         [data_file.filename for data_file in data_files])
+        for t_process, process in zip(t_processes, processes):
+            self.assertEqual([getattr(item, 'name', None) for item in t_process.inputs],
+                             [getattr(item, 'name', None) for item in process.inputs])
+            self.assertEqual([getattr(item, 'filename', getattr(item, 'name', None)) for item in t_process.outputs],
+                             [getattr(item, 'filename', getattr(item, 'name', None)) for item in process.outputs])
+            self.assertEqual(t_process.prev_process.name if t_process.prev_process else None,
+                             process.prev_process.name if process.prev_process else None)
+            self.assertEqual(t_process.next_process.name if t_process.next_process else None,
+                             process.next_process.name if process.next_process else None)
+        self.assertIs(t_processes[0].inputs[0], sample)
+
+    def test_generate_assay_with_template(self):
+        assay_graph = AssayGraph.generate_assay_plan_from_dict(nmr_assay_dict)
+        samples = [Sample(name='sample_{}'.format(i)) for i in range(3)]
+        template = AssayTemplate(assay_graph)
+        assay = StudyDesign.generate_assay(assay_graph, samples)
+        assay_from_template = StudyDesign.generate_assay(assay_graph, samples, assay_template=template)
+        self.assertEqual(len(assay.process_sequence), 3 * (1 + 8 * 2))
+        self.assertEqual([process.name for process in assay.process_sequence],
+                         [process.name for process in assay_from_template.process_sequence])
+        self.assertEqual([process.inputs[0] for process in assay.process_sequence[::1 + 8 * 2]], samples)
+
     def test_generate_isa_study_single_arm_single_cell_elements(self):
         with open(os.path.join(os.path.dirname(__file__), '..', '..', 'isatools', 'resources', 'config', 'yaml',
                                'study-creator-config.yml')) as yaml_file:
@@ -2182,6 +2222,55 @@ class StudyDesignTest(BaseStudyDesignTest):
         ]
         self.assertEqual(len(ms_processes), 2 * 2 * 2 * 2 * expected_num_of_samples_ms_plan_first_arm)
 
+    def _two_arms_study_design(self):
+        first_arm = StudyArm(name=TEST_STUDY_ARM_NAME_00, group_size=4, arm_map=OrderedDict([
+            (self.cell_screen, None), (self.cell_run_in, None),
+            (self.cell_single_treatment_00, self.ms_sample_assay_plan),
+            (self.cell_follow_up, self.nmr_sample_assay_plan)
+        ]))
+        second_arm = StudyArm(name=TEST_STUDY_ARM_NAME_01, group_size=3, arm_map=OrderedDict([
+            (self.cell_screen, None), (self.cell_run_in, None),
+            (self.cell_single_treatment_01, self.nmr_sample_assay_plan),
+            (self.cell_follow_up_01, self.nmr_sample_assay_plan)
+        ]))
+        return StudyDesign(study_arms=(first_arm, second_arm))
+
+    def test_generate_isa_study_with_workers(self):
+        study_design = self._two_arms_study_design()
+        study = study_design.generate_isa_study()
+        parallel_study = study_design.generate_isa_study(workers=2)
+        self.assertEqual([sample.name for sample in parallel_study.samples], [sample.name for sample in study.samples])
+        self.assertEqual([assay.filename for assay in parallel_study.assays],
+                         [assay.filename for assay in study.assays])
+        for assay, parallel_assay in zip(study.assays, parallel_study.assays):
+            self.assertEqual([process.name for process in parallel_assay.process_sequence],
+                             [process.name for process in assay.process_sequence])
+            self.assertEqual([data_file.filename for data_file in parallel_assay.data_files],
+                             [data_file.filename for data_file in assay.data_files])
+            self.assertEqual([material.name for material in parallel_assay.other_material],
+                             [material.name for material in assay.other_material])
+            for process, parallel_process in zip(assay.process_sequence, parallel_assay.process_sequence):
+                self.assertIs(parallel_process.executes_protocol, process.executes_protocol)
+                self.assertEqual([getattr(item, 'name', None) for item in parallel_process.inputs],
+                                 [getattr(item, 'name', None) for item in process.inputs])
+            first_inputs = [process.inputs[0] for process in parallel_assay.process_sequence
+                            if isinstance(process.inputs[0], Sample)]
+            self.assertTrue(first_inputs)
+            self.assertTrue(all(any(sample is study_sample for study_sample in parallel_study.samples)
+                                for sample in first_inputs))
+
+    def test_iter_isa_study(self):
+        study_design = self._two_arms_study_design()
+        isa_study = study_design.iter_isa_study()
+        study = next(isa_study)
+        self.assertIsInstance(study, Study)
+        self.assertEqual(study.assays, [])
+        assays = list(isa_study)
+        self.assertEqual(len(assays), 2)
+        self.assertTrue(all(isinstance(assay, Assay) for assay in assays))
+        self.assertEqual(sorted(assay.filename for assay in assays),
+                         sorted(assay.filename for assay in study_design.generate_isa_study().assays))
+
     def test_generate_isa_study_two_arms_single_cell_elements_check_source_characteristics(self):
         control_source_type = Characteristic(
             category=OntologyAnnotation(
@@ -2367,6 +2456,71 @@ class QualityControlServiceTest(BaseStudyDesignTest):
             test_qc2 = QualityControlService.augment_study(study_no_qc, sample)
             self.assertEqual(test_qc2, er_msg.exception.args[0])
 
+    def test_augment_study_shares_unchanged_objects(self):
+        ms_sample_assay_plan = SampleAndAssayPlan.from_sample_and_assay_plan_dict(
+            'mass spectrometry sample and assay plan', sample_list, ms_assay_dict, quality_controls=[self.qc]
+        )
+        first_arm = StudyArm(name=TEST_STUDY_ARM_NAME_00, group_size=5, arm_map=OrderedDict([
+            (self.cell_screen, None), (self.cell_run_in, None),
+            (self.cell_single_treatment_00, ms_sample_assay_plan),
+            (self.cell_follow_up, self.nmr_sample_assay_plan)
+        ]))
+        study_design = StudyDesign(study_arms=(first_arm,))
+        study_no_qc = study_design.generate_isa_study()
+        samples, assays = list(study_no_qc.samples), list(study_no_qc.assays)
+        study_with_qc = QualityControlService.augment_study(study_no_qc, study_design)
+        # the original study is left unchanged
+        self.assertEqual(study_no_qc.samples, samples)
+        self.assertEqual([id(assay) for assay in study_no_qc.assays], [id(assay) for assay in assays])
+        # the samples and the assays without QC are shared, not copied
+        self.assertEqual([id(sample) for sample in study_with_qc.samples[:len(samples)]],
+                         [id(sample) for sample in samples])
+        self.assertGreater(len(study_with_qc.samples), len(samples))
+        nmr_assay = next(assay for assay in assays if assay.technology_type != ms_assay_dict['technology_type'])
+        self.assertIn(nmr_assay, study_with_qc.assays)
+        self.assertIs(study_with_qc.assays[assays.index(nmr_assay)], nmr_assay)
+
+    def test_augment_study_runs_pre_run_qc_samples_first(self):
+        ms_sample_assay_plan = SampleAndAssayPlan.from_sample_and_assay_plan_dict(
+            'mass spectrometry sample and assay plan', sample_list, ms_assay_dict, quality_controls=[self.qc]
+        )
+        first_arm = StudyArm(name=TEST_STUDY_ARM_NAME_00, group_size=5, arm_map=OrderedDict([
+            (self.cell_screen, None), (self.cell_run_in, None),
+            (self.cell_single_treatment_00, ms_sample_assay_plan),
+            (self.cell_follow_up, None)
+        ]))
+        study_design = StudyDesign(study_arms=(first_arm,))
+        study_with_qc = QualityControlService.augment_study(study_design.generate_isa_study(), study_design)
+        ms_assay_with_qc = next(assay for assay in study_with_qc.assays
+                                if assay.technology_type == ms_assay_dict['technology_type'])
+        run_order = []
+        for process in ms_assay_with_qc.process_sequence:
+            for sample in process.inputs:
+                if isinstance(sample, Sample) and sample not in run_order:
+                    run_order.append(sample)
+        pre_run_size, post_run_size = self.qc.pre_run_sample_type.size, self.qc.post_run_sample_type.size
+        self.assertTrue(all(sample.name.startswith('SMP-QC-PRE') for sample in run_order[:pre_run_size]))
+        self.assertTrue(all(sample.name.startswith('SMP-QC-POST') for sample in run_order[-post_run_size:]))
+        self.assertFalse(any(sample.name.startswith(('SMP-QC-PRE', 'SMP-QC-POST'))
+                             for sample in run_order[pre_run_size:-post_run_size]))
+
+    def test_augment_sample_batch_with_qc_samples(self):
+        samples = [Sample(name='sample_{0}'.format(i)) for i in range(7, -1, -1)]
+        pre_run_samples = [Sample(name='pre_run')]
+        post_run_samples = [Sample(name='post_run_{0}'.format(i)) for i in range(2)]
+        interspersed_samples = OrderedDict([
+            (('qc_a', 3), [Sample(name='qc_a_0'), Sample(name='qc_a_1')]),
+            (('qc_b', 6), [Sample(name='qc_b_0')])
+        ])
+        augmented_samples = QualityControlService._augment_sample_batch_with_qc_samples(
+            samples, pre_run_samples=pre_run_samples, post_run_samples=post_run_samples,
+            interspersed_samples=interspersed_samples
+        )
+        self.assertEqual([sample.name for sample in augmented_samples], [
+            'pre_run', 'sample_0', 'sample_1', 'sample_2', 'qc_a_0', 'sample_3', 'sample_4', 'sample_5',
+            'qc_a_1', 'qc_b_0', 'sample_6', 'sample_7', 'post_run_0', 'post_run_1'
+        ])
+
 
 class TreatmentFactoryTest(unittest.TestCase):
 
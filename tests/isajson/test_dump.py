@@ -1,8 +1,56 @@
+import re
 from unittest import TestCase
+from io import StringIO
 from json import dumps, loads
 
-from isatools.isajson.dump import ISAJSONEncoder
-from isatools.model import Investigation
+from isatools import isajson
+from isatools.isajson.dump import ISAJSONEncoder, ISAJSONStreamWriter, _STREAM_METHODS
+from isatools.model import (
+    Assay, Characteristic, Comment, DataFile, Extract, FactorValue, Investigation, Material, OntologyAnnotation,
+    OntologySource, ParameterValue, Process, Protocol, ProtocolParameter, Sample, Source, Study, StudyFactor
+)
+from isatools.model.context import set_context
+
+# the JSON-LD @id of an object created without an id is a new uuid4 on every to_dict()
+UUID = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+
+def create_investigation():
+    obi = OntologySource(name='OBI')
+    organism = OntologyAnnotation(term='organism', term_source=obi, term_accession='OBI:0100026')
+    mouse = OntologyAnnotation(term='Mus musculus', term_source=OntologySource(name='NCBITAXON'))
+    year = OntologyAnnotation(term='year')
+    dose = StudyFactor(name='dose', factor_type=OntologyAnnotation(term='dose'))
+    volume = ProtocolParameter(parameter_name=OntologyAnnotation(term='volume'))
+    collection = Protocol(name='sample collection', parameters=[volume])
+    extraction = Protocol(name='extraction')
+    study = Study(filename='s_test.txt', protocols=[collection, extraction], factors=[dose],
+                  comments=[Comment(name='note', value='"quoted"')])
+    study.characteristic_categories.append(organism)
+    study.units.append(year)
+    assay = Assay(filename='a_test.txt', measurement_type=OntologyAnnotation(term='metabolite profiling'))
+    for i in range(3):
+        source = Source(name='source{}'.format(i), characteristics=[
+            Characteristic(category=organism, value=mouse),
+            Characteristic(category=OntologyAnnotation(term='age'), value=i, unit=year)
+        ])
+        sample = Sample(name='sample{}'.format(i), derives_from=[source],
+                        factor_values=[FactorValue(factor_name=dose, value=i * 1.5, unit=year)])
+        study.sources.append(source)
+        study.samples.append(sample)
+        process = Process(executes_protocol=collection, inputs=[source], outputs=[sample], parameter_values=[
+            ParameterValue(category=volume, value=i, unit=year)])
+        study.process_sequence.append(process)
+        extract = Extract(name='extract{}'.format(i))
+        data_file = DataFile(filename='data{}.raw'.format(i), label='Raw Data File')
+        assay.samples.append(sample)
+        assay.other_material.append(extract)
+        assay.data_files.append(data_file)
+        assay.process_sequence.append(Process(executes_protocol=extraction, inputs=[sample],
+                                              outputs=[extract, data_file]))
+    study.assays.append(assay)
+    return Investigation(identifier='i1', title='Investigation é', ontology_source_references=[obi],
+                         studies=[study])
 
 
 class TestISAJsonDump(TestCase):
@@ -25,3 +73,91 @@ class TestISAJsonDump(TestCase):
             dumps(Test(), cls=ISAJSONEncoder)
         error = "Object of type Test is not JSON serializable"
         self.assertEqual(str(context.exception), error)
+
+
+class TestISAJSONStreamWriter(TestCase):
+
+    def setUp(self):
+        self.investigation = create_investigation()
+
+    def test_dumps_matches_encoder(self):
+        self.assertEqual(isajson.dumps(self.investigation), dumps(self.investigation, cls=ISAJSONEncoder))
+
+    def test_dump_matches_encoder(self):
+        buffer = StringIO()
+        isajson.dump(self.investigation, buffer)
+        self.assertEqual(buffer.getvalue(), dumps(self.investigation, cls=ISAJSONEncoder))
+
+    def test_dumps_other_isa_objects(self):
+        study = self.investigation.studies[0]
+        for isa_object in (study, study.assays[0], study.sources[0], study.protocols[0], study.factors[0]):
+            self.assertEqual(isajson.dumps(isa_object), dumps(isa_object, cls=ISAJSONEncoder))
+
+    def test_dumps_ld_keys(self):
+        expected = loads(dumps(self.investigation.to_dict(ld=True)))
+        actual = loads(isajson.dumps(self.investigation, ld=True))
+        self.assertEqual(list(actual.keys()), list(expected.keys()))
+        self.assertEqual(actual['@context'], expected['@context'])
+        self.assertEqual(list(actual['studies'][0]['materials']['sources'][0].keys()),
+                         list(expected['studies'][0]['materials']['sources'][0].keys()))
+
+    def test_dumps_ld_context_at_root(self):
+        set_context(context_at_root=True)
+        try:
+            expected = self.investigation.to_ld()
+            actual = loads(isajson.dumps(self.investigation, ld=True))
+        finally:
+            set_context()
+        self.assertEqual(list(actual.keys()), list(expected.keys()))
+        self.assertEqual(actual['@context'], expected['@context'])
+        self.assertNotIn('@context', actual['studies'][0])
+
+    def test_stream_methods_match_to_dict(self):
+        study = self.investigation.studies[0]
+        assay = study.assays[0]
+        isa_objects = {
+            Investigation: self.investigation,
+            Study: study,
+            Assay: assay,
+            Process: study.process_sequence[0],
+            Source: study.sources[0],
+            Sample: study.samples[0],
+            Material: assay.other_material[0],
+            DataFile: assay.data_files[0],
+            Characteristic: study.sources[0].characteristics[1],
+            FactorValue: study.samples[0].factor_values[0],
+            Comment: study.comments[0],
+            OntologyAnnotation: study.characteristic_categories[0],
+            OntologySource: self.investigation.ontology_source_references[0]
+        }
+        # every class with a streaming method must be checked against its to_dict()
+        self.assertEqual(set(isa_objects), set(_STREAM_METHODS))
+        for cls, isa_object in isa_objects.items():
+            with self.subTest(cls=cls.__name__):
+                self.assertIsInstance(isa_object, cls)
+                self.assertEqual(isajson.dumps(isa_object), dumps(isa_object.to_dict(), cls=ISAJSONEncoder))
+                self.assertEqual(UUID.sub('uuid', isajson.dumps(isa_object, ld=True)),
+                                 UUID.sub('uuid', dumps(isa_object.to_dict(ld=True), cls=ISAJSONEncoder)))
+
+    def test_stream_methods_table_is_not_modified(self):
+        stream_methods = dict(_STREAM_METHODS)
+        isajson.dumps(self.investigation)
+        self.assertEqual(_STREAM_METHODS, stream_methods)
+
+    def test_ontology_annotation_encoded_once(self):
+        chunks = []
+        writer = ISAJSONStreamWriter(StringIO())
+        writer._write = chunks.append
+        organism = self.investigation.studies[0].characteristic_categories[0]
+        writer.write([organism, organism])
+        self.assertEqual(len(writer._cache), 1)
+        self.assertEqual(''.join(chunks), dumps([organism, organism], cls=ISAJSONEncoder))
+
+    def test_dumps_with_error(self):
+
+        class Test:
+            pass
+
+        with self.assertRaises(TypeError) as context:
+            isajson.dumps(Test())
+        self.assertEqual(str(context.exception), "Object of type Test is not JSON serializable")
@@ -0,0 +1,137 @@
+import unittest
+
+from isatools.isajson.index import ISAJSONIndex, is_ontology_annotation
+
+
+def create_isa_json():
+    return {
+        "publicReleaseDate": "2020-01-01",
+        "submissionDate": "not a date",
+        "ontologySourceReferences": [{"name": "OBI"}, {"name": "UO"}],
+        "publications": [{"doi": "10.1000/xyz", "pubMedID": "12345678"}],
+        "studies": [{
+            "filename": "s_study.txt",
+            "publicReleaseDate": "2020-01-02",
+            "publications": [{"pubMedID": "PMC12345678"}],
+            "characteristicCategories": [{"@id": "#ontology_annotation/organism"}],
+            "unitCategories": [{"@id": "#unit/mg"}],
+            "factors": [{"@id": "#factor/dose", "factorName": "dose"}],
+            "protocols": [{
+                "@id": "#protocol/sampling", "name": "sampling",
+                "protocolType": {"annotationValue": "sampling", "termAccession": "", "termSource": ""},
+                "parameters": [{"@id": "#parameter/volume", "parameterName": "volume"}]
+            }],
+            "materials": {
+                "sources": [{
+                    "@id": "#source/1",
+                    "characteristics": [{
+                        "category": {"@id": "#ontology_annotation/organism"},
+                        "value": {"annotationValue": "mouse", "termAccession": "acc", "termSource": "NCBITAXON"}
+                    }]
+                }],
+                "samples": [{
+                    "@id": "#sample/1", "characteristics": [],
+                    "factorValues": [{"category": {"@id": "#factor/dose"}, "value": 1, "unit": {"@id": "#unit/mg"}}]
+                }]
+            },
+            "processSequence": [{
+                "@id": "#process/1", "date": "2020-01-03",
+                "executesProtocol": {"@id": "#protocol/sampling"},
+                "parameterValues": [{"category": {"@id": "#parameter/volume"}, "value": 1}],
+                "inputs": [{"@id": "#source/1"}], "outputs": [{"@id": "#sample/1"}]
+            }],
+            "assays": [{
+                "filename": "a_assay.txt",
+                "characteristicCategories": [],
+                "unitCategories": [],
+                "materials": {
+                    "samples": [{"@id": "#sample/1"}],
+                    "otherMaterials": [{"@id": "#material/extract"}]
+                },
+                "dataFiles": [{"@id": "#data/raw"}],
+                "processSequence": [{
+                    "@id": "#process/2",
+                    "executesProtocol": {"@id": "#protocol/extraction"},
+                    "parameterValues": [],
+                    "inputs": [{"@id": "#sample/1"}], "outputs": [{"@id": "#material/extract"}]
+                }]
+            }]
+        }]
+    }
+
+
+class TestISAJSONIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.isa_json = create_isa_json()
+        self.index = ISAJSONIndex(self.isa_json)
+
+    def test_is_ontology_annotation(self):
+        self.assertTrue(is_ontology_annotation({"annotationValue": "", "termAccession": "", "termSource": ""}))
+        self.assertTrue(is_ontology_annotation(
+            {"@id": "#oa", "annotationValue": "", "termAccession": "", "termSource": ""}))
+        self.assertFalse(is_ontology_annotation(
+            {"comments": [], "annotationValue": "", "termAccession": "", "termSource": ""}))
+        self.assertFalse(is_ontology_annotation({"annotationValue": "", "termSource": ""}))
+
+    def test_investigation_index(self):
+        self.assertEqual(self.index.ontology_source_refs, ["OBI", "UO"])
+        self.assertEqual(self.index.dates, ["2020-01-01", "not a date", "2020-01-02", "2020-01-03"])
+        self.assertEqual(self.index.dois, ["10.1000/xyz"])
+        self.assertEqual(self.index.pubmed_ids, ["12345678", "PMC12345678"])
+        self.assertEqual([annotation["annotationValue"] for annotation in self.index.annotations],
+                         ["sampling", "mouse"])
+
+    def test_study_index(self):
+        self.assertEqual(len(self.index.studies), 1)
+        study_index = self.index.studies[0]
+        self.assertEqual(study_index.source_ids, ["#source/1"])
+        self.assertEqual(study_index.sample_ids, ["#sample/1"])
+        self.assertEqual(study_index.material_ids, ["#material/extract"])
+        self.assertEqual(study_index.data_file_ids, ["#data/raw"])
+        self.assertEqual(study_index.all_io_ids, ["#source/1", "#sample/1", "#sample/1", "#material/extract"])
+        self.assertEqual(study_index.protocol_ids, ["#protocol/sampling"])
+        self.assertEqual(study_index.all_protocol_ids_used, ["#protocol/sampling", "#protocol/extraction"])
+        self.assertEqual(study_index.parameter_ids, ["#parameter/volume"])
+        self.assertEqual(study_index.all_parameter_ids_used, ["#parameter/volume"])
+        self.assertEqual(study_index.factor_ids_used, ["#factor/dose"])
+        self.assertEqual(study_index.all_characteristic_categories, ["#characteristic_category/organism"])
+        self.assertEqual(study_index.all_characteristic_categories_used, ["#characteristic_category/organism"])
+        self.assertEqual(study_index.all_unit_categories_used, ["#unit/mg"])
+
+    def test_index_study(self):
+        study_index = ISAJSONIndex.index_study(self.isa_json["studies"][0])
+        self.assertEqual(study_index.all_io_ids, self.index.studies[0].all_io_ids)
+        self.assertEqual(study_index.dates, ["2020-01-02", "2020-01-03"])
+
+
+class TestValidateWithIndex(unittest.TestCase):
+
+    def setUp(self):
+        import importlib
+        self.validate = importlib.import_module("isatools.isajson.validate")
+        self.validate.errors = []
+        self.validate.warnings = []
+
+    def _run_checks(self, index):
+        isa_json = create_isa_json()
+        study_index = index.studies[0] if index else None
+        study_json = isa_json["studies"][0]
+        self.validate.check_material_ids_not_declared_used(study_json, study_index)
+        self.validate.check_material_ids_declared_used(study_json, self.validate.get_data_file_ids, study_index)
+        self.validate.check_process_protocol_ids_usage(study_json, study_index)
+        self.validate.check_date_formats(isa_json, index)
+        self.validate.check_pubmed_ids_format(isa_json, index)
+        self.validate.check_term_source_refs(isa_json, index)
+        self.validate.check_term_accession_used_no_source_ref(isa_json, index)
+        return self.validate.errors, self.validate.warnings
+
+    def test_checks_with_and_without_index(self):
+        errors, warnings = self._run_checks(None)
+        self.assertEqual([error["code"] for error in errors], [1007, 3009])
+        self.assertEqual([warning["code"] for warning in warnings], [1017, 3001])
+        self.validate.errors = []
+        self.validate.warnings = []
+        indexed_errors, indexed_warnings = self._run_checks(ISAJSONIndex(create_isa_json()))
+        self.assertEqual(errors, indexed_errors)
+        self.assertEqual(warnings, indexed_warnings)
@@ -0,0 +1,130 @@
+import importlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from isatools.isajson import ISAJSONEncoder, batch_validate, iter_batch_validate, load, load_dict
+from isatools.model import (
+    Assay, Extract, Investigation, OntologyAnnotation, Process, Protocol, Sample, Source, Study
+)
+
+
+class TestCheckUTF8(unittest.TestCase):
+
+    def setUp(self):
+        self.validate = importlib.import_module("isatools.isajson.validate")
+        self.validate.warnings = []
+        self._tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def _write(self, content, encoding):
+        path = os.path.join(self._tmp_dir, "isa.json")
+        with open(path, "w", encoding=encoding) as fp:
+            fp.write(content)
+        return open(path)
+
+    def test_utf8_file(self):
+        with self._write('{"title": "' + "café " * 100000 + '"}', "utf-8") as fp:
+            self.validate.check_utf8(fp, limit=1024)
+        self.assertEqual(self.validate.warnings, [])
+
+    def test_non_utf8_file(self):
+        text = "Les études menées à l'hôpital ont montré des résultats très " \
+               "intéressants pour la santé publique. "
+        with self._write('{"title": "' + text * 50 + '"}', "cp1252") as fp:
+            with self.assertRaises(SystemError):
+                self.validate.check_utf8(fp)
+        self.assertEqual([warning["code"] for warning in self.validate.warnings], [10])
+
+
+class TestLoadDict(unittest.TestCase):
+
+    def test_load_dict_matches_load(self):
+        isa_json = {"identifier": "i1", "title": "Investigation", "studies": [{"identifier": "s1"}]}
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "isa.json")
+            with open(path, "w") as fp:
+                json.dump(isa_json, fp)
+            with open(path) as fp:
+                loaded = load(fp)
+        finally:
+            shutil.rmtree(tmp_dir)
+        investigation = load_dict(isa_json)
+        self.assertEqual(investigation.identifier, loaded.identifier)
+        self.assertEqual([study.identifier for study in investigation.studies], ["s1"])
+
+
+class TestBatchValidate(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self.json_files = []
+        for identifier in ("S1", "S2", "S3", "S4"):
+            investigation = Investigation(identifier=identifier)
+            investigation.studies.append(Study(identifier=identifier, filename="s_%s.txt" % identifier))
+            path = os.path.join(self._tmp_dir, identifier + ".json")
+            with open(path, "w") as fp:
+                json.dump(investigation, fp, cls=ISAJSONEncoder)
+            self.json_files.append(path)
+        with open(os.path.join(self._tmp_dir, "invalid.json"), "w") as fp:
+            fp.write('{"studies": "none"}')
+        self.json_files.append(fp.name)
+        self.json_files.insert(1, os.path.join(self._tmp_dir, "missing.json"))
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def test_batch_validate_workers(self):
+        serial = batch_validate(self.json_files)["batch_report"]
+        parallel = batch_validate(self.json_files, workers=2, chunksize=2)["batch_report"]
+        self.assertEqual([entry["filename"] for entry in serial],
+                         [path for path in self.json_files if not path.endswith("missing.json")])
+        self.assertEqual(parallel, serial)
+        self.assertNotEqual(serial[-1]["report"]["errors"], [])
+
+    def test_iter_batch_validate(self):
+        entries = list(iter_batch_validate(self.json_files, workers=2))
+        self.assertEqual(sorted(entry["filename"] for entry in entries),
+                         sorted(path for path in self.json_files if not path.endswith("missing.json")))
+
+    def test_worker_validations_leave_configs_unchanged(self):
+        # the configurations preloaded by a worker are shared by all its validations
+        validate = importlib.import_module("isatools.isajson.validate")
+        study = Study(identifier="S5", filename="s_S5.txt")
+        sampling = Protocol(name="sampling", protocol_type=OntologyAnnotation(term="sample collection"))
+        extraction = Protocol(name="extraction", protocol_type=OntologyAnnotation(term="extraction"))
+        source = Source(name="source1")
+        sample = Sample(name="sample1", derives_from=[source])
+        extract = Extract(name="extract1")
+        study.protocols.extend([sampling, extraction])
+        study.sources.append(source)
+        study.samples.append(sample)
+        study.process_sequence.append(Process(executes_protocol=sampling, inputs=[source], outputs=[sample]))
+        assay = Assay(filename="a_S5.txt", measurement_type=OntologyAnnotation(term="metabolite profiling"),
+                      technology_type=OntologyAnnotation(term="mass spectrometry"))
+        assay.samples.append(sample)
+        assay.other_material.append(extract)
+        assay.process_sequence.append(Process(executes_protocol=extraction, inputs=[sample], outputs=[extract]))
+        study.assays.append(assay)
+        path = os.path.join(self._tmp_dir, "S5.json")
+        with open(path, "w") as fp:
+            json.dump(Investigation(identifier="S5", studies=[study]), fp, cls=ISAJSONEncoder)
+
+        config_dir = validate.default_config_dir
+        validate._init_batch_worker(config_dir)
+        try:
+            configs = validate._preloaded_configs[config_dir]
+            snapshot = pickle.dumps(configs)
+            first, second = validate._validate_json_files([path, path], config_dir)
+            self.assertEqual(pickle.dumps(configs), snapshot)
+        finally:
+            validate._preloaded_configs.clear()
+            validate._preloaded_schema_validators.clear()
+        self.assertTrue(first["report"]["validation_finished"])
+        self.assertEqual(second, first)
@@ -0,0 +1,63 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from isatools import isatab
+from isatools.isatab.dump import DataFrameTableSink, StringTableSink, write_study_table_files
+from isatools.model import (
+    Characteristic, Investigation, OntologyAnnotation, Process, Protocol, Sample, Source, Study
+)
+
+
+def create_investigation():
+    investigation = Investigation(identifier='i1')
+    study = Study(filename='s_test.txt', protocols=[Protocol(name='sample collection')])
+    for i in range(3):
+        source = Source(name='source{}'.format(i), characteristics=[
+            Characteristic(category=OntologyAnnotation(term='organism'), value=OntologyAnnotation(term='N/A')),
+            Characteristic(category=OntologyAnnotation(term='age'), value=i, unit=OntologyAnnotation(term='year'))
+        ])
+        sample = Sample(name='sample{}'.format(i))
+        process = Process(executes_protocol=study.protocols[0], inputs=[source], outputs=[sample])
+        study.process_sequence.append(process)
+    investigation.studies.append(study)
+    return investigation
+
+
+class TestTableSinks(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self.investigation = create_investigation()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def test_string_sink_matches_file(self):
+        write_study_table_files(self.investigation, self._tmp_dir)
+        sink = StringTableSink()
+        write_study_table_files(self.investigation, sink)
+        with open(os.path.join(self._tmp_dir, 's_test.txt'), encoding='utf-8', newline='') as s_fp:
+            self.assertEqual(sink.tables['s_test.txt'], s_fp.read())
+
+    def test_dataframe_sink_matches_read_tfile(self):
+        write_study_table_files(self.investigation, self._tmp_dir)
+        expected = isatab.read_tfile(os.path.join(self._tmp_dir, 's_test.txt'))
+        sink = DataFrameTableSink()
+        write_study_table_files(self.investigation, sink)
+        actual = sink.tables['s_test.txt']
+        self.assertIsInstance(actual, isatab.IsaTabDataFrame)
+        self.assertEqual(list(actual.columns), list(expected.columns))
+        self.assertEqual(actual.values.tolist(), expected.values.tolist())
+
+    def test_dumps(self):
+        output = isatab.dumps(self.investigation)
+        self.assertTrue(output.startswith('i_investigation.txt\nONTOLOGY SOURCE REFERENCE\n'))
+        self.assertIn('--------\ns_test.txt\nSource Name\t', output)
+
+    def test_dump_tables_to_dataframes(self):
+        tables = isatab.dump_tables_to_dataframes(self.investigation)
+        self.assertEqual(list(tables.keys()), ['s_test.txt'])
+        self.assertEqual(tables['s_test.txt']['Source Name'].tolist(), ['source0', 'source1', 'source2'])
+        self.assertEqual(tables['s_test.txt']['Characteristics[organism]'].tolist(), ['', '', ''])
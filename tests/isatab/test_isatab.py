@@ -1864,6 +1864,44 @@ sample1\textraction\te2\tscanning\td2"""
                               'Data Transformation Name')
         os.remove(tmp.name)
 
+    def test_isatab_parser_study_and_process_nodes(self):
+        investigation = Investigation(identifier='I1')
+        investigation.studies.append(Study(identifier='S1', filename='s_S1.txt'))
+        isatab.dump(investigation, self._tmp_dir)
+        with open(os.path.join(self._tmp_dir, 's_S1.txt'), 'w') as fp:
+            fp.write('Source Name\tCharacteristics[organism]\tTerm Source REF\tTerm Accession Number\t'
+                     'Protocol REF\tPerformer\tDate\tParameter Value[volume]\tUnit\tTerm Source REF\t'
+                     'Term Accession Number\tSample Name\tFactor Value[dose]\tComment[note]\n'
+                     'source1\tmouse\tNCBITaxon\t10090\tsampling\tjo\t2020-01-01\t5\tml\tUO\t1\t'
+                     'sample1\tlow\tfirst\n'
+                     'source1\tmouse\tNCBITaxon\t10090\tsampling\tjo\t2020-01-01\t5\tml\tUO\t1\t'
+                     'sample2\thigh\tsecond\n'
+                     'source2\trat\tNCBITaxon\t10116\tsampling\tal\t2020-01-02\t6\tml\tUO\t1\t'
+                     'sample3\tlow\tthird\n')
+        study = isatab_parser.parse(self._tmp_dir).studies[0]
+
+        self.assertEqual(sorted(study.nodes), ['sample-sample1', 'sample-sample2', 'sample-sample3',
+                                               'source-source1', 'source-source2'])
+        source = study.nodes['source-source1']
+        self.assertEqual(source.attributes, ['Characteristics[organism]'])
+        organism = source.metadata['Characteristics[organism]'][0]
+        self.assertEqual(organism._fields, ('organism', 'Term_Source_REF', 'Term_Accession_Number'))
+        self.assertEqual(tuple(organism), ('mouse', 'NCBITaxon', '10090'))
+        sample = study.nodes['sample-sample2']
+        self.assertEqual(sample.attributes, ['Factor Value[dose]', 'Comment[note]'])
+        self.assertEqual(sample.derivesFrom, ['source1'])
+        self.assertEqual(sample.metadata['Factor Value[dose]'][0].dose, 'high')
+
+        self.assertEqual(sorted(study.process_nodes), ['sampling1', 'sampling2'])
+        process = study.process_nodes['sampling1']
+        self.assertEqual((process.protocol, process.performer, process.date), ('sampling', 'jo', '2020-01-01'))
+        self.assertEqual(process.inputs, ['source-source1'])
+        self.assertEqual(sorted(process.outputs), ['sample-sample1', 'sample-sample2'])
+        self.assertEqual(process.parameters, ['Parameter Value[volume]', 'Parameter Value[volume]'])
+        volume = process.metadata['Parameter Value[volume]'][0]
+        self.assertEqual((volume.volume, volume.Unit), ('5', 'ml'))
+        self.assertEqual(study.process_nodes['sampling2'].outputs, ['sample-sample3'])
+
     def test_isatab_factor_value_parsing_issue270(self):
         with open(os.path.join(self._tab_data_dir, 'issue270', 'i_matteo.txt'),
                   encoding='utf-8') as fp:
@@ -1,8 +1,18 @@
+import os
+import pickle
+import shutil
+import tempfile
 import unittest
 from os import path
 
 from isatools.tests import utils
-from isatools.isatab import validate
+from isatools.isatab import batch_validate, dump, iter_batch_validate, validate
+from isatools.isatab.defaults import default_config_dir
+from isatools.model import (
+    Assay, Extract, Investigation, OntologyAnnotation, Process, Protocol, Sample, Source, Study
+)
+from isatools.isatab.validate import core as validate_core
+from isatools.isatab.validate.rules import rules_40xx
 from isatools.isatab.validate.rules.core import Rule, Rules
 from isatools.isatab.validate.rules.defaults import INVESTIGATION_RULES_MAPPING
 from isatools.isatab.validate.store import validator as message_handler
@@ -98,3 +108,77 @@ class TestValidators(unittest.TestCase):
     def test_store(self):
         message_handler.reset_store()
         self.assertEqual(str(message_handler), "{'errors': [], 'warnings': [], 'info': []}")
+
+
+class TestBatchValidate(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self._tmp_dir = tempfile.mkdtemp()
+        self.tab_dirs = []
+        for identifier in ('S1', 'S2', 'S3', 'S4', 'S5'):
+            investigation = Investigation(identifier=identifier)
+            study = Study(identifier=identifier, title='Study ' + identifier, filename='s_%s.txt' % identifier)
+            sampling = Protocol(name='sampling', protocol_type=OntologyAnnotation(term='sample collection'))
+            source = Source(name='source1')
+            sample = Sample(name='sample1', derives_from=[source])
+            study.protocols.append(sampling)
+            study.sources.append(source)
+            study.samples.append(sample)
+            study.process_sequence.append(Process(executes_protocol=sampling, inputs=[source], outputs=[sample]))
+            investigation.studies.append(study)
+            tab_dir = path.join(self._tmp_dir, identifier)
+            os.makedirs(tab_dir)
+            dump(investigation, tab_dir)
+            self.tab_dirs.append(tab_dir)
+        # no investigation file, skipped
+        self.tab_dirs.insert(2, path.join(self._tmp_dir, 'empty'))
+        os.makedirs(self.tab_dirs[2])
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self._tmp_dir)
+
+    def test_batch_validate_workers(self):
+        serial = batch_validate(self.tab_dirs)['batch_report']
+        parallel = batch_validate(self.tab_dirs, workers=2, chunksize=2)['batch_report']
+        self.assertEqual([x['filename'] for x in serial],
+                         [path.join(self._tmp_dir, x, 'i_investigation.txt') for x in ('S1', 'S2', 'S3', 'S4', 'S5')])
+        self.assertEqual(parallel, serial)
+
+    def test_iter_batch_validate(self):
+        entries = list(iter_batch_validate(self.tab_dirs, workers=2))
+        self.assertEqual(sorted(x['filename'] for x in entries),
+                         [path.join(self._tmp_dir, x, 'i_investigation.txt') for x in ('S1', 'S2', 'S3', 'S4', 'S5')])
+        self.assertTrue(all(x['report']['validation_finished'] for x in entries))
+
+    def test_worker_validations_leave_configs_unchanged(self):
+        # the configurations preloaded by a worker are shared by all its validations
+        study = Study(identifier='S6', title='Study S6', filename='s_S6.txt')
+        sampling = Protocol(name='sampling', protocol_type=OntologyAnnotation(term='sample collection'))
+        extraction = Protocol(name='extraction', protocol_type=OntologyAnnotation(term='extraction'))
+        source = Source(name='source1')
+        sample = Sample(name='sample1', derives_from=[source])
+        extract = Extract(name='extract1')
+        study.protocols.extend([sampling, extraction])
+        study.sources.append(source)
+        study.samples.append(sample)
+        study.process_sequence.append(Process(executes_protocol=sampling, inputs=[source], outputs=[sample]))
+        assay = Assay(filename='a_S6.txt', measurement_type=OntologyAnnotation(term='metabolite profiling'),
+                      technology_type=OntologyAnnotation(term='mass spectrometry'))
+        assay.samples.append(sample)
+        assay.other_material.append(extract)
+        assay.process_sequence.append(Process(executes_protocol=extraction, inputs=[sample], outputs=[extract]))
+        study.assays.append(assay)
+        tab_dir = path.join(self._tmp_dir, 'S6')
+        os.makedirs(tab_dir)
+        dump(Investigation(identifier='S6', studies=[study]), tab_dir)
+
+        validate_core._init_batch_worker(default_config_dir)
+        try:
+            configs = rules_40xx._preloaded_configs[default_config_dir]
+            snapshot = pickle.dumps(configs)
+            first, second = validate_core._validate_tab_dirs([tab_dir, tab_dir], default_config_dir)
+            self.assertEqual(pickle.dumps(configs), snapshot)
+        finally:
+            rules_40xx._preloaded_configs.pop(default_config_dir, None)
+        self.assertIn(4010, [warning['code'] for warning in first['report']['warnings']])
+        self.assertEqual(second, first)
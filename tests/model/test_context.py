@@ -1,5 +1,6 @@
 from unittest import TestCase
-from isatools.model.context import ContextPath
+from isatools.model import Comment, Investigation
+from isatools.model.context import ContextPath, set_context
 
 
 class TestContextPath(TestCase):
@@ -21,3 +22,41 @@ class TestContextPath(TestCase):
         self.context.context = 'sdo'
         self.assertEqual(repr(self.context), "sdo")
         self.assertEqual(str(self.context), "sdo")
+
+    def test_get_context_memoized(self):
+        context_path = self.context.get_context('Characteristic')
+        self.assertIs(self.context.get_context('Characteristic'), context_path)
+        self.assertIn(('Characteristic', 'obo', True, True), self.context.context_paths)
+        self.context.all_in_one = False
+        self.assertTrue(self.context.get_context('Characteristic').endswith(
+            'isa_material_attribute_value_number_obo_context.jsonld'))
+        self.context.context = 'sdo'
+        self.assertTrue(self.context.get_context('Characteristic').endswith(
+            'isa_material_attribute_value_number_sdo_context.jsonld'))
+
+    def test_load_context_cached(self):
+        self.context.all_in_one = False
+        self.context.include_contexts = True
+        loaded_context = self.context.get_context('Comment')
+        self.assertIn('@context', loaded_context)
+        self.assertIn(self.context.get_context_path('Comment'), self.context.contexts)
+        self.assertIs(self.context.get_context('Comment'), loaded_context)
+
+
+class TestContextAtRoot(TestCase):
+
+    def tearDown(self) -> None:
+        set_context()
+
+    def test_to_ld(self):
+        investigation = Investigation(identifier='i1', comments=[Comment(name='note', value='value')])
+        inv_ld = investigation.to_ld()
+        self.assertIn('@context', inv_ld['comments'][0])
+
+        set_context(context_at_root=True)
+        inv_ld = investigation.to_ld()
+        self.assertEqual(list(inv_ld.keys())[0], '@context')
+        self.assertTrue(inv_ld['@context'].endswith('isa_allinone_obo_context.jsonld'))
+        self.assertEqual(inv_ld['@type'], 'Investigation')
+        self.assertNotIn('@context', inv_ld['comments'][0])
+        self.assertEqual(inv_ld['comments'][0]['@type'], 'Comment')
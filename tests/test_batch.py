@@ -0,0 +1,196 @@
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from io import StringIO
+from logging import getLogger, CRITICAL
+from unittest.mock import patch
+
+from isatools import isatab
+from isatools.isajson import ISAJSONEncoder
+from isatools.__main__ import main
+from isatools.batch import BatchRunner, glob_items, make_item, read_completed, read_manifest
+from isatools.model import (
+    Assay, Extract, Investigation, OntologyAnnotation, OntologySource, Process, Protocol, Sample, Source, Study
+)
+
+log = getLogger('isatools')
+log.level = CRITICAL
+
+
+def dump_archive(directory, identifier):
+    investigation = Investigation(identifier=identifier)
+    obi = OntologySource(name='OBI', description='Ontology for Biomedical Investigations')
+    investigation.ontology_source_references.append(obi)
+    study = Study(identifier=identifier, title='Study ' + identifier, description='A study',
+                  filename='s_%s.txt' % identifier)
+    investigation.studies.append(study)
+    sampling = Protocol(name='sampling', protocol_type=OntologyAnnotation(term='sample collection'))
+    extraction = Protocol(name='extraction', protocol_type=OntologyAnnotation(term='extraction'))
+    study.protocols.extend([sampling, extraction])
+    source = Source(name='source1')
+    sample = Sample(name='sample1', derives_from=[source])
+    study.sources.append(source)
+    study.samples.append(sample)
+    study.process_sequence.append(Process(executes_protocol=sampling, inputs=[source], outputs=[sample]))
+    extract = Extract(name='extract1')
+    assay = Assay(filename='a_%s.txt' % identifier, samples=[sample], other_material=[extract],
+                  measurement_type=OntologyAnnotation(term='metabolite profiling'),
+                  technology_type=OntologyAnnotation(term='mass spectrometry'))
+    assay.process_sequence.append(Process(executes_protocol=extraction, inputs=[sample], outputs=[extract]))
+    study.assays.append(assay)
+    os.makedirs(directory)
+    isatab.dump(investigation, directory)
+    return investigation
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self.archives_dir = os.path.join(self._tmp_dir, 'archives')
+        self.out_dir = os.path.join(self._tmp_dir, 'out')
+        self.results_path = os.path.join(self._tmp_dir, 'results.jsonl')
+        self.json_dir = os.path.join(self._tmp_dir, 'json')
+        os.makedirs(self.json_dir)
+        for identifier in ('S1', 'S2', 'S3'):
+            investigation = dump_archive(os.path.join(self.archives_dir, identifier), identifier)
+            with open(os.path.join(self.json_dir, identifier + '.json'), 'w') as isa_json:
+                json.dump(investigation, isa_json, cls=ISAJSONEncoder)
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def read_results(self):
+        with open(self.results_path) as results:
+            return [json.loads(line) for line in results]
+
+    def test_glob_items(self):
+        items = glob_items(os.path.join(self.archives_dir, '*'), ['validate-isatab', 'isatab2json'], self.out_dir)
+        self.assertEqual(len(items), 6)
+        self.assertEqual(items[0], {'task': 'validate-isatab', 'input': os.path.join(self.archives_dir, 'S1'),
+                                    'output': None})
+        self.assertEqual(items[1]['output'], os.path.join(self.out_dir, 'S1.json'))
+        with self.assertRaises(ValueError):
+            glob_items(os.path.join(self.archives_dir, '*'), ['isatab2json'])
+        with self.assertRaises(ValueError):
+            make_item('isatab2xml', 'S1')
+
+    def test_read_manifest(self):
+        manifest_path = os.path.join(self._tmp_dir, 'manifest.txt')
+        with open(manifest_path, 'w') as manifest:
+            manifest.write('# nightly\n\narchives/S1\n'
+                           '{"input": "S2.json", "task": "json2isatab", "output": "tabs/S2"}\n')
+        items = read_manifest(manifest_path, ['validate-isatab', 'isatab2json'], 'out')
+        self.assertEqual(items, [
+            {'task': 'validate-isatab', 'input': 'archives/S1', 'output': None},
+            {'task': 'isatab2json', 'input': 'archives/S1', 'output': os.path.join('out', 'S1.json')},
+            {'task': 'json2isatab', 'input': 'S2.json', 'output': 'tabs/S2'}
+        ])
+        with self.assertRaises(ValueError):
+            read_manifest(manifest_path)
+
+    def test_run(self):
+        items = glob_items(os.path.join(self.archives_dir, '*'), ['validate-isatab'])
+        items += glob_items(os.path.join(self.json_dir, '*.json'), ['validate-isajson', 'json2isatab'], self.out_dir)
+        items.append(make_item('validate-isajson', os.path.join(self._tmp_dir, 'missing.json')))
+        summary = BatchRunner(self.results_path, workers=2).run(items)
+        self.assertEqual({k: summary[k] for k in ('total', 'skipped', 'completed', 'ok', 'failed')},
+                         {'total': 10, 'skipped': 0, 'completed': 10, 'ok': 9, 'failed': 1})
+        self.assertGreater(summary['items_per_second'], 0)
+        self.assertGreater(summary['bytes_per_second'], 0)
+
+        results = {(result['task'], os.path.basename(result['input'])): result for result in self.read_results()}
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[('validate-isatab', 'S1')]['status'], 'ok')
+        self.assertEqual(results[('validate-isatab', 'S1')]['report']['errors'], [])
+        self.assertEqual(results[('validate-isajson', 'S2.json')]['report']['errors'], [])
+        self.assertEqual(results[('json2isatab', 'S3.json')]['output'], os.path.join(self.out_dir, 'S3'))
+        self.assertEqual(results[('validate-isajson', 'missing.json')]['status'], 'error')
+        self.assertIn('FileNotFoundError', results[('validate-isajson', 'missing.json')]['error'])
+        with open(os.path.join(self.out_dir, 'S2', 'i_investigation.txt')) as i_file:
+            self.assertIn('Study Identifier\tS2\n', i_file.read())
+
+    def test_resume(self):
+        items = glob_items(os.path.join(self.archives_dir, '*'), ['validate-isatab'])
+        BatchRunner(self.results_path, workers=2).run(items)
+        with open(self.results_path) as results:
+            lines = results.readlines()
+        # an interrupted batch, the last result cut short
+        with open(self.results_path, 'w') as results:
+            results.write(lines[0] + lines[1][:10])
+        self.assertEqual(len(read_completed(self.results_path)), 1)
+
+        summary = BatchRunner(self.results_path, workers=2, resume=True).run(items)
+        self.assertEqual((summary['skipped'], summary['completed']), (1, 2))
+        self.assertEqual(sorted(result['input'] for result in self.read_results()),
+                         sorted(item['input'] for item in items))
+
+        summary = BatchRunner(self.results_path, resume=True).run(items)
+        self.assertEqual((summary['skipped'], summary['completed']), (3, 0))
+
+        summary = BatchRunner(self.results_path).run(items[:1])
+        self.assertEqual(summary['completed'], 1)
+        self.assertEqual(len(self.read_results()), 1)
+
+    def test_resume_retries_failed_items(self):
+        missing_path = os.path.join(self.json_dir, 'missing.json')
+        items = [make_item('validate-isatab', os.path.join(self.archives_dir, 'S1')),
+                 make_item('json2isatab', missing_path, out_dir=self.out_dir)]
+        summary = BatchRunner(self.results_path).run(items)
+        self.assertEqual((summary['ok'], summary['failed']), (1, 1))
+        self.assertEqual(read_completed(self.results_path), {('validate-isatab', items[0]['input'])})
+
+        summary = BatchRunner(self.results_path, resume=True).run(items)
+        self.assertEqual((summary['skipped'], summary['completed'], summary['failed']), (1, 1, 1))
+
+        shutil.copy(os.path.join(self.json_dir, 'S2.json'), missing_path)
+        summary = BatchRunner(self.results_path, resume=True).run(items)
+        self.assertEqual((summary['skipped'], summary['completed'], summary['ok']), (1, 1, 1))
+        self.assertEqual([result['status'] for result in self.read_results()], ['ok', 'error', 'error', 'ok'])
+        self.assertEqual(len(read_completed(self.results_path)), 2)
+
+    @unittest.skipUnless(hasattr(os, 'mkfifo'), 'needs named pipes')
+    def test_timeout(self):
+        # opening a named pipe no one writes to blocks forever
+        fifo_path = os.path.join(self._tmp_dir, 'blocked.txt')
+        os.mkfifo(fifo_path)
+        items = [make_item('sampletab2json', fifo_path, out_dir=self.out_dir),
+                 make_item('validate-isatab', os.path.join(self.archives_dir, 'S1'))]
+        summary = BatchRunner(self.results_path, workers=2, timeout=1).run(items)
+        self.assertEqual((summary['ok'], summary['failed']), (1, 1))
+        results = {result['task']: result for result in self.read_results()}
+        self.assertEqual(results['sampletab2json']['status'], 'timeout')
+        self.assertGreaterEqual(results['sampletab2json']['elapsed'], 1)
+        self.assertEqual(results['validate-isatab']['status'], 'ok')
+
+    @unittest.skipUnless(sys.platform.startswith('linux') and multiprocessing.get_start_method() == 'fork',
+                         'needs address space limits and forked workers')
+    def test_memory_cap(self):
+        def allocate(task, in_path, out_path):
+            return {'size': len(bytearray(512 * 1024 * 1024))}
+
+        items = [make_item('validate-isatab', os.path.join(self.archives_dir, 'S1'))]
+        with patch('isatools.batch.run_task', allocate):
+            summary = BatchRunner(self.results_path, max_memory=64).run(items)
+        self.assertEqual(summary['failed'], 1)
+        self.assertIn(self.read_results()[0]['status'], ('memory', 'crashed'))
+
+    def test_command_line(self):
+        with patch('sys.stdout', new_callable=StringIO) as out:
+            summary = main(argv=['-c', 'batch', '-i', os.path.join(self.json_dir, 'S*.json'),
+                                 '-o', self.results_path, '--task', 'json2isatab', '--out-dir', self.out_dir,
+                                 '--workers', '2', '--timeout', '120', '--max-memory', '4096', '-v'])
+        self.assertEqual(summary['ok'], 3)
+        self.assertEqual(sorted(os.listdir(self.out_dir)), ['S1', 'S2', 'S3'])
+        self.assertIn('3 tasks completed (3 ok, 0 failed, 0 already done)', out.getvalue())
+        self.assertIn('ok\tjson2isatab\t' + os.path.join(self.json_dir, 'S1.json'), out.getvalue())
+
+        with patch('sys.stderr', new_callable=StringIO):
+            with self.assertRaises(SystemExit):
+                main(argv=['-c', 'batch', '-i', os.path.join(self.archives_dir, 'S*'), '-o', self.results_path])
+            with self.assertRaises(SystemExit):
+                main(argv=['-c', 'isatab2json', '-o', self.results_path])
@@ -0,0 +1,190 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from ftplib import FTP
+from logging import getLogger, CRITICAL
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import FTPServer
+
+from isatools import isatab
+from isatools.model import (
+    Assay, Extract, FactorValue, Investigation, OntologyAnnotation, OntologySource, Process, Protocol, Sample,
+    Source, Study, StudyFactor
+)
+from isatools.net.mtbls.cache import MTBLSCache
+from isatools.net.mtbls.core import MTBLSInvestigation
+from isatools.net.mtbls.utils import MTBLS_BASE_DIR
+
+log = getLogger('isatools')
+log.level = CRITICAL
+
+
+def dump_study(directory):
+    investigation = Investigation(identifier='MTBLS1')
+    # as wide as the widest line, so that load_dataframes can read the investigation file as a table too
+    investigation.ontology_source_references.extend([OntologySource(name='OBI'), OntologySource(name='EFO')])
+    study = Study(identifier='MTBLS1', filename='s_MTBLS1.txt')
+    investigation.studies.append(study)
+    dose = StudyFactor(name='dose', factor_type=OntologyAnnotation(term='dose'))
+    study.factors.append(dose)
+    sampling = Protocol(name='sampling', protocol_type=OntologyAnnotation(term='sample collection'))
+    extraction = Protocol(name='extraction', protocol_type=OntologyAnnotation(term='extraction'))
+    study.protocols.extend([sampling, extraction])
+    assay = Assay(filename='a_MTBLS1.txt')
+    for i, level in ((1, 'low'), (2, 'high')):
+        source = Source(name='source%s' % i)
+        sample = Sample(name='sample%s' % i, derives_from=[source],
+                        factor_values=[FactorValue(factor_name=dose, value=OntologyAnnotation(term=level))])
+        extract = Extract(name='extract%s' % i)
+        study.sources.append(source)
+        study.samples.append(sample)
+        study.process_sequence.append(Process(executes_protocol=sampling, inputs=[source], outputs=[sample]))
+        assay.samples.append(sample)
+        assay.other_material.append(extract)
+        assay.process_sequence.append(Process(executes_protocol=extraction, inputs=[sample], outputs=[extract]))
+    study.assays.append(assay)
+    isatab.dump(investigation, directory)
+
+
+class CountingHandler(FTPHandler):
+    retrieved = []
+
+    def ftp_RETR(self, file, *args, **kwargs):
+        self.retrieved.append(os.path.basename(file))
+        return super().ftp_RETR(file, *args, **kwargs)
+
+
+class TestMTBLSCache(unittest.TestCase):
+
+    def setUp(self):
+        self.ftp_root = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.study_dir = os.path.join(self.ftp_root, MTBLS_BASE_DIR.lstrip('/'), 'MTBLS1')
+        os.makedirs(self.study_dir)
+        dump_study(self.study_dir)
+        self.write_remote('m_MTBLS1.tsv', 'not an ISA-Tab file\n')
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_anonymous(self.ftp_root)
+        CountingHandler.authorizer = authorizer
+        CountingHandler.retrieved = []
+        self.server = FTPServer(('127.0.0.1', 0), CountingHandler)
+        self.stopped = threading.Event()
+        self.server_thread = threading.Thread(target=self.serve)
+        self.server_thread.start()
+        self.connections = []
+
+    def tearDown(self):
+        for ftp in self.connections:
+            ftp.close()
+        self.stopped.set()
+        self.server_thread.join()
+        shutil.rmtree(self.ftp_root)
+        shutil.rmtree(self.cache_dir)
+
+    def serve(self):
+        while not self.stopped.is_set():
+            self.server.serve_forever(timeout=0.1, blocking=False)
+        self.server.close_all()
+
+    def read_remote(self, filename):
+        with open(os.path.join(self.study_dir, filename)) as remote_file:
+            return remote_file.read()
+
+    def write_remote(self, filename, content, mtime=None):
+        file_path = os.path.join(self.study_dir, filename)
+        with open(file_path, 'w') as remote_file:
+            remote_file.write(content)
+        if mtime is not None:
+            os.utime(file_path, (mtime, mtime))
+
+    def connect(self):
+        ftp = FTP(timeout=10)
+        ftp.connect('127.0.0.1', self.server.address[1])
+        ftp.login()
+        self.connections.append(ftp)
+        return ftp
+
+    def get_investigation(self, cache, connect=True):
+        return MTBLSInvestigation('MTBLS1', cache=cache, ftp_server=self.connect() if connect else None)
+
+    def test_get_investigation(self):
+        cache = MTBLSCache(self.cache_dir)
+        investigation = self.get_investigation(cache)
+        output_dir = investigation.get_investigation()
+        self.assertEqual(sorted(os.listdir(output_dir)), ['a_MTBLS1.txt', 'i_investigation.txt', 's_MTBLS1.txt'])
+        with open(os.path.join(output_dir, 's_MTBLS1.txt')) as study_file:
+            self.assertEqual(study_file.read(), self.read_remote('s_MTBLS1.txt'))
+        self.assertEqual(sorted(CountingHandler.retrieved),
+                         ['a_MTBLS1.txt', 'i_investigation.txt', 's_MTBLS1.txt'])
+        manifest = cache.get_manifest('MTBLS1')
+        self.assertEqual(sorted(manifest['files']), ['a_MTBLS1.txt', 'i_investigation.txt', 's_MTBLS1.txt'])
+        self.assertEqual(manifest['files']['s_MTBLS1.txt']['size'],
+                         str(os.path.getsize(os.path.join(self.study_dir, 's_MTBLS1.txt'))))
+
+    def test_fresh_study_needs_no_connection(self):
+        cache = MTBLSCache(self.cache_dir)
+        self.get_investigation(cache).get_investigation()
+        investigation = self.get_investigation(cache, connect=False)
+        self.assertEqual(investigation.get_factor_values('dose'), {'low', 'high'})
+        self.assertEqual(len(CountingHandler.retrieved), 3)
+
+    def test_revalidation_downloads_changed_files(self):
+        cache = MTBLSCache(self.cache_dir, ttl=0)
+        self.get_investigation(cache).get_investigation()
+        assay = self.read_remote('a_MTBLS1.txt').replace('extract2', 'extract3')
+        self.write_remote('a_MTBLS1.txt', assay, mtime=time.time() + 60)
+        CountingHandler.retrieved = []
+        investigation = self.get_investigation(cache)
+        investigation.get_investigation()
+        self.assertEqual(CountingHandler.retrieved, ['a_MTBLS1.txt'])
+        with open(os.path.join(investigation.output_dir, 'a_MTBLS1.txt')) as assay_file:
+            self.assertEqual(assay_file.read(), assay)
+
+    def test_parsed_content_is_cached(self):
+        cache = MTBLSCache(self.cache_dir)
+        investigation = self.get_investigation(cache)
+        investigation.load_dataframes()
+        investigation.load_json()
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir, 'parsed', 'tables'))), 3)
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir, 'parsed', 'investigations'))), 1)
+
+        # a new cache on the same directory reads the pickles back
+        investigation = self.get_investigation(MTBLSCache(self.cache_dir), connect=False)
+        investigation.load_json()
+        self.assertEqual([x.name for x in investigation.investigation.studies[0].samples], ['sample1', 'sample2'])
+        investigation.load_dataframes()
+        df = next(df for table_file, df in investigation.dataframes.items() if table_file.endswith('s_MTBLS1.txt'))
+        self.assertEqual(list(df['Sample Name']), ['sample1', 'sample2'])
+
+        # the cached DataFrames are copies, changing one does not change the cache
+        df.columns = ['x'] * len(df.columns)
+        investigation = self.get_investigation(cache, connect=False)
+        investigation.load_dataframes()
+        df = next(df for table_file, df in investigation.dataframes.items() if table_file.endswith('s_MTBLS1.txt'))
+        self.assertIn('Sample Name', df.columns)
+
+    def test_missing_investigation_file(self):
+        os.remove(os.path.join(self.study_dir, 'i_investigation.txt'))
+        with self.assertRaises(Exception) as context:
+            self.get_investigation(MTBLSCache(self.cache_dir)).get_investigation()
+        self.assertEqual(str(context.exception), 'Could not find an investigation file for this study')
+
+    def test_missing_file(self):
+        os.remove(os.path.join(self.study_dir, 'a_MTBLS1.txt'))
+        with self.assertRaises(Exception) as context:
+            self.get_investigation(MTBLSCache(self.cache_dir)).get_investigation()
+        self.assertTrue(str(context.exception).startswith('Could not download a file: 550'))
+        self.assertIsNone(MTBLSCache(self.cache_dir).get_manifest('MTBLS1'))
+        self.assertEqual(os.listdir(os.path.join(self.cache_dir, 'objects', 'tmp')), [])
+
+    def test_clear(self):
+        cache = MTBLSCache(self.cache_dir)
+        self.get_investigation(cache).get_investigation()
+        cache.clear()
+        self.assertIsNone(cache.get_manifest('MTBLS1'))
@@ -0,0 +1,166 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from ftplib import error_perm, error_temp
+from logging import getLogger, CRITICAL
+from unittest.mock import patch
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import FTPServer
+
+from isatools.net.mtbls.mirror import FTPConnectionPool, MTBLSMirror, get_table_filenames
+
+log = getLogger('isatools')
+log.level = CRITICAL
+
+INVESTIGATION = ('ONTOLOGY SOURCE REFERENCE\n'
+                 'Study Identifier\t"{0}"\n'
+                 'Study File Name\t"s_{0}.txt"\n'
+                 'Study Assay File Name\t"a_{0}_1.txt"\t"a_{0}_2.txt"\n')
+
+
+class TestMTBLSMirror(unittest.TestCase):
+
+    def setUp(self):
+        self.ftp_root = tempfile.mkdtemp()
+        self.target_dir = tempfile.mkdtemp()
+        self.studies_dir = os.path.join(self.ftp_root, 'studies')
+        for mtbls_id in ('MTBLS1', 'MTBLS2', 'MTBLS3'):
+            os.makedirs(os.path.join(self.studies_dir, mtbls_id))
+            self.write_remote(mtbls_id, 'i_Investigation.txt', INVESTIGATION.format(mtbls_id))
+            for filename in ('s_{0}.txt', 'a_{0}_1.txt', 'a_{0}_2.txt', 'm_{0}.tsv'):
+                self.write_remote(mtbls_id, filename.format(mtbls_id), 'Sample Name\n{0}\n'.format(filename))
+        os.makedirs(os.path.join(self.studies_dir, 'MTBLS4'))  # no investigation file
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_anonymous(self.ftp_root)
+        handler = type('Handler', (FTPHandler,), {'authorizer': authorizer})
+        self.server = FTPServer(('127.0.0.1', 0), handler)
+        self.port = self.server.address[1]
+        self.stopped = threading.Event()
+        self.server_thread = threading.Thread(target=self.serve)
+        self.server_thread.start()
+        self.pool = FTPConnectionPool(host='127.0.0.1', port=self.port, size=2, timeout=10)
+
+    def tearDown(self):
+        self.pool.close()
+        self.stopped.set()
+        self.server_thread.join()
+        shutil.rmtree(self.ftp_root)
+        shutil.rmtree(self.target_dir)
+
+    def serve(self):
+        while not self.stopped.is_set():
+            self.server.serve_forever(timeout=0.1, blocking=False)
+        self.server.close_all()
+
+    def write_remote(self, mtbls_id, filename, content):
+        with open(os.path.join(self.studies_dir, mtbls_id, filename), 'w') as remote_file:
+            remote_file.write(content)
+
+    def get_mirror(self, **kwargs):
+        return MTBLSMirror(self.target_dir, pool=self.pool, workers=2, backoff=0, base_dir='/studies', **kwargs)
+
+    def test_get_mtbls_list(self):
+        self.assertEqual(self.get_mirror().get_mtbls_list(), ['MTBLS1', 'MTBLS2', 'MTBLS3', 'MTBLS4'])
+
+    def test_mirror(self):
+        mirror = self.get_mirror()
+        download_count, download_errors = mirror.mirror()
+        self.assertEqual(download_count, 3)
+        self.assertEqual(list(download_errors.keys()), ['MTBLS4'])
+        self.assertEqual(str(download_errors['MTBLS4']), 'Could not find an investigation file for this study')
+        self.assertEqual(mirror.downloaded_files, 12)
+        for mtbls_id in ('MTBLS1', 'MTBLS2', 'MTBLS3'):
+            self.assertEqual(sorted(os.listdir(os.path.join(self.target_dir, mtbls_id))),
+                             ['a_{0}_1.txt'.format(mtbls_id), 'a_{0}_2.txt'.format(mtbls_id),
+                              'i_Investigation.txt', 's_{0}.txt'.format(mtbls_id)])
+            with open(os.path.join(self.target_dir, mtbls_id, 'i_Investigation.txt')) as local_file:
+                self.assertEqual(local_file.read(), INVESTIGATION.format(mtbls_id))
+
+    def test_mirror_skips_up_to_date_files(self):
+        self.get_mirror().mirror(['MTBLS1', 'MTBLS2'])
+        self.write_remote('MTBLS2', 'a_MTBLS2_1.txt', 'Sample Name\nchanged\n')
+        mirror = self.get_mirror()
+        self.assertEqual(mirror.mirror(['MTBLS1', 'MTBLS2']), (2, {}))
+        self.assertEqual(mirror.downloaded_files, 1)
+        self.assertEqual(mirror.skipped_files, 7)
+        with open(os.path.join(self.target_dir, 'MTBLS2', 'a_MTBLS2_1.txt')) as local_file:
+            self.assertEqual(local_file.read(), 'Sample Name\nchanged\n')
+
+    def test_mirror_skips_up_to_date_files_without_mlsd(self):
+        with patch('ftplib.FTP.mlsd', side_effect=error_perm('500 Command "MLSD" not understood.')):
+            self.assertEqual(self.get_mirror().mirror(['MTBLS1']), (1, {}))
+            remote_path = os.path.join(self.studies_dir, 'MTBLS1', 'i_Investigation.txt')
+            local_path = os.path.join(self.target_dir, 'MTBLS1', 'i_Investigation.txt')
+            self.assertEqual(int(os.stat(local_path).st_mtime), int(os.stat(remote_path).st_mtime))
+            mirror = self.get_mirror()
+            self.assertEqual(mirror.mirror(['MTBLS1']), (1, {}))
+            self.assertEqual((mirror.downloaded_files, mirror.skipped_files), (0, 4))
+
+    def test_mirror_limit(self):
+        download_count, download_errors = self.get_mirror().mirror(['MTBLS4', 'MTBLS1', 'MTBLS2', 'MTBLS3'], limit=2)
+        self.assertEqual(download_count, 2)
+        self.assertEqual(list(download_errors.keys()), ['MTBLS4'])
+        self.assertEqual(len(os.listdir(self.target_dir)), 3)
+
+    def test_mirror_missing_file(self):
+        os.remove(os.path.join(self.studies_dir, 'MTBLS1', 'a_MTBLS1_2.txt'))
+        download_count, download_errors = self.get_mirror().mirror(['MTBLS1'])
+        self.assertEqual(download_count, 0)
+        self.assertEqual(str(download_errors['MTBLS1']),
+                         'Could not download a file: a_MTBLS1_2.txt not found for MTBLS1')
+
+    def test_retry(self):
+        mirror = self.get_mirror(retries=2)
+        calls = []
+
+        def fail_twice():
+            calls.append(1)
+            if len(calls) < 3:
+                raise error_temp('421 Too many connections')
+            return 'done'
+        self.assertEqual(mirror._retry(fail_twice), 'done')
+        self.assertEqual(len(calls), 3)
+
+        def fail_always():
+            calls.append(1)
+            raise error_temp('421 Too many connections')
+        with self.assertRaises(error_temp):
+            mirror._retry(fail_always)
+        self.assertEqual(len(calls), 6)
+
+        def fail_permanently():
+            calls.append(1)
+            raise error_perm('550 No such file')
+        with self.assertRaises(error_perm):
+            mirror._retry(fail_permanently)
+        self.assertEqual(len(calls), 7)
+
+    def test_pool_reuses_sessions(self):
+        with self.pool.session() as session:
+            session.cwd('/studies/MTBLS1')
+            first = session
+        with self.pool.session() as session:
+            self.assertIs(session, first)
+            self.assertEqual(session.directory, '/studies/MTBLS1')
+        with self.assertRaises(OSError):
+            with self.pool.session() as session:
+                raise OSError('connection reset')
+        with self.pool.session() as session:
+            self.assertIsNot(session, first)
+
+    def test_pool_size(self):
+        with self.assertRaises(ValueError):
+            FTPConnectionPool(size=0)
+
+
+class TestGetTableFilenames(unittest.TestCase):
+
+    def test_get_table_filenames(self):
+        lines = INVESTIGATION.format('MTBLS1').splitlines() + ['Study File Name\t"s_2.txt"', 'Study Assay File Name\t']
+        self.assertEqual(get_table_filenames(lines),
+                         ['s_MTBLS1.txt', 's_2.txt', 'a_MTBLS1_1.txt', 'a_MTBLS1_2.txt'])
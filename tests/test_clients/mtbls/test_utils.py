@@ -1,6 +1,9 @@
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch
-from isatools.net.mtbls.utils import MTBLSDownloader
+from isatools.net.mtbls.utils import MTBLSDownloader, MTBLSStudyIndex, slice_data_files
 
 
 @patch('isatools.net.mtbls.utils.FTP', autospec=True)
@@ -27,3 +30,73 @@ class TestMTBLSDownloader(unittest.TestCase):
         with self.assertRaises(Exception) as context:
             MTBLSDownloader()
         self.assertEqual(str(context.exception), "Cannot contact the remote FTP server: Mock FTP Failure")
+
+
+class TestMTBLSStudyIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.write_table('i_Investigation.txt', 'ONTOLOGY SOURCE REFERENCE\n')
+        self.write_table('s_study.txt', [
+            ['Source Name', 'Sample Name', 'Factor Value[Gender]', 'Factor Value[Age]'],
+            ['source1', 'sample1', 'Male', '25'],
+            ['source2', 'sample2', 'Female', '60'],
+            ['source3', 'sample3', 'Male', '61.5'],
+            ['source3', 'sample4', 'Female', 'unknown'],
+        ])
+        self.write_table('a_assay1.txt', [
+            ['Sample Name', 'Extract Name', 'Raw Spectral Data File', 'Derived Spectral Data File'],
+            ['sample1', 'extract1', 'sample1.raw', 'derived.txt'],
+            ['sample2', 'extract2', 'sample2.raw', ''],
+            ['sample1', 'extract3', 'sample1b.raw', 'derived.txt'],
+        ])
+        self.write_table('a_assay2.txt', [
+            ['Sample Name', 'Free Induction Decay Data File'],
+            ['sample3', 'sample3.fid'],
+            ['sample1', 'sample1.fid'],
+        ])
+        self.index = MTBLSStudyIndex.from_directory(self.dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write_table(self, filename, rows):
+        with open(os.path.join(self.dir, filename), 'w') as table_file:
+            table_file.write(rows if isinstance(rows, str) else ''.join('\t'.join(row) + '\n' for row in rows))
+
+    def test_index(self):
+        self.assertEqual(list(self.index.samples), ['sample1', 'sample2', 'sample3', 'sample4'])
+        self.assertEqual(set(self.index.factors), {'Gender', 'Age'})
+        self.assertEqual(list(self.index.factors['Gender']['Male']), ['sample1', 'sample3'])
+        self.assertEqual(self.index.get_sources('sample4'), ['source3'])
+        self.assertEqual(self.index.get_sources('unknown'), [])
+        self.assertEqual(self.index.get_data_files('sample1'),
+                         ['sample1.raw', 'derived.txt', 'sample1b.raw', 'sample1.fid'])
+        self.assertEqual(self.index.get_data_files('sample2'), ['sample2.raw'])
+        self.assertEqual(self.index.get_data_files('sample4'), [])
+
+    def test_select_samples(self):
+        self.assertEqual(self.index.select_samples(), ['sample1', 'sample2', 'sample3', 'sample4'])
+        self.assertEqual(self.index.select_samples({'Gender': 'Male'}), ['sample1', 'sample3'])
+        self.assertEqual(self.index.select_samples({'Gender': ['Female', 'Other']}), ['sample2', 'sample4'])
+        self.assertEqual(self.index.select_samples({'Gender': 'Male', 'Age': '25'}), ['sample1'])
+        self.assertEqual(self.index.select_samples({'Age': 60}), ['sample2'])
+        self.assertEqual(self.index.select_samples({'Age': {'equals': 61.5}}), ['sample3'])
+        self.assertEqual(self.index.select_samples({'Age': {'less_than': 60}}), ['sample1'])
+        self.assertEqual(self.index.select_samples({'Age': {'more_than': 25}}), ['sample2', 'sample3'])
+        self.assertEqual(self.index.select_samples({'Age': {'more_than': 25, 'less_than': 61}}), ['sample2'])
+        self.assertEqual(self.index.select_samples({'Gender': 'Female', 'Age': {'less_than': 100}}), ['sample2'])
+        self.assertEqual(self.index.select_samples({'Unknown factor': 'Male'}), [])
+        with self.assertRaises(ValueError) as context:
+            self.index.select_samples({'Age': {'between': [1, 2]}})
+        self.assertEqual(str(context.exception),
+                         'Unknown factor value filter between, expected one of: equals, less_than, more_than')
+
+    def test_slice_data_files(self):
+        self.assertEqual(slice_data_files(self.dir, {'Gender': 'Male', 'Age': {'more_than': 30}}), [
+            {'sample': 'sample3', 'data_files': ['sample3.fid'],
+             'query_used': {'Gender': 'Male', 'Age': {'more_than': 30}}}
+        ])
+        self.assertEqual([x['sample'] for x in slice_data_files(self.dir)],
+                         ['sample1', 'sample2', 'sample3', 'sample4'])
+        self.assertEqual(slice_data_files(self.dir)[1]['query_used'], '')
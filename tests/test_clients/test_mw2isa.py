@@ -1,12 +1,29 @@
+import io
+import json
 import unittest
 import tempfile
 import shutil
 import os
 import logging
+from unittest.mock import patch
 
 
 from isatools import isatab
-from isatools.net.mw2isa import mw2isa_convert
+from isatools.net.mw2isa import (
+    MWTabFile,
+    create_ms_assay_records,
+    create_raw_data_files,
+    download_mwfile,
+    generate_maf_file,
+    get_fv_records,
+    get_local_mwfile,
+    get_mwfile_as_lol,
+    getblock,
+    iter_mwfile_rows,
+    mw2isa_convert,
+    write_assay,
+    write_study_file,
+)
 
 
 log = logging.getLogger('isatools')
@@ -71,3 +88,136 @@ class mw2ISATest(unittest.TestCase):
                                                          validate_option=False)
             self.assertFalse(success)
             self.assertTrue('invalid input, option not recognized' in context.exception)
+
+
+MWTAB = "\r\n".join([
+    "#METABOLOMICS WORKBENCH STUDY_ID:ST000001 ANALYSIS_ID:AN000001",
+    "VERSION\t1",
+    "SU:SUBJECT_SPECIES\tHomo sapiens",
+    "SU:TAXONOMY_ID\t9606",
+    "SUBJECT_SAMPLE_FACTORS:\t-\tS1\tdose:low | time:1",
+    "SUBJECT_SAMPLE_FACTORS:\tsrc2\tS2\tdose:high | time:2",
+    "CH:COLUMN_NAME\tC18 \u00b5m  ",
+    "MS:ION_MODE\tPOSITIVE",
+    "MS_METABOLITE_DATA:UNITS\tpeak area",
+    "MS_METABOLITE_DATA_START",
+    "Samples\tS1\tS2",
+    "alanine\t1.5\t2.5",
+    "MS_METABOLITE_DATA_END",
+    "MS_ALL_DATA:UNITS\tcounts",
+    "MS_ALL_DATA_START",
+    "Bin range(ppm)\tS1\tS2",
+    "1.0\t3\t4",
+    "MS_ALL_DATA_END",
+    "#END",
+])
+
+
+class MWTabStreamingTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self.mwtab_path = self.write_fixture('ST000001_AN000001.txt', MWTAB)
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def write_fixture(self, filename, content):
+        file_path = os.path.join(self._tmp_dir, filename)
+        with open(file_path, 'w', encoding='utf-8', newline='') as fixture:
+            fixture.write(content)
+        return file_path
+
+    def read_output(self, *parts):
+        with open(os.path.join(self._tmp_dir, *parts), encoding='utf-8', newline='') as output:
+            return output.read()
+
+    def get_records(self):
+        records, factors, header = get_fv_records(MWTabFile(self.mwtab_path))
+        for record in records:
+            record.insert(0, 'Homo sapiens')
+            record.insert(1, '9606')
+        return records, header
+
+    def test_iter_mwfile_rows(self):
+        rows = list(iter_mwfile_rows(self.mwtab_path))
+        self.assertEqual(rows[1], ['VERSION', '1'])
+        self.assertEqual(rows[6], ['CH:COLUMN_NAME', 'C18 \u00b5m  '])
+        self.assertEqual(rows[-1], ['#END'])
+        self.assertEqual(list(iter_mwfile_rows(self.mwtab_path, rstrip=True))[6], ['CH:COLUMN_NAME', 'C18 \u00b5m'])
+        self.assertEqual(list(iter_mwfile_rows(io.BytesIO(MWTAB.encode('utf-8')))), rows)
+        self.assertEqual(get_mwfile_as_lol(self.mwtab_path), rows)
+
+    def test_mwtab_file_is_read_again_on_every_pass(self):
+        mwtab_file = MWTabFile(self.mwtab_path)
+        self.assertEqual(list(mwtab_file), list(mwtab_file))
+
+    def test_getblock(self):
+        expected = [['MS_ALL_DATA_START'], ['Bin range(ppm)', 'S1', 'S2'], ['1.0', '3', '4']]
+        self.assertEqual(getblock(MWTabFile(self.mwtab_path), 'MS_ALL_DATA_START', 'MS_ALL_DATA_END'), expected)
+        self.assertEqual(getblock(MWTAB.encode('utf-8'), 'MS_ALL_DATA_START', 'MS_ALL_DATA_END'), expected)
+
+    def test_create_raw_data_files(self):
+        create_raw_data_files(self._tmp_dir, 'mass spectrometry', self.mwtab_path, 'ST000001', 'AN000001')
+        self.assertEqual(self.read_output('ST000001', 'data', 'ST000001_AN000001_maf.txt'),
+                         'MS_METABOLITE_DATA_START\t\nSamples\tS1\tS2\t\nalanine\t1.5\t2.5\t\n')
+        raw_data = self.read_output('ST000001', 'data', 'ST000001_AN000001_raw_data.txt')
+        self.assertEqual(raw_data.splitlines()[:2],
+                         ['MS_ALL_DATA_START\tMS_ALL_DATA_START', 'datatype:\tMS_ALL_DATA_START'])
+        self.assertIn('quantitationtype:   Bin range(ppm)\n', raw_data)
+
+    def test_write_study_and_assay_files(self):
+        records, header = self.get_records()
+        assay_records, assay_header, raw_data_qt, maf_qt = create_ms_assay_records(
+            self.mwtab_path, 'ST000001', 'AN000001', records)
+        self.assertEqual((raw_data_qt, maf_qt), ('counts', 'peak area'))
+        write_assay(self._tmp_dir, 'mass spectrometry', 'ST000001', 'AN000001', assay_records, assay_header)
+        write_study_file(self._tmp_dir, 'ST000001', ['Source Name', 'Sample Name'] + header, records)
+
+        assay_lines = self.read_output('ST000001', 'a_ST000001_AN000001.txt').split('\n')
+        self.assertEqual(len(assay_lines), 5)
+        self.assertTrue(assay_lines[0].startswith('"Sample Name"\t"Protocol REF"\t'))
+        cells = assay_lines[1].split('\t')
+        self.assertEqual(cells[:3], ['"S1"', '"metabolite extraction protocol"', '"S1"'])
+        self.assertEqual(cells[6], '" C18 \u00b5m"')
+        self.assertEqual(cells[19], '"S1.mzml"')
+        self.assertEqual(cells[-1], '')
+        self.assertEqual(assay_lines[3:], ['', ''])
+
+        self.assertEqual(self.read_output('ST000001', 's_ST000001.txt'), (
+            '"Source Name"\t"Sample Name"\t"Factor Value[dose]"\t"Factor Value[time]"\t\n'
+            '"S1"\t"specimen"\t"Homo sapiens"\t"9606"\t""\t"sample collection protocol"\t"S1"\t"low"\t"1"\t\n'
+            '"S2"\t"specimen"\t"Homo sapiens"\t"9606"\t""\t"sample collection protocol"\t"src2"\t"high"\t"2"\t\n'
+        ))
+        # the records of the caller are left as they are
+        self.assertEqual(records[0][:4], ['Homo sapiens', '9606', 'S1', 'S1'])
+
+    def test_generate_maf_file(self):
+        data = {"1": {"analysis_id": "AN000001", "metabolite_name": "alanine", "metabolite_id": "ME1",
+                      "units": "uM", "DATA": {"S1": 1.5, "S2": 2}},
+                "2": {"analysis_id": "AN000002", "metabolite_name": "serine", "metabolite_id": "ME2",
+                      "units": "uM", "DATA": {"S1": 1, "S2": 1}}}
+        metabolites = {"1": {"metabolite_name": "alanine"}, "2": {"metabolite_name": "serine"}}
+        data_path = self.write_fixture('data.json', json.dumps(data))
+        metabolites_path = self.write_fixture('metabolites.json', json.dumps(metabolites))
+        os.makedirs(os.path.join(self._tmp_dir, 'ST000001', 'data'))
+        generate_maf_file(self._tmp_dir, 'ST000001', 'AN000001', data_url=data_path, metabolites_url=metabolites_path)
+        self.assertEqual(self.read_output('ST000001', 'data', 'ST000001_AN000001-maf-data-jsonparsing.txt'),
+                         'metabolite number\tmetabolite name\tmetabolite identifier\tS1(uM)\tS2(uM)\n'
+                         '1\talanine\tME1\t1.5\t2\n')
+
+    def test_get_local_mwfile_downloads_once(self):
+        download_dir = os.path.join(self._tmp_dir, 'downloads')
+        os.makedirs(download_dir)
+        with patch('isatools.net.mw2isa.urlopen', side_effect=lambda url: open(self.mwtab_path, 'rb')) as urlopen:
+            file_path = get_local_mwfile(download_dir, 'ST000001', 'AN000001')
+            self.assertEqual(get_local_mwfile(download_dir, 'ST000001', 'AN000001'), file_path)
+        self.assertEqual(urlopen.call_count, 1)
+        self.assertIn('STUDY_ID=ST000001&ANALYSIS_ID=AN000001', urlopen.call_args[0][0])
+        self.assertEqual(list(iter_mwfile_rows(file_path)), list(iter_mwfile_rows(self.mwtab_path)))
+
+    def test_download_mwfile(self):
+        file_path = os.path.join(self._tmp_dir, 'copy.txt')
+        download_mwfile('file://' + self.mwtab_path, file_path)
+        with open(file_path, 'rb') as copy, open(self.mwtab_path, 'rb') as original:
+            self.assertEqual(copy.read(), original.read())
@@ -0,0 +1,165 @@
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from isatools.model import OntologyAnnotation, OntologySource
+from isatools.net import ols
+
+
+def ontology_json(name, title):
+    return {
+        'ontologyId': name,
+        'config': {'version': '1.0', 'title': title},
+        '_links': {'self': {'href': 'http://localhost/api/ontologies/{0}?lang=en'.format(name)}}
+    }
+
+
+ONTOLOGIES = {'efo': ontology_json('efo', 'Experimental Factor Ontology'), 'obi': ontology_json('obi', '')}
+TERMS = {
+    'efo': {
+        'cell type': 'http://www.ebi.ac.uk/efo/EFO_0000324',
+        'organism': 'http://purl.obolibrary.org/obo/OBI_0100026'
+    },
+}
+
+
+class OLSHandler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.requests.append(url.path)
+        if url.path == '/api/ontologies':
+            self.reply({'_embedded': {'ontologies': list(ONTOLOGIES.values())}})
+        elif url.path.startswith('/api/ontologies/'):
+            ontology = ONTOLOGIES.get(url.path.rsplit('/', 1)[1])
+            self.reply(ontology, 200 if ontology else 404)
+        elif url.path == '/api/search':
+            term, ontology = query['q'][0], query['ontology'][0]
+            iri = TERMS.get(ontology, {}).get(term)
+            docs = [{'label': term, 'iri': iri}] if iri else []
+            self.reply({'response': {'docs': docs}})
+        else:
+            self.reply({}, 500)
+
+    def reply(self, content, status=200):
+        body = json.dumps(content).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOLSClient(unittest.TestCase):
+
+    def setUp(self):
+        OLSHandler.requests = []
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), OLSHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self.server_thread.start()
+        self.cache_dir = tempfile.mkdtemp()
+        self.client = self.get_client()
+
+    def tearDown(self):
+        self.client.close()
+        ols.set_default_client(None)
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        shutil.rmtree(self.cache_dir)
+
+    def get_client(self, **kwargs):
+        cache = ols.OLSCache(self.cache_dir + '/ols.sqlite', **kwargs)
+        return ols.OLSClient('http://127.0.0.1:%s/api' % self.server.server_address[1], cache=cache, rate=0)
+
+    def test_get_ontologies(self):
+        ontology_sources = self.client.get_ontologies()
+        self.assertEqual([x.name for x in ontology_sources], ['efo', 'obi'])
+        self.assertIsInstance(ontology_sources[0], OntologySource)
+        self.assertEqual(ontology_sources[0].description, 'Experimental Factor Ontology')
+        self.assertEqual(ontology_sources[1].description, '')
+        self.client.get_ontologies()
+        self.assertEqual(OLSHandler.requests, ['/api/ontologies'])
+
+    def test_get_ontology(self):
+        ontology_source = self.client.get_ontology('efo')
+        self.assertEqual(ontology_source.name, 'efo')
+        self.assertEqual(ontology_source.version, '1.0')
+        self.assertIn('/api/ontologies/efo?lang=en', ontology_source.file)
+        self.assertIsNone(self.client.get_ontology('unknown'))
+        self.client.get_ontology('efo')
+        self.client.get_ontology('unknown')
+        self.assertEqual(OLSHandler.requests, ['/api/ontologies/efo', '/api/ontologies/unknown'])
+
+    def test_search(self):
+        ontology_source = self.client.get_ontology('efo')
+        ontology_annotations = self.client.search('cell type', ontology_source)
+        self.assertEqual(len(ontology_annotations), 1)
+        self.assertIsInstance(ontology_annotations[0], OntologyAnnotation)
+        self.assertEqual(ontology_annotations[0].term, 'cell type')
+        self.assertEqual(ontology_annotations[0].term_accession, 'http://www.ebi.ac.uk/efo/EFO_0000324')
+        self.assertIs(ontology_annotations[0].term_source, ontology_source)
+        self.assertIsNone(self.client.search('cell type', 'efo')[0].term_source)
+        self.assertEqual(self.client.search('unknown', 'efo'), [])
+        self.assertEqual(OLSHandler.requests.count('/api/search'), 2)
+
+    def test_cache_is_persistent(self):
+        self.client.search('cell type', 'efo')
+        self.client.close()
+        self.client = self.get_client()
+        self.assertEqual(self.client.search('cell type', 'efo')[0].term, 'cell type')
+        self.assertEqual(OLSHandler.requests, ['/api/search'])
+
+    def test_cache_expiry(self):
+        self.client.close()
+        self.client = self.get_client(ttl=60, negative_ttl=0)
+        self.client.search('cell type', 'efo')
+        self.client.search('unknown', 'efo')
+        self.client.search('cell type', 'efo')
+        self.client.search('unknown', 'efo')
+        self.assertEqual(OLSHandler.requests, ['/api/search'] * 3)
+        self.client.cache.ttl = 0
+        self.client.search('cell type', 'efo')
+        self.assertEqual(len(OLSHandler.requests), 4)
+
+    def test_search_many(self):
+        terms = ['cell type', 'organism', 'unknown', 'cell type']
+        results = self.client.search_many(terms, 'efo')
+        self.assertEqual(list(results), ['cell type', 'organism', 'unknown'])
+        self.assertEqual([x.term for x in results['organism']], ['organism'])
+        self.assertEqual(results['unknown'], [])
+        self.assertEqual(len(OLSHandler.requests), 3)
+        self.client.search_many(terms, 'efo')
+        self.assertEqual(len(OLSHandler.requests), 3)
+
+    def test_server_error(self):
+        self.client.base_uri += '/missing'
+        with self.assertRaises(Exception):
+            self.client.get_ontologies()
+
+    def test_module_functions(self):
+        ols.set_default_client(self.client)
+        self.assertEqual(ols.get_ols_ontology('obi').name, 'obi')
+        self.assertEqual(len(ols.get_ols_ontologies()), 2)
+        self.assertEqual(ols.search_ols('organism', 'efo')[0].term, 'organism')
+        self.assertEqual(list(ols.search_ols_many(['organism'], 'efo')), ['organism'])
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_acquire(self):
+        rate_limiter = ols.RateLimiter(50)
+        start = time.monotonic()
+        for _ in range(6):
+            rate_limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
@@ -0,0 +1,103 @@
+import io
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from isatools.model import Comment, Publication
+from isatools.net import pubmed
+
+MEDLINE = {
+    '25520553': ('PMID- 25520553\n'
+                 'TI  - A first article.\n'
+                 'AU  - Smith J\n'
+                 'AU  - Doe A\n'
+                 'TA  - Nucleic Acids Res\n'
+                 'EDAT- 2014/12/19 06:00\n'
+                 'LID - 10.1093/nar/gku1306 [doi]\n'),
+    '27924034': ('PMID- 27924034\n'
+                 'TI  - A second article.\n'
+                 'AU  - Roe R\n'
+                 'TA  - Sci Data\n'
+                 'EDAT- 2016/12/07 06:00\n'
+                 'AID - S0000 [pii]\n'
+                 'AID - 10.1038/sdata.2016.102 [doi]\n'),
+}
+
+
+def efetch(db, id, rettype, retmode):
+    return io.StringIO('\n'.join(MEDLINE[x] for x in id.split(',') if x in MEDLINE))
+
+
+@patch('isatools.net.pubmed.Entrez.efetch', side_effect=efetch)
+class TestPubMedArticles(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = pubmed.PubMedCache(self.cache_dir + '/pubmed.sqlite')
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.cache_dir)
+
+    def test_get_pubmed_articles(self, mock_efetch):
+        articles = pubmed.get_pubmed_articles(['27924034', ' 25520553', '25520553', '1'],
+                                              cache=self.cache, batch_size=2, rate=0)
+        self.assertEqual(list(articles), ['27924034', '25520553', '1'])
+        self.assertEqual(articles['25520553']['authors'], ['Smith J', 'Doe A'])
+        self.assertEqual(articles['25520553']['doi'], '10.1093/nar/gku1306')
+        self.assertEqual(articles['25520553']['year'], '2014')
+        self.assertEqual(articles['27924034']['doi'], '10.1038/sdata.2016.102')
+        self.assertEqual(articles['1'], {})
+        self.assertEqual(sorted(x.kwargs['id'] for x in mock_efetch.call_args_list), ['1', '27924034,25520553'])
+
+        # the articles, and the missing one, are cached
+        pubmed.get_pubmed_articles(['25520553', '1'], cache=self.cache)
+        self.assertEqual(mock_efetch.call_count, 2)
+        self.assertEqual(self.cache.get_many(['27924034'])['27924034'], articles['27924034'])
+
+    def test_negative_cache_expiry(self, mock_efetch):
+        pubmed.get_pubmed_articles(['25520553', '1'], cache=self.cache, rate=0)
+        pubmed.get_pubmed_articles(['25520553', '1'], cache=self.cache, rate=0)
+        self.assertEqual(mock_efetch.call_count, 1)
+        # once expired, only the missing article is fetched again
+        self.cache.negative_ttl = 0
+        articles = pubmed.get_pubmed_articles(['25520553', '1'], cache=self.cache, rate=0)
+        self.assertEqual(mock_efetch.call_count, 2)
+        self.assertEqual(mock_efetch.call_args.kwargs['id'], '1')
+        self.assertEqual(articles['1'], {})
+        self.assertEqual(articles['25520553']['title'], 'A first article.')
+
+    def test_cache_without_fetch_times(self, mock_efetch):
+        self.cache.close()
+        cache_path = self.cache_dir + '/old.sqlite'
+        connection = sqlite3.connect(cache_path)
+        connection.execute('CREATE TABLE articles (pmid TEXT PRIMARY KEY, article TEXT)')
+        connection.execute('INSERT INTO articles VALUES (?, ?)', ('1', '{}'))
+        connection.commit()
+        connection.close()
+        self.cache = pubmed.PubMedCache(cache_path)
+        self.assertEqual(self.cache.get_many(['1']), {})
+        self.cache.set_many({'1': {}})
+        self.assertEqual(self.cache.get_many(['1']), {'1': {}})
+
+    def test_get_pubmed_article(self, mock_efetch):
+        article = pubmed.get_pubmed_article('27924034')
+        self.assertEqual(article['title'], 'A second article.')
+        self.assertEqual(article['journal'], 'Sci Data')
+
+    def test_set_pubmed_articles(self, mock_efetch):
+        publications = [Publication(pubmed_id='25520553'), Publication(pubmed_id='1'),
+                        Publication(pubmed_id='25520553')]
+        pubmed.set_pubmed_articles(publications, cache=self.cache, rate=0)
+        self.assertEqual(mock_efetch.call_count, 1)
+        for publication in (publications[0], publications[2]):
+            self.assertEqual(publication.title, 'A first article.')
+            self.assertEqual(publication.author_list, 'Smith J, Doe A')
+            self.assertEqual(publication.doi, '10.1093/nar/gku1306')
+            self.assertIsInstance(publication.comments[0], Comment)
+            self.assertEqual(publication.comments[0].value, 'Nucleic Acids Res')
+        self.assertEqual(publications[1].title, '')
+        with self.assertRaises(TypeError):
+            pubmed.set_pubmed_articles(['25520553'], cache=self.cache)
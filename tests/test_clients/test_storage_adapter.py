@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from zipfile import ZipFile
+
+from isatools.net import storage_adapter
+from isatools.net.storage_adapter import IsaGitHubStorageAdapter
+
+FILES = {
+    'i_investigation.txt': b'INVESTIGATION\nInvestigation Identifier\tBII-I-1\n',
+    's_study.txt': b'Source Name\tSample Name\nsource1\tsample1\n',
+    'a_assay.txt': b'Sample Name\tRaw Data File\nsample1\tdata1.raw\n',
+}
+
+
+class GitHubHandler(BaseHTTPRequestHandler):
+    requests = []
+    files = {}
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        base_url = 'http://%s:%s' % self.server.server_address
+        if path == '/repos/ISA-tools/isa-api/contents/data/BII-I-1':
+            items = [{'name': name, 'type': 'file', 'download_url': base_url + '/raw/' + name} for name in self.files]
+            items.append({'name': 'sub', 'type': 'dir', 'download_url': None})
+            items.append({'name': 'image.png', 'type': 'file', 'download_url': base_url + '/raw/image.png'})
+            self.reply(json.dumps(items).encode('utf-8'), 'application/json')
+        elif path == '/raw/image.png':
+            self.reply(b'\x89PNG', 'image/png')
+        elif path.startswith('/raw/'):
+            self.reply(self.files[path[5:]], 'text/plain; charset=utf-8')
+        else:
+            self.reply(b'{"message": "Not Found"}', 'application/json', 404)
+
+    def reply(self, body, content_type, status=200):
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.requests.append((self.path, 304))
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.requests.append((self.path, status))
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestIsaGitHubStorageAdapter(unittest.TestCase):
+
+    def setUp(self):
+        GitHubHandler.requests = []
+        GitHubHandler.files = dict(FILES)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), GitHubHandler)
+        self.server_thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+        self.server_thread.start()
+        self.api_url = 'http://127.0.0.1:%s' % self.server.server_address[1]
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.server_thread.join()
+        shutil.rmtree(self.tmp_dir)
+
+    def retrieve(self, destination, **kwargs):
+        with IsaGitHubStorageAdapter(api_url=self.api_url, workers=2, **kwargs) as adapter:
+            return adapter.retrieve('data/BII-I-1', destination=os.path.join(self.tmp_dir, destination))
+
+    def test_retrieve_directory(self):
+        buf = self.retrieve('target')
+        with ZipFile(buf) as zip_file:
+            self.assertEqual(sorted(zip_file.namelist()), sorted('BII-I-1/' + name for name in FILES))
+            for name, content in FILES.items():
+                self.assertEqual(zip_file.read('BII-I-1/' + name), content)
+        target_dir = os.path.join(self.tmp_dir, 'target', 'BII-I-1')
+        self.assertEqual(sorted(os.listdir(target_dir)), sorted(FILES))
+        with open(os.path.join(target_dir, 's_study.txt'), 'rb') as study_file:
+            self.assertEqual(study_file.read(), FILES['s_study.txt'])
+
+    def test_retrieve_directory_with_cache(self):
+        self.retrieve('first', cache_dir=self.cache_dir)
+        GitHubHandler.requests = []
+        GitHubHandler.files['a_assay.txt'] = b'Sample Name\tRaw Data File\nsample1\tdata2.raw\n'
+        buf = self.retrieve('second', cache_dir=self.cache_dir)
+        self.assertEqual(sorted(GitHubHandler.requests), [
+            ('/raw/a_assay.txt', 200), ('/raw/i_investigation.txt', 304), ('/raw/image.png', 200),
+            ('/raw/s_study.txt', 304), ('/repos/ISA-tools/isa-api/contents/data/BII-I-1?ref=master', 304)
+        ])
+        with ZipFile(buf) as zip_file:
+            self.assertEqual(zip_file.read('BII-I-1/a_assay.txt'), GitHubHandler.files['a_assay.txt'])
+            self.assertEqual(zip_file.read('BII-I-1/s_study.txt'), FILES['s_study.txt'])
+            self.assertNotIn('BII-I-1/image.png', zip_file.namelist())
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp_dir, 'second', 'BII-I-1'))), sorted(FILES))
+
+    def test_retrieve_directory_with_cache_refreshes_changed_etag(self):
+        listing = ('/repos/ISA-tools/isa-api/contents/data/BII-I-1?ref=master', 200)
+        self.retrieve('first', cache_dir=self.cache_dir)
+        GitHubHandler.files['s_extra.txt'] = b'Source Name\tSample Name\nsource2\tsample2\n'
+        GitHubHandler.requests = []
+        self.retrieve('second', cache_dir=self.cache_dir)
+        self.assertIn(listing, GitHubHandler.requests)
+        GitHubHandler.requests = []
+        buf = self.retrieve('third', cache_dir=self.cache_dir)
+        self.assertNotIn(listing, GitHubHandler.requests)
+        self.assertIn((listing[0], 304), GitHubHandler.requests)
+        with ZipFile(buf) as zip_file:
+            self.assertEqual(zip_file.read('BII-I-1/s_extra.txt'), GitHubHandler.files['s_extra.txt'])
+
+    def test_retrieve_missing_source(self):
+        with IsaGitHubStorageAdapter(api_url=self.api_url) as adapter:
+            with self.assertRaises(Exception):
+                adapter.retrieve('data/missing', destination=self.tmp_dir)
+
+
+class TestSchemaValidation(unittest.TestCase):
+
+    def test_validators_are_compiled_once(self):
+        storage_adapter._get_json_validator.cache_clear()
+        for _ in range(3):
+            storage_adapter.validate_json_against_schema(
+                {'identifier': 'I1', 'studies': []}, storage_adapter.INVESTIGATION_SCHEMA_FILE)
+        self.assertEqual(storage_adapter._get_json_validator.cache_info().misses, 1)
+        self.assertEqual(storage_adapter._get_json_validator.cache_info().hits, 2)
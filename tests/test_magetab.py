@@ -1,7 +1,11 @@
 import unittest
 from isatools.tests.utils import MAGETAB_DATA_DIR
 import os
-from isatools.magetab import MageTabParser
+import shutil
+import tempfile
+from unittest.mock import patch
+from isatools import isatab, magetab
+from isatools.magetab import MageTabParser, write_merged_table
 from isatools.model import Investigation
 
 """ Unit tests for MAGE-TAB package - only for sanity check, not comprehensive testing """
@@ -73,3 +77,112 @@ class WhenParsedIDF(unittest.TestCase):
     def test_should_load_assay_with_transcription_micro(self):
         self.assertEqual(self.parser.ISA.studies[-1].assays[-1].measurement_type.term, "transcription profiling")
         self.assertEqual(self.parser.ISA.studies[-1].assays[-1].technology_type.term, "DNA microarray")
+
+
+class WhenSplittingSDRF(unittest.TestCase):
+    """ Test case using an SDRF file written in a temporary directory """
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self.idf_path = os.path.join(self._tmp_dir, 'E-TEST-1.idf.txt')
+        with open(self.idf_path, 'w', encoding='utf-8') as idf_fp:
+            idf_fp.write('Investigation Title\ttranscription profiling test\n'
+                         'Experiment Description\ttest\nSDRF File\tE-TEST-1.sdrf.txt\n')
+        self.sdrf_path = os.path.join(self._tmp_dir, 'E-TEST-1.sdrf.txt')
+        with open(self.sdrf_path, 'w', encoding='utf-8') as sdrf_fp:
+            sdrf_fp.write('Source Name\tCharacteristics[organism]\tProtocol REF\tTerm Source REF\tSample Name\t'
+                          'Material Type\tExtract Name\tTechnology Type\tHybridization Name\tArray Data File\n')
+            for i in range(25):
+                if i % 10 == 0:
+                    sdrf_fp.write('# comment\n')
+                sdrf_fp.write('source{0}\tHomo sapiens\tP-1\tEFO\tsample{1}\t{2}\textract{3}\tarray assay\t'
+                              'hyb{3}\tfile{3}.txt\n'.format(i // 4, i // 2, 'total RNA' if i % 3 else 'RNA-seq', i))
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def _split(self, chunk_size):
+        parser = MageTabParser()
+        parser.parse_idf(self.idf_path)
+        with patch('isatools.magetab.SDRF_CHUNK_SIZE', chunk_size):
+            table_files = parser.parse_sdrf_to_isa_table_files(self.sdrf_path)
+        return parser, {table_fp.name: table_fp.read() for table_fp in table_files}
+
+    def test_should_write_study_and_assay_tables(self):
+        parser, tables = self._split(chunk_size=10000)
+        self.assertEqual(list(tables.keys()), ['s_study.txt', 'a_assay-transcription profiling by array.txt'])
+        self.assertEqual(parser.ISA.studies[-1].assays[-1].technology_platform, 'transcription profiling by array')
+        study_lines = tables['s_study.txt'].splitlines()
+        self.assertEqual(study_lines[0], 'Source Name\tCharacteristics[organism]\tProtocol REF\tSample Name')
+        self.assertEqual(len(study_lines), 1 + 13)
+        assay_lines = tables['a_assay-transcription profiling by array.txt'].splitlines()
+        self.assertEqual(assay_lines[0], 'Sample Name\tCharacteristic[material]\tExtract Name\t'
+                                         'Hybridization Assay Name\tArray Data File')
+        self.assertEqual(len(assay_lines), 1 + 25)
+
+    def test_should_not_depend_on_chunk_size(self):
+        self.assertEqual(self._split(chunk_size=3)[1], self._split(chunk_size=10000)[1])
+
+    def test_should_write_same_table_files(self):
+        _, tables = self._split(chunk_size=10000)
+        parser = MageTabParser()
+        parser.parse_idf(self.idf_path)
+        filenames = parser.write_sdrf_to_isa_table_files(self.sdrf_path, self._tmp_dir)
+        self.assertEqual(filenames, list(tables.keys()))
+        for filename in filenames:
+            with open(os.path.join(self._tmp_dir, filename), encoding='utf-8') as table_fp:
+                self.assertEqual(table_fp.read(), tables[filename])
+
+    def _record_spool_files(self):
+        spool_files = []
+
+        def spooled_table_file():
+            spool_file = spooled_table_file.__wrapped__()
+            spool_files.append(spool_file)
+            return spool_file
+        spooled_table_file.__wrapped__ = magetab._spooled_table_file
+        return spool_files, patch('isatools.magetab._spooled_table_file', spooled_table_file)
+
+    def test_should_close_all_spool_files(self):
+        spool_files, spooled_table_file = self._record_spool_files()
+        with spooled_table_file:
+            self._split(chunk_size=10000)
+        # the study table, the assay type found and the default assay
+        self.assertEqual(len(spool_files), 3)
+        self.assertTrue(all(spool_file.closed for spool_file in spool_files))
+
+    def test_should_close_all_spool_files_on_error(self):
+        parser = MageTabParser()
+        parser.parse_idf(self.idf_path)
+        spool_files, spooled_table_file = self._record_spool_files()
+        with spooled_table_file, self.assertRaises(FileNotFoundError):
+            parser.write_sdrf_to_isa_table_files(self.sdrf_path, os.path.join(self._tmp_dir, 'missing'))
+        self.assertEqual(len(spool_files), 3)
+        self.assertTrue(all(spool_file.closed for spool_file in spool_files))
+
+
+class WhenMergingTables(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def test_should_merge_as_isatab(self):
+        study_path = os.path.join(self._tmp_dir, 's_study.txt')
+        assay_path = os.path.join(self._tmp_dir, 'a_assay.txt')
+        with open(study_path, 'w') as study_fp:
+            study_fp.write('Source Name\tCharacteristics[organism]\tProtocol REF\tSample Name\n'
+                           's1\tHomo sapiens\tP-1\tsample1\ns1\tHomo sapiens\tP-1\tsample2\n'
+                           's2\t"Mus, musculus"\tP-1\tsample3\n')
+        with open(assay_path, 'w') as assay_fp:
+            assay_fp.write('Sample Name\tProtocol REF\tExtract Name\tProtocol REF\tRaw Data File\n'
+                           'sample2\tP-2\te1\tP-3\tf1\nsample1\tP-2\te2\tP-3\t\nsample2\tP-2\te3\tP-3\tf3\n'
+                           'sample4\tP-2\te4\tP-3\tf4\n')
+        expected_path = os.path.join(self._tmp_dir, 'expected.txt')
+        isatab.merge_study_with_assay_tables(study_path, assay_path, expected_path)
+        merged_path = os.path.join(self._tmp_dir, 'merged.txt')
+        write_merged_table(isatab.read_tfile(study_path), isatab.read_tfile(assay_path), merged_path)
+        with open(expected_path) as expected_fp, open(merged_path) as merged_fp:
+            self.assertEqual(merged_fp.read(), expected_fp.read())
@@ -17,6 +17,7 @@ from isatools.model import (
 )
 import tempfile
 import shutil
+from io import StringIO
 
 
 def setUpModule():
@@ -110,6 +111,88 @@ class UnitSampleTabLoad(unittest.TestCase):
             self.assertEqual(len(ISA.studies[0].process_sequence), 109)
 
 
+class UnitSampleTabColumnGroups(unittest.TestCase):
+
+    SAMPLETAB = "\n".join([
+        "[MSI]",
+        "Submission Title\tTest SampleTab",
+        "Submission Identifier\tTEST-999",
+        "Submission Description\tColumn groups",
+        "Submission Version\t1.2",
+        "Submission Reference Layer\tfalse",
+        "Submission Release Date\t2017-01-01",
+        "Submission Update Date\t2017-02-01",
+        "Organization Name\tUniversity of Oxford",
+        "Organization Address\tOxford",
+        "Organization URI\thttp://www.ox.ac.uk",
+        "Organization Email\t",
+        "Organization Role\tinstitution",
+        "Term Source Name\tNCBI Taxonomy\tUO",
+        "Term Source URI\thttp://www.ncbi.nlm.nih.gov/taxonomy/\thttp://purl.obolibrary.org/obo/uo.owl",
+        "Term Source Version\t\t",
+        "[SCD]",
+        "\t".join(["Sample Name", "Sample Accession", "Sample Description", "Derived From", "Group Name",
+                   "Group Accession", "Characteristic[organism]", "Term Source REF", "Term Source ID",
+                   "Characteristic[age]", "Unit", "Term Source REF", "Term Source ID", "Characteristic[sex]"]),
+        "\t".join(["source1", "S1", "A source", "", "", "", "Homo sapiens", "NCBI Taxonomy", "9606",
+                   "50", "year", "UO", "UO_0000036", ""]),
+        "\t".join(["sample1", "S2", "", "S1", "group A", "G1", "Homo sapiens", "NCBI Taxonomy", "9606",
+                   "30", "year", "UO", "UO_0000036", "male"]),
+        "\t".join(["sample2", "S3", "", "S1", "group A", "G1", "Homo sapiens", "NCBI Taxonomy", "9606",
+                   "35", "year", "UO", "UO_0000036", "female"]),
+        "\t".join(["sample2", "S3", "", "S1", "group A", "G1", "Homo sapiens", "NCBI Taxonomy", "9606",
+                   "35", "year", "UO", "UO_0000036", "female"]),
+        ""
+    ])
+
+    def setUp(self):
+        self.ISA = sampletab.load(StringIO(self.SAMPLETAB))
+        self.study = self.ISA.studies[0]
+
+    def test_load(self):
+        self.assertEqual([s.name for s in self.study.sources], ["source1"])
+        self.assertEqual([s.name for s in self.study.samples], ["sample1", "sample2"])
+        self.assertEqual([c.term for c in self.study.characteristic_categories],
+                         ["Sample Accession", "Sample Description", "organism", "age", "sex", "Derived From"])
+        sample1 = self.study.samples[0]
+        self.assertEqual([(c.category.term, c.value) for c in sample1.characteristics[:2]],
+                         [("Sample Accession", "S2"), ("Derived From", "S1")])
+        self.assertEqual([(fv.factor_name.name, fv.value) for fv in sample1.factor_values],
+                         [("Group Name", "group A"), ("Group Accession", "G1")])
+        organism = sample1.characteristics[2].value
+        self.assertEqual(organism.term, "Homo sapiens")
+        self.assertEqual(organism.term_source.name, "NCBI Taxonomy")
+        self.assertEqual(organism.term_accession, "9606")
+        age = sample1.characteristics[3]
+        self.assertEqual(age.value, 30)
+        self.assertEqual(age.unit.term, "year")
+        self.assertEqual(age.unit.term_accession, "UO_0000036")
+        self.assertEqual(sample1.derives_from, self.study.sources)
+        self.assertEqual(len(self.study.process_sequence), 1)
+        self.assertEqual(self.study.process_sequence[0].inputs, self.study.sources)
+        self.assertEqual(self.study.process_sequence[0].outputs, self.study.samples)
+
+    def test_load_shares_annotations(self):
+        sample1, sample2 = self.study.samples
+        self.assertIs(sample1.characteristics[2].value, sample2.characteristics[2].value)
+        self.assertIs(sample1.characteristics[2].value, self.study.sources[0].characteristics[2].value)
+        self.assertIs(sample1.characteristics[3].unit, sample2.characteristics[3].unit)
+        self.assertEqual(self.study.units, [sample1.characteristics[3].unit])
+
+    def test_dumps(self):
+        sampletab_dump = sampletab.dumps(self.ISA)
+        self.assertIn("""[SCD]
+Sample Name	Sample Accession	Sample Description	Derived From	Group Name	Group Accession	\
+Characteristic[organism]	Term Source REF	Term Source ID	Characteristic[age]	Unit	Term Source REF	Term Source ID	\
+Characteristic[sex]
+source1	S1	A source				Homo sapiens	NCBI Taxonomy	9606	50	year	UO	UO_0000036
+sample1	S2		S1	group A	G1	Homo sapiens	NCBI Taxonomy	9606	30	year	UO	UO_0000036	male
+sample2	S3		S1	group A	G1	Homo sapiens	NCBI Taxonomy	9606	35	year	UO	UO_0000036	female
+""", sampletab_dump)
+        ISA = sampletab.load(StringIO(sampletab_dump))
+        self.assertEqual([s.name for s in ISA.studies[0].samples], ["sample1", "sample2"])
+
+
 class UnitSampleTabDump(unittest.TestCase):
 
     def setUp(self):
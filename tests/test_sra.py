@@ -1,8 +1,10 @@
 """Tests for exporting from ISA to SRA XML 1.5"""
+import hashlib
 import unittest
 import os
 import shutil
 import tempfile
+from unittest.mock import patch
 from lxml import etree
 
 from isatools.tests import utils
@@ -212,3 +214,93 @@ class TestSraExport(unittest.TestCase):
             self.assertTrue(
                 utils.assert_xml_equal(self._expected_project_set_xml_obj,
                                        actual_project_set_xml_obj))
+
+
+class TestDataFileHashes(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp_dir = tempfile.mkdtemp()
+        self._contents = {
+            'reads_1.fastq': b'@read1\nACGT\n+\n!!!!\n' * 100000,
+            'reads_2.fastq': b'@read2\nTTGA\n+\n####\n' * 1000,
+            'empty.sff': b''
+        }
+        for filename, content in self._contents.items():
+            with open(os.path.join(self._tmp_dir, filename), 'wb') as fp:
+                fp.write(content)
+        self._cache_path = os.path.join(self._tmp_dir, 'cache', 'hashes.json')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmp_dir)
+
+    def test_hash_datafiles(self):
+        datafilehashes = sra.hash_datafiles(self._tmp_dir, list(self._contents), algorithms=('md5', 'sha256'),
+                                            workers=2, buffer_size=1000)
+        self.assertEqual(list(datafilehashes), list(self._contents))
+        for filename, content in self._contents.items():
+            self.assertEqual(datafilehashes[filename], {
+                'md5': hashlib.md5(content).hexdigest(), 'sha256': hashlib.sha256(content).hexdigest()
+            })
+
+    def test_create_datafile_hashes(self):
+        datafilehashes = sra.create_datafile_hashes(self._tmp_dir, ['empty.sff', 'reads_2.fastq'])
+        self.assertEqual(datafilehashes, {
+            'empty.sff': 'd41d8cd98f00b204e9800998ecf8427e',
+            'reads_2.fastq': hashlib.md5(self._contents['reads_2.fastq']).hexdigest()
+        })
+        with self.assertRaises(FileNotFoundError):
+            sra.create_datafile_hashes(self._tmp_dir, ['reads_3.fastq'])
+
+    def test_cache(self):
+        filenames = list(self._contents)
+        expected = sra.create_datafile_hashes(self._tmp_dir, filenames, cache_path=self._cache_path)
+        self.assertTrue(os.path.isfile(self._cache_path))
+        with patch('isatools.sra.hash_file', side_effect=sra.hash_file) as mock_hash_file:
+            self.assertEqual(sra.create_datafile_hashes(self._tmp_dir, filenames, cache_path=self._cache_path),
+                             expected)
+            mock_hash_file.assert_not_called()
+            # a changed file is hashed again
+            with open(os.path.join(self._tmp_dir, 'empty.sff'), 'wb') as fp:
+                fp.write(b'not empty anymore')
+            datafilehashes = sra.create_datafile_hashes(self._tmp_dir, filenames, cache_path=self._cache_path)
+            self.assertEqual(mock_hash_file.call_count, 1)
+            self.assertEqual(datafilehashes['empty.sff'], hashlib.md5(b'not empty anymore').hexdigest())
+            # so is a file without the hash of a new algorithm
+            sra.hash_datafiles(self._tmp_dir, ['reads_2.fastq'], algorithms=('md5', 'sha1'),
+                               cache_path=self._cache_path)
+            self.assertEqual(mock_hash_file.call_count, 2)
+
+
+class TestSraXmlWriter(unittest.TestCase):
+
+    DOCUMENTS = [
+        '<R xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:noNamespaceSchemaLocation="x.xsd" a="1">\n'
+        '    <A>  </A>\n    <B>\n  text &amp; more  \n</B>\n    <C><D/> tail <E b="&quot;\tq&quot;">e</E></C>'
+        '  <!-- comment -->  <F/>\n</R>',
+        '<R>only &lt;text&gt; "quoted"</R>',
+        '<R><A b="line&#10;break&#13;&#10;tab&#9;" c=\'"\'/></R>',
+        '<R>\n\n</R>',
+        '<R>text<A>  </A>tail<B/></R>',
+    ]
+
+    def _minidom_pretty(self, xmlstr):
+        import xml.dom.minidom
+        exsub = etree.XML(xmlstr, parser=etree.XMLParser(remove_blank_text=True))
+        return xml.dom.minidom.parseString(etree.tostring(exsub)).toprettyxml()
+
+    def test_write_pretty_xml(self):
+        from io import StringIO
+        for document in self.DOCUMENTS:
+            # feed the document in chunks of every size
+            for size in (1, 2, 3, 7, len(document)):
+                chunks = [document[i:i + size] for i in range(0, len(document), size)]
+                with patch('isatools.sra.XML_FEED_SIZE', size):
+                    xml_file = StringIO()
+                    sra.write_pretty_xml(chunks, xml_file)
+                self.assertEqual(xml_file.getvalue(), self._minidom_pretty(document))
+
+    def test_template_environment_is_cached(self):
+        env = sra.get_sra_template_environment()
+        self.assertIs(sra.get_sra_template_environment(), env)
+        self.assertIs(env.get_template('run.xml'), env.get_template('run.xml'))
+        self.assertIs(sra.get_sra_schema('SRA.run.xsd'), sra.get_sra_schema('SRA.run.xsd'))
@@ -73,6 +73,17 @@ class TestIsaGraph(unittest.TestCase):
 
 class TestOlsSearch(unittest.TestCase):
 
+    def setUp(self):
+        # keep the OLS cache out of the user's cache directory
+        self.cache_dir = tempfile.mkdtemp()
+        self.client = ols.OLSClient(cache=ols.OLSCache(os.path.join(self.cache_dir, 'ols.sqlite')))
+        ols.set_default_client(self.client)
+
+    def tearDown(self):
+        self.client.close()
+        ols.set_default_client(None)
+        shutil.rmtree(self.cache_dir)
+
     def test_get_ontologies(self):
         ontology_sources = ols.get_ols_ontologies()
         self.assertGreater(len(ontology_sources), 0)
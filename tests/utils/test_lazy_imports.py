@@ -0,0 +1,40 @@
+import subprocess
+import sys
+import unittest
+
+import isatools
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_import_isatools_does_not_import_converters(self):
+        code = 'import sys, isatools; print(sorted(name for name in ("isatools.convert.isatab2json", ' \
+               '"isatools.net.mtbls", "pandas", "requests") if name in sys.modules))'
+        completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        self.assertEqual(completed.stdout.strip(), '[]')
+
+    def test_import_modules_depending_on_isatab_first(self):
+        for module_name in ('isatools.utils', 'isatools.create.model'):
+            completed = subprocess.run([sys.executable, '-c', 'import ' + module_name], capture_output=True, text=True)
+            self.assertEqual(completed.returncode, 0, completed.stderr)
+
+    def test_public_names(self):
+        from isatools import isatab2json, mtbls
+        from isatools.convert import isatab2json as isatab2json_module
+        from isatools.net import mtbls as mtbls_module
+        self.assertIs(isatab2json, isatab2json_module)
+        self.assertIs(isatools.isatab2json_module, isatab2json_module)
+        self.assertIs(mtbls, mtbls_module)
+        self.assertIs(isatools.mtbls_module, mtbls_module)
+        self.assertIn('sampletab2json', dir(isatools))
+
+    def test_subpackages(self):
+        self.assertEqual(isatools.isatab.__name__, 'isatools.isatab')
+        self.assertEqual(isatools.convert.json2isatab.__name__, 'isatools.convert.json2isatab')
+        self.assertEqual(isatools.net.pubmed.__name__, 'isatools.net.pubmed')
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            isatools.not_a_module
+        with self.assertRaises(AttributeError):
+            isatools.convert.not_a_converter
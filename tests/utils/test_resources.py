@@ -0,0 +1,59 @@
+import copy
+import json
+import os
+import pickle
+import unittest
+from types import MappingProxyType
+
+import yaml
+
+from isatools.create import constants
+from isatools.io import resources
+from isatools.model.protocol import load_protocol_types_info
+
+
+class TestResources(unittest.TestCase):
+
+    def test_get_resource_is_loaded_once(self):
+        protocol_types = resources.get_resource('config', 'yaml', 'protocol-types.yml')
+        self.assertIs(resources.get_resource('config', 'yaml', 'protocol-types.yml'), protocol_types)
+
+    def test_get_resource_matches_yaml_file(self):
+        study_config = resources.get_resource('config', 'yaml', 'study-creator-config.yml')
+        file_path = os.path.join(resources.RESOURCES_DIR, 'config', 'yaml', 'study-creator-config.yml')
+        with open(file_path) as yaml_file:
+            self.assertEqual(resources.thaw(study_config), yaml.load(yaml_file, Loader=yaml.FullLoader))
+
+    def test_get_resource_json(self):
+        qc_terms = resources.get_resource('qc_terms', 'qc_terms.json')
+        self.assertIsInstance(qc_terms, (MappingProxyType, tuple))
+
+    def test_get_resource_is_read_only(self):
+        study_config = resources.get_resource('config', 'yaml', 'study-creator-config.yml')
+        self.assertIsInstance(study_config, MappingProxyType)
+        self.assertIsInstance(study_config['study']['protocols'], tuple)
+        with self.assertRaises(TypeError):
+            study_config['study'] = {}
+
+    def test_get_resource_unsupported_file(self):
+        with self.assertRaises(ValueError):
+            resources.get_resource('isatools.ini')
+
+    def test_load_protocol_types_info(self):
+        protocol_types = load_protocol_types_info()
+        self.assertIsInstance(protocol_types, dict)
+        protocol_types.clear()
+        self.assertEqual(len(load_protocol_types_info().keys()), 16)
+        self.assertIs(load_protocol_types_info(read_only=True),
+                      resources.get_resource('config', 'yaml', 'protocol-types.yml'))
+
+    def test_create_constants_are_plain_containers(self):
+        self.assertIsInstance(constants.yaml_config, dict)
+        self.assertIsInstance(constants.yaml_config['study']['protocols'], list)
+        self.assertIsInstance(constants.assays_opts, list)
+        for value in (constants.yaml_config, constants.assays_opts):
+            self.assertEqual(copy.deepcopy(value), value)
+            self.assertEqual(pickle.loads(pickle.dumps(value)), value)
+            self.assertEqual(json.loads(json.dumps(value)), value)
+        self.assertEqual(constants.yaml_config,
+                         resources.thaw(resources.get_resource('config', 'yaml', 'study-creator-config.yml')))